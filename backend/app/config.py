@@ -42,6 +42,18 @@ def _env_int(name: str, default: str) -> int:
     except (TypeError, ValueError):
         return int(default)
 
+# Mock provider (LLM_PROVIDER=mock): offline, deterministic replies + seeded latency / error injection
+MOCK_MODEL_NAME = os.getenv("MOCK_MODEL_NAME", "mock-llm")
+MOCK_LLM_LATENCY_DIST = str(os.getenv("MOCK_LLM_LATENCY_DIST", "lognormal")).strip().lower()
+MOCK_LLM_LATENCY_MS = max(0, _env_int("MOCK_LLM_LATENCY_MS", "800"))
+MOCK_LLM_LATENCY_SPREAD = max(0.0, float(os.getenv("MOCK_LLM_LATENCY_SPREAD", "0.5")))
+MOCK_LLM_STREAM_CHUNK_MS = max(0, _env_int("MOCK_LLM_STREAM_CHUNK_MS", "20"))
+MOCK_LLM_REPLY_WORDS = max(1, _env_int("MOCK_LLM_REPLY_WORDS", "60"))
+MOCK_LLM_RATE_LIMIT_RATE = min(1.0, max(0.0, float(os.getenv("MOCK_LLM_RATE_LIMIT_RATE", "0.0"))))
+MOCK_LLM_TIMEOUT_RATE = min(1.0, max(0.0, float(os.getenv("MOCK_LLM_TIMEOUT_RATE", "0.0"))))
+MOCK_LLM_TIMEOUT_MS = max(0, _env_int("MOCK_LLM_TIMEOUT_MS", "5000"))
+MOCK_LLM_SEED = _env_int("MOCK_LLM_SEED", "42")
+
 # เนเธชเธ”เธเธชเธ–เธฒเธเธฐเน€เธฃเธดเนเธกเธ•เนเธ
 print(f"LLM Provider: {LLM_PROVIDER}")
 
@@ -87,6 +99,51 @@ ALLOWED_ORIGINS = _env_csv("ALLOWED_ORIGINS", "*")
 # ----------------------------------------------------------------------------- #
 # [PHASE 1] เธเธณเธเธฑเธ”เธเธณเธเธงเธเธเธฒเธฃเน€เธฃเธตเธขเธ LLM เธเธฃเนเธญเธกเธเธฑเธ (Global Semaphore)
 MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "10"))
+# Adaptive (AIMD) limiter: เริ่มที่ MAX_CONCURRENT_LLM_CALLS แล้วปรับตาม 429/timeout/latency
+LLM_LIMIT_INITIAL = max(1, _env_int("LLM_LIMIT_INITIAL", str(MAX_CONCURRENT_LLM_CALLS)))
+LLM_LIMIT_MIN = max(1, _env_int("LLM_LIMIT_MIN", "1"))
+LLM_LIMIT_MAX = max(LLM_LIMIT_MIN, _env_int("LLM_LIMIT_MAX", str(max(LLM_LIMIT_INITIAL, MAX_CONCURRENT_LLM_CALLS * 4))))
+LLM_LIMIT_LATENCY_TARGET_MS = max(100, _env_int("LLM_LIMIT_LATENCY_TARGET_MS", "20000"))
+LLM_LIMIT_DECREASE_FACTOR = float(os.getenv("LLM_LIMIT_DECREASE_FACTOR", "0.5"))
+# Staged pipeline: concurrency ของ cache tier (session/greeting/FAQ) และ retrieval (CPU pool แยก)
+PIPELINE_CACHE_CONCURRENCY = max(1, _env_int("PIPELINE_CACHE_CONCURRENCY", "64"))
+PIPELINE_RETRIEVAL_CONCURRENCY = max(1, _env_int("PIPELINE_RETRIEVAL_CONCURRENCY", "4"))
+# เริ่ม retrieval พร้อม session/greeting/FAQ lookup (ทิ้งผลถ้า cache tier ตอบได้)
+PIPELINE_SPECULATIVE_RETRIEVAL = _env_bool("PIPELINE_SPECULATIVE_RETRIEVAL", "true")
+# Hedged requests (OpenAI หลาย key): ยิงซ้ำไป key ถัดไปถ้า primary ช้ากว่า p95, จำกัดด้วย budget
+LLM_HEDGE_ENABLED = _env_bool("LLM_HEDGE_ENABLED", "false")
+LLM_HEDGE_DELAY_MS = max(0, _env_int("LLM_HEDGE_DELAY_MS", "3000"))  # ใช้จนกว่าจะมี latency sample พอ
+LLM_HEDGE_MIN_DELAY_MS = max(0, _env_int("LLM_HEDGE_MIN_DELAY_MS", "500"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_BUDGET_RATIO = max(0.0, float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.1")))
+LLM_HEDGE_BUDGET_BURST = max(1, _env_int("LLM_HEDGE_BUDGET_BURST", "3"))
+# Shared LLM quota (Redis token bucket ต่อ provider+key): "provider=RPM:TPM" คั่นด้วย comma, 0 = ไม่จำกัด
+LLM_QUOTA_ENABLED = _env_bool("LLM_QUOTA_ENABLED", "true")
+LLM_QUOTA_LIMITS = _env_csv("LLM_QUOTA_LIMITS", "")
+# สัดส่วน quota ที่งาน background ต้องเหลือไว้ให้ class ที่สูงกว่า (interactive > refresh > ingest)
+LLM_QUOTA_RESERVE_REFRESH = min(0.9, max(0.0, float(os.getenv("LLM_QUOTA_RESERVE_REFRESH", "0.3"))))
+LLM_QUOTA_RESERVE_INGEST = min(0.9, max(0.0, float(os.getenv("LLM_QUOTA_RESERVE_INGEST", "0.5"))))
+LLM_QUOTA_INTERACTIVE_MAX_WAIT_MS = max(0, _env_int("LLM_QUOTA_INTERACTIVE_MAX_WAIT_MS", "2000"))
+LLM_QUOTA_COMPLETION_ESTIMATE = max(0, _env_int("LLM_QUOTA_COMPLETION_ESTIMATE", "512"))
+# FAQ refresh: เว้นระยะระหว่างคำถาม (วินาที) เมื่อ provider ไม่มี LLM_QUOTA_LIMITS ให้ quota limiter คุม
+FAQ_REFRESH_PACING_S = max(0.0, float(os.getenv("FAQ_REFRESH_PACING_S", "5")))
+# Circuit breaker ต่อ provider/key: failure ติดกันครบ threshold → fail fast ไป fallback, probe ใหม่หลัง cooldown
+LLM_BREAKER_ENABLED = _env_bool("LLM_BREAKER_ENABLED", "true")
+LLM_BREAKER_FAILURE_THRESHOLD = max(1, _env_int("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = max(1, _env_int("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+LLM_BREAKER_MAX_COOLDOWN_SECONDS = max(LLM_BREAKER_COOLDOWN_SECONDS, _env_int("LLM_BREAKER_MAX_COOLDOWN_SECONDS", "300"))
+# Deadline ต่อ request (queue request_timeout / realtime timeout): งบที่ต้องเหลือก่อนเริ่มงานแต่ละแบบ
+# ไม่พอ → ข้ามงานเสริม (rerank / retry / fallback provider) หรือตอบแบบ degraded แทนการรอจน timeout
+LLM_DEADLINE_MIN_CALL_S = max(0.0, float(os.getenv("LLM_DEADLINE_MIN_CALL_S", "1.5")))
+LLM_DEADLINE_MIN_RERANK_S = max(0.0, float(os.getenv("LLM_DEADLINE_MIN_RERANK_S", "3")))
+# กันเวลาท้ายงบไว้ส่งคำตอบ degraded ก่อน timeout ภายนอกตัด (ไม่เกิน 20% ของงบ)
+LLM_DEADLINE_RESERVE_S = max(0.0, float(os.getenv("LLM_DEADLINE_RESERVE_S", "1")))
+# รวมคำถามเดียวกันที่กำลังประมวลผลพร้อมกันให้รัน retrieval + LLM ครั้งเดียว (single-flight, เฉพาะ turn ที่ไม่มี history)
+LLM_SINGLE_FLIGHT_ENABLED = _env_bool("LLM_SINGLE_FLIGHT_ENABLED", "true")
+# ความละเอียดของเวลาใน prompt: hour / day (ยิ่งหยาบ prompt ยิ่งซ้ำกันได้นาน)
+PROMPT_TIME_GRANULARITY = str(os.getenv("PROMPT_TIME_GRANULARITY", "hour")).strip().lower()
+if PROMPT_TIME_GRANULARITY not in {"hour", "day", "second"}:
+    PROMPT_TIME_GRANULARITY = "hour"
 
 # [PHASE 2] เธเธตเธขเนเธชเธณเธซเธฃเธฑเธเธ•เธฃเธงเธเธชเธญเธเธเธงเธฒเธกเธ–เธนเธเธ•เนเธญเธ
 AUTH_SECRET_KEY = os.getenv("AUTH_SECRET_KEY", "your-university-sso-secret")
@@ -105,6 +162,12 @@ AUDIT_LOG_MAX_SIZE_MB = max(1, _env_int("AUDIT_LOG_MAX_SIZE_MB", "20"))
 # ----------------------------------------------------------------------------- #
 # จำนวน worker สำหรับประมวลผล LLM request พร้อมกัน
 QUEUE_NUM_WORKERS = max(1, _env_int("QUEUE_NUM_WORKERS", "10"))
+# Elastic worker pool: ขยาย/ลด worker ตาม backlog + LLM limiter headroom (QUEUE_NUM_WORKERS = ขนาดเริ่มต้น)
+QUEUE_MIN_WORKERS = max(1, _env_int("QUEUE_MIN_WORKERS", "2"))
+QUEUE_MAX_WORKERS = max(QUEUE_MIN_WORKERS, _env_int("QUEUE_MAX_WORKERS", "32"))
+# ขยายจนระบาย backlog ได้ภายในกี่วินาที / ปลด worker ที่ว่างนานเกินกี่วินาที
+QUEUE_SCALE_TARGET_WAIT_S = max(0.5, float(os.getenv("QUEUE_SCALE_TARGET_WAIT_S", "5")))
+QUEUE_SCALE_DOWN_IDLE_S = max(5, _env_int("QUEUE_SCALE_DOWN_IDLE_S", "120"))
 # จำนวน request สูงสุดที่รอในคิว (pending + active)
 QUEUE_MAX_SIZE = max(10, _env_int("QUEUE_MAX_SIZE", "200"))
 # จำนวน request สูงสุดต่อผู้ใช้ (pending + active)
@@ -113,6 +176,29 @@ QUEUE_PER_USER_LIMIT = max(1, _env_int("QUEUE_PER_USER_LIMIT", "3"))
 QUEUE_REQUEST_TIMEOUT = max(10, _env_int("QUEUE_REQUEST_TIMEOUT", "120"))
 # ระยะเวลาระหว่าง health log (วินาที)
 QUEUE_HEALTH_LOG_INTERVAL = max(10, _env_int("QUEUE_HEALTH_LOG_INTERVAL", "60"))
+# น้ำหนักต่อ priority class (ส่วนแบ่ง dispatch เมื่อทุก class มีงานค้าง) "class=weight,..."
+QUEUE_CLASS_WEIGHTS = _env_csv("QUEUE_CLASS_WEIGHTS", "realtime=16,web=4,messenger=2,background=1")
+# จำนวน request ต่อผู้ใช้ต่อรอบ (deficit round-robin ภายใน class เดียวกัน)
+QUEUE_USER_QUANTUM = max(1, _env_int("QUEUE_USER_QUANTUM", "1"))
+# รวบการแจ้งลำดับคิวเป็น batch ทุกกี่ ms (ส่งเฉพาะผู้ใช้ที่ลำดับเปลี่ยน)
+QUEUE_POSITION_BROADCAST_MS = max(0, _env_int("QUEUE_POSITION_BROADCAST_MS", "500"))
+# Admission control: ทำนายเวลาเสร็จจาก EWMA service time ถ้าเกิน QUEUE_REQUEST_TIMEOUT
+# ตอบจาก FAQ / เอกสารโดยไม่ใช้ LLM หรือปฏิเสธทันที (แทนรอจน timeout)
+QUEUE_ADMISSION_CONTROL = _env_bool("QUEUE_ADMISSION_CONTROL", "true")
+QUEUE_ADMISSION_MIN_SAMPLES = max(1, _env_int("QUEUE_ADMISSION_MIN_SAMPLES", "5"))
+QUEUE_SERVICE_EWMA_ALPHA = min(1.0, max(0.01, float(os.getenv("QUEUE_SERVICE_EWMA_ALPHA", "0.2"))))
+# Write-ahead log ของคิว: รวม submit/complete เป็น batch ลง Redis ทุกกี่ ms (crash ไม่เสียคิว)
+QUEUE_WAL_FLUSH_MS = max(0, _env_int("QUEUE_WAL_FLUSH_MS", "20"))
+# Recovery คิวค้างหลัง restart: re-queue ที่ priority background พร้อมกันกี่รายการ / เริ่มกี่รายการต่อวินาที
+QUEUE_RECOVERY_CONCURRENCY = max(1, _env_int("QUEUE_RECOVERY_CONCURRENCY", "4"))
+QUEUE_RECOVERY_RATE = max(0.0, float(os.getenv("QUEUE_RECOVERY_RATE", "2")))
+# Client หลุด (socket ทุกตัวของ session disconnect นานเกินกี่วินาที / HTTP abort) → cancel งานในคิว + ที่กำลังทำ
+QUEUE_DISCONNECT_GRACE_S = max(0.0, float(os.getenv("QUEUE_DISCONNECT_GRACE_S", "5")))
+QUEUE_DISCONNECT_POLL_S = max(0.1, float(os.getenv("QUEUE_DISCONNECT_POLL_S", "1")))
+# Queue backend: memory = คิวใน process (ค่าเริ่มต้น) / redis = Redis Streams + consumer group
+# (หลาย uvicorn worker / หลาย node ใช้คิว + per-user limit ร่วมกัน; admission control / elastic pool ใช้ได้เฉพาะ memory)
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "memory").strip().lower()
+QUEUE_REDIS_PREFIX = os.getenv("QUEUE_REDIS_PREFIX", "reg01:q").strip() or "reg01:q"
 
 # ----------------------------------------------------------------------------- #
 # DATABASE (PostgreSQL)
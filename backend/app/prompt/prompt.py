@@ -1,8 +1,19 @@
 from datetime import datetime
 
+from app.config import PROMPT_TIME_GRANULARITY
 
-def get_current_time():
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def get_current_time(granularity: str = PROMPT_TIME_GRANULARITY):
+    """
+    เวลาปัจจุบันสำหรับใส่ใน prompt — ปัดเป็นชั่วโมง/วัน
+    เพื่อไม่ให้ prompt ต่างกันทุกวินาที (ส่วนท้ายของ prompt เท่านั้นที่เปลี่ยน)
+    """
+    now = datetime.now()
+    if granularity == "day":
+        return now.strftime("%Y-%m-%d")
+    if granularity == "second":
+        return now.strftime("%Y-%m-%d %H:%M:%S")
+    return now.strftime("%Y-%m-%d %H:00")
 
 
 # ---------------------------------------------------------------------------
@@ -34,6 +45,97 @@ _GROUNDED_CONTRACT = """Grounded/Citation Contract:
 - ถ้าข้อมูลไม่พอหรือไม่แน่ใจ ให้ตอบปฏิเสธอย่างปลอดภัยและบอกว่าไม่มีข้อมูลพอ"""
 
 
+_BACKGROUND_KNOWLEDGE = """ความรู้พื้นฐาน:
+- มหาวิทยาลัยเชียงใหม่ใช้ระบบ 2 ภาคเรียน และภาคฤดูร้อน
+- "ดรอป" หมายถึง "ถอนกระบวนวิชา"
+- หากข้อมูลเป็นช่วงวันที่ และถามว่า "เริ่ม" → ใช้วันแรกของช่วง"""
+
+
+_ANSWER_RULES = """กฎสำคัญ:
+- ใช้ข้อมูลได้เฉพาะในส่วน "ข้อมูลอ้างอิง" เท่านั้น
+- ห้ามปฏิเสธข้อมูล หากใน context มีช่วงวันที่ที่สอดคล้องกับคำถาม
+- หากไม่มีข้อมูลที่เกี่ยวข้อง → ตอบว่า "ข้อมูลส่วนนี้ไม่มีระบุ"
+- ตอบตรงคำถามทันที ใช้ "//" สำหรับเว้นวรรค"""
+
+
+# ---------------------------------------------------------------------------
+# Static system blocks — เหมือนกันทุก request (cacheable prefix)
+# ---------------------------------------------------------------------------
+UNIFIED_SYSTEM_PROMPT = f"""{_PERSONA_RULES}
+
+{_SEMESTER_GUIDE}
+{_GROUNDED_CONTRACT}
+
+{_BACKGROUND_KNOWLEDGE}
+
+{_ANSWER_RULES}"""
+
+
+CHAT_SYSTEM_PROMPT = f"""{_PERSONA_RULES}
+
+คุณคือ 'พี่เร็ก' ผู้ช่วย AI สำหรับนักศึกษาและบุคลากรของมหาวิทยาลัยเชียงใหม่
+ตอบคำถามอย่างสุภาพ จริงใจ และให้คำปรึกษาแบบเข้าใจง่าย
+ห้ามเดา ห้ามสมมุติ ห้ามให้ความเห็นส่วนตัว"""
+
+
+_LANG_INSTRUCTIONS = {
+    "th": "ตอบเป็นภาษาไทยแบบภาษาพูดที่สุภาพ ชัดเจน เหมาะกับการอ่านออกเสียง",
+    "en": "Respond in clear, spoken-style English suitable for TTS. Avoid slang.",
+    "zh": "请用简体中文作答，不要使用拼音或翻译",
+    "ja": "日本語で丁寧に答えてください。話し言葉スタイルでお願いします。",
+}
+
+
+def _language_instruction(detected_lang: str) -> str:
+    lang_key = "th"
+    for prefix in ["th", "en", "zh", "ja"]:
+        if str(detected_lang or "").startswith(prefix):
+            lang_key = prefix
+            break
+    return _LANG_INSTRUCTIONS.get(lang_key, _LANG_INSTRUCTIONS["th"])
+
+
+def join_prompt_parts(system_prompt: str, user_prompt: str) -> str:
+    """รวม system + user เป็น prompt เดียว (provider/เครื่องมือที่รับข้อความเดียว)"""
+    return f"{system_prompt}\n\n{user_prompt}"
+
+
+def build_unified_prompt_parts(
+    question: str,
+    context: str,
+    history_text: str = "",
+    detected_lang: str = "th",
+) -> tuple[str, str]:
+    """
+    Single-pass unified prompt แบบแยกส่วน → (system_prompt, user_prompt)
+
+    ลำดับ (stable prefix → volatile tail) เพื่อให้ provider prompt caching ทำงาน:
+    1. system: persona / grounded contract / ความรู้พื้นฐาน (คงที่ทุก request)
+    2. user:   ข้อมูลอ้างอิง (เหมือนกันเมื่อคำถามคล้ายกัน)
+    3. user:   เวลา (ปัดชั่วโมง/วัน) / ภาษา / ประวัติ / คำถาม (เปลี่ยนทุก turn)
+    """
+    context_section = ""
+    if context.strip():
+        context_section = f"""ข้อมูลอ้างอิง (ใช้ได้เท่านั้น):
+{context}
+
+"""
+
+    history_section = ""
+    if history_text.strip():
+        history_section = f"""ประวัติการสนทนา (ล่าสุด):
+{history_text}
+
+"""
+
+    user_prompt = f"""{context_section}เวลาปัจจุบัน = {get_current_time()}
+{_language_instruction(detected_lang)}
+
+{history_section}คำถาม: {question}
+ตอบ:"""
+    return UNIFIED_SYSTEM_PROMPT, user_prompt
+
+
 def build_unified_prompt(
     question: str,
     context: str,
@@ -44,56 +146,26 @@ def build_unified_prompt(
     Single-pass unified prompt — ใช้สำหรับทุก query (มี context แนบเสมอ)
     ลดจาก 2-pass เหลือ 1-pass → ประหยัด token 50%+
     """
-    current_time = get_current_time()
-
-    # Language-specific instruction
-    lang_instruction = {
-        "th": "ตอบเป็นภาษาไทยแบบภาษาพูดที่สุภาพ ชัดเจน เหมาะกับการอ่านออกเสียง",
-        "en": "Respond in clear, spoken-style English suitable for TTS. Avoid slang.",
-        "zh": "请用简体中文作答，不要使用拼音或翻译",
-        "ja": "日本語で丁寧に答えてください。話し言葉スタイルでお願いします。",
-    }
-    lang_key = "th"
-    for prefix in ["th", "en", "zh", "ja"]:
-        if detected_lang.startswith(prefix):
-            lang_key = prefix
-            break
-    instruction = lang_instruction.get(lang_key, lang_instruction["th"])
+    return join_prompt_parts(*build_unified_prompt_parts(question, context, history_text, detected_lang))
 
+
+def context_prompt_parts(question: str, history_text: str = "") -> tuple[str, str]:
+    """
+    Lightweight prompt แบบแยกส่วน → (system_prompt, user_prompt)
+    system คงที่ / เวลา ประวัติ และคำถามอยู่ท้ายสุด
+    """
     history_section = ""
     if history_text.strip():
-        history_section = f"""
-ประวัติการสนทนา (ล่าสุด):
+        history_section = f"""ประวัติการสนทนา:
 {history_text}
-"""
 
-    context_section = ""
-    if context.strip():
-        context_section = f"""
-ข้อมูลอ้างอิง (ใช้ได้เท่านั้น):
-{context}
 """
 
-    return f"""เวลาปัจจุบัน = {current_time}
-{_PERSONA_RULES}
-{instruction}
+    user_prompt = f"""เวลาปัจจุบัน = {get_current_time()}
 
-{_SEMESTER_GUIDE}
-{_GROUNDED_CONTRACT}
-
-ความรู้พื้นฐาน:
-- มหาวิทยาลัยเชียงใหม่ใช้ระบบ 2 ภาคเรียน และภาคฤดูร้อน
-- "ดรอป" หมายถึง "ถอนกระบวนวิชา"
-- หากข้อมูลเป็นช่วงวันที่ และถามว่า "เริ่ม" → ใช้วันแรกของช่วง
-{context_section}{history_section}
-กฎสำคัญ:
-- ใช้ข้อมูลได้เฉพาะในส่วน "ข้อมูลอ้างอิง" เท่านั้น
-- ห้ามปฏิเสธข้อมูล หากใน context มีช่วงวันที่ที่สอดคล้องกับคำถาม
-- หากไม่มีข้อมูลที่เกี่ยวข้อง → ตอบว่า "ข้อมูลส่วนนี้ไม่มีระบุ"
-- ตอบตรงคำถามทันที ใช้ "//" สำหรับเว้นวรรค
-
-คำถาม: {question}
+{history_section}คำถาม: {question}
 ตอบ:"""
+    return CHAT_SYSTEM_PROMPT, user_prompt
 
 
 def context_prompt(question: str) -> str:
@@ -101,15 +173,4 @@ def context_prompt(question: str) -> str:
     Lightweight prompt สำหรับ casual chat (ไม่มี context จาก RAG)
     ใช้เมื่อระบบตรวจพบว่าคำถามไม่ต้องการค้นหา knowledge base
     """
-    current_time = get_current_time()
-
-    return f"""เวลาปัจจุบัน = {current_time}
-{_PERSONA_RULES}
-
-คุณคือ 'พี่เร็ก' ผู้ช่วย AI สำหรับนักศึกษาและบุคลากรของมหาวิทยาลัยเชียงใหม่
-ตอบคำถามอย่างสุภาพ จริงใจ และให้คำปรึกษาแบบเข้าใจง่าย
-ห้ามเดา ห้ามสมมุติ ห้ามให้ความเห็นส่วนตัว
-
-คำถาม: {question}
-ตอบ:"""
-
+    return join_prompt_parts(*context_prompt_parts(question))
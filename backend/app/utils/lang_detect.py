@@ -0,0 +1,124 @@
+"""
+Language detection จากการนับ Unicode script (Thai / CJK / Kana / Latin)
+
+- ทำงานใน event loop ได้เลย (ไม่ต้อง to_thread) และ deterministic ต่างจาก langdetect
+- langdetect ใช้เป็น fallback เฉพาะข้อความ Latin ที่ยาวพอและแยกไม่ได้ว่าภาษาอะไร
+- ผลลัพธ์ถูก memoize ต่อข้อความที่ normalize แล้ว
+"""
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from langdetect import DetectorFactory
+    from langdetect import detect as _langdetect_detect
+
+    DetectorFactory.seed = 0  # deterministic
+except ImportError:  # pragma: no cover - optional at runtime
+    _langdetect_detect = None
+
+DEFAULT_LANGUAGE = "th"
+
+# Latin ที่สั้นกว่านี้ langdetect เดามั่ว → ถือเป็นภาษาอังกฤษ
+_MIN_LATIN_FOR_LANGDETECT = 24
+_THAI_SHARE = 0.3
+_CACHE_SIZE = 4096
+_MAX_KEY_CHARS = 512
+
+
+def script_counts(text: str) -> Dict[str, int]:
+    """นับตัวอักษรตาม script: thai / cjk / kana / latin"""
+    counts = {"thai": 0, "cjk": 0, "kana": 0, "latin": 0}
+    for ch in str(text or ""):
+        code = ord(ch)
+        if 0x0E00 <= code <= 0x0E7F:
+            counts["thai"] += 1
+        elif 0x3040 <= code <= 0x30FF or 0x31F0 <= code <= 0x31FF or 0xFF66 <= code <= 0xFF9F:
+            counts["kana"] += 1
+        elif 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0xF900 <= code <= 0xFAFF:
+            counts["cjk"] += 1
+        elif ch.isascii() and ch.isalpha():
+            counts["latin"] += 1
+    return counts
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()[:_MAX_KEY_CHARS]
+
+
+def _classify_scripts(counts: Dict[str, int]) -> Optional[str]:
+    """ตัดสินจาก script อย่างเดียว; None = Latin ที่ต้องให้ langdetect ช่วย"""
+    letters = sum(counts.values())
+    if letters == 0:
+        return DEFAULT_LANGUAGE
+    if counts["thai"] and counts["thai"] >= letters * _THAI_SHARE:
+        return "th"
+    if counts["kana"]:
+        return "ja"  # ญี่ปุ่นมี kana ปนเสมอ, จีนไม่มี
+    if counts["cjk"] >= counts["latin"]:
+        return "zh"
+    if counts["thai"] > counts["latin"]:
+        return "th"
+    if counts["latin"] < _MIN_LATIN_FOR_LANGDETECT:
+        return "en"
+    return None
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _detect_fast_cached(key: str) -> Optional[str]:
+    return _classify_scripts(script_counts(key))
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _detect_cached(key: str) -> str:
+    fast = _detect_fast_cached(key)
+    if fast is not None:
+        return fast
+    if _langdetect_detect is None:
+        return "en"
+    try:
+        return str(_langdetect_detect(key))
+    except Exception as exc:
+        logger.debug("langdetect fallback failed: %s", exc)
+        return "en"
+
+
+def detect_language_fast(text: str) -> Optional[str]:
+    """
+    Script-only detection (ไม่ block) — คืน None เมื่อเป็น Latin ยาวที่ต้องใช้ langdetect
+    ใช้ใน hot path: `detect_language_fast(msg) or await asyncio.to_thread(detect_language, msg)`
+    """
+    return _detect_fast_cached(_normalize(text))
+
+
+def detect_language(text: str) -> str:
+    """ISO-639-1 code (th / en / zh / ja / langdetect result), memoized per normalized text"""
+    return _detect_cached(_normalize(text))
+
+
+def classify_document_language(text: str, sample_chars: int = 5000) -> str:
+    """
+    ภาษาหลักของเอกสาร (ingest metadata): 'th' / 'en' / 'mixed'
+    เกณฑ์เดิมของ metadata_extractor: script หนึ่งต้องมากกว่าอีกฝั่ง 2 เท่า
+    """
+    counts = script_counts(str(text or "")[:sample_chars])
+    thai_chars = counts["thai"]
+    eng_chars = counts["latin"]
+    if thai_chars > eng_chars * 2:
+        return "th"
+    if eng_chars > thai_chars * 2:
+        return "en"
+    return "mixed"
+
+
+def get_cache_stats() -> Dict[str, int]:
+    info = _detect_cached.cache_info()
+    fast = _detect_fast_cached.cache_info()
+    return {
+        "hits": info.hits + fast.hits,
+        "misses": info.misses + fast.misses,
+        "size": info.currsize + fast.currsize,
+    }
@@ -0,0 +1,188 @@
+"""
+Adaptive (AIMD) concurrency limiter for LLM provider calls.
+
+แทน asyncio.Semaphore แบบค่าคงที่:
+- Additive increase: ทุกครั้งที่มี call สำเร็จและ latency ปกติครบ `limit` ครั้ง → limit + 1
+- Multiplicative decrease: เจอ 429 / timeout → limit × decrease_factor
+  (ลดได้ครั้งเดียวต่อ cooldown เพื่อไม่ให้ burst ของ 429 จาก call ที่ค้างอยู่กด limit จนติดพื้น)
+- latency เกิน target → ไม่เพิ่ม limit (ถือว่าเริ่มแน่น)
+
+ใช้งาน:
+    async with llm_limiter:
+        ... provider call ...
+    llm_limiter.on_success(latency_s) / llm_limiter.on_overload()
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.config import (
+    LLM_LIMIT_DECREASE_FACTOR,
+    LLM_LIMIT_INITIAL,
+    LLM_LIMIT_LATENCY_TARGET_MS,
+    LLM_LIMIT_MAX,
+    LLM_LIMIT_MIN,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str = "llm",
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 40,
+        decrease_factor: float = 0.5,
+        latency_target_s: float = 20.0,
+        decrease_cooldown_s: float = 2.0,
+    ):
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.decrease_factor = min(0.95, max(0.1, float(decrease_factor)))
+        self.latency_target_s = max(0.1, float(latency_target_s))
+        self.decrease_cooldown_s = max(0.0, float(decrease_cooldown_s))
+
+        self._limit = min(self.max_limit, max(self.min_limit, int(initial_limit)))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._successes_since_change = 0
+        self._last_decrease_at = 0.0
+        self._latency_ewma: Optional[float] = None
+
+        # counters
+        self._total_success = 0
+        self._total_overload = 0
+        self._total_error = 0
+        self._increases = 0
+        self._decreases = 0
+        self._peak_in_flight = 0
+
+    # ── slot management ──────────────────────────────────────────────
+    async def acquire(self) -> None:
+        if self._in_flight < self._limit and not self._waiters:
+            self._take_slot()
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut  # slot is handed over by _wake()
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was granted just before cancellation → give it back
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self) -> None:
+        self._in_flight = max(0, self._in_flight - 1)
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def _take_slot(self) -> None:
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self._limit:
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self._take_slot()
+            fut.set_result(None)
+
+    # ── feedback ─────────────────────────────────────────────────────
+    def on_success(self, latency_s: float) -> None:
+        self._total_success += 1
+        latency_s = max(0.0, float(latency_s))
+        self._latency_ewma = latency_s if self._latency_ewma is None else (
+            0.8 * self._latency_ewma + 0.2 * latency_s
+        )
+        if latency_s > self.latency_target_s:
+            # Slow but successful: hold the limit where it is
+            self._successes_since_change = 0
+            return
+
+        self._successes_since_change += 1
+        if self._successes_since_change >= self._limit and self._limit < self.max_limit:
+            self._limit += 1
+            self._increases += 1
+            self._successes_since_change = 0
+            logger.debug("[%s] limiter +1 → %d", self.name, self._limit)
+            self._wake()
+
+    def on_overload(self) -> None:
+        """429 / timeout — multiplicative decrease (once per cooldown window)."""
+        self._total_overload += 1
+        self._successes_since_change = 0
+        now = time.monotonic()
+        if now - self._last_decrease_at < self.decrease_cooldown_s:
+            return
+        new_limit = max(self.min_limit, int(self._limit * self.decrease_factor))
+        if new_limit < self._limit:
+            logger.warning("[%s] provider overload → limit %d → %d", self.name, self._limit, new_limit)
+            self._limit = new_limit
+            self._decreases += 1
+        self._last_decrease_at = now
+
+    def on_error(self) -> None:
+        """Non-overload failure: does not move the limit."""
+        self._total_error += 1
+
+    # ── introspection ────────────────────────────────────────────────
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def available(self) -> int:
+        """Slots free right now under the current limit (LLM queue sizes its worker pool on this)"""
+        return max(0, self._limit - self._in_flight)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self._limit,
+            "in_flight": self._in_flight,
+            "waiting": sum(1 for fut in self._waiters if not fut.done()),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "peak_in_flight": self._peak_in_flight,
+            "latency_ewma_ms": round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+            "latency_target_ms": round(self.latency_target_s * 1000, 1),
+            "total_success": self._total_success,
+            "total_overload": self._total_overload,
+            "total_error": self._total_error,
+            "increases": self._increases,
+            "decreases": self._decreases,
+        }
+
+
+# Shared limiter for provider calls (replaces the fixed llm_semaphore)
+llm_limiter = AdaptiveLimiter(
+    name="llm",
+    initial_limit=LLM_LIMIT_INITIAL,
+    min_limit=LLM_LIMIT_MIN,
+    max_limit=LLM_LIMIT_MAX,
+    decrease_factor=LLM_LIMIT_DECREASE_FACTOR,
+    latency_target_s=LLM_LIMIT_LATENCY_TARGET_MS / 1000.0,
+)
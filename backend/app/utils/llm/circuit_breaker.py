@@ -0,0 +1,253 @@
+"""
+Circuit breaker ต่อ provider / key สำหรับ LLM calls (แนวเดียวกับ _CircuitBreaker ใน app/tts_multi.py)
+
+- closed:    เรียกได้ปกติ นับ failure ติดกัน
+- open:      failure ติดกันครบ threshold → fail fast ทันที (ไม่ retry / ไม่ sleep / ไม่ถือ slot)
+- half_open: พ้น cooldown → ปล่อย probe ได้ทีละ 1 call; สำเร็จ = closed, พัง = open อีกรอบ (cooldown x2)
+
+ถ้า register probe ไว้ จะ probe แบบ background (เช่น models.list) เมื่อครบ cooldown
+→ ไม่ต้องให้ผู้ใช้จริงเป็นคนลองเรียก provider ที่ยังล่มอยู่
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import (
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_BREAKER_ENABLED,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_MAX_COOLDOWN_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+_PROBE_TIMEOUT_S = 10.0
+
+
+class CircuitOpenError(RuntimeError):
+    """Provider/key ถูกตัดวงจรอยู่ — caller ควร fallback ทันที"""
+
+    def __init__(self, key: str, retry_in_s: float = 0.0):
+        super().__init__(f"LLM circuit open for {key} (retry in {retry_in_s:.0f}s)")
+        self.key = key
+        self.retry_in_s = retry_in_s
+
+
+class _Circuit:
+    __slots__ = (
+        "state", "failures", "opened_until", "cooldown_s", "probe_in_flight",
+        "opens", "rejected", "last_error",
+    )
+
+    def __init__(self, cooldown_s: float):
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self.cooldown_s = cooldown_s
+        self.probe_in_flight = False
+        self.opens = 0
+        self.rejected = 0
+        self.last_error = ""
+
+
+class LLMCircuitBreaker:
+    def __init__(
+        self,
+        enabled: bool = True,
+        failure_threshold: int = 5,
+        cooldown_s: float = 30.0,
+        max_cooldown_s: float = 300.0,
+    ):
+        self.enabled = bool(enabled)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_cooldown_s = max(0.01, float(cooldown_s))
+        self.max_cooldown_s = max(self.base_cooldown_s, float(max_cooldown_s))
+        self._circuits: Dict[str, _Circuit] = {}
+        self._probes: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._probe_tasks: Dict[str, asyncio.Task] = {}
+
+    def _circuit(self, key: str) -> _Circuit:
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = _Circuit(self.base_cooldown_s)
+            self._circuits[key] = circuit
+        return circuit
+
+    def register_probe(self, key: str, probe: Callable[[], Awaitable[Any]]) -> None:
+        """probe = coroutine factory ราคาถูก (เช่น client.models.list) ใช้ทดสอบตอน half-open"""
+        self._probes[key] = probe
+
+    # ── call gating ──────────────────────────────────────────────────
+    def allow(self, key: str) -> bool:
+        if not self.enabled:
+            return True
+        circuit = self._circuit(key)
+        if circuit.state == STATE_CLOSED:
+            return True
+        now = time.monotonic()
+        if circuit.state == STATE_OPEN and now >= circuit.opened_until and key not in self._probe_tasks:
+            # ไม่มี background probe → ให้ call จริงตัวแรกเป็น probe
+            circuit.state = STATE_HALF_OPEN
+            circuit.probe_in_flight = False
+        if circuit.state == STATE_HALF_OPEN and not circuit.probe_in_flight:
+            circuit.probe_in_flight = True
+            logger.info("LLM circuit half-open for %s: probing with a live call", key)
+            return True
+        circuit.rejected += 1
+        return False
+
+    def check(self, key: str) -> None:
+        """allow() แบบ raise CircuitOpenError"""
+        if not self.allow(key):
+            raise CircuitOpenError(key, self.retry_in(key))
+
+    def retry_in(self, key: str) -> float:
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit.state == STATE_CLOSED:
+            return 0.0
+        return max(0.0, circuit.opened_until - time.monotonic())
+
+    def is_open(self, key: str) -> bool:
+        circuit = self._circuits.get(key)
+        return bool(self.enabled and circuit is not None and circuit.state != STATE_CLOSED)
+
+    async def call(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        is_failure: Callable[[BaseException], bool],
+    ) -> Any:
+        """
+        เรียก fn() ผ่าน breaker: error ที่ is_failure() = True นับเป็น failure,
+        error อื่น (เช่น 400) แปลว่า provider ยังตอบได้ → นับเป็น success ของวงจร
+        """
+        self.check(key)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.release(key)
+            raise
+        except Exception as exc:
+            if is_failure(exc):
+                self.record_failure(key, exc)
+            else:
+                self.record_success(key)
+            raise
+        self.record_success(key)
+        return result
+
+    def release(self, key: str) -> None:
+        """Live probe ถูก cancel กลางทาง → เปิดให้ call ถัดไป probe แทน"""
+        circuit = self._circuits.get(key)
+        if circuit is not None and circuit.state == STATE_HALF_OPEN and key not in self._probe_tasks:
+            circuit.probe_in_flight = False
+
+    # ── feedback ─────────────────────────────────────────────────────
+    def record_success(self, key: str) -> None:
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            return
+        if circuit.state != STATE_CLOSED:
+            logger.info("LLM circuit closed for %s (provider recovered)", key)
+        circuit.state = STATE_CLOSED
+        circuit.failures = 0
+        circuit.probe_in_flight = False
+        circuit.cooldown_s = self.base_cooldown_s
+
+    def record_failure(self, key: str, exc: Optional[BaseException] = None) -> None:
+        if not self.enabled:
+            return
+        circuit = self._circuit(key)
+        circuit.failures += 1
+        if exc is not None:
+            circuit.last_error = f"{type(exc).__name__}: {str(exc)[:160]}"
+        if circuit.state == STATE_HALF_OPEN:
+            # probe พัง → เปิดวงจรอีกรอบ, cooldown ยาวขึ้น
+            circuit.cooldown_s = min(self.max_cooldown_s, circuit.cooldown_s * 2)
+            self._open(key, circuit)
+        elif circuit.state == STATE_CLOSED and circuit.failures >= self.failure_threshold:
+            self._open(key, circuit)
+
+    def _open(self, key: str, circuit: _Circuit) -> None:
+        circuit.state = STATE_OPEN
+        circuit.probe_in_flight = False
+        circuit.opened_until = time.monotonic() + circuit.cooldown_s
+        circuit.opens += 1
+        logger.warning(
+            "LLM circuit OPEN for %s after %d failures; failing fast for %.0fs (%s)",
+            key, circuit.failures, circuit.cooldown_s, circuit.last_error,
+        )
+        if key in self._probes and key not in self._probe_tasks:
+            try:
+                task = asyncio.get_running_loop().create_task(self._probe_loop(key))
+            except RuntimeError:
+                return  # ไม่มี loop → half-open แบบ passive ตอน call ถัดไป
+            self._probe_tasks[key] = task
+
+            def _forget(_task: "asyncio.Task[None]") -> None:
+                self._probe_tasks.pop(key, None)
+
+            task.add_done_callback(_forget)
+
+    async def _probe_loop(self, key: str) -> None:
+        circuit = self._circuit(key)
+        probe = self._probes[key]
+        while circuit.state != STATE_CLOSED:
+            await asyncio.sleep(max(0.0, circuit.opened_until - time.monotonic()))
+            if circuit.state == STATE_CLOSED:
+                return
+            circuit.state = STATE_HALF_OPEN
+            circuit.probe_in_flight = True  # real calls stay rejected while the probe runs
+            try:
+                await asyncio.wait_for(probe(), timeout=_PROBE_TIMEOUT_S)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.info("LLM circuit probe failed for %s: %s", key, exc)
+                self.record_failure(key, exc)
+                continue
+            self.record_success(key)
+
+    # ── introspection / lifecycle ────────────────────────────────────
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "failure_threshold": self.failure_threshold,
+            "circuits": {
+                key: {
+                    "state": circuit.state,
+                    "failures": circuit.failures,
+                    "opens": circuit.opens,
+                    "rejected": circuit.rejected,
+                    "retry_in_s": round(max(0.0, circuit.opened_until - now), 1) if circuit.state != STATE_CLOSED else 0.0,
+                    "last_error": circuit.last_error,
+                }
+                for key, circuit in sorted(self._circuits.items())
+            },
+        }
+
+    async def close(self) -> None:
+        tasks = list(self._probe_tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except BaseException:
+                pass
+        self._probe_tasks.clear()
+
+
+# Shared breaker for every LLM provider / key
+llm_breaker = LLMCircuitBreaker(
+    enabled=LLM_BREAKER_ENABLED,
+    failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+    cooldown_s=LLM_BREAKER_COOLDOWN_SECONDS,
+    max_cooldown_s=LLM_BREAKER_MAX_COOLDOWN_SECONDS,
+)
@@ -21,36 +21,61 @@ LLM Module — Single-Pass Always-RAG Architecture (v3)
 import asyncio
 import logging
 import os
+import random
 import re
 import time
 import uuid
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
-from langdetect import detect
+from google.genai import types as genai_types
 
 from app.config import (
     GEMINI_API_KEY,
     GEMINI_MODEL_NAME,
+    LLM_DEADLINE_MIN_CALL_S,
     LLM_PROVIDER,
+    LLM_SINGLE_FLIGHT_ENABLED,
     LOCAL_MODEL_NAME,
-    MAX_CONCURRENT_LLM_CALLS,
+    MOCK_MODEL_NAME,
     OPENAI_MODEL_NAME,
     PDF_QUICK_USE_FOLDER,
+    PIPELINE_SPECULATIVE_RETRIEVAL,
+)
+from app.prompt.prompt import build_unified_prompt_parts, context_prompt_parts, join_prompt_parts
+from app.utils.lang_detect import detect_language, detect_language_fast
+from app.utils.llm.adaptive_limiter import llm_limiter
+from app.utils.llm.circuit_breaker import CircuitOpenError, llm_breaker
+from app.utils.llm.llm_model import (
+    LOCAL_BREAKER_KEY,
+    MOCK_BREAKER_KEY,
+    _extract_status_code,
+    _is_retryable_openai_error,
+    gemini_breaker_key,
+    get_gemini_client,
+    get_llm_model,
+)
+from app.utils.llm.pipeline_stages import SpeculativeRun, cache_stage, retrieval_stage
+from app.utils.llm.quota_limiter import estimate_request_tokens, llm_quota, quota_key
+from app.utils.llm.single_flight import answer_flights, make_flight_key
+from app.utils.token_counter import (
+    count_tokens_async,
+    estimate_tokens,
+    format_token_usage,
+    get_cached_prompt_tokens,
+    get_token_usage,
 )
-from app.prompt.prompt import build_unified_prompt, context_prompt
-from app.utils.llm.llm_model import get_llm_model
-from app.utils.token_counter import count_tokens, format_token_usage, get_token_usage
 from dev.flow_store import get_effective_flow_config
 from dev.trace_store import record_trace
 from memory.faq_cache import get_faq_answer, update_faq
 from memory.greeting_cache import get_greeting_response
 from memory.session import get_or_create_history, save_history
+from queue_manager.cancellation import RequestCancelled, cancellable, check_cancelled
+from queue_manager.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
 from retriever.context_selector import retrieve_top_k_chunks
 from retriever.intent_analyzer import needs_retrieval
 
 logger = logging.getLogger(__name__)
-llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
 _llm_prewarmed = False
 
 
@@ -61,6 +86,9 @@ async def prewarm_llm_clients() -> None:
         return
     try:
         await asyncio.to_thread(get_llm_model)
+        if LLM_PROVIDER not in ("gemini", "mock") and GEMINI_API_KEY:
+            # Gemini fallback client is shared too; build it before the first 429
+            await asyncio.to_thread(get_gemini_client)
         _llm_prewarmed = True
         logger.info("[LLM] prewarm complete")
     except Exception as exc:
@@ -88,6 +116,9 @@ def _looks_out_of_scope_query(query: str) -> bool:
     return any(term in normalized for term in weather_terms)
 
 
+_DEADLINE_REPLY = "ขออภัยครับ ตอนนี้ระบบตอบสนองช้า กรุณาลองถามใหม่อีกครั้งนะครับ"
+
+
 def _format_retrieval_fallback(
     chunks: list[tuple[dict, float]],
     max_lines: int = 3,
@@ -161,6 +192,313 @@ async def _emit_status(emit_fn, text: str) -> None:
         logger.debug("emit_fn failed for ai_status", exc_info=True)
 
 
+_RATE_LIMIT_MARKERS = ["429", "rate limit", "rate_limit", "too many", "quota", "resource_exhausted"]
+_TIMEOUT_MARKERS = ["timeout", "timed out", "deadline exceeded"]
+
+
+def _is_overload_error(exc: Exception) -> bool:
+    """429 / 503 / timeout → สัญญาณให้ limiter ลด concurrency"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    if _extract_status_code(exc) in {429, 503, 504}:
+        return True
+    err_msg = str(exc).lower()
+    return any(t in err_msg for t in _RATE_LIMIT_MARKERS + _TIMEOUT_MARKERS)
+
+
+def _chat_messages(system_prompt: str, user_prompt: str) -> list[Dict[str, str]]:
+    # system (คงที่) มาก่อนเสมอ → prefix เดียวกันทุก request สำหรับ prompt caching
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _chat_model_name() -> str:
+    """model ของ provider แบบ OpenAI-compatible (openai / local / mock)"""
+    models: Dict[str, str] = {"openai": OPENAI_MODEL_NAME, "mock": MOCK_MODEL_NAME}
+    return models.get(LLM_PROVIDER, str(LOCAL_MODEL_NAME))
+
+
+def _gemini_config(system_prompt: str):
+    return genai_types.GenerateContentConfig(system_instruction=system_prompt)
+
+
+async def _estimated_usage(system_prompt: str, user_prompt: str, reply: str, model_name: str) -> Dict[str, Any]:
+    """ใช้เมื่อ provider ไม่รายงาน usage เท่านั้น — tiktoken รันบน worker thread ไม่ block event loop"""
+    prompt_tokens, completion_tokens = await count_tokens_async(
+        join_prompt_parts(system_prompt, user_prompt), reply, model_name=model_name
+    )
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "estimated": True,
+    }
+
+
+def _gemini_reported_usage(usage_meta) -> Optional[Dict[str, Any]]:
+    """usage_metadata ของ Gemini → usage dict; None ถ้า provider ไม่ได้รายงาน"""
+    if usage_meta is None or not getattr(usage_meta, "total_token_count", None):
+        return None
+    return {
+        "prompt_tokens": int(getattr(usage_meta, "prompt_token_count", 0) or 0),
+        "completion_tokens": int(getattr(usage_meta, "candidates_token_count", 0) or 0),
+        "total_tokens": int(getattr(usage_meta, "total_token_count", 0) or 0),
+        "cached_prompt_tokens": get_cached_prompt_tokens(usage_meta, "gemini"),
+    }
+
+
+async def _stream_openai_compatible(
+    client, model_name: str, system_prompt: str, user_prompt: str, on_delta
+) -> tuple[str, Dict[str, Any]]:
+    """OpenAI-compatible streaming (`stream=True`); ส่ง delta ทีละ chunk ผ่าน on_delta"""
+    extra: Dict[str, Any] = {}
+    if LLM_PROVIDER in ("openai", "mock"):
+        # usage มากับ chunk สุดท้าย (local/Ollama บางรุ่นไม่รองรับ option นี้)
+        extra["stream_options"] = {"include_usage": True}
+    stream = await client.chat.completions.create(
+        model=model_name,
+        messages=_chat_messages(system_prompt, user_prompt),
+        stream=True,
+        **extra,
+    )
+    parts: list[str] = []
+    usage_obj = None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage_obj = chunk.usage
+        choices = getattr(chunk, "choices", None) or []
+        if not choices:
+            continue
+        delta = getattr(choices[0].delta, "content", None)
+        if delta:
+            parts.append(delta)
+            await on_delta(delta)
+
+    reply = "".join(parts).strip()
+    if usage_obj is not None:
+        usage = {
+            "prompt_tokens": int(getattr(usage_obj, "prompt_tokens", 0) or 0),
+            "completion_tokens": int(getattr(usage_obj, "completion_tokens", 0) or 0),
+            "total_tokens": int(getattr(usage_obj, "total_tokens", 0) or 0),
+            "cached_prompt_tokens": get_cached_prompt_tokens(usage_obj, LLM_PROVIDER),
+        }
+    else:
+        usage = await _estimated_usage(system_prompt, user_prompt, reply, model_name)
+    return reply, usage
+
+
+async def _stream_gemini(
+    client, model_name: str, system_prompt: str, user_prompt: str, on_delta
+) -> tuple[str, Dict[str, Any]]:
+    """Gemini streaming ผ่าน client.aio.models.generate_content_stream"""
+    stream = await client.aio.models.generate_content_stream(
+        model=model_name,
+        contents=user_prompt,
+        config=_gemini_config(system_prompt),
+    )
+    parts: list[str] = []
+    usage_meta = None
+    async for chunk in stream:
+        usage_meta = getattr(chunk, "usage_metadata", None) or usage_meta
+        delta = getattr(chunk, "text", None)
+        if delta:
+            parts.append(delta)
+            await on_delta(delta)
+
+    reply = "".join(parts).strip()
+    usage = _gemini_reported_usage(usage_meta)
+    if usage is None:
+        usage = await _estimated_usage(system_prompt, user_prompt, reply, model_name)
+    return reply, usage
+
+
+async def _gemini_generate(client, model_name: str, system_prompt: str, user_prompt: str) -> tuple[str, Dict[str, Any]]:
+    """Gemini non-streaming; usage มาจาก usage_metadata (ประมาณเองเฉพาะเมื่อไม่มี)"""
+    response = await client.aio.models.generate_content(
+        model=model_name,
+        contents=user_prompt,
+        config=_gemini_config(system_prompt),
+    )
+    reply = (response.text or "").strip()
+    usage = _gemini_reported_usage(getattr(response, "usage_metadata", None))
+    if usage is None:
+        usage = await _estimated_usage(system_prompt, user_prompt, reply, model_name)
+    return reply, usage
+
+
+async def _within_deadline(coro, deadline: Optional[Deadline]):
+    """
+    await provider call ภายในงบของ request (deadline ถูกผูกกับ context ให้ failover client เห็นด้วย)
+    หมดงบ → DeadlineExceeded (ไม่ใช่ความผิดของ provider: ไม่นับเข้า circuit breaker / limiter)
+    """
+    if deadline is None:
+        return await coro
+    with deadline_scope(deadline):
+        try:
+            return await asyncio.wait_for(coro, timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"request deadline reached ({deadline.budget_s:.1f}s budget)") from None
+
+
+async def _call_llm(
+    system_prompt: str,
+    user_prompt: str,
+    on_delta=None,
+    deadline: Optional[Deadline] = None,
+) -> tuple[str, Dict[str, Any]]:
+    """
+    เรียก provider หลัก (retry เมื่อโดน rate limit) แล้ว fallback ไป Gemini
+    system_prompt (คงที่) ส่งเป็น system message / system_instruction แยกจาก user_prompt
+    on_delta != None → ใช้ provider streaming และส่ง delta ทีละ chunk
+    deadline != None → ทุก attempt จบภายในงบ; retry backoff / Gemini fallback
+                       เฉพาะเมื่องบที่เหลือพอ (LLM_DEADLINE_MIN_CALL_S) ไม่งั้น raise ให้ ask_llm ตอบ degraded
+
+    Returns: (reply, usage)
+    """
+    model = get_llm_model()
+    streamed = {"deltas": 0}
+
+    async def _counting_delta(text: str) -> None:
+        streamed["deltas"] += 1
+        await on_delta(text)
+
+    # OpenAI keys acquire quota inside OpenAIFailoverClient (per key); Gemini is acquired here
+    quota_estimate = estimate_request_tokens(system_prompt, user_prompt)
+    # OpenAI keys have per-key circuits inside OpenAIFailoverClient; gemini / local are gated here
+    breaker_key = {
+        "gemini": gemini_breaker_key,
+        "local": lambda: LOCAL_BREAKER_KEY,
+        "mock": lambda: MOCK_BREAKER_KEY,
+    }.get(LLM_PROVIDER, lambda: None)()
+
+    async def _provider_attempt() -> tuple[str, Dict[str, Any]]:
+        if on_delta is not None:
+            if LLM_PROVIDER == "gemini":
+                return await _stream_gemini(model, GEMINI_MODEL_NAME, system_prompt, user_prompt, _counting_delta)
+            return await _stream_openai_compatible(
+                model, _chat_model_name(), system_prompt, user_prompt, _counting_delta
+            )
+        if LLM_PROVIDER == "gemini":
+            return await _gemini_generate(model, GEMINI_MODEL_NAME, system_prompt, user_prompt)
+        model_name = _chat_model_name()
+        response = await model.chat.completions.create(
+            model=model_name,
+            messages=_chat_messages(system_prompt, user_prompt),
+        )
+        text = (response.choices[0].message.content or "").strip()
+        attempt_usage = get_token_usage(response, LLM_PROVIDER, model_name)
+        if not attempt_usage.get("total_tokens"):
+            attempt_usage = await _estimated_usage(system_prompt, user_prompt, text, model_name)
+        return text, attempt_usage
+
+    max_retries = 3
+    reply = ""
+    usage: Dict[str, Any] = {}
+    last_error = None
+    for attempt in range(max_retries):
+        try:
+            if breaker_key:
+                llm_breaker.check(breaker_key)
+            if LLM_PROVIDER == "gemini":
+                await llm_quota.acquire("gemini", quota_key(GEMINI_API_KEY, GEMINI_MODEL_NAME), quota_estimate)
+            # Gate only the provider call; the slot is released during backoff sleeps
+            async with llm_limiter:
+                attempt_started = time.perf_counter()
+                reply, usage = await _within_deadline(_provider_attempt(), deadline)
+            llm_limiter.on_success(time.perf_counter() - attempt_started)
+            if breaker_key:
+                llm_breaker.record_success(breaker_key)
+            if LLM_PROVIDER == "gemini":
+                await llm_quota.settle(
+                    "gemini", quota_key(GEMINI_API_KEY, GEMINI_MODEL_NAME),
+                    quota_estimate, int(usage.get("total_tokens") or 0),
+                )
+            last_error = None
+            break  # Success
+        except CircuitOpenError as circuit_exc:
+            # Provider/keys known down: no retries, no backoff sleeps → straight to fallback
+            logger.warning("%s; skipping retries", circuit_exc)
+            last_error = circuit_exc
+            break
+        except (asyncio.CancelledError, DeadlineExceeded):
+            if breaker_key:
+                llm_breaker.release(breaker_key)
+            raise
+        except Exception as retry_exc:
+            if breaker_key:
+                if _is_retryable_openai_error(retry_exc):
+                    llm_breaker.record_failure(breaker_key, retry_exc)
+                else:
+                    llm_breaker.record_success(breaker_key)  # provider answered (e.g. 400)
+            if _is_overload_error(retry_exc):
+                llm_limiter.on_overload()
+            else:
+                llm_limiter.on_error()
+            if streamed["deltas"]:
+                raise  # Partial answer already streamed: retrying would duplicate text
+            last_error = retry_exc
+            err_msg = str(retry_exc).lower()
+            is_rate_limit = any(t in err_msg for t in _RATE_LIMIT_MARKERS)
+            if is_rate_limit and breaker_key and llm_breaker.is_open(breaker_key):
+                break  # Circuit just opened: don't sleep before failing over
+            if is_rate_limit and attempt < max_retries - 1:
+                # Limiter already cut concurrency; short jittered backoff instead of a 15-30 s stall
+                wait_sec = min(2.0 * (2 ** attempt), 8.0) + random.uniform(0.0, 0.5)
+                if deadline is not None and not deadline.allows(wait_sec + LLM_DEADLINE_MIN_CALL_S):
+                    logger.warning(
+                        "Rate limit hit (attempt %d/%d); %.1fs left before the deadline — skipping retries",
+                        attempt + 1, max_retries, deadline.remaining(),
+                    )
+                    break
+                logger.warning(
+                    f"Rate limit hit (attempt {attempt+1}/{max_retries}, limit={llm_limiter.limit}), "
+                    f"waiting {wait_sec:.1f}s..."
+                )
+                await asyncio.sleep(wait_sec)
+                continue
+            if not is_rate_limit:
+                raise  # Non-rate-limit error: raise immediately
+            # Last attempt + rate limit → fall through to Gemini fallback
+
+    # ── Gemini Fallback: if primary provider rate-limited or its circuit is open ─────
+    # (mock stays offline: injected 429s surface as errors instead of reaching a real Gemini key)
+    if last_error is not None and LLM_PROVIDER not in ("gemini", "mock") and GEMINI_API_KEY:
+        # ไม่พอสำหรับอีก provider call → ข้าม fallback ให้ ask_llm ตอบ degraded ทันที
+        if deadline is not None and not deadline.allows(LLM_DEADLINE_MIN_CALL_S):
+            logger.warning(
+                "Skipping Gemini fallback: %.2fs left before the request deadline", deadline.remaining()
+            )
+        else:
+            gemini_model = GEMINI_MODEL_NAME or "gemini-2.0-flash"
+
+            async def _gemini_fallback():
+                gemini_client = get_gemini_client()
+                await llm_quota.acquire("gemini", quota_key(GEMINI_API_KEY, gemini_model), quota_estimate)
+                if on_delta is not None:
+                    return await _stream_gemini(
+                        gemini_client, gemini_model, system_prompt, user_prompt, _counting_delta
+                    )
+                return await _gemini_generate(gemini_client, gemini_model, system_prompt, user_prompt)
+
+            try:
+                logger.warning(f"Falling back to Gemini ({gemini_model}) after {type(last_error).__name__}...")
+                reply, usage = await _within_deadline(
+                    llm_breaker.call(gemini_breaker_key(), _gemini_fallback, is_failure=_is_retryable_openai_error),
+                    deadline,
+                )
+                usage["fallback_provider"] = "gemini"
+                last_error = None  # Successfully fell back
+            except Exception as gemini_exc:
+                logger.error(f"Gemini fallback also failed: {gemini_exc}")
+                raise  # Will trigger the outer except block
+
+    if last_error is not None:
+        raise last_error
+    return reply, usage
+
+
 async def ask_llm(
     msg: str,
     session_id: str,
@@ -169,6 +507,8 @@ async def ask_llm(
     include_debug: bool = False,
     trace_source: str = "runtime",
     runtime_profile: str = "default",
+    stream: bool = False,
+    deadline: Optional[Deadline] = None,
 ):
     """
     Single-Pass Always-RAG Architecture (v3)
@@ -181,6 +521,17 @@ async def ask_llm(
       5. **Single LLM call** → answer
       6. FAQ auto-learn (local)
 
+    stream=True (ต้องมี emit_fn): เรียก provider แบบ streaming และส่ง
+    `ai_response_delta` {"trace_id", "seq", "delta"} ทุกครั้งที่มี token ใหม่
+    ข้อความเต็มยังถูกบันทึกลง history / FAQ ตอนจบเหมือนเดิม
+
+    เมื่อรันผ่านคิว: client หลุด → CancelScope ของ request ถูก cancel
+    ตรวจที่ขอบ stage และหยุด retrieval + LLM กลางทาง → raise RequestCancelled
+
+    deadline (ไม่ส่ง → ใช้ของคิว / ผู้เรียกจาก contextvars): ส่งต่อให้ retrieval และ provider
+    งบไม่พอ → ข้าม rerank / retry / fallback provider และตอบแบบ degraded
+    (ข้อความจากเอกสารที่ค้นได้) แทนการรอจน timeout ภายนอกตัด
+
     Returns: {"text", "from_faq", "tokens", "trace_id", "debug"?}
     """
     active_flow = get_effective_flow_config(flow_config)
@@ -209,6 +560,9 @@ async def ask_llm(
     prompt_cfg = active_flow.get("prompt", {})
     faq_cfg = active_flow.get("faq", {})
 
+    if deadline is None:
+        deadline = current_deadline()
+
     trace_id = uuid.uuid4().hex
     trace_started_perf = time.perf_counter()
     trace_steps: list[Dict[str, Any]] = []
@@ -225,6 +579,8 @@ async def ask_llm(
 
     if include_debug:
         trace_meta["flow_config_snapshot"] = active_flow
+    if deadline is not None:
+        trace_meta["deadline"] = deadline.to_dict()
 
     def step_start(node_id: str, title: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         return {
@@ -249,10 +605,6 @@ async def ask_llm(
             "data": merged_data,
         })
 
-    primary_model_name = GEMINI_MODEL_NAME if LLM_PROVIDER == "gemini" else (
-        OPENAI_MODEL_NAME if LLM_PROVIDER == "openai" else LOCAL_MODEL_NAME
-    )
-
     # ── Step 0: Ingress ──────────────────────────────────────────────
     ingress_step = step_start("ingress", "Ingress Router", {
         "message_chars": len(msg or ""),
@@ -263,151 +615,214 @@ async def ask_llm(
     step_finish(ingress_step, "ok")
 
     # ── Step 1: Language Detection ────────────────────────────────────
-    detect_step = step_start("lang_detect", "Language Detect", {"detector": "langdetect"})
+    detect_step = step_start("lang_detect", "Language Detect", {"detector": "unicode_script"})
     if str(runtime_profile).strip().lower() == "realtime":
         detected_lang = "th"
         step_finish(detect_step, "skipped", {"language": detected_lang, "reason": "realtime_profile"})
     else:
         try:
-            detected_lang = await asyncio.to_thread(detect, msg)
-            step_finish(detect_step, "ok", {"language": detected_lang})
+            # Script counts answer inline (memoized); only long ambiguous Latin goes to langdetect
+            detected_lang = detect_language_fast(msg)
+            detector = "unicode_script"
+            if detected_lang is None:
+                detected_lang = await asyncio.to_thread(detect_language, msg)
+                detector = "langdetect"
+            step_finish(detect_step, "ok", {"language": detected_lang, "detector": detector})
         except Exception as lang_error:
             detected_lang = "th"
             step_finish(detect_step, "warn", {"language": detected_lang, "error": str(lang_error)})
 
-    async with llm_semaphore:
-        await _emit_status(emit_fn, "Processing request...")
-
-        # ── Step 2: Session + Sliding Window History (no LLM call) ───
-        session_step = step_start("session", "Session + Sliding Window")
-        history = await get_or_create_history(session_id)
-        if not (history and history[-1]["parts"][0]["text"] == msg):
-            history.append({"role": "user", "parts": [{"text": msg}]})
-            await save_history(session_id, history)
-
-        recent_messages = int(memory_cfg.get("recent_messages", 10))
-        history_text = _build_sliding_window_history(history, max_messages=recent_messages)
-        step_finish(session_step, "ok", {
-            "history_total": len(history),
-            "window_size": recent_messages,
-            "history_chars": len(history_text),
-            "method": "sliding_window",
-        })
+    check_cancelled()  # client หลุดระหว่างรอคิว / detect → ไม่เริ่ม retrieval
+    await _emit_status(emit_fn, "Processing request...")
+
+    # ── Step 1b: Speculative retrieval ───────────────────────────
+    # needs_retrieval เป็น rule-based (ไม่ขึ้นกับ history/cache) → เริ่ม retrieval บน CPU pool
+    # ระหว่างรอ session + greeting/FAQ lookup; ถ้า cache tier ตอบได้ก็ทิ้งผล
+    should_retrieve = needs_retrieval(msg)
+    retrieval_kwargs = {
+        "k": int(rag_cfg.get("top_k", 5)),
+        "folder": PDF_QUICK_USE_FOLDER,
+        "use_hybrid": bool(rag_cfg.get("use_hybrid", True)),
+        "use_rerank": bool(rag_cfg.get("use_rerank", rag_cfg.get("use_llm_rerank", True))),
+        "use_intent_analysis": bool(rag_cfg.get("use_intent_analysis", True)),
+        "deadline": deadline,  # rerank ถูกข้ามถ้างบเหลือน้อย (thread pool ไม่เห็น contextvars)
+    }
+    speculation: Optional[SpeculativeRun] = None
+    if should_retrieve and PIPELINE_SPECULATIVE_RETRIEVAL:
+        speculation = SpeculativeRun(retrieval_stage, retrieve_top_k_chunks, msg, **retrieval_kwargs)
+
+    # ── Step 2: Session + Sliding Window History (no LLM call) ───
+    # โหลด history พร้อมกับ cache tier (greeting → FAQ ยังเรียงตามลำดับ เพราะ FAQ นับ hit)
+    session_step = step_start("session", "Session + Sliding Window")
+    greeting_step = step_start("greeting_lookup", "Tier 1: Greeting Cache")
+    faq_lookup_step = step_start("faq_lookup", "Tier 2: RAG FAQ Cache")
+    faq_lookup_enabled = bool(faq_cfg.get("lookup_enabled", True))
+
+    async def _cache_tiers():
+        greeting = await cache_stage.run(get_greeting_response(msg))
+        if greeting or not faq_lookup_enabled:
+            return greeting, None
+        return None, await cache_stage.run(get_faq_answer(msg, include_meta=True))
 
-        # ── Step 3: Token usage tracking ─────────────────────────────
-        total_token_usage = {
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "total_tokens": 0,
-            "cached": False,
-        }
+    try:
+        history, (greeting_reply, faq_hit) = await asyncio.gather(
+            cache_stage.run(get_or_create_history(session_id)),
+            _cache_tiers(),
+        )
+    except BaseException:
+        if speculation is not None:
+            speculation.discard("error")
+        raise
+    if not (history and history[-1]["parts"][0]["text"] == msg):
+        history.append({"role": "user", "parts": [{"text": msg}]})
+        await save_history(session_id, history)
+
+    recent_messages = int(memory_cfg.get("recent_messages", 10))
+    history_text = _build_sliding_window_history(history, max_messages=recent_messages)
+    step_finish(session_step, "ok", {
+        "history_total": len(history),
+        "window_size": recent_messages,
+        "history_chars": len(history_text),
+        "method": "sliding_window",
+    })
 
-        rag_debug: Dict[str, Any] = {
-            "mode": "always_retrieve",
-            "should_run": False,
-            "query": msg,
-            "retrieved": [],
-        }
+    # ── Step 3: Token usage tracking ─────────────────────────────
+    total_token_usage = {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "cached": False,
+    }
 
-        # ── Step 4a: Tier 1 — Greeting Cache (exact match, 0 tokens) ──
-        greeting_step = step_start("greeting_lookup", "Tier 1: Greeting Cache")
-        greeting_reply = await get_greeting_response(msg)
-        if greeting_reply:
-            reply = greeting_reply
-            total_token_usage["cached"] = True
-            step_finish(greeting_step, "ok", {"hit": True, "tier": 1})
-            logger.info("[GREETING HIT] '%s' → instant response (0 tokens)", msg[:40])
+    rag_debug: Dict[str, Any] = {
+        "mode": "always_retrieve",
+        "should_run": False,
+        "query": msg,
+        "retrieved": [],
+    }
 
-            history.append({"role": "model", "parts": [{"text": reply}]})
-            await save_history(session_id, history)
+    # ── Step 4a: Tier 1 — Greeting Cache (exact match, 0 tokens) ──
+    if greeting_reply:
+        if speculation is not None:
+            speculation.discard("greeting_hit")
+        reply = greeting_reply
+        total_token_usage["cached"] = True
+        step_finish(greeting_step, "ok", {"hit": True, "tier": 1})
+        logger.info("[GREETING HIT] '%s' → instant response (0 tokens)", msg[:40])
+
+        history.append({"role": "model", "parts": [{"text": reply}]})
+        await save_history(session_id, history)
+
+        trace_meta["status"] = "ok"
+        trace_meta["ended_at"] = _now_iso()
+        trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
+        trace_meta["tokens"] = total_token_usage
+        trace_meta["detected_language"] = detected_lang
+        trace_meta["rag"] = rag_debug
+        record_trace(trace_meta)
+
+        output = {"text": reply, "from_faq": True, "tokens": total_token_usage, "trace_id": trace_id}
+        if include_debug:
+            output["debug"] = {
+                "trace_id": trace_id, "detected_language": detected_lang,
+                "rag": rag_debug, "steps": trace_steps,
+                "flow_config_snapshot": active_flow,
+                "greeting_hit": True, "tier": 1,
+            }
+        return output
+    step_finish(greeting_step, "skipped", {"hit": False})
+
+    # ── Step 4b: Tier 2 — RAG FAQ Cache (exact match, 0 tokens) ──
+    if isinstance(faq_hit, dict) and str(faq_hit.get("answer") or "").strip():
+        if speculation is not None:
+            speculation.discard("faq_hit")
+        reply = str(faq_hit["answer"]).strip()
+        total_token_usage["cached"] = True
+        step_finish(faq_lookup_step, "ok", {
+            "hit": True, "tier": 2,
+            "matched_question": faq_hit.get("question"),
+            "score": faq_hit.get("score"),
+            "last_validated": faq_hit.get("last_validated"),
+            "ttl_seconds": faq_hit.get("ttl_seconds"),
+        })
 
-            trace_meta["status"] = "ok"
-            trace_meta["ended_at"] = _now_iso()
-            trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
-            trace_meta["tokens"] = total_token_usage
-            trace_meta["detected_language"] = detected_lang
-            trace_meta["rag"] = rag_debug
-            record_trace(trace_meta)
+        logger.info("[FAQ HIT] exact match='%s' (0 tokens)", faq_hit.get("question", "")[:60])
+        history.append({"role": "model", "parts": [{"text": reply}]})
+        await save_history(session_id, history)
+
+        trace_meta["status"] = "ok"
+        trace_meta["ended_at"] = _now_iso()
+        trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
+        trace_meta["tokens"] = total_token_usage
+        trace_meta["detected_language"] = detected_lang
+        trace_meta["rag"] = rag_debug
+        record_trace(trace_meta)
+
+        output = {"text": reply, "from_faq": True, "tokens": total_token_usage, "trace_id": trace_id}
+        if include_debug:
+            output["debug"] = {
+                "trace_id": trace_id, "detected_language": detected_lang,
+                "rag": rag_debug, "steps": trace_steps,
+                "flow_config_snapshot": active_flow, "faq_hit": faq_hit,
+                "tier": 2,
+            }
+        return output
 
-            output = {"text": reply, "from_faq": True, "tokens": total_token_usage, "trace_id": trace_id}
-            if include_debug:
-                output["debug"] = {
-                    "trace_id": trace_id, "detected_language": detected_lang,
-                    "rag": rag_debug, "steps": trace_steps,
-                    "flow_config_snapshot": active_flow,
-                    "greeting_hit": True, "tier": 1,
-                }
-            return output
-        step_finish(greeting_step, "skipped", {"hit": False})
-
-        # ── Step 4b: Tier 2 — RAG FAQ Cache (exact match, 0 tokens) ──
-        faq_lookup_step = step_start("faq_lookup", "Tier 2: RAG FAQ Cache")
-        faq_lookup_enabled = bool(faq_cfg.get("lookup_enabled", True))
-
-        faq_hit = None
-        if faq_lookup_enabled:
-            faq_hit = await get_faq_answer(
-                msg,
-                include_meta=True,
-            )
+    step_finish(faq_lookup_step, "skipped", {
+        "hit": False, "lookup_enabled": faq_lookup_enabled,
+        "reason": "lookup_disabled" if not faq_lookup_enabled else "exact_match_miss",
+    })
 
-        if isinstance(faq_hit, dict) and str(faq_hit.get("answer") or "").strip():
-            reply = str(faq_hit["answer"]).strip()
-            total_token_usage["cached"] = True
-            step_finish(faq_lookup_step, "ok", {
-                "hit": True, "tier": 2,
-                "matched_question": faq_hit.get("question"),
-                "score": faq_hit.get("score"),
-                "last_validated": faq_hit.get("last_validated"),
-                "ttl_seconds": faq_hit.get("ttl_seconds"),
+    # ── Step 5-8: Shared generation (single-flight) ──────────────
+    # retrieval → prompt → LLM ของคำถามเดียวกัน (normalize แล้ว) + ภาษา + flow config
+    # ที่กำลังประมวลผลพร้อมกัน จะรันครั้งเดียวแล้วแชร์ผล (เหมือน FAQ tier
+    # ที่ตอบคำถามเดียวกันด้วยคำตอบเดียวกันอยู่แล้ว) — history ยังแยกตาม session
+    stream_enabled = bool(stream and emit_fn)
+    stream_state: Dict[str, Any] = {"deltas": 0, "first_delta_ms": None}
+
+    async def _on_delta(text: str) -> None:
+        stream_state["deltas"] += 1
+        if stream_state["first_delta_ms"] is None:
+            stream_state["first_delta_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
+        try:
+            await emit_fn("ai_response_delta", {
+                "trace_id": trace_id,
+                "seq": stream_state["deltas"],
+                "delta": text,
             })
+        except Exception:
+            logger.debug("emit_fn failed for ai_response_delta", exc_info=True)
+
+    async def _generate(publish_delta) -> Dict[str, Any]:
+        generation: Dict[str, Any] = {
+            "reply": "",
+            "usage": {},
+            "should_retrieve": False,
+            "top_chunks": [],
+            "retrieved": [],
+            "abstained": False,
+            "degraded": "",
+            "leader_trace_id": trace_id,
+        }
 
-            logger.info("[FAQ HIT] exact match='%s' (0 tokens)", faq_hit.get("question", "")[:60])
-            history.append({"role": "model", "parts": [{"text": reply}]})
-            await save_history(session_id, history)
-
-            trace_meta["status"] = "ok"
-            trace_meta["ended_at"] = _now_iso()
-            trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
-            trace_meta["tokens"] = total_token_usage
-            trace_meta["detected_language"] = detected_lang
-            trace_meta["rag"] = rag_debug
-            record_trace(trace_meta)
-
-            output = {"text": reply, "from_faq": True, "tokens": total_token_usage, "trace_id": trace_id}
-            if include_debug:
-                output["debug"] = {
-                    "trace_id": trace_id, "detected_language": detected_lang,
-                    "rag": rag_debug, "steps": trace_steps,
-                    "flow_config_snapshot": active_flow, "faq_hit": faq_hit,
-                    "tier": 2,
-                }
-            return output
-
-        step_finish(faq_lookup_step, "skipped", {
-            "hit": False, "lookup_enabled": faq_lookup_enabled,
-            "reason": "lookup_disabled" if not faq_lookup_enabled else "exact_match_miss",
-        })
-
-        # ── Step 5: Retrieval Decision (rule-based, no LLM call) ─────
-        should_retrieve = needs_retrieval(msg)
-        rag_debug["should_run"] = should_retrieve
+        # ── Step 5: Retrieval Decision (rule-based, decided in Step 1b) ──
+        generation["should_retrieve"] = should_retrieve
 
         # ── Step 6: Hybrid Retrieval + Cross-Encoder Reranking ───────
         context = ""
         top_chunks = []
         if should_retrieve:
             await _emit_status(emit_fn, "Retrieving context...")
-            retrieve_step = step_start("retriever", "Hybrid Retriever + Cross-Encoder")
+            retrieve_step = step_start("retriever", "Hybrid Retriever + Cross-Encoder", {
+                "speculative": speculation is not None,
+            })
             try:
-                top_chunks = await asyncio.to_thread(
-                    retrieve_top_k_chunks, msg,
-                    k=int(rag_cfg.get("top_k", 5)),
-                    folder=PDF_QUICK_USE_FOLDER,
-                    use_hybrid=bool(rag_cfg.get("use_hybrid", True)),
-                    use_rerank=bool(rag_cfg.get("use_rerank", rag_cfg.get("use_llm_rerank", True))),
-                    use_intent_analysis=bool(rag_cfg.get("use_intent_analysis", True)),
-                )
+                if speculation is not None:
+                    retrieval = speculation.result()
+                else:
+                    retrieval = retrieval_stage.run_sync(retrieve_top_k_chunks, msg, **retrieval_kwargs)
+                top_chunks = await _within_deadline(retrieval, deadline)
                 retrieval_preview = []
                 for idx, (chunk_data, score) in enumerate(top_chunks[:8]):
                     retrieval_preview.append({
@@ -417,244 +832,330 @@ async def ask_llm(
                         "index": chunk_data.get("index"),
                         "chunk_preview": _preview_text(chunk_data.get("chunk", ""), 240),
                     })
-                rag_debug["retrieved"] = retrieval_preview
+                generation["retrieved"] = retrieval_preview
                 context = _format_context_with_citations(top_chunks)
                 step_finish(retrieve_step, "ok", {"count": len(top_chunks), "preview": retrieval_preview})
             except Exception as ret_err:
                 logger.warning("Retrieval error: %s", ret_err)
                 step_finish(retrieve_step, "warn", {"error": str(ret_err)})
+        generation["top_chunks"] = top_chunks
 
         if should_retrieve and top_chunks:
             top_score = float(top_chunks[0][1])
             abstain_threshold = float(faq_cfg.get("min_retrieval_score", 0.35))
             if top_score < abstain_threshold:
                 abstain_reply = "พี่ไม่มีข้อมูลที่เชื่อถือได้พอสำหรับคำถามนี้นะครับ"
-                abstain_reply = _ensure_citation_suffix(abstain_reply, top_chunks)
-                history.append({"role": "model", "parts": [{"text": abstain_reply}]})
-                await save_history(session_id, history)
-                trace_meta["status"] = "ok"
-                trace_meta["ended_at"] = _now_iso()
-                trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
-                trace_meta["tokens"] = total_token_usage
-                trace_meta["detected_language"] = detected_lang
-                trace_meta["rag"] = rag_debug
-                trace_meta["abstained"] = True
-                record_trace(trace_meta)
-                return {"text": abstain_reply, "from_faq": False, "tokens": total_token_usage, "trace_id": trace_id}
+                generation["reply"] = _ensure_citation_suffix(abstain_reply, top_chunks)
+                generation["abstained"] = True
+                return generation
 
         # ── Step 7: Build Unified Prompt (single prompt for everything) ──
         prompt_step = step_start("prompt", "Unified Prompt Builder")
         extra_instruction = str(prompt_cfg.get("extra_context_instruction") or "").strip()
 
+        # Stable prefix: static system block → context → volatile tail (time/history/question)
         if should_retrieve and context:
-            full_prompt = build_unified_prompt(
+            system_prompt, user_prompt = build_unified_prompt_parts(
                 question=msg,
                 context=context,
                 history_text=history_text,
                 detected_lang=detected_lang,
             )
         else:
-            full_prompt = context_prompt(msg)
-            if history_text:
-                full_prompt = f"{full_prompt}\n\nประวัติการสนทนา:\n{history_text}"
+            system_prompt, user_prompt = context_prompt_parts(msg, history_text=history_text)
 
         if extra_instruction:
-            full_prompt += f"\n\n[Developer Instruction]\n{extra_instruction}"
+            user_prompt += f"\n\n[Developer Instruction]\n{extra_instruction}"
 
+        full_prompt = join_prompt_parts(system_prompt, user_prompt)
         step_finish(prompt_step, "ok", {
             "prompt_chars": len(full_prompt),
-            "prompt_tokens_est": count_tokens(full_prompt, primary_model_name),
+            "system_prompt_chars": len(system_prompt),
+            "prompt_tokens_est": estimate_tokens(full_prompt),  # provider usage ตามมาใน llm_call
             "has_context": bool(context),
             "language": detected_lang,
         })
 
         # ── Step 8: Single LLM Call (with retry for rate limits) ─────
+        llm_step = step_start("llm_call", "LLM Call (Single Pass)", {
+            "provider": LLM_PROVIDER,
+            "stream": stream_enabled,
+            "deadline": deadline.to_dict() if deadline is not None else None,
+        })
         try:
-            model = get_llm_model()
-            llm_step = step_start("llm_call", "LLM Call (Single Pass)", {"provider": LLM_PROVIDER})
-
-            max_retries = 3
-            reply = ""
-            usage = {}
-            last_error = None
-            for attempt in range(max_retries):
-                try:
-                    if LLM_PROVIDER == "gemini":
-                        response = await asyncio.to_thread(
-                            model.models.generate_content,
-                            model=GEMINI_MODEL_NAME,
-                            contents=full_prompt,
-                        )
-                        reply = (response.text or "").strip()
-                        prompt_tokens = count_tokens(full_prompt, GEMINI_MODEL_NAME)
-                        completion_tokens = count_tokens(reply, GEMINI_MODEL_NAME)
-                        usage = {
-                            "prompt_tokens": prompt_tokens,
-                            "completion_tokens": completion_tokens,
-                            "total_tokens": prompt_tokens + completion_tokens,
-                        }
-                    else:
-                        model_name = OPENAI_MODEL_NAME if LLM_PROVIDER == "openai" else LOCAL_MODEL_NAME
-                        response = await model.chat.completions.create(
-                            model=model_name,
-                            messages=[{"role": "user", "content": full_prompt}],
-                        )
-                        reply = (response.choices[0].message.content or "").strip()
-                        usage = get_token_usage(response, LLM_PROVIDER, model_name)
-                    last_error = None
-                    break  # Success
-                except Exception as retry_exc:
-                    last_error = retry_exc
-                    err_msg = str(retry_exc).lower()
-                    is_rate_limit = any(t in err_msg for t in ["429", "rate limit", "rate_limit", "too many", "quota"])
-                    if is_rate_limit and attempt < max_retries - 1:
-                        wait_sec = min(15.0 * (attempt + 1), 30.0)
-                        logger.warning(f"Rate limit hit (attempt {attempt+1}/{max_retries}), waiting {wait_sec:.0f}s...")
-                        await asyncio.sleep(wait_sec)
-                        continue
-                    if not is_rate_limit:
-                        raise  # Non-rate-limit error: raise immediately
-                    # Last attempt + rate limit → fall through to Gemini fallback
-
-            # ── Gemini Fallback: if primary provider rate-limited ─────
-            if last_error is not None and LLM_PROVIDER != "gemini" and GEMINI_API_KEY:
-                try:
-                    from google import genai
-                    gemini_client = genai.Client(api_key=GEMINI_API_KEY)
-                    gemini_model = GEMINI_MODEL_NAME or "gemini-2.0-flash"
-                    logger.warning(f"Falling back to Gemini ({gemini_model}) after rate limit...")
-                    response = await asyncio.to_thread(
-                        gemini_client.models.generate_content,
-                        model=gemini_model,
-                        contents=full_prompt,
-                    )
-                    reply = (response.text or "").strip()
-                    prompt_tokens = count_tokens(full_prompt, gemini_model)
-                    completion_tokens = count_tokens(reply, gemini_model)
-                    usage = {
-                        "prompt_tokens": prompt_tokens,
-                        "completion_tokens": completion_tokens,
-                        "total_tokens": prompt_tokens + completion_tokens,
-                        "fallback_provider": "gemini",
-                    }
-                    last_error = None  # Successfully fell back
-                except Exception as gemini_exc:
-                    logger.error(f"Gemini fallback also failed: {gemini_exc}")
-                    raise  # Will trigger the outer except block
-
-            if last_error is not None:
-                raise last_error
-
+            # ขอไม่เกินครึ่งงบ: voice turn (งบ < LLM_DEADLINE_MIN_CALL_S) ยังได้ลองเรียก LLM
+            # แทนที่จะ degraded ทุกครั้ง — เรียกแล้วไม่ทัน _call_llm ก็ตัดที่ deadline อยู่ดี
+            if deadline is not None and not deadline.allows(min(LLM_DEADLINE_MIN_CALL_S, deadline.budget_s * 0.5)):
+                raise DeadlineExceeded(f"{deadline.remaining():.2f}s left, not enough for an LLM call")
+            reply, usage = await _call_llm(
+                system_prompt, user_prompt, publish_delta if stream_enabled else None, deadline=deadline
+            )
+        except DeadlineExceeded as deadline_exc:
+            # Degraded answer: ข้อความจากเอกสารที่ค้นได้แล้ว (ไม่ต้องรอ timeout ภายนอก)
+            logger.warning("[Deadline] %s → degraded answer", deadline_exc)
+            reply = _format_retrieval_fallback(top_chunks) or _DEADLINE_REPLY
+            generation["reply"] = reply
+            generation["degraded"] = "deadline"
+            step_finish(llm_step, "warn", {"degraded": "deadline", "error": str(deadline_exc)})
+            return generation
+
+        logger.info(f"[LLM Single Pass] {format_token_usage(usage)}")
+        if should_retrieve and top_chunks:
+            reply = _ensure_citation_suffix(reply, top_chunks)
+        llm_step_data: Dict[str, Any] = {"usage": usage, "reply_preview": _preview_text(reply)}
+        if stream_enabled:
+            llm_step_data["stream_deltas"] = stream_state["deltas"]
+            llm_step_data["first_delta_ms"] = stream_state["first_delta_ms"]
+        step_finish(llm_step, "ok", llm_step_data)
+
+        generation["reply"] = reply
+        generation["usage"] = usage
+        return generation
+
+    top_chunks = []
+    try:
+        # Stage boundary: retrieval + LLM คือส่วนที่แพง → หยุดกลางทางได้ถ้า client หลุด
+        # (single-flight: งานที่แชร์ยังเดินต่อถ้ามี session อื่นรออยู่)
+        check_cancelled()
+        # Coalesce เฉพาะ turn แรกของ session (history มีแค่ข้อความปัจจุบัน):
+        # prompt ของงานที่แชร์จะไม่มีบทสนทนาของ session อื่นปน
+        if LLM_SINGLE_FLIGHT_ENABLED and len(history) <= 1:
+            flight_key = make_flight_key(msg, detected_lang, {
+                "flow": active_flow,
+                "profile": str(runtime_profile).strip().lower(),
+            })
+            generation, coalesced = await cancellable(answer_flights.run(
+                flight_key,
+                _generate,
+                listener=_on_delta if stream_enabled else None,
+            ))
+        else:
+            generation, coalesced = await cancellable(_generate(_on_delta)), False
+        if speculation is not None:
+            # Follower: ใช้ retrieval ของ leader → ของตัวเองทิ้ง (no-op ถ้าเป็น leader)
+            speculation.discard("coalesced")
+
+        should_retrieve = bool(generation["should_retrieve"])
+        top_chunks = list(generation["top_chunks"])
+        reply = str(generation["reply"])
+        usage = dict(generation["usage"])
+        rag_debug["should_run"] = should_retrieve
+        rag_debug["retrieved"] = generation["retrieved"]
+
+        if coalesced:
+            # Follower: no LLM spend of its own — tokens are billed to the leader's trace
+            single_flight_step = step_start("single_flight", "Single-Flight (coalesced)")
+            step_finish(single_flight_step, "ok", {
+                "leader_trace_id": generation["leader_trace_id"],
+                "abstained": bool(generation["abstained"]),
+            })
+            trace_meta["coalesced_with"] = generation["leader_trace_id"]
+            total_token_usage["coalesced"] = True
+        else:
             total_token_usage["prompt_tokens"] += int(usage.get("prompt_tokens", 0))
             total_token_usage["completion_tokens"] += int(usage.get("completion_tokens", 0))
             total_token_usage["total_tokens"] += int(usage.get("total_tokens", 0))
+            total_token_usage["cached_prompt_tokens"] += int(usage.get("cached_prompt_tokens", 0) or 0)
 
-            logger.info(f"[LLM Single Pass] {format_token_usage(usage)}")
-            if should_retrieve and top_chunks:
-                reply = _ensure_citation_suffix(reply, top_chunks)
-            step_finish(llm_step, "ok", {"usage": usage, "reply_preview": _preview_text(reply)})
-
-            # ── Step 9: FAQ Auto Learn ───────────────────────────────
-            if should_retrieve and top_chunks and bool(faq_cfg.get("auto_learn", True)):
-                faq_step = step_start("faq_learn", "FAQ Auto Learn")
-                top_score = float(top_chunks[0][1]) if top_chunks else 0.0
-                learn_meta = {
-                    "source": "rag",
-                    "require_retrieval": True,
-                    "retrieval_count": len(top_chunks),
-                    "retrieval_top_score": top_score,
-                    "min_retrieval_score": faq_cfg.get("min_retrieval_score", 0.35),
-                    "min_answer_chars": faq_cfg.get("min_answer_chars", 30),
-                    "ttl_seconds": 86400,  # 24h TTL, refreshed daily
-                }
-                faq_update_result = await update_faq(msg, reply, learn_meta)
-                step_finish(
-                    faq_step,
-                    "ok" if bool(faq_update_result.get("updated")) else "skipped",
-                    faq_update_result,
-                )
-
-            # ── Step 10: Finalize ────────────────────────────────────
-            logger.info(f"[Total Token Usage] {format_token_usage(total_token_usage)}")
+        if generation["abstained"]:
             history.append({"role": "model", "parts": [{"text": reply}]})
             await save_history(session_id, history)
-
             trace_meta["status"] = "ok"
             trace_meta["ended_at"] = _now_iso()
             trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
             trace_meta["tokens"] = total_token_usage
             trace_meta["detected_language"] = detected_lang
             trace_meta["rag"] = rag_debug
+            trace_meta["abstained"] = True
             record_trace(trace_meta)
+            return {"text": reply, "from_faq": False, "tokens": total_token_usage, "trace_id": trace_id}
+
+        if generation.get("degraded"):
+            trace_meta["degraded"] = generation["degraded"]
+
+        # ── Step 9: FAQ Auto Learn (leader only; never a degraded answer) ──
+        if (
+            not coalesced and not generation.get("degraded") and should_retrieve and top_chunks
+            and bool(faq_cfg.get("auto_learn", True))
+        ):
+            faq_step = step_start("faq_learn", "FAQ Auto Learn")
+            top_score = float(top_chunks[0][1]) if top_chunks else 0.0
+            learn_meta = {
+                "source": "rag",
+                "require_retrieval": True,
+                "retrieval_count": len(top_chunks),
+                "retrieval_top_score": top_score,
+                "min_retrieval_score": faq_cfg.get("min_retrieval_score", 0.35),
+                "min_answer_chars": faq_cfg.get("min_answer_chars", 30),
+                "ttl_seconds": 86400,  # 24h TTL, refreshed daily
+            }
+            faq_update_result = await update_faq(msg, reply, learn_meta)
+            step_finish(
+                faq_step,
+                "ok" if bool(faq_update_result.get("updated")) else "skipped",
+                faq_update_result,
+            )
 
-            output = {"text": reply, "from_faq": False, "tokens": total_token_usage, "trace_id": trace_id}
-            if include_debug:
-                output["debug"] = {
-                    "trace_id": trace_id, "detected_language": detected_lang,
-                    "rag": rag_debug, "steps": trace_steps,
-                    "flow_config_snapshot": active_flow,
-                }
-            return output
-
-        except Exception as exc:
-            # ── Fallback: deterministic response when LLM fails ──────
-            logger.error("LLM Error: %s", exc, exc_info=True)
-            fallback_step = step_start("fallback", "Deterministic Fallback", {"error": str(exc)})
-            fallback_debug: Dict[str, Any] = {"mode": "generic_error"}
-            fallback_message = ""
+        # ── Step 10: Finalize ────────────────────────────────────
+        logger.info(f"[Total Token Usage] {format_token_usage(total_token_usage)}")
+        history.append({"role": "model", "parts": [{"text": reply}]})
+        await save_history(session_id, history)
+
+        trace_meta["status"] = "ok"
+        trace_meta["ended_at"] = _now_iso()
+        trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
+        trace_meta["tokens"] = total_token_usage
+        trace_meta["detected_language"] = detected_lang
+        trace_meta["rag"] = rag_debug
+        record_trace(trace_meta)
+
+        output = {"text": reply, "from_faq": False, "tokens": total_token_usage, "trace_id": trace_id}
+        if generation.get("degraded"):
+            # ผู้เรียก (FAQ refresh / service-time model) ต้องแยกคำตอบ degraded ออกจากคำตอบจริง
+            output["degraded"] = generation["degraded"]
+        if include_debug:
+            output["debug"] = {
+                "trace_id": trace_id, "detected_language": detected_lang,
+                "rag": rag_debug, "steps": trace_steps,
+                "flow_config_snapshot": active_flow,
+            }
+        return output
+
+    except asyncio.CancelledError:
+        if speculation is not None:
+            speculation.discard("cancelled")
+        raise
+
+    except RequestCancelled as cancelled:
+        # Client gone: ไม่มีใครอ่านคำตอบ → ไม่ทำ fallback, บันทึก trace แล้วส่งต่อให้คิว
+        if speculation is not None:
+            speculation.discard("cancelled")
+        logger.info("[Cancelled] session=%s reason=%s", session_id[:16], cancelled.reason)
+        trace_meta["status"] = "cancelled"
+        trace_meta["cancel_reason"] = cancelled.reason
+        trace_meta["ended_at"] = _now_iso()
+        trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
+        trace_meta["detected_language"] = detected_lang
+        trace_meta["rag"] = rag_debug
+        record_trace(trace_meta)
+        raise
 
-            try:
-                if _looks_out_of_scope_query(msg):
-                    fallback_message = "ไม่พบข้อมูลเรื่องนี้ในเอกสารที่ระบบมีอยู่ตอนนี้ครับ"
-                    fallback_debug["mode"] = "out_of_scope_guard"
-                elif top_chunks:
-                    fallback_message = _format_retrieval_fallback(top_chunks)
+    except Exception as exc:
+        # ── Fallback: deterministic response when LLM fails ──────
+        logger.error("LLM Error: %s", exc, exc_info=True)
+        if speculation is not None:
+            speculation.discard("error")
+        fallback_step = step_start("fallback", "Deterministic Fallback", {"error": str(exc)})
+        fallback_debug: Dict[str, Any] = {"mode": "generic_error"}
+        fallback_message = ""
+
+        try:
+            if _looks_out_of_scope_query(msg):
+                fallback_message = "ไม่พบข้อมูลเรื่องนี้ในเอกสารที่ระบบมีอยู่ตอนนี้ครับ"
+                fallback_debug["mode"] = "out_of_scope_guard"
+            elif top_chunks:
+                fallback_message = _format_retrieval_fallback(top_chunks)
+                if fallback_message:
+                    fallback_debug["mode"] = "retrieval_excerpt"
+
+            # หมดงบแล้ว → ไม่ค้นซ้ำ (ผู้ใช้รอไม่ไหวแล้ว) ตอบข้อความทั่วไปทันที
+            deadline_left = deadline is None or not deadline.expired
+            if not fallback_message and not _looks_out_of_scope_query(msg) and deadline_left:
+                try:
+                    fallback_chunks = await retrieval_stage.run_sync(
+                        retrieve_top_k_chunks, msg,
+                        k=3, folder=PDF_QUICK_USE_FOLDER,
+                        use_hybrid=True, use_rerank=False, use_intent_analysis=False,
+                    )
+                    fallback_message = _format_retrieval_fallback(fallback_chunks)
                     if fallback_message:
                         fallback_debug["mode"] = "retrieval_excerpt"
+                except Exception:
+                    pass
 
-                if not fallback_message and not _looks_out_of_scope_query(msg):
-                    try:
-                        fallback_chunks = await asyncio.to_thread(
-                            retrieve_top_k_chunks, msg,
-                            k=3, folder=PDF_QUICK_USE_FOLDER,
-                            use_hybrid=True, use_rerank=False, use_intent_analysis=False,
-                        )
-                        fallback_message = _format_retrieval_fallback(fallback_chunks)
-                        if fallback_message:
-                            fallback_debug["mode"] = "retrieval_excerpt"
-                    except Exception:
-                        pass
-
-                if not fallback_message:
-                    fallback_message = "ขออภัยครับ ระบบขัดข้องชั่วคราว กรุณาลองใหม่อีกครั้งนะครับ"
-                step_finish(fallback_step, "warn", fallback_debug)
-            except Exception as fallback_exc:
-                logger.error("Fallback Error: %s", fallback_exc, exc_info=True)
+            if not fallback_message:
                 fallback_message = "ขออภัยครับ ระบบขัดข้องชั่วคราว กรุณาลองใหม่อีกครั้งนะครับ"
-                step_finish(fallback_step, "error", {"fallback_error": str(fallback_exc)})
+            step_finish(fallback_step, "warn", fallback_debug)
+        except Exception as fallback_exc:
+            logger.error("Fallback Error: %s", fallback_exc, exc_info=True)
+            fallback_message = "ขออภัยครับ ระบบขัดข้องชั่วคราว กรุณาลองใหม่อีกครั้งนะครับ"
+            step_finish(fallback_step, "error", {"fallback_error": str(fallback_exc)})
+
+        fallback_tokens = estimate_tokens(fallback_message)
+        error_tokens = {
+            "prompt_tokens": 0,
+            "completion_tokens": fallback_tokens,
+            "total_tokens": fallback_tokens,
+            "estimated": True,
+            "error": True,
+        }
 
-            error_tokens = {
-                "prompt_tokens": 0,
-                "completion_tokens": count_tokens(fallback_message, primary_model_name),
-                "total_tokens": count_tokens(fallback_message, primary_model_name),
-                "error": True,
+        trace_meta["status"] = "error"
+        trace_meta["error"] = str(exc)
+        trace_meta["ended_at"] = _now_iso()
+        trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
+        trace_meta["tokens"] = error_tokens
+        trace_meta["detected_language"] = detected_lang
+        trace_meta["rag"] = rag_debug
+        record_trace(trace_meta)
+
+        output = {"text": fallback_message, "from_faq": False, "tokens": error_tokens, "trace_id": trace_id}
+        if include_debug:
+            output["debug"] = {
+                "trace_id": trace_id, "detected_language": detected_lang,
+                "rag": rag_debug, "steps": trace_steps,
+                "flow_config_snapshot": active_flow,
+                "error": str(exc), "fallback": fallback_debug,
             }
+        return output
 
-            trace_meta["status"] = "error"
-            trace_meta["error"] = str(exc)
-            trace_meta["ended_at"] = _now_iso()
-            trace_meta["latency_ms"] = round((time.perf_counter() - trace_started_perf) * 1000, 2)
-            trace_meta["tokens"] = error_tokens
-            trace_meta["detected_language"] = detected_lang
-            trace_meta["rag"] = rag_debug
-            record_trace(trace_meta)
 
-            output = {"text": fallback_message, "from_faq": False, "tokens": error_tokens, "trace_id": trace_id}
-            if include_debug:
-                output["debug"] = {
-                    "trace_id": trace_id, "detected_language": detected_lang,
-                    "rag": rag_debug, "steps": trace_steps,
-                    "flow_config_snapshot": active_flow,
-                    "error": str(exc), "fallback": fallback_debug,
-                }
-            return output
+async def answer_without_llm(msg: str, session_id: str, **_kwargs) -> Optional[Dict[str, Any]]:
+    """
+    คำตอบแบบไม่ใช้ LLM สำหรับ queue overload (admission control): greeting / FAQ cache
+    แล้วค่อย extractive answer จาก retrieval — คืน None ถ้าตอบไม่ได้ (คิวจะปฏิเสธแทน)
+    """
+    reply = ""
+    from_faq = False
+    try:
+        greeting = await cache_stage.run(get_greeting_response(msg))
+        if greeting:
+            reply, from_faq = greeting, True
+        else:
+            faq_hit = await cache_stage.run(get_faq_answer(msg, include_meta=True))
+            if isinstance(faq_hit, dict) and str(faq_hit.get("answer") or "").strip():
+                reply, from_faq = str(faq_hit["answer"]).strip(), True
+        if not reply and needs_retrieval(msg) and not _looks_out_of_scope_query(msg):
+            chunks = await retrieval_stage.run_sync(
+                retrieve_top_k_chunks, msg,
+                k=3, folder=PDF_QUICK_USE_FOLDER,
+                use_hybrid=True, use_rerank=False, use_intent_analysis=False,
+            )
+            reply = _format_retrieval_fallback(chunks)
+    except Exception as exc:
+        logger.warning("answer_without_llm failed: %s", exc)
+        return None
+    if not reply:
+        return None
+
+    history = await get_or_create_history(session_id)
+    if not (history and history[-1]["parts"][0]["text"] == msg):
+        history.append({"role": "user", "parts": [{"text": msg}]})
+    history.append({"role": "model", "parts": [{"text": reply}]})
+    await save_history(session_id, history)
+
+    completion_tokens = 0 if from_faq else estimate_tokens(reply)
+    logger.info("[Overload] answered without LLM (%s): '%s'", "faq" if from_faq else "extractive", msg[:40])
+    return {
+        "text": reply,
+        "from_faq": from_faq,
+        "tokens": {
+            "prompt_tokens": 0,
+            "completion_tokens": completion_tokens,
+            "total_tokens": completion_tokens,
+            "cached": from_faq,
+            "estimated": True,
+        },
+        "trace_id": f"overload_{uuid.uuid4().hex[:12]}",
+        "diverted": True,
+    }
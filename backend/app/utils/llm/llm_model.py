@@ -1,27 +1,52 @@
 import asyncio
+import math
 import os
 import subprocess
 import time
 import logging
+from collections import deque
 import httpx
 import openai
 import shutil
 from google import genai
+from google.genai import types as genai_types
 from app.config import (
     GEMINI_API_KEY,
+    GEMINI_MODEL_NAME,
     OPENAI_API_KEY,
     LLM_PROVIDER,
+    MAX_CONCURRENT_LLM_CALLS,
     OPENAI_BASE_URL,
     LOCAL_API_KEY,
     LOCAL_BASE_URL,
-    LOCAL_MODEL_NAME
+    LOCAL_MODEL_NAME,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_DELAY_MS,
+    LLM_HEDGE_MIN_DELAY_MS,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_BUDGET_RATIO,
+    LLM_HEDGE_BUDGET_BURST,
+    LLM_DEADLINE_MIN_CALL_S,
 )
+from app.utils.llm.circuit_breaker import CircuitOpenError, llm_breaker
+from app.utils.llm.quota_limiter import estimate_request_tokens, llm_quota, quota_key
+from queue_manager.deadline import current_deadline
 
 logger = logging.getLogger(__name__)
 
 # Global async clients (singleton pattern)
 _async_openai_client = None
 _async_local_client = None
+_gemini_client = None
+_mock_client = None
+
+# Gemini transport: keep-alive pool shared by every turn (ms for HttpOptions.timeout)
+_GEMINI_TIMEOUT_MS = 60_000
+_GEMINI_POOL_LIMITS = httpx.Limits(
+    max_connections=max(4, MAX_CONCURRENT_LLM_CALLS * 2),
+    max_keepalive_connections=max(2, MAX_CONCURRENT_LLM_CALLS),
+    keepalive_expiry=60.0,
+)
 
 
 def _split_csv_env(raw: str) -> list[str]:
@@ -58,6 +83,18 @@ def _mask_api_key(api_key: str) -> str:
     return f"{value[:6]}...{value[-4:]}"
 
 
+def openai_breaker_key(label: str) -> str:
+    return f"openai:{label}"
+
+
+def gemini_breaker_key() -> str:
+    return f"gemini:{quota_key(GEMINI_API_KEY)}"
+
+
+LOCAL_BREAKER_KEY = "local"
+MOCK_BREAKER_KEY = "mock"
+
+
 def _extract_status_code(exc: Exception) -> int | None:
     status_code = getattr(exc, "status_code", None)
     if isinstance(status_code, int):
@@ -117,31 +154,182 @@ class _OpenAIChatFailover:
         self.completions = _OpenAICompletionsFailover(pool)
 
 
+class _HedgePolicy:
+    """
+    Hedge delay จาก latency จริง (p95 ของ call ที่สำเร็จล่าสุด) + budget แบบ token bucket
+
+    ทุก primary call เติม budget `ratio` token (สูงสุด `burst`), hedge หนึ่งครั้งใช้ 1 token
+    → hedge ได้ไม่เกิน ~ratio ของ traffic ทั้งหมด (เช่น 0.1 = ค่าใช้จ่ายเพิ่มไม่เกิน ~10%)
+    """
+
+    _MIN_SAMPLES = 20
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        default_delay_s: float = 2.0,
+        min_delay_s: float = 0.3,
+        percentile: float = 95.0,
+        budget_ratio: float = 0.1,
+        budget_burst: float = 3.0,
+        window: int = 256,
+    ):
+        self.enabled = bool(enabled)
+        self.default_delay_s = max(0.0, float(default_delay_s))
+        self.min_delay_s = max(0.0, float(min_delay_s))
+        self.percentile = min(99.9, max(50.0, float(percentile)))
+        self.budget_ratio = max(0.0, float(budget_ratio))
+        self.budget_burst = max(1.0, float(budget_burst))
+        self._latencies: "deque[float]" = deque(maxlen=max(self._MIN_SAMPLES, int(window)))
+        self._tokens = self.budget_burst
+
+        self.primary_calls = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def record_latency(self, latency_s: float) -> None:
+        self._latencies.append(max(0.0, float(latency_s)))
+
+    def delay_s(self) -> float:
+        if len(self._latencies) < self._MIN_SAMPLES:
+            return max(self.min_delay_s, self.default_delay_s)
+        ordered = sorted(self._latencies)
+        rank = max(1, math.ceil(self.percentile / 100.0 * len(ordered)))
+        return max(self.min_delay_s, ordered[rank - 1])
+
+    def on_primary(self) -> None:
+        self.primary_calls += 1
+        self._tokens = min(self.budget_burst, self._tokens + self.budget_ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self.hedges_sent += 1
+            return True
+        self.budget_denied += 1
+        return False
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "delay_ms": round(self.delay_s() * 1000, 1),
+            "samples": len(self._latencies),
+            "primary_calls": self.primary_calls,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+            "budget_tokens": round(self._tokens, 2),
+            "hedge_rate": round(self.hedges_sent / self.primary_calls, 4) if self.primary_calls else 0.0,
+        }
+
+
 class OpenAIFailoverClient:
-    def __init__(self, clients: list, labels: list[str]):
+    def __init__(self, clients: list, labels: list[str], hedge_policy: _HedgePolicy | None = None):
         if not clients:
             raise ValueError("OpenAIFailoverClient requires at least one client.")
         self._clients = clients
         self._labels = labels
         self._active_index = 0
         self._switch_lock = asyncio.Lock()
+        self._hedge = hedge_policy or _HedgePolicy(enabled=False)
         self.chat = _OpenAIChatFailover(self)
 
     async def create_chat_completion(self, *args, **kwargs):
+        # Streaming ไม่ hedge: delta ถูกส่งถึง client ทันที ยกเลิกฝั่งที่แพ้ไม่ได้
+        if self._hedge.enabled and len(self._clients) > 1 and not kwargs.get("stream"):
+            return await self._create_hedged(*args, **kwargs)
+        return await self._create_with_failover(None, *args, **kwargs)
+
+    async def _timed_failover(self, preferred_index, *args, **kwargs):
+        started = time.perf_counter()
+        result = await self._create_with_failover(preferred_index, *args, **kwargs)
+        self._hedge.record_latency(time.perf_counter() - started)
+        return result
+
+    async def _create_hedged(self, *args, **kwargs):
+        """
+        Primary เริ่มที่ key ที่ active อยู่; ถ้ายังไม่ตอบภายใน hedge delay (p95)
+        และ budget ยังเหลือ → ยิงซ้ำโดยเริ่มที่ key ถัดไป ใครตอบก่อนชนะ อีกฝั่งถูก cancel
+        """
+        async with self._switch_lock:
+            primary_index = self._active_index
+        hedge_index = (primary_index + 1) % len(self._clients)
+        self._hedge.on_primary()
+
+        primary = asyncio.create_task(self._timed_failover(primary_index, *args, **kwargs))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge.delay_s())
+            if not done and self._hedge.try_spend():
+                logger.info(
+                    "OpenAI hedge: key #%d slow (>%.2fs), duplicating on key #%d (%s).",
+                    primary_index + 1,
+                    self._hedge.delay_s(),
+                    hedge_index + 1,
+                    self._labels[hedge_index],
+                )
+                tasks.add(asyncio.create_task(self._timed_failover(hedge_index, *args, **kwargs)))
+
+            first_error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._hedge.hedge_wins += 1
+                        return task.result()
+                    if first_error is None or task is primary:
+                        first_error = task.exception()
+            raise first_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            for task in tasks:
+                if not task.done():
+                    try:
+                        await task
+                    except BaseException:
+                        pass
+
+    async def _create_with_failover(self, preferred_index, *args, **kwargs):
         retry_rounds = 2
         last_retryable_error = None
+        pinned_index = preferred_index
+        circuit_error = None
+        estimated_tokens = estimate_request_tokens(
+            *(str(message.get("content") or "") for message in kwargs.get("messages") or [] if isinstance(message, dict))
+        )
+        # Request deadline (ผูกโดย _call_llm / queue): งบไม่พอ → ไม่ลอง key ถัดไป / ไม่รอรอบใหม่
+        deadline = current_deadline()
+        out_of_budget = False
 
         hit_rate_limit = False
         for round_idx in range(retry_rounds):
-            async with self._switch_lock:
-                preferred_index = self._active_index
+            if pinned_index is None:
+                async with self._switch_lock:
+                    preferred_index = self._active_index
 
             call_order = [preferred_index] + [idx for idx in range(len(self._clients)) if idx != preferred_index]
 
+            attempted = False
             for idx in call_order:
+                if attempted and deadline is not None and not deadline.allows(LLM_DEADLINE_MIN_CALL_S):
+                    logger.warning(
+                        "OpenAI failover stopped: %.2fs left before the request deadline (key #%d not tried).",
+                        deadline.remaining(), idx + 1,
+                    )
+                    out_of_budget = True
+                    break
                 client = self._clients[idx]
                 try:
-                    result = await client.chat.completions.create(*args, **kwargs)
+                    result = await llm_breaker.call(
+                        openai_breaker_key(self._labels[idx]),
+                        lambda client=client, idx=idx: self._call_key(client, idx, estimated_tokens, *args, **kwargs),
+                        is_failure=_is_retryable_openai_error,
+                    )
                     if idx != preferred_index:
                         async with self._switch_lock:
                             self._active_index = idx
@@ -151,7 +339,11 @@ class OpenAIFailoverClient:
                             self._labels[idx],
                         )
                     return result
+                except CircuitOpenError as exc:
+                    circuit_error = exc  # key ถูกตัดวงจรอยู่ → ข้ามไป key ถัดไปทันที
+                    continue
                 except Exception as exc:
+                    attempted = True
                     if _is_retryable_openai_error(exc):
                         last_retryable_error = exc
                         status_code = _extract_status_code(exc)
@@ -170,11 +362,18 @@ class OpenAIFailoverClient:
 
             # On 429 rate limit, don't do extra rounds — raise immediately
             # so the higher-level retry-with-wait logic can handle the cooldown
-            if hit_rate_limit:
+            if hit_rate_limit or out_of_budget:
                 break
 
+            # ทุก key ถูกตัดวงจร → fail fast ให้ caller ไป fallback (ไม่ sleep รอรอบถัดไป)
+            if not attempted and circuit_error is not None:
+                raise circuit_error
+
             if round_idx < retry_rounds - 1:
-                await asyncio.sleep(0.35 * (round_idx + 1))
+                backoff = 0.35 * (round_idx + 1)
+                if deadline is not None and not deadline.allows(backoff + LLM_DEADLINE_MIN_CALL_S):
+                    break  # ไม่พอสำหรับอีกรอบ → ส่ง error ให้ caller ตอบแบบ degraded
+                await asyncio.sleep(backoff)
 
         if last_retryable_error is not None:
             logger.warning(
@@ -182,8 +381,27 @@ class OpenAIFailoverClient:
                 round_idx + 1, hit_rate_limit,
             )
             raise last_retryable_error
+        if circuit_error is not None:
+            raise circuit_error
         raise RuntimeError("OpenAI failover could not create completion.")
 
+    async def _call_key(self, client, idx: int, estimated_tokens: int, *args, **kwargs):
+        await llm_quota.acquire("openai", self._labels[idx], estimated_tokens)
+        result = await client.chat.completions.create(*args, **kwargs)
+        usage = getattr(result, "usage", None)
+        if usage is not None:
+            await llm_quota.settle(
+                "openai", self._labels[idx], estimated_tokens, getattr(usage, "total_tokens", 0) or 0
+            )
+        return result
+
+    def get_stats(self) -> dict:
+        return {
+            "keys": len(self._clients),
+            "active_key": self._active_index + 1,
+            "hedge": self._hedge.get_stats(),
+        }
+
     async def close(self):
         for idx, client in enumerate(self._clients):
             try:
@@ -241,17 +459,48 @@ def ensure_local_llm_ready():
     except Exception as e:
         logger.warning(f"⚠️ การ Pull โมเดลขัดข้อง: {e}")
 
+def get_gemini_client():
+    """
+    คืนค่า GenAI Client ตัวเดียวของทั้ง process (singleton)
+    ใช้ผ่าน `client.aio.models.generate_content(...)` เพื่อไม่กิน thread pool
+    และใช้ connection pool เดิมซ้ำ (ไม่ต้อง TLS handshake ใหม่ทุก turn)
+    ใช้ทั้งกรณี LLM_PROVIDER=gemini และ Gemini fallback ของ provider อื่น
+    """
+    global _gemini_client
+
+    if not GEMINI_API_KEY:
+        raise ValueError("❌ ไม่พบ GEMINI_API_KEY")
+
+    if _gemini_client is None:
+        try:
+            _gemini_client = genai.Client(
+                api_key=GEMINI_API_KEY,
+                http_options=genai_types.HttpOptions(
+                    timeout=_GEMINI_TIMEOUT_MS,
+                    async_client_args={"limits": _GEMINI_POOL_LIMITS},
+                ),
+            )
+        except (TypeError, ValueError) as exc:
+            # SDK รุ่นเก่าไม่รองรับ async_client_args → ใช้ transport ค่าเริ่มต้น (ยัง reuse client เดิม)
+            logger.warning("Gemini pooled transport unavailable (%s); using default transport.", exc)
+            _gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+        client = _gemini_client
+        llm_breaker.register_probe(
+            gemini_breaker_key(), lambda: client.aio.models.get(model=GEMINI_MODEL_NAME or "gemini-2.0-flash")
+        )
+        logger.info("Gemini client ready (async, pooled transport)")
+    return _gemini_client
+
+
 def get_llm_model():
     """
     สร้างและคืนค่า Client ของ LLM (Async สำหรับ OpenAI/Local, GenAI Client สำหรับ Gemini)
     """
-    global _async_openai_client, _async_local_client
+    global _async_openai_client, _async_local_client, _mock_client
     
     if LLM_PROVIDER == "gemini":
-        if not GEMINI_API_KEY:
-            raise ValueError("❌ ไม่พบ GEMINI_API_KEY")
         # GenAI SDK รองรับ .aio สำหรับการเรียกใช้แบบ asynchronous
-        return genai.Client(api_key=GEMINI_API_KEY)
+        return get_gemini_client()
 
     elif LLM_PROVIDER == "openai":
         openai_keys = _load_openai_api_keys()
@@ -272,10 +521,24 @@ def get_llm_model():
                     )
                 )
                 labels.append(_mask_api_key(api_key))
+                llm_breaker.register_probe(openai_breaker_key(labels[-1]), clients[-1].models.list)
                 logger.info("OpenAI key #%d ready (%s)", idx + 1, labels[-1])
-            _async_openai_client = OpenAIFailoverClient(clients, labels)
+            hedge_policy = _HedgePolicy(
+                enabled=LLM_HEDGE_ENABLED,
+                default_delay_s=LLM_HEDGE_DELAY_MS / 1000.0,
+                min_delay_s=LLM_HEDGE_MIN_DELAY_MS / 1000.0,
+                percentile=LLM_HEDGE_PERCENTILE,
+                budget_ratio=LLM_HEDGE_BUDGET_RATIO,
+                budget_burst=LLM_HEDGE_BUDGET_BURST,
+            )
+            _async_openai_client = OpenAIFailoverClient(clients, labels, hedge_policy=hedge_policy)
             if len(openai_keys) > 1:
                 logger.info("OpenAI failover enabled with %d keys.", len(openai_keys))
+                if LLM_HEDGE_ENABLED:
+                    logger.info(
+                        "OpenAI hedged requests enabled (p%.0f delay, budget %.0f%%).",
+                        LLM_HEDGE_PERCENTILE, LLM_HEDGE_BUDGET_RATIO * 100,
+                    )
         return _async_openai_client
 
     elif LLM_PROVIDER == "local":
@@ -288,7 +551,18 @@ def get_llm_model():
                 base_url=LOCAL_BASE_URL,
                 timeout=httpx.Timeout(120.0, connect=10.0)
             )
+            llm_breaker.register_probe(LOCAL_BREAKER_KEY, _async_local_client.models.list)
         return _async_local_client
+
+    elif LLM_PROVIDER == "mock":
+        # Offline OpenAI-compatible client (deterministic replies, injected latency / 429 / timeouts)
+        if _mock_client is None:
+            from app.utils.llm.mock_llm import MockLLMClient
+
+            _mock_client = MockLLMClient()
+            llm_breaker.register_probe(MOCK_BREAKER_KEY, _mock_client.models.list)
+            logger.info("Mock LLM provider ready: %s", _mock_client.get_stats())
+        return _mock_client
     else:
         raise ValueError(f"❌ ไม่รู้จัก LLM_PROVIDER: {LLM_PROVIDER}")
 
@@ -296,7 +570,7 @@ async def close_llm_clients():
     """
     ✅ ปิด async clients อย่างถูกวิธี
     """
-    global _async_openai_client, _async_local_client
+    global _async_openai_client, _async_local_client, _gemini_client, _mock_client
     
     if _async_openai_client is not None:
         try:
@@ -314,6 +588,25 @@ async def close_llm_clients():
             logger.warning(f"⚠️ Error closing Local client: {e}")
         _async_local_client = None
 
+    if _gemini_client is not None:
+        try:
+            aio_client = getattr(_gemini_client, "aio", None)
+            aclose = getattr(aio_client, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            close = getattr(_gemini_client, "close", None)
+            if close is not None:
+                close()
+            logger.info("✅ Closed Gemini client")
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing Gemini client: {e}")
+        _gemini_client = None
+
+    _mock_client = None
+
+    await llm_quota.close()
+    await llm_breaker.close()
+
 def log_llm_usage(response, context="", model_name=None):
     """
     บันทึกการใช้งาน Token ของระบบ
@@ -0,0 +1,222 @@
+"""
+Mock LLM provider (LLM_PROVIDER=mock) — offline, OpenAI-compatible client สำหรับ load test / benchmark
+
+- คำตอบ deterministic: prompt เดียวกัน → ข้อความเดียวกันเสมอ (hash ของ messages)
+- latency สุ่มจาก distribution ที่กำหนด (fixed / uniform / lognormal / exponential) ด้วย seed คงที่
+- streaming: delta ทีละไม่กี่คำ ห่างกัน MOCK_LLM_STREAM_CHUNK_MS
+- inject 429 / timeout ตามสัดส่วน → ทดสอบ limiter / breaker / fallback ได้โดยไม่ต้องมี network
+
+รูปร่าง response เหมือน openai SDK (choices / message / delta / usage) เท่าที่ llm.py ใช้
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import random
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import (
+    MOCK_LLM_LATENCY_DIST,
+    MOCK_LLM_LATENCY_MS,
+    MOCK_LLM_LATENCY_SPREAD,
+    MOCK_LLM_RATE_LIMIT_RATE,
+    MOCK_LLM_REPLY_WORDS,
+    MOCK_LLM_SEED,
+    MOCK_LLM_STREAM_CHUNK_MS,
+    MOCK_LLM_TIMEOUT_MS,
+    MOCK_LLM_TIMEOUT_RATE,
+    MOCK_MODEL_NAME,
+)
+from app.utils.llm.quota_limiter import estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "exponential")
+
+_WORDS_PER_CHUNK = 3
+_VOCABULARY = (
+    "ข้อมูล", "จำลอง", "สำหรับ", "ทดสอบ", "ระบบ", "ลงทะเบียน", "นักศึกษา", "ภาคเรียน",
+    "กำหนดการ", "ค่าธรรมเนียม", "เอกสาร", "ครับ", "mock", "response", "benchmark", "latency",
+)
+
+
+class MockRateLimitError(Exception):
+    """Injected 429 (รูปแบบเดียวกับ openai.RateLimitError: มี status_code + ข้อความ 429)"""
+
+    status_code = 429
+
+    def __init__(self):
+        super().__init__("Error code: 429 - rate limit exceeded (mock)")
+
+
+class MockTimeoutError(TimeoutError):
+    """Injected timeout หลังรอ MOCK_LLM_TIMEOUT_MS"""
+
+    status_code = 408
+
+    def __init__(self, timeout_ms: int):
+        super().__init__(f"Request timed out after {timeout_ms} ms (mock)")
+
+
+def _messages_text(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(message.get("content") or "") for message in messages or [])
+
+
+def mock_reply(prompt_text: str, words: int = MOCK_LLM_REPLY_WORDS) -> str:
+    """ข้อความตอบแบบ deterministic จาก hash ของ prompt"""
+    digest = hashlib.sha256(str(prompt_text or "").encode("utf-8")).digest()
+    picked = [_VOCABULARY[digest[idx % len(digest)] % len(_VOCABULARY)] for idx in range(max(1, int(words)))]
+    return f"[mock {digest[:4].hex()}] " + " ".join(picked)
+
+
+class _LatencyModel:
+    def __init__(self, distribution: str, median_ms: float, spread: float, seed: int):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            logger.warning("Unknown MOCK_LLM_LATENCY_DIST=%r, using 'fixed'", distribution)
+            distribution = "fixed"
+        self.distribution = distribution
+        self.median_s = max(0.0, float(median_ms)) / 1000.0
+        self.spread = max(0.0, float(spread))
+        self._rng = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.median_s <= 0 or self.distribution == "fixed":
+            return self.median_s
+        if self.distribution == "uniform":
+            low = self.median_s * max(0.0, 1.0 - self.spread)
+            return self._rng.uniform(low, self.median_s * (1.0 + self.spread))
+        if self.distribution == "lognormal":
+            return self._rng.lognormvariate(math.log(self.median_s), self.spread)
+        # exponential with the given median (mean = median / ln 2)
+        return self._rng.expovariate(math.log(2) / self.median_s)
+
+    def roll(self) -> float:
+        return self._rng.random()
+
+
+class _MockCompletions:
+    def __init__(self, client: "MockLLMClient"):
+        self._client = client
+
+    async def create(self, model: str = "", messages: Optional[List[Dict[str, Any]]] = None, stream: bool = False, **kwargs):
+        return await self._client._create(model or MOCK_MODEL_NAME, messages or [], stream, kwargs)
+
+
+class MockLLMClient:
+    """แทน openai.AsyncOpenAI: client.chat.completions.create(...) / client.models.list()"""
+
+    def __init__(
+        self,
+        latency_dist: str = MOCK_LLM_LATENCY_DIST,
+        latency_ms: float = MOCK_LLM_LATENCY_MS,
+        latency_spread: float = MOCK_LLM_LATENCY_SPREAD,
+        stream_chunk_ms: float = MOCK_LLM_STREAM_CHUNK_MS,
+        reply_words: int = MOCK_LLM_REPLY_WORDS,
+        rate_limit_rate: float = MOCK_LLM_RATE_LIMIT_RATE,
+        timeout_rate: float = MOCK_LLM_TIMEOUT_RATE,
+        timeout_ms: int = MOCK_LLM_TIMEOUT_MS,
+        seed: int = MOCK_LLM_SEED,
+    ):
+        self._latency = _LatencyModel(latency_dist, latency_ms, latency_spread, seed)
+        self.stream_chunk_s = max(0.0, float(stream_chunk_ms)) / 1000.0
+        self.reply_words = max(1, int(reply_words))
+        self.rate_limit_rate = min(1.0, max(0.0, float(rate_limit_rate)))
+        self.timeout_rate = min(1.0, max(0.0, float(timeout_rate)))
+        self.timeout_ms = max(0, int(timeout_ms))
+        self.chat = SimpleNamespace(completions=_MockCompletions(self))
+        self.models = SimpleNamespace(list=self._list_models)
+        self._calls = 0
+        self._streams = 0
+        self._rate_limited = 0
+        self._timeouts = 0
+        self._latency_total_s = 0.0
+
+    async def _list_models(self):
+        return SimpleNamespace(data=[SimpleNamespace(id=MOCK_MODEL_NAME, object="model")])
+
+    async def _inject_failure(self) -> None:
+        roll = self._latency.roll()
+        if roll < self.rate_limit_rate:
+            self._rate_limited += 1
+            raise MockRateLimitError()
+        if roll < self.rate_limit_rate + self.timeout_rate:
+            self._timeouts += 1
+            await asyncio.sleep(self.timeout_ms / 1000.0)
+            raise MockTimeoutError(self.timeout_ms)
+
+    def _usage(self, prompt_text: str, reply: str) -> SimpleNamespace:
+        prompt_tokens = estimate_request_tokens(prompt_text, completion_tokens=0)
+        completion_tokens = estimate_request_tokens(reply, completion_tokens=0)
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=None,
+        )
+
+    def _chunks(self, reply: str) -> List[str]:
+        words = reply.split(" ")
+        return [
+            " ".join(words[idx:idx + _WORDS_PER_CHUNK]) + (" " if idx + _WORDS_PER_CHUNK < len(words) else "")
+            for idx in range(0, len(words), _WORDS_PER_CHUNK)
+        ]
+
+    async def _create(self, model: str, messages: List[Dict[str, Any]], stream: bool, options: Dict[str, Any]):
+        self._calls += 1
+        await self._inject_failure()
+        prompt_text = _messages_text(messages)
+        reply = mock_reply(prompt_text, self.reply_words)
+        chunks = self._chunks(reply)
+        first_token_s = self._latency.sample()
+        self._latency_total_s += first_token_s + self.stream_chunk_s * max(0, len(chunks) - 1)
+
+        if stream:
+            self._streams += 1
+            include_usage = bool((options.get("stream_options") or {}).get("include_usage"))
+            return self._stream(model, chunks, first_token_s, self._usage(prompt_text, reply) if include_usage else None)
+
+        # non-stream = เวลาเท่ากับ stream ทั้งก้อน (TTFT + chunk intervals)
+        await asyncio.sleep(first_token_s + self.stream_chunk_s * max(0, len(chunks) - 1))
+        return SimpleNamespace(
+            id=f"mock-{self._calls}",
+            model=model,
+            choices=[SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content=reply),
+                finish_reason="stop",
+            )],
+            usage=self._usage(prompt_text, reply),
+        )
+
+    async def _stream(
+        self, model: str, chunks: List[str], first_token_s: float, usage: Optional[SimpleNamespace]
+    ) -> AsyncIterator[SimpleNamespace]:
+        await asyncio.sleep(first_token_s)
+        for idx, text in enumerate(chunks):
+            if idx:
+                await asyncio.sleep(self.stream_chunk_s)
+            yield SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(
+                    index=0,
+                    delta=SimpleNamespace(content=text),
+                    finish_reason="stop" if idx == len(chunks) - 1 else None,
+                )],
+                usage=None,
+            )
+        if usage is not None:
+            yield SimpleNamespace(model=model, choices=[], usage=usage)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self._calls,
+            "streams": self._streams,
+            "rate_limited": self._rate_limited,
+            "timeouts": self._timeouts,
+            "latency_distribution": self._latency.distribution,
+            "avg_latency_ms": round(self._latency_total_s / max(1, self._calls - self._rate_limited - self._timeouts) * 1000, 1),
+        }
+
+    async def close(self) -> None:
+        return None
@@ -0,0 +1,252 @@
+"""
+Staged concurrency for the ask_llm pipeline.
+
+แต่ละ stage มี concurrency ของตัวเอง เพื่อไม่ให้งานถูก (greeting/FAQ) ต้องรอหลังงานแพง (LLM):
+- cache:     session load + greeting / FAQ lookup (I/O เบาๆ, limit สูง)
+- retrieval: hybrid search + cross-encoder บน CPU pool เฉพาะ (ไม่แย่ง default thread pool)
+- llm:       provider call เท่านั้น → ใช้ adaptive limiter (app.utils.llm.adaptive_limiter)
+
+ทุก stage รายงาน in_flight / waiting / peak / wait time ผ่าน get_pipeline_stage_stats()
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import PIPELINE_CACHE_CONCURRENCY, PIPELINE_RETRIEVAL_CONCURRENCY
+from app.utils.llm.adaptive_limiter import llm_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class StageGate:
+    """Bounded concurrency for one pipeline stage, with saturation stats."""
+
+    def __init__(self, name: str, limit: int, executor: Optional[ThreadPoolExecutor] = None):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self._executor = executor
+        self._in_flight = 0
+        self._waiting = 0
+        self._peak_in_flight = 0
+        self._total = 0
+        self._queued = 0  # calls that had to wait for a slot
+        self._total_wait_s = 0.0
+        self._max_wait_s = 0.0
+
+    async def _enter(self) -> None:
+        started = time.perf_counter()
+        if self._semaphore.locked():
+            self._queued += 1
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - started
+        self._total += 1
+        self._total_wait_s += waited
+        self._max_wait_s = max(self._max_wait_s, waited)
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _exit(self) -> None:
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    async def run(self, coro: Awaitable[Any]) -> Any:
+        """Await `coro` inside this stage's concurrency bound."""
+        try:
+            await self._enter()
+        except BaseException:
+            close = getattr(coro, "close", None)
+            if close is not None:
+                close()  # never started → avoid "coroutine was never awaited"
+            raise
+        try:
+            return await coro
+        finally:
+            self._exit()
+
+    async def run_sync(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run blocking `fn` on this stage's executor inside the bound."""
+        await self._enter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._exit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "peak_in_flight": self._peak_in_flight,
+            "saturation": round(self._in_flight / self.limit, 3),
+            "total": self._total,
+            "queued": self._queued,
+            "avg_wait_ms": round(self._total_wait_s / self._total * 1000, 2) if self._total else 0.0,
+            "max_wait_ms": round(self._max_wait_s * 1000, 2),
+        }
+
+
+class SpeculationStats:
+    """
+    วัดผล speculative retrieval (เริ่ม retrieval พร้อม session/cache lookup)
+
+    - used:      ผลถูกใช้จริง; head_start = retrieval เริ่มก่อนถึงจุดที่เคยเริ่มแบบ serial นานเท่าไร
+    - discarded: greeting/FAQ hit หรือ error → ทิ้งผล (cancel ทันถ้ายังไม่เริ่มรันใน thread)
+    - wasted_ms: เวลา CPU ที่ retrieval ที่ถูกทิ้งรันไปจริงใน thread pool
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # wasted time is reported from retrieval threads
+        self.started = 0
+        self.used = 0
+        self.discarded: Dict[str, int] = {}
+        self.cancelled_before_run = 0
+        self.wasted_ms = 0.0
+        self.head_start_ms = 0.0
+
+    def on_started(self) -> None:
+        with self._lock:
+            self.started += 1
+
+    def on_used(self, head_start_ms: float) -> None:
+        with self._lock:
+            self.used += 1
+            self.head_start_ms += max(0.0, head_start_ms)
+
+    def on_discarded(self, reason: str) -> None:
+        with self._lock:
+            self.discarded[reason] = self.discarded.get(reason, 0) + 1
+
+    def on_cancelled_before_run(self) -> None:
+        with self._lock:
+            self.cancelled_before_run += 1
+
+    def on_wasted(self, exec_ms: float) -> None:
+        with self._lock:
+            self.wasted_ms += max(0.0, exec_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            discarded_total = sum(self.discarded.values())
+            return {
+                "started": self.started,
+                "used": self.used,
+                "discarded": dict(self.discarded),
+                "discard_rate": round(discarded_total / self.started, 4) if self.started else 0.0,
+                "cancelled_before_run": self.cancelled_before_run,
+                "wasted_ms_total": round(self.wasted_ms, 1),
+                "wasted_ms_avg": round(self.wasted_ms / discarded_total, 1) if discarded_total else 0.0,
+                "head_start_ms_avg": round(self.head_start_ms / self.used, 1) if self.used else 0.0,
+            }
+
+
+class SpeculativeRun:
+    """
+    งาน sync ที่เริ่มบน stage ล่วงหน้า ก่อนรู้ว่าจะได้ใช้ผลหรือไม่
+
+    result()  → รอผล (นับเป็น used)
+    discard() → ทิ้งผล: ถ้ายังไม่เริ่มใน thread จะไม่รันเลย, ถ้ารันอยู่จะนับเวลาที่รันเป็น wasted
+                (thread ถูก interrupt ไม่ได้ จึงปล่อยให้จบเองแล้วทิ้งผล)
+    """
+
+    _PENDING, _RUNNING, _FINISHED = "pending", "running", "finished"
+
+    def __init__(
+        self,
+        stage: "StageGate",
+        fn: Callable[..., Any],
+        *args,
+        stats: Optional[SpeculationStats] = None,
+        **kwargs,
+    ):
+        self._stats = stats or speculation_stats
+        self._lock = threading.Lock()
+        self._state = self._PENDING
+        self._discarded = False
+        self._claimed = False
+        self._exec_ms = 0.0
+        self._started_perf = time.perf_counter()
+        self._stats.on_started()
+        self.task = asyncio.get_running_loop().create_task(
+            stage.run_sync(self._execute, fn, args, kwargs)
+        )
+        self.task.add_done_callback(self._consume_exception)
+
+    @staticmethod
+    def _consume_exception(task: asyncio.Task) -> None:
+        if not task.cancelled():
+            task.exception()  # discarded runs must not log "exception was never retrieved"
+
+    def _execute(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> Any:
+        with self._lock:
+            if self._discarded:
+                return None
+            self._state = self._RUNNING
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            exec_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._state = self._FINISHED
+                self._exec_ms = exec_ms
+                wasted = self._discarded
+            if wasted:
+                self._stats.on_wasted(exec_ms)
+
+    async def result(self) -> Any:
+        if not self._claimed:
+            self._claimed = True
+            self._stats.on_used((time.perf_counter() - self._started_perf) * 1000)
+        return await self.task
+
+    def discard(self, reason: str) -> None:
+        """No-op เมื่อผลถูกใช้ไปแล้วหรือ discard ไปแล้ว"""
+        if self._claimed or self._discarded:
+            return
+        with self._lock:
+            self._discarded = True
+            state = self._state
+            exec_ms = self._exec_ms
+        self._stats.on_discarded(reason)
+        if state == self._PENDING:
+            self._stats.on_cancelled_before_run()
+        elif state == self._FINISHED:
+            self._stats.on_wasted(exec_ms)
+        if not self.task.done():
+            self.task.cancel()
+
+
+speculation_stats = SpeculationStats()
+
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=PIPELINE_RETRIEVAL_CONCURRENCY,
+    thread_name_prefix="retrieval",
+)
+
+cache_stage = StageGate("cache", PIPELINE_CACHE_CONCURRENCY)
+retrieval_stage = StageGate("retrieval", PIPELINE_RETRIEVAL_CONCURRENCY, executor=retrieval_executor)
+
+
+def get_pipeline_stage_stats() -> Dict[str, Any]:
+    llm_stats = llm_limiter.get_stats()
+    return {
+        "cache": cache_stage.get_stats(),
+        "retrieval": retrieval_stage.get_stats(),
+        "speculative_retrieval": speculation_stats.get_stats(),
+        "llm": {
+            "limit": llm_stats["limit"],
+            "in_flight": llm_stats["in_flight"],
+            "waiting": llm_stats["waiting"],
+            "saturation": round(llm_stats["in_flight"] / max(1, llm_stats["limit"]), 3),
+        },
+    }
@@ -0,0 +1,440 @@
+"""
+Shared token-bucket quota limiter for every LLM consumer (runtime chat, FAQ refresh, PDF ingest).
+
+- หนึ่ง bucket ต่อ provider + key (Gemini แยกตาม model ด้วย เพราะ quota คิดต่อ model)
+- สอง bucket ซ้อนกัน: requests/min (RPM) และ tokens/min (TPM), refill ต่อเนื่อง
+- state อยู่ใน Redis (Lua script atomic) → หลาย backend process ใช้ quota ก้อนเดียวกัน
+  ถ้า Redis ใช้ไม่ได้จะ fallback เป็น bucket ใน process (กันไม่ให้ระบบหยุด)
+- Priority classes: interactive > refresh > ingest
+  งานที่ priority ต่ำต้องเหลือ quota ไว้ให้ class ที่สูงกว่า (reserve floor) ถึงจะหยิบได้
+  → job กลางคืนกิน quota ได้แค่ส่วนที่เกิน reserve ของผู้ใช้จริง
+
+ใช้งาน:
+    granted = await llm_quota.acquire("openai", key_label, estimated_tokens)
+    ... provider call ...
+    await llm_quota.settle("openai", key_label, estimated_tokens, actual_tokens)
+
+งาน background กำหนด class ผ่าน context:
+    with llm_priority("refresh"):
+        await ask_llm(...)
+"""
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from app.config import (
+    LLM_QUOTA_COMPLETION_ESTIMATE,
+    LLM_QUOTA_ENABLED,
+    LLM_QUOTA_INTERACTIVE_MAX_WAIT_MS,
+    LLM_QUOTA_LIMITS,
+    LLM_QUOTA_RESERVE_INGEST,
+    LLM_QUOTA_RESERVE_REFRESH,
+    REDIS_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_REFRESH = "refresh"
+PRIORITY_INGEST = "ingest"
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_REFRESH, PRIORITY_INGEST)
+
+_KEY_PREFIX = "llm_quota"
+_BUCKETS_SET = f"{_KEY_PREFIX}:buckets"
+_STATE_TTL_S = 3600
+_REDIS_RETRY_AFTER_S = 30.0
+_MAX_SLEEP_S = 5.0
+
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_quota_priority", default=PRIORITY_INTERACTIVE
+)
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """กำหนด priority class ให้ทุก LLM call ภายใน block (ไหลผ่าน await / create_task)"""
+    token = _current_priority.set(priority if priority in PRIORITY_CLASSES else PRIORITY_INTERACTIVE)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+def estimate_request_tokens(*texts: str, completion_tokens: Optional[int] = None) -> int:
+    """ประมาณ token แบบถูก (~3 chars/token ครอบคลุมไทย+อังกฤษ) + งบ output"""
+    chars = sum(len(str(text or "")) for text in texts)
+    completion = LLM_QUOTA_COMPLETION_ESTIMATE if completion_tokens is None else completion_tokens
+    return max(1, chars // 3) + max(0, int(completion))
+
+
+def quota_key(api_key: str, model: str = "") -> str:
+    value = str(api_key or "").strip()
+    masked = f"{value[:6]}...{value[-4:]}" if len(value) > 10 else ("*" * len(value) or "default")
+    return f"{masked}:{model}" if model else masked
+
+
+def _parse_limits(items) -> Dict[str, Tuple[int, int]]:
+    """"openai=30:60000" → {"openai": (rpm, tpm)}; 0 = ไม่จำกัด"""
+    limits: Dict[str, Tuple[int, int]] = {}
+    for item in items:
+        provider, _, spec = str(item).partition("=")
+        rpm_raw, _, tpm_raw = spec.partition(":")
+        try:
+            limits[provider.strip().lower()] = (max(0, int(rpm_raw or 0)), max(0, int(tpm_raw or 0)))
+        except ValueError:
+            logger.warning("Ignoring malformed LLM_QUOTA_LIMITS entry: %r", item)
+    return limits
+
+
+# KEYS[1]=bucket hash, KEYS[2]=stats hash, KEYS[3]=bucket registry set
+# ARGV: now_ms, rpm, tpm, cost_req, cost_tok, floor, class, ttl_s, bucket_id
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local creq = tonumber(ARGV[4])
+local ctok = tonumber(ARGV[5])
+local floor = tonumber(ARGV[6])
+local state = redis.call('HMGET', KEYS[1], 'req', 'tok', 'ts')
+local req = tonumber(state[1]) or rpm
+local tok = tonumber(state[2]) or tpm
+local ts = tonumber(state[3]) or now
+local elapsed = math.max(0, now - ts) / 1000.0
+if rpm > 0 then req = math.min(rpm, req + elapsed * rpm / 60.0) end
+if tpm > 0 then tok = math.min(tpm, tok + elapsed * tpm / 60.0) end
+local wait = 0
+if rpm > 0 then
+  local need = creq + floor * rpm - req
+  if need > 0 then wait = math.max(wait, need * 60.0 / rpm) end
+end
+if tpm > 0 then
+  ctok = math.min(ctok, tpm * (1 - floor))
+  local need = ctok + floor * tpm - tok
+  if need > 0 then wait = math.max(wait, need * 60.0 / tpm) end
+end
+local granted = 0
+if wait <= 0 then
+  granted = 1
+  if rpm > 0 then req = req - creq end
+  if tpm > 0 then tok = tok - ctok end
+  redis.call('HINCRBY', KEYS[2], ARGV[7] .. ':granted', 1)
+  redis.call('HINCRBY', KEYS[2], ARGV[7] .. ':tokens', math.floor(ctok))
+else
+  redis.call('HINCRBY', KEYS[2], ARGV[7] .. ':denied', 1)
+end
+redis.call('HSET', KEYS[1], 'req', tostring(req), 'tok', tostring(tok), 'ts', tostring(now),
+           'rpm', tostring(rpm), 'tpm', tostring(tpm))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[8]))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[8]))
+redis.call('SADD', KEYS[3], ARGV[9])
+return {granted, math.ceil(wait * 1000)}
+"""
+
+# KEYS[1]=bucket hash; ARGV[1]=token delta to debit (negative = refund)
+_SETTLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  local tpm = tonumber(redis.call('HGET', KEYS[1], 'tpm')) or 0
+  if tpm > 0 then
+    local tok = tonumber(redis.call('HGET', KEYS[1], 'tok')) or tpm
+    tok = math.min(tpm, tok - tonumber(ARGV[1]))
+    redis.call('HSET', KEYS[1], 'tok', tostring(tok))
+  end
+end
+return 1
+"""
+
+
+class _LocalBucket:
+    """Fallback bucket ใน process (thread-safe; ใช้ได้ทุก event loop)"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.req = float(rpm)
+        self.tok = float(tpm)
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, cost_tok: int, floor: float) -> Tuple[bool, float, int]:
+        with self.lock:
+            now = time.monotonic()
+            elapsed = max(0.0, now - self.ts)
+            self.ts = now
+            if self.rpm > 0:
+                self.req = min(self.rpm, self.req + elapsed * self.rpm / 60.0)
+            if self.tpm > 0:
+                self.tok = min(self.tpm, self.tok + elapsed * self.tpm / 60.0)
+            wait = 0.0
+            if self.rpm > 0:
+                need = 1 + floor * self.rpm - self.req
+                if need > 0:
+                    wait = max(wait, need * 60.0 / self.rpm)
+            if self.tpm > 0:
+                cost_tok = min(cost_tok, int(self.tpm * (1 - floor)))
+                need = cost_tok + floor * self.tpm - self.tok
+                if need > 0:
+                    wait = max(wait, need * 60.0 / self.tpm)
+            if wait > 0:
+                return False, wait, cost_tok
+            if self.rpm > 0:
+                self.req -= 1
+            if self.tpm > 0:
+                self.tok -= cost_tok
+            return True, 0.0, cost_tok
+
+    def settle(self, delta: int) -> None:
+        with self.lock:
+            if self.tpm > 0:
+                self.tok = min(self.tpm, self.tok - delta)
+
+
+class QuotaLimiter:
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        enabled: bool = True,
+        reserves: Optional[Dict[str, float]] = None,
+        interactive_max_wait_s: float = 2.0,
+        redis_url: str = REDIS_URL,
+        use_redis: bool = True,
+    ):
+        self.enabled = bool(enabled)
+        self.use_redis = bool(use_redis)
+        self._provider_limits: Dict[str, Tuple[int, int]] = dict(limits or {})
+        self._bucket_limits: Dict[str, Tuple[int, int]] = {}
+        self._floors = {
+            PRIORITY_INTERACTIVE: 0.0,
+            PRIORITY_REFRESH: 0.3,
+            PRIORITY_INGEST: 0.5,
+            **(reserves or {}),
+        }
+        self.interactive_max_wait_s = max(0.0, float(interactive_max_wait_s))
+        self._redis_url = redis_url
+        # redis.asyncio client ผูกกับ event loop → แยก client ต่อ loop (pdf_to_txt รันใน loop ของ thread ตัวเอง)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self._redis_down_until = 0.0
+        self._local: Dict[str, _LocalBucket] = {}
+        self._local_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {
+            cls: {"granted": 0, "throttled": 0, "timeouts": 0, "waited_ms": 0} for cls in PRIORITY_CLASSES
+        }
+
+    # ── configuration ────────────────────────────────────────────────
+    def configure(self, provider: str, key: str, rpm: int, tpm: int) -> None:
+        """กำหนด limit ของ bucket เฉพาะ (เช่น pdf_to_txt ใช้ quota ของ gemma แยกจาก runtime)"""
+        self._bucket_limits[self._bucket_id(provider, key)] = (max(0, int(rpm)), max(0, int(tpm)))
+
+    @staticmethod
+    def _bucket_id(provider: str, key: str) -> str:
+        return f"{str(provider).lower()}:{key or 'default'}"
+
+    def is_limited(self, provider: str) -> bool:
+        """provider นี้มี RPM / TPM limit หรือไม่ (ไม่มี → acquire ปล่อยผ่านทันที ผู้เรียกต้องคุมจังหวะเอง)"""
+        if not self.enabled:
+            return False
+        rpm, tpm = self._provider_limits.get(str(provider).lower(), (0, 0))
+        return rpm > 0 or tpm > 0
+
+    def _limits_for(self, provider: str, key: str) -> Tuple[int, int]:
+        bucket_id = self._bucket_id(provider, key)
+        if bucket_id in self._bucket_limits:
+            return self._bucket_limits[bucket_id]
+        return self._provider_limits.get(str(provider).lower(), (0, 0))
+
+    # ── redis ────────────────────────────────────────────────────────
+    def _redis(self):
+        if not self.use_redis or time.monotonic() < self._redis_down_until:
+            return None
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            try:
+                client = aioredis.from_url(self._redis_url, decode_responses=True)
+                entry = (client, client.register_script(_TAKE_SCRIPT), client.register_script(_SETTLE_SCRIPT))
+            except Exception as exc:
+                self._mark_redis_down(exc)
+                return None
+            self._clients[loop] = entry
+        return entry
+
+    def _mark_redis_down(self, exc: Exception) -> None:
+        if time.monotonic() >= self._redis_down_until:
+            logger.warning("LLM quota: Redis unavailable (%s); using in-process buckets for %.0fs",
+                           exc, _REDIS_RETRY_AFTER_S)
+        self._redis_down_until = time.monotonic() + _REDIS_RETRY_AFTER_S
+
+    def _local_bucket(self, bucket_id: str, rpm: int, tpm: int) -> _LocalBucket:
+        with self._local_lock:
+            bucket = self._local.get(bucket_id)
+            if bucket is None or (bucket.rpm, bucket.tpm) != (rpm, tpm):
+                bucket = _LocalBucket(rpm, tpm)
+                self._local[bucket_id] = bucket
+            return bucket
+
+    async def _try_take(self, bucket_id: str, rpm: int, tpm: int, cost_tok: int, floor: float, cls: str):
+        entry = self._redis()
+        if entry is not None:
+            _client, take, _settle = entry
+            try:
+                granted, wait_ms = await take(
+                    keys=[f"{_KEY_PREFIX}:{bucket_id}", f"{_KEY_PREFIX}:stats:{bucket_id}", _BUCKETS_SET],
+                    args=[int(time.time() * 1000), rpm, tpm, 1, cost_tok, floor, cls, _STATE_TTL_S, bucket_id],
+                )
+                return bool(int(granted)), int(wait_ms) / 1000.0
+            except Exception as exc:
+                self._mark_redis_down(exc)
+        granted, wait_s, _ = self._local_bucket(bucket_id, rpm, tpm).take(cost_tok, floor)
+        return granted, wait_s
+
+    # ── public API ───────────────────────────────────────────────────
+    async def acquire(
+        self,
+        provider: str,
+        key: str,
+        estimated_tokens: int = 0,
+        priority: Optional[str] = None,
+        max_wait_s: Optional[float] = None,
+    ) -> bool:
+        """
+        รอจนกว่า bucket จะมี quota สำหรับ 1 request + estimated_tokens
+
+        interactive รอไม่เกิน interactive_max_wait_s แล้วปล่อยผ่าน (ให้ 429 / adaptive limiter จัดการต่อ)
+        refresh / ingest รอจนได้ — return False เมื่อหมดเวลารอเท่านั้น
+        """
+        if not self.enabled:
+            return True
+        rpm, tpm = self._limits_for(provider, key)
+        if rpm <= 0 and tpm <= 0:
+            return True
+
+        cls = priority if priority in PRIORITY_CLASSES else current_priority()
+        floor = min(0.9, max(0.0, float(self._floors.get(cls, 0.0))))
+        if max_wait_s is None and cls == PRIORITY_INTERACTIVE:
+            max_wait_s = self.interactive_max_wait_s
+        bucket_id = self._bucket_id(provider, key)
+        stats = self._stats[cls]
+        started = time.monotonic()
+        throttled = False
+
+        while True:
+            granted, wait_s = await self._try_take(bucket_id, rpm, tpm, max(0, int(estimated_tokens)), floor, cls)
+            if granted:
+                stats["granted"] += 1
+                if throttled:
+                    stats["waited_ms"] += int((time.monotonic() - started) * 1000)
+                return True
+            if not throttled:
+                throttled = True
+                stats["throttled"] += 1
+                logger.info("LLM quota: %s throttled on %s (wait ~%.1fs)", cls, bucket_id, wait_s)
+            waited = time.monotonic() - started
+            if max_wait_s is not None and waited + wait_s > max_wait_s:
+                stats["timeouts"] += 1
+                stats["waited_ms"] += int(waited * 1000)
+                return False
+            await asyncio.sleep(min(_MAX_SLEEP_S, wait_s) + random.uniform(0.0, 0.05))
+
+    async def settle(self, provider: str, key: str, estimated_tokens: int, actual_tokens: int) -> None:
+        """ปรับ TPM bucket ตาม token ที่ใช้จริง (ประมาณเกิน → คืน, ประมาณขาด → หักเพิ่ม)"""
+        if not self.enabled or not actual_tokens:
+            return
+        rpm, tpm = self._limits_for(provider, key)
+        if tpm <= 0:
+            return
+        delta = int(actual_tokens) - int(estimated_tokens)
+        if delta == 0:
+            return
+        bucket_id = self._bucket_id(provider, key)
+        entry = self._redis()
+        if entry is not None:
+            try:
+                await entry[2](keys=[f"{_KEY_PREFIX}:{bucket_id}"], args=[delta])
+                return
+            except Exception as exc:
+                self._mark_redis_down(exc)
+        self._local_bucket(bucket_id, rpm, tpm).settle(delta)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """มุมมองรวม quota ทุก bucket (จาก Redis = ทุก process) + ตัวนับของ process นี้"""
+        buckets: Dict[str, Any] = {}
+        backend = "local"
+        entry = self._redis() if self.enabled else None
+        if entry is not None:
+            client = entry[0]
+            try:
+                for bucket_id in sorted(await client.smembers(_BUCKETS_SET)):
+                    state = await client.hgetall(f"{_KEY_PREFIX}:{bucket_id}")
+                    if not state:
+                        continue
+                    counters = await client.hgetall(f"{_KEY_PREFIX}:stats:{bucket_id}")
+                    rpm = int(float(state.get("rpm", 0)))
+                    tpm = int(float(state.get("tpm", 0)))
+                    buckets[bucket_id] = {
+                        "rpm_limit": rpm,
+                        "tpm_limit": tpm,
+                        "requests_available": round(float(state.get("req", 0)), 2),
+                        "tokens_available": round(float(state.get("tok", 0)), 1),
+                        "classes": {
+                            cls: {
+                                "granted": int(counters.get(f"{cls}:granted", 0)),
+                                "denied": int(counters.get(f"{cls}:denied", 0)),
+                                "tokens": int(counters.get(f"{cls}:tokens", 0)),
+                            }
+                            for cls in PRIORITY_CLASSES
+                        },
+                    }
+                backend = "redis"
+            except Exception as exc:
+                self._mark_redis_down(exc)
+        if backend == "local":
+            with self._local_lock:
+                for bucket_id, bucket in self._local.items():
+                    buckets[bucket_id] = {
+                        "rpm_limit": bucket.rpm,
+                        "tpm_limit": bucket.tpm,
+                        "requests_available": round(bucket.req, 2),
+                        "tokens_available": round(bucket.tok, 1),
+                    }
+        return {
+            "enabled": self.enabled,
+            "backend": backend,
+            "reserves": dict(self._floors),
+            "buckets": buckets,
+            "process": {cls: dict(values) for cls, values in self._stats.items()},
+        }
+
+    async def close(self) -> None:
+        """ปิด Redis client ของ event loop ปัจจุบัน"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        entry = self._clients.pop(loop, None)
+        if entry is not None:
+            try:
+                await entry[0].aclose()
+            except Exception as exc:
+                logger.debug("LLM quota: error closing Redis client: %s", exc)
+
+
+llm_quota = QuotaLimiter(
+    limits=_parse_limits(LLM_QUOTA_LIMITS),
+    enabled=LLM_QUOTA_ENABLED,
+    reserves={
+        PRIORITY_REFRESH: LLM_QUOTA_RESERVE_REFRESH,
+        PRIORITY_INGEST: LLM_QUOTA_RESERVE_INGEST,
+    },
+    interactive_max_wait_s=LLM_QUOTA_INTERACTIVE_MAX_WAIT_MS / 1000.0,
+)
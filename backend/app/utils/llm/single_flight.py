@@ -0,0 +1,161 @@
+"""
+Single-flight coalescing for identical in-flight LLM turns.
+
+ถ้ามีหลาย session ถามคำถามเดียวกัน (normalize แล้ว) พร้อมกัน ภาษาเดียวกัน
+และใช้ flow config เดียวกัน จะรัน retrieval + LLM เพียงครั้งเดียว
+แล้วแชร์ผลให้ทุกคนที่รออยู่ (history ยังบันทึกแยกตาม session ตามปกติ)
+ask_llm ใช้เฉพาะ turn แรกของ session (ไม่มี history ก่อนหน้า) → prompt ที่แชร์ไม่มีบทสนทนาของ session ใด
+
+- งานที่แชร์รันเป็น task แยก → ถ้าผู้รอคนใดถูก cancel งานยังเดินต่อให้คนอื่น
+- ถ้าผู้รอทุกคนถูก cancel งานที่แชร์จะถูก cancel ด้วย
+- streaming delta ถูก fan-out ให้ทุกคน (คนที่เข้ามาทีหลังจะได้ delta เดิมย้อนหลังก่อน)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DeltaListener = Callable[[str], Awaitable[None]]
+
+
+def normalize_question(text: str) -> str:
+    value = re.sub(r"\s+", " ", str(text or "")).strip().lower()
+    return value.rstrip(" ?？!.。")
+
+
+def make_flight_key(question: str, language: str, flow_config: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps(
+        {
+            "q": normalize_question(question),
+            "lang": str(language or "").strip().lower(),
+            "flow": flow_config or {},
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("task", "deltas", "listeners", "waiters", "followers")
+
+    task: "asyncio.Task[Any]"  # set by SingleFlight._start right after construction
+
+    def __init__(self) -> None:
+        self.deltas: List[str] = []
+        self.listeners: List[DeltaListener] = []
+        self.waiters = 0
+        self.followers = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share the same key into one run."""
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._max_fanout = 0
+
+    async def _publish(self, flight: _Flight, delta: str) -> None:
+        flight.deltas.append(delta)
+        for listener in list(flight.listeners):
+            try:
+                await listener(delta)
+            except Exception:
+                logger.debug("[%s] delta listener failed", self.name, exc_info=True)
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            self._flights.pop(key, None)
+
+    def _start(
+        self,
+        key: str,
+        fn: Callable[[DeltaListener], Coroutine[Any, Any, Any]],
+        listener: Optional[DeltaListener],
+    ) -> _Flight:
+        flight = _Flight()
+        self._flights[key] = flight
+        self._leaders += 1
+        if listener is not None:
+            flight.listeners.append(listener)
+
+        async def publish(delta: str) -> None:
+            await self._publish(flight, delta)
+
+        def forget(_task: "asyncio.Task[Any]") -> None:
+            self._forget(key, flight)
+
+        flight.task = asyncio.create_task(fn(publish))
+        flight.task.add_done_callback(forget)
+        return flight
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[DeltaListener], Coroutine[Any, Any, Any]],
+        listener: Optional[DeltaListener] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Run `fn(publish)` once per key; concurrent callers await the same result.
+
+        Returns (result, shared) — shared=True when this caller joined a run
+        started by another caller.
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self._start(key, fn, listener)
+        else:
+            flight.followers += 1
+            self._coalesced += 1
+            self._max_fanout = max(self._max_fanout, flight.followers + 1)
+            logger.info("[%s] coalesced turn (fan-out=%d)", self.name, flight.followers + 1)
+
+        # นับเป็นผู้รอก่อน await แรก (replay) → leader ที่ถูก cancel ระหว่างนั้นจะไม่ cancel งานที่แชร์
+        flight.waiters += 1
+        try:
+            if shared and listener is not None:
+                # Replay what was already streamed; no await between the last
+                # length check and append, so no delta can slip in between.
+                replayed = 0
+                while replayed < len(flight.deltas):
+                    delta = flight.deltas[replayed]
+                    replayed += 1
+                    try:
+                        await listener(delta)
+                    except Exception:
+                        logger.debug("[%s] delta listener failed", self.name, exc_info=True)
+                flight.listeners.append(listener)
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters <= 1 and not flight.task.done():
+                flight.task.cancel()
+                self._forget(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+            if listener is not None and listener in flight.listeners:
+                flight.listeners.remove(listener)
+        return result, shared
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._leaders + self._coalesced
+        return {
+            "in_flight": len(self._flights),
+            "runs": self._leaders,
+            "coalesced": self._coalesced,
+            "coalesce_rate": round(self._coalesced / total, 4) if total else 0.0,
+            "max_fanout": self._max_fanout,
+        }
+
+
+# Shared instance used by ask_llm (answer generation)
+answer_flights = SingleFlight("answer")
@@ -4,6 +4,8 @@ import logging
 from datetime import datetime
 from typing import Dict, List
 
+from app.utils.lang_detect import classify_document_language
+
 logger = logging.getLogger("MetadataExtractor")
 
 class MetadataExtractor:
@@ -87,19 +89,8 @@ class MetadataExtractor:
         return 'general'
     
     def _detect_language(self, text: str) -> str:
-        """Detect primary language"""
-        sample = text[:5000]
-        
-        # Count character types
-        thai_chars = sum(1 for c in sample if '\u0e00' <= c <= '\u0e7f')
-        eng_chars = sum(1 for c in sample if c.isalpha() and c.isascii())
-        
-        if thai_chars > eng_chars * 2:
-            return 'th'
-        elif eng_chars > thai_chars * 2:
-            return 'en'
-        else:
-            return 'mixed'
+        """Detect primary language (th / en / mixed) from Unicode script counts"""
+        return str(classify_document_language(text, sample_chars=5000))
     
     def _has_date_info(self, text: str) -> bool:
         """Check if document contains date information"""
@@ -1,3 +1,4 @@
+import asyncio
 import tiktoken
 import logging
 from typing import Dict, Any
@@ -50,6 +51,16 @@ def count_tokens(text: str, model_name: str = "gpt-3.5-turbo") -> int:
         # Fallback: rough estimation
         return len(text.split())
 
+async def count_tokens_async(*texts: str, model_name: str = "gpt-3.5-turbo") -> list:
+    """
+    count_tokens() บน worker thread — tiktoken เป็น sync/CPU-bound จึงไม่ควรรันใน event loop
+    (prompt ภาษาไทยยาวๆ ใช้เวลาหลาย ms) นับหลายข้อความใน thread hop เดียว
+
+    Returns:
+        จำนวน token ของแต่ละข้อความตามลำดับ
+    """
+    return await asyncio.to_thread(lambda: [count_tokens(text, model_name) for text in texts])
+
 def count_message_tokens(messages: list, model_name: str = "gpt-3.5-turbo") -> int:
     """
     Count tokens in message format (for chat models)
@@ -99,29 +110,46 @@ def count_message_tokens(messages: list, model_name: str = "gpt-3.5-turbo") -> i
         ])
         return len(total_text.split())
 
-def estimate_gemini_tokens(text: str) -> int:
+def estimate_tokens(text: str) -> int:
     """
-    Estimate Gemini tokens (Gemini uses SentencePiece similar to Claude)
-    Approximation: ~0.75 tokens per word for English, ~1.5 for Thai
-    
+    Estimate tokens without a tokenizer (any provider) — สำหรับ trace / log ใน hot path
+    นับจากตัวอักษร เพราะภาษาไทยไม่เว้นวรรคระหว่างคำ (นับจากคำจะได้ค่าต่ำเกินจริงมาก)
+    Approximation: ~2 chars/token สำหรับไทย, ~4 chars/token สำหรับอักษรอื่น
+
     Args:
         text: Text to estimate tokens for
-    
+
     Returns:
         Estimated number of tokens
     """
     if not text:
         return 0
-    
-    # Detect Thai characters
-    thai_ratio = sum(1 for c in text if '\u0e00' <= c <= '\u0e7f') / max(len(text), 1)
-    
-    words = len(text.split())
-    
-    if thai_ratio > 0.3:  # Mostly Thai
-        return int(words * 1.5)
-    else:  # Mostly English
-        return int(words * 0.75)
+    thai_chars = sum(1 for c in text if '\u0e00' <= c <= '\u0e7f')
+    return max(1, thai_chars // 2 + (len(text) - thai_chars) // 4)
+
+def get_cached_prompt_tokens(usage_obj: Any, provider: str) -> int:
+    """
+    Prompt tokens served from the provider's prompt cache
+
+    Args:
+        usage_obj: OpenAI-compatible `usage` or Gemini `usage_metadata`
+        provider: LLM provider (gemini/openai/local)
+
+    Returns:
+        Number of cached prompt tokens (0 when not reported)
+    """
+    if usage_obj is None:
+        return 0
+    try:
+        if provider == "gemini":
+            return int(getattr(usage_obj, "cached_content_token_count", 0) or 0)
+        details = getattr(usage_obj, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            return int(details.get("cached_tokens", 0) or 0)
+        return int(getattr(details, "cached_tokens", 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
 
 def get_token_usage(response: Any, provider: str, model_name: str = None) -> Dict[str, int]:
     """
@@ -129,16 +157,18 @@ def get_token_usage(response: Any, provider: str, model_name: str = None) -> Dic
     
     Args:
         response: LLM response object
-        provider: LLM provider (gemini/openai/local)
-        model_name: Model name for fallback estimation
+        provider: LLM provider (gemini/openai/local/mock)
+        model_name: Unused (kept for callers); no tokenizer runs here
     
     Returns:
-        Dict with prompt_tokens, completion_tokens, total_tokens
+        Dict with prompt_tokens, completion_tokens, total_tokens, cached_prompt_tokens
+        — ศูนย์ทั้งหมดถ้า provider ไม่รายงาน usage (ผู้เรียกประมาณเองนอก event loop)
     """
     usage = {
         "prompt_tokens": 0,
         "completion_tokens": 0,
-        "total_tokens": 0
+        "total_tokens": 0,
+        "cached_prompt_tokens": 0,
     }
     
     try:
@@ -149,26 +179,16 @@ def get_token_usage(response: Any, provider: str, model_name: str = None) -> Dic
                 usage["prompt_tokens"] = getattr(meta, "prompt_token_count", 0)
                 usage["completion_tokens"] = getattr(meta, "candidates_token_count", 0)
                 usage["total_tokens"] = getattr(meta, "total_token_count", 0)
-            elif hasattr(response, "text"):
-                # Fallback: estimate from response text
-                usage["completion_tokens"] = estimate_gemini_tokens(response.text)
-                usage["total_tokens"] = usage["completion_tokens"]
+                usage["cached_prompt_tokens"] = get_cached_prompt_tokens(meta, provider)
         
-        elif provider in ["openai", "local"]:
+        elif provider in ["openai", "local", "mock"]:
             # OpenAI-compatible usage
-            if hasattr(response, "usage"):
-                u = response.usage
-                usage["prompt_tokens"] = getattr(u, "prompt_tokens", 0)
-                usage["completion_tokens"] = getattr(u, "completion_tokens", 0)
-                usage["total_tokens"] = getattr(u, "total_tokens", 0)
-            elif hasattr(response, "choices") and response.choices:
-                # Fallback: estimate from response
-                content = response.choices[0].message.content
-                if model_name:
-                    usage["completion_tokens"] = count_tokens(content, model_name)
-                else:
-                    usage["completion_tokens"] = count_tokens(content)
-                usage["total_tokens"] = usage["completion_tokens"]
+            u = getattr(response, "usage", None)
+            if u is not None:
+                usage["prompt_tokens"] = getattr(u, "prompt_tokens", 0) or 0
+                usage["completion_tokens"] = getattr(u, "completion_tokens", 0) or 0
+                usage["total_tokens"] = getattr(u, "total_tokens", 0) or 0
+                usage["cached_prompt_tokens"] = get_cached_prompt_tokens(u, provider)
     
     except Exception as e:
         logger.error(f"Error extracting token usage: {e}")
@@ -185,11 +205,14 @@ def format_token_usage(usage: Dict[str, int]) -> str:
     Returns:
         Formatted string
     """
-    return (
+    text = (
         f"Tokens - Prompt: {usage['prompt_tokens']:,} | "
         f"Completion: {usage['completion_tokens']:,} | "
         f"Total: {usage['total_tokens']:,}"
     )
+    if usage.get("cached_prompt_tokens"):
+        text += f" | Cached: {usage['cached_prompt_tokens']:,}"
+    return text
 
 # Cost calculation (approximate, update with latest pricing)
 TOKEN_COSTS = {
@@ -208,6 +231,7 @@ TOKEN_COSTS = {
     "chinda": {"prompt": 0, "completion": 0},              # Local model
     "local": {"prompt": 0, "completion": 0},               # Local model
     "ollama": {"prompt": 0, "completion": 0},              # Local model
+    "mock": {"prompt": 0, "completion": 0},                # Offline mock provider
 }
 
 def calculate_cost(usage: Dict[str, int], model_name: str) -> float:
@@ -221,15 +245,11 @@ def calculate_cost(usage: Dict[str, int], model_name: str) -> float:
     Returns:
         Cost in USD
     """
-    # Find matching cost entry
-    cost_entry = None
-    for key in TOKEN_COSTS:
-        if key in model_name.lower():
-            cost_entry = TOKEN_COSTS[key]
-            break
-    
-    if not cost_entry:
+    # Find matching cost entry — key ที่ยาวที่สุดก่อน ("gpt-4o-mini" ต้องไม่ถูกคิดราคาเป็น "gpt-4")
+    matches = [key for key in TOKEN_COSTS if key in model_name.lower()]
+    if not matches:
         return 0.0
+    cost_entry = TOKEN_COSTS[max(matches, key=len)]
     
     prompt_cost = usage["prompt_tokens"] * cost_entry["prompt"]
     completion_cost = usage["completion_tokens"] * cost_entry["completion"]
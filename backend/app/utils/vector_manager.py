@@ -241,11 +241,10 @@ class VectorManager:
         logger.info("Indexed %d chunks from %s", len(chunks), os.path.basename(filepath))
 
     def search(self, query: str, k: int = 5, filter_dict: Optional[Dict] = None) -> List[Dict]:
-        query_embedding = self.model.encode(
-            f"query: {query}",
-            normalize_embeddings=True,
-        ).tolist()
+        return self.search_batch([query], k=k, filter_dicts=[filter_dict])[0]
 
+    @staticmethod
+    def _split_filters(filter_dict: Optional[Dict]) -> tuple:
         where_clause = None
         post_filters = {}
 
@@ -262,50 +261,107 @@ class VectorManager:
             if "semester" in filter_dict:
                 post_filters["semester"] = str(filter_dict["semester"])
 
-        query_k = k * 3 if post_filters else k
+        return where_clause, post_filters
 
+    def _query_collection(self, embeddings: List[List[float]], n_results: int, where_clause: Optional[Dict]):
         try:
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=query_k,
+            return self.collection.query(
+                query_embeddings=embeddings,
+                n_results=n_results,
                 where=where_clause,
             )
         except Exception as exc:
             logger.error("ChromaDB query error: %s", exc)
             try:
-                results = self.collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=query_k,
+                return self.collection.query(
+                    query_embeddings=embeddings,
+                    n_results=n_results,
                 )
             except Exception as fallback_exc:
                 logger.error("Fallback query failed: %s", fallback_exc)
-                return []
+                return None
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_dicts: Optional[List[Optional[Dict]]] = None,
+    ) -> List[List[Dict]]:
+        """
+        Dense search for many queries at once.
 
-        formatted_results = []
-        if results["documents"] and results["documents"][0]:
-            for i in range(len(results["documents"][0])):
-                metadata = results["metadatas"][0][i]
-
-                if post_filters:
-                    if "academic_year" in post_filters:
-                        academic_years = metadata.get("academic_years", "")
-                        if post_filters["academic_year"] not in academic_years:
-                            continue
-
-                    if "semester" in post_filters:
-                        semesters = metadata.get("semesters", "")
-                        if post_filters["semester"] not in semesters:
-                            continue
-
-                formatted_results.append(
-                    {
-                        "chunk": results["documents"][0][i],
-                        "source": metadata.get("source", ""),
-                        "score": 1.0 - results["distances"][0][i],
-                        "metadata": metadata,
-                    }
+        Queries are embedded in a single encoder batch, and queries that share
+        the same pre-filter are sent to ChromaDB as one multi-embedding query.
+        Returns one result list per query, in input order.
+        """
+        if not queries:
+            return []
+        if filter_dicts is None:
+            filter_dicts = [None] * len(queries)
+        if len(filter_dicts) != len(queries):
+            raise ValueError("filter_dicts must have the same length as queries")
+
+        query_embeddings = self.model.encode(
+            [f"query: {query}" for query in queries],
+            normalize_embeddings=True,
+        ).tolist()
+
+        # Group queries by (where_clause, query_k) so each group is one ChromaDB call
+        plans = [self._split_filters(filter_dict) for filter_dict in filter_dicts]
+        groups: Dict[tuple, List[int]] = {}
+        for idx, (where_clause, post_filters) in enumerate(plans):
+            query_k = k * 3 if post_filters else k
+            group_key = (repr(sorted((where_clause or {}).items())), query_k)
+            groups.setdefault(group_key, []).append(idx)
+
+        output: List[List[Dict]] = [[] for _ in queries]
+        for (_, query_k), indices in groups.items():
+            where_clause = plans[indices[0]][0]
+            results = self._query_collection(
+                [query_embeddings[i] for i in indices],
+                query_k,
+                where_clause,
+            )
+            if results is None:
+                continue
+
+            for row_idx, query_idx in enumerate(indices):
+                output[query_idx] = self._format_results(
+                    results, row_idx, plans[query_idx][1], k
                 )
 
+        return output
+
+    @staticmethod
+    def _format_results(results: Dict, row_idx: int, post_filters: Dict, k: int) -> List[Dict]:
+        documents = results.get("documents") or []
+        if row_idx >= len(documents) or not documents[row_idx]:
+            return []
+
+        formatted_results = []
+        for i in range(len(documents[row_idx])):
+            metadata = results["metadatas"][row_idx][i]
+
+            if post_filters:
+                if "academic_year" in post_filters:
+                    academic_years = metadata.get("academic_years", "")
+                    if post_filters["academic_year"] not in academic_years:
+                        continue
+
+                if "semester" in post_filters:
+                    semesters = metadata.get("semesters", "")
+                    if post_filters["semester"] not in semesters:
+                        continue
+
+            formatted_results.append(
+                {
+                    "chunk": documents[row_idx][i],
+                    "source": metadata.get("source", ""),
+                    "score": 1.0 - results["distances"][row_idx][i],
+                    "metadata": metadata,
+                }
+            )
+
         filtered_count = len(formatted_results)
         formatted_results = formatted_results[:k]
 
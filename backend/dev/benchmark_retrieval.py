@@ -0,0 +1,314 @@
+"""
+Offline retrieval-stage benchmark for REG-01.
+
+Runs each stage of the retrieval pipeline in isolation against the gold set
+(no HTTP server, no LLM, no network):
+1. analyze_intent      (rule-based)
+2. dense               (VectorManager.search)
+3. bm25                (HybridRetriever.bm25_search)
+4. rrf                 (HybridRetriever.rrf_fusion)
+5. rerank              (cross-encoder, local model)
+6. keyword_guarantee   (entity boost)
+
+Reports recall@k / MRR per ranking stage, p50/p95/p99 latency and peak
+traced memory per stage. The JSON output is stable (sorted keys, no
+timestamps inside "stages") so two runs can be diffed between commits.
+
+Relevance is judged by answer terms: a chunk is relevant when it contains
+every term of the question's "expected_terms" (if present in the gold set)
+or the numbers/Thai month names of "expected_answer". Questions with
+expected_behavior != "answer" are timed but excluded from recall/MRR.
+
+Usage:
+  python -m backend.dev.benchmark_retrieval
+  python -m backend.dev.benchmark_retrieval --k 5 --repeat 3 --output backend/dev/benchmark_retrieval_latest.json
+"""
+
+from __future__ import annotations
+
+import os
+
+# Offline guard: embedding/reranker models must come from the local cache.
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import json
+import math
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.utils.vector_manager import vector_manager
+from retriever.context_selector import (
+    _apply_keyword_guarantee,
+    _build_filters,
+    _filter_sparse_by_doc_type,
+    _to_scored_chunks,
+)
+from retriever.hybrid_retriever import hybrid_retriever
+from retriever.intent_analyzer import analyze_intent
+from retriever.reranker import rerank_chunks
+
+GOLD_SET_PATH = os.path.join(os.path.dirname(__file__), "gold_set_data.json")
+
+STAGES = ["analyze_intent", "dense", "bm25", "rrf", "rerank", "keyword_guarantee"]
+RANKED_STAGES = ["dense", "bm25", "rrf", "rerank", "keyword_guarantee"]
+
+_THAI_MONTHS = [
+    "มกราคม", "กุมภาพันธ์", "มีนาคม", "เมษายน", "พฤษภาคม", "มิถุนายน",
+    "กรกฎาคม", "สิงหาคม", "กันยายน", "ตุลาคม", "พฤศจิกายน", "ธันวาคม",
+]
+
+
+def _normalize_text(value: str) -> str:
+    return re.sub(r"\s+", " ", str(value or "").strip()).lower()
+
+
+def _answer_terms(item: Dict) -> List[str]:
+    explicit = item.get("expected_terms")
+    if isinstance(explicit, list) and explicit:
+        return [str(term).lower() for term in explicit]
+    answer = str(item.get("expected_answer") or "")
+    terms = re.findall(r"\d+(?:[.:]\d+)?", answer)
+    terms.extend(month for month in _THAI_MONTHS if month in answer)
+    return [term.lower() for term in terms]
+
+
+def _is_relevant(chunk_text: str, terms: List[str]) -> bool:
+    if not terms:
+        return False
+    normalized = _normalize_text(chunk_text)
+    return all(term in normalized for term in terms)
+
+
+def _first_relevant_rank(texts: List[str], terms: List[str]) -> Optional[int]:
+    for rank, text in enumerate(texts, start=1):
+        if _is_relevant(text, terms):
+            return rank
+    return None
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    sorted_vals = sorted(values)
+    # nearest-rank percentile
+    idx = max(0, min(len(sorted_vals) - 1, math.ceil(pct / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[idx]
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def _load_gold_set(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8-sig") as handle:
+        data = json.load(handle)
+    if not isinstance(data, list):
+        raise ValueError(f"gold set must be a JSON list: {path}")
+    return [item for item in data if str(item.get("question") or "").strip()]
+
+
+def _ensure_bm25_index() -> int:
+    if hybrid_retriever.bm25_index is None:
+        chunks = vector_manager.get_all_chunks()
+        if chunks:
+            hybrid_retriever.build_index(chunks)
+    return len(hybrid_retriever.documents or []) if hybrid_retriever.bm25_index is not None else 0
+
+
+def _run_pipeline(query: str, k: int, measure: Callable[[str, Callable], object]) -> Dict[str, List[str]]:
+    """
+    Run one query through every stage; `measure(stage, fn)` wraps each call.
+    Returns the ranked chunk texts produced by each ranking stage.
+    """
+    intent_data = measure("analyze_intent", lambda: analyze_intent(query)) or {}
+    filters = _build_filters(intent_data)
+
+    dense_results = measure("dense", lambda: vector_manager.search(query, k=k * 3, filter_dict=filters))
+    sparse_results = measure("bm25", lambda: hybrid_retriever.bm25_search(query, k=k * 2))
+    sparse_results = _filter_sparse_by_doc_type(sparse_results, filters)
+    fused_results = measure(
+        "rrf",
+        lambda: hybrid_retriever.rrf_fusion(
+            dense_results, sparse_results, k=k * 2, dense_weight=0.7, sparse_weight=0.3
+        ),
+    )
+    scored_chunks = _to_scored_chunks(fused_results)
+    reranked = measure("rerank", lambda: rerank_chunks(query, scored_chunks, top_k=k))
+    final = measure(
+        "keyword_guarantee",
+        lambda: _apply_keyword_guarantee(list(reranked), fused_results, intent_data.get("key_entities", []), k),
+    )
+
+    return {
+        "dense": [r.get("chunk", "") for r in dense_results],
+        "bm25": [doc.get("chunk", "") for doc, _ in sparse_results],
+        "rrf": [r.get("chunk", "") for r in fused_results],
+        "rerank": [entry.get("chunk", "") for entry, _ in reranked],
+        "keyword_guarantee": [entry.get("chunk", "") for entry, _ in final],
+    }
+
+
+def run_benchmark(
+    gold_set_path: str = GOLD_SET_PATH,
+    k: int = 5,
+    repeat: int = 3,
+    warmup: int = 1,
+    question_ids: Optional[List[str]] = None,
+) -> Dict[str, object]:
+    items = _load_gold_set(gold_set_path)
+    if question_ids:
+        wanted = set(question_ids)
+        items = [item for item in items if str(item.get("question_id")) in wanted]
+    if not items:
+        raise ValueError("no gold set questions selected")
+
+    bm25_docs = _ensure_bm25_index()
+    if bm25_docs == 0:
+        print("⚠️ BM25 index is empty; bm25/rrf stages will only see dense results")
+
+    latencies: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    peak_memory: Dict[str, List[int]] = {stage: [] for stage in STAGES}
+
+    def _timed(stage: str, fn: Callable):
+        started = time.perf_counter()
+        result = fn()
+        latencies[stage].append((time.perf_counter() - started) * 1000.0)
+        return result
+
+    def _traced(stage: str, fn: Callable):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_memory[stage].append(max(0, peak - baseline))
+        return result
+
+    def _untimed(stage: str, fn: Callable):
+        return fn()
+
+    # Warm-up: load embedding / cross-encoder models outside the measured window
+    for _ in range(max(0, int(warmup))):
+        _run_pipeline(str(items[0]["question"]), k, _untimed)
+
+    # Latency pass (tracemalloc off, it skews timings)
+    ranked_by_question: Dict[str, Dict[str, List[str]]] = {}
+    for _ in range(max(1, int(repeat))):
+        for item in items:
+            ranked_by_question[str(item.get("question_id"))] = _run_pipeline(str(item["question"]), k, _timed)
+
+    # Memory pass (one run per question)
+    tracemalloc.start()
+    try:
+        for item in items:
+            _run_pipeline(str(item["question"]), k, _traced)
+    finally:
+        tracemalloc.stop()
+
+    # Quality: recall@k / MRR per ranking stage, answerable questions only
+    per_question: List[Dict[str, object]] = []
+    reciprocal_ranks: Dict[str, List[float]] = {stage: [] for stage in RANKED_STAGES}
+    hits: Dict[str, List[int]] = {stage: [] for stage in RANKED_STAGES}
+    for item in items:
+        qid = str(item.get("question_id"))
+        answerable = str(item.get("expected_behavior") or "answer") == "answer"
+        terms = _answer_terms(item)
+        row: Dict[str, object] = {
+            "question_id": qid,
+            "answerable": answerable,
+            "terms": terms,
+            "first_relevant_rank": {},
+        }
+        for stage in RANKED_STAGES:
+            rank = _first_relevant_rank(ranked_by_question[qid][stage], terms)
+            row["first_relevant_rank"][stage] = rank
+            if answerable and terms:
+                hits[stage].append(1 if rank is not None and rank <= k else 0)
+                reciprocal_ranks[stage].append(1.0 / rank if rank is not None else 0.0)
+        per_question.append(row)
+
+    stages: Dict[str, Dict[str, object]] = {}
+    for stage in STAGES:
+        values = latencies[stage]
+        memory = peak_memory[stage]
+        summary: Dict[str, object] = {
+            "calls": len(values),
+            "latency_ms": {
+                "mean": _round(statistics.mean(values)) if values else None,
+                "p50": _round(_percentile(values, 50)),
+                "p95": _round(_percentile(values, 95)),
+                "p99": _round(_percentile(values, 99)),
+            },
+            "peak_memory_kb": {
+                "max": _round(max(memory) / 1024.0, 1) if memory else None,
+                "mean": _round(statistics.mean(memory) / 1024.0, 1) if memory else None,
+            },
+        }
+        if stage in RANKED_STAGES:
+            summary[f"recall@{k}"] = _round(statistics.mean(hits[stage])) if hits[stage] else None
+            summary["mrr"] = _round(statistics.mean(reciprocal_ranks[stage])) if reciprocal_ranks[stage] else None
+        stages[stage] = summary
+
+    return {
+        "gold_set": os.path.basename(gold_set_path),
+        "questions": len(items),
+        "answerable": sum(1 for row in per_question if row["answerable"]),
+        "k": k,
+        "repeat": max(1, int(repeat)),
+        "bm25_documents": bm25_docs,
+        "stages": stages,
+        "per_question": per_question,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gold-set", default=GOLD_SET_PATH)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="Latency pass repetitions per question.")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--questions", default="", help="Comma-separated question ids to run.")
+    parser.add_argument("--output", default=os.path.join("backend", "dev", "benchmark_retrieval_latest.json"))
+    args = parser.parse_args()
+
+    question_ids: Optional[List[str]] = None
+    if str(args.questions or "").strip():
+        question_ids = [item.strip() for item in str(args.questions).split(",") if item.strip()]
+
+    summary = run_benchmark(
+        gold_set_path=str(args.gold_set),
+        k=int(args.k),
+        repeat=int(args.repeat),
+        warmup=int(args.warmup),
+        question_ids=question_ids,
+    )
+
+    output_path = str(args.output)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as handle:
+        json.dump(summary, handle, ensure_ascii=False, indent=2, sort_keys=True)
+
+    print("\n=== RETRIEVAL BENCHMARK SUMMARY ===")
+    for stage, data in summary["stages"].items():
+        latency = data["latency_ms"]
+        quality = ""
+        if "mrr" in data:
+            recall_key = f"recall@{summary['k']}"
+            quality = f" {recall_key}={data[recall_key]} mrr={data['mrr']}"
+        print(
+            f"{stage:<18} p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms "
+            f"peak={data['peak_memory_kb']['max']}KB{quality}"
+        )
+    print(f"output: {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
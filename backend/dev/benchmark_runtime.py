@@ -9,6 +9,11 @@ Measures:
 Usage:
   python -m backend.dev.benchmark_runtime
   python -m backend.dev.benchmark_runtime --base-url http://127.0.0.1:5000
+  python -m backend.dev.benchmark_runtime --mode testclient --llm-provider mock
+
+With LLM_PROVIDER=mock (server env, or --llm-provider mock in testclient mode) the
+LLM answers offline with deterministic text, so latency = our own pipeline overhead +
+the configured MOCK_LLM_* latency; accuracy rules are skipped.
 """
 
 from __future__ import annotations
@@ -123,6 +128,7 @@ def _run_case(
     timeout_seconds: int,
     include_debug: bool,
     config_override: Optional[Dict[str, object]] = None,
+    check_accuracy: bool = True,
 ) -> Dict[str, object]:
     payload = {
         "message": case.message,
@@ -176,7 +182,9 @@ def _run_case(
             "total": int(tokens.get("total_tokens", 0) or 0),
             "error": bool(tokens.get("error", False)),
         }
-        row["ok"] = bool(case.validator(output_text)) and not _is_system_error_reply(output_text)
+        row["ok"] = (
+            bool(case.validator(output_text)) if check_accuracy else True
+        ) and not _is_system_error_reply(output_text)
         return row
     except Exception as exc:
         row["error"] = str(exc)
@@ -192,8 +200,11 @@ def run_benchmark(
     config_override: Optional[Dict[str, object]] = None,
     case_ids: Optional[List[str]] = None,
     pause_seconds: float = 0.0,
+    llm_provider: str = "",
 ) -> Dict[str, object]:
     cases = _build_cases()
+    # Mock replies are deterministic filler: only "no system error" is checked
+    check_accuracy = str(llm_provider or "").strip().lower() != "mock"
     if case_ids:
         wanted = set(case_ids)
         cases = [case for case in cases if case.case_id in wanted]
@@ -244,6 +255,7 @@ def run_benchmark(
                 timeout_seconds=timeout_seconds,
                 include_debug=include_debug,
                 config_override=config_override,
+                check_accuracy=check_accuracy,
             )
             rows.append(row)
             print(
@@ -272,6 +284,8 @@ def run_benchmark(
     summary: Dict[str, object] = {
         "run_at": time.strftime("%Y-%m-%d %H:%M:%S"),
         "base_url": base_url,
+        "llm_provider": llm_provider or None,
+        "accuracy_checked": check_accuracy,
         "cases": len(rows),
         "http_ok": len(ok_rows),
         "accuracy_pass": len(pass_rows),
@@ -303,6 +317,12 @@ def main() -> int:
     parser.add_argument("--timeout-seconds", type=int, default=240)
     parser.add_argument("--mode", choices=["http", "testclient"], default="http")
     parser.add_argument("--include-debug", action="store_true")
+    parser.add_argument(
+        "--llm-provider",
+        default=os.getenv("BENCH_LLM_PROVIDER", ""),
+        help="Set LLM_PROVIDER for testclient mode (e.g. 'mock' for offline runs); "
+             "in http mode it only labels the report and must match the server env.",
+    )
     parser.add_argument("--pause-seconds", type=float, default=0.0)
     parser.add_argument("--cases", default="", help="Comma-separated case ids to run.")
     parser.add_argument(
@@ -338,6 +358,10 @@ def main() -> int:
             raise ValueError("--config-override-file must point to a JSON object.")
         config_override = parsed
 
+    llm_provider = str(args.llm_provider or "").strip().lower()
+    if llm_provider and args.mode == "testclient":
+        os.environ["LLM_PROVIDER"] = llm_provider  # read by app.config on import of main
+
     summary = run_benchmark(
         base_url=args.base_url,
         dev_token=args.dev_token,
@@ -347,6 +371,7 @@ def main() -> int:
         config_override=config_override,
         case_ids=case_ids,
         pause_seconds=float(args.pause_seconds),
+        llm_provider=llm_provider,
     )
 
     output_path = str(args.output)
@@ -359,6 +384,7 @@ def main() -> int:
         json.dumps(
             {
                 "cases": summary["cases"],
+                "llm_provider": summary["llm_provider"],
                 "http_ok": summary["http_ok"],
                 "accuracy_pass": summary["accuracy_pass"],
                 "accuracy_rate": summary["accuracy_rate"],
@@ -0,0 +1,166 @@
+"""
+Adaptive Limiter Test — ทดสอบ AIMD concurrency limiter ของ LLM
+
+ทดสอบ:
+1. in-flight never exceeds the current limit
+2. Additive increase after `limit` healthy successes
+3. Multiplicative decrease on overload (once per cooldown)
+4. Slow successes hold the limit
+5. Cancelled waiter does not leak a slot
+6. Limit increase wakes queued waiters
+
+Usage:
+    cd backend
+    python dev/test_adaptive_limiter.py
+"""
+
+import asyncio
+import logging
+import sys
+import traceback
+
+sys.path.insert(0, ".")
+from app.utils.llm.adaptive_limiter import AdaptiveLimiter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("AdaptiveLimiterTest")
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+async def test_1_limit_respected():
+    """Test 1: in-flight never exceeds limit"""
+    limiter = AdaptiveLimiter(initial_limit=3, max_limit=3)
+    peak = {"n": 0}
+
+    async def work():
+        async with limiter:
+            peak["n"] = max(peak["n"], limiter.in_flight)
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(*[work() for _ in range(20)])
+    ok = peak["n"] == 3 and limiter.in_flight == 0
+    record("Limit respected", ok, f"peak={peak['n']} in_flight={limiter.in_flight}")
+
+
+async def test_2_additive_increase():
+    """Test 2: +1 after `limit` healthy successes"""
+    limiter = AdaptiveLimiter(initial_limit=4, max_limit=10, latency_target_s=1.0)
+    for _ in range(4):
+        limiter.on_success(0.1)
+    after_first = limiter.limit
+    for _ in range(5):
+        limiter.on_success(0.1)
+    ok = after_first == 5 and limiter.limit == 6
+    record("Additive increase", ok, f"limit={after_first}→{limiter.limit}")
+
+
+async def test_3_multiplicative_decrease():
+    """Test 3: overload halves limit, burst within cooldown cuts once"""
+    limiter = AdaptiveLimiter(initial_limit=16, min_limit=2, decrease_factor=0.5, decrease_cooldown_s=60)
+    for _ in range(5):
+        limiter.on_overload()
+    ok = limiter.limit == 8 and limiter.get_stats()["decreases"] == 1
+    record("Multiplicative decrease", ok, f"limit={limiter.limit}")
+
+
+async def test_4_slow_success_holds():
+    """Test 4: successes above latency target do not raise the limit"""
+    limiter = AdaptiveLimiter(initial_limit=2, latency_target_s=0.5)
+    for _ in range(10):
+        limiter.on_success(2.0)
+    ok = limiter.limit == 2
+    record("Slow success holds", ok, f"limit={limiter.limit}")
+
+
+async def test_5_cancelled_waiter():
+    """Test 5: cancelled waiter does not leak a slot"""
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    try:
+        await waiter
+    except asyncio.CancelledError:
+        pass
+    limiter.release()
+    await asyncio.wait_for(limiter.acquire(), timeout=0.5)
+    ok = limiter.in_flight == 1
+    limiter.release()
+    record("Cancelled waiter", ok, f"in_flight={limiter.in_flight}")
+
+
+async def test_6_increase_wakes_waiters():
+    """Test 6: raising the limit admits a queued waiter"""
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=5, latency_target_s=1.0)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    limiter.on_success(0.1)  # 1 success at limit=1 → limit=2
+    await asyncio.wait_for(waiter, timeout=0.5)
+    ok = limiter.in_flight == 2 and limiter.limit == 2
+    limiter.release()
+    limiter.release()
+    record("Increase wakes waiters", ok, f"limit={limiter.limit}")
+
+
+async def run_all_tests():
+    tests = [
+        test_1_limit_respected,
+        test_2_additive_increase,
+        test_3_multiplicative_decrease,
+        test_4_slow_success_holds,
+        test_5_cancelled_waiter,
+        test_6_increase_wakes_waiters,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Adaptive Limiter Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            await test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,212 @@
+"""
+Circuit Breaker Test — ทดสอบ circuit breaker ของ LLM provider / key
+
+ทดสอบ:
+1. Open after N consecutive failures → fail fast
+2. Half-open (passive): one live probe, success closes
+3. Failed probe re-opens with doubled cooldown
+4. Background probe closes the circuit without live traffic
+5. Non-transient errors count as "provider reachable"
+6. Cancelled live probe is released
+
+Usage:
+    cd backend
+    python dev/test_circuit_breaker.py
+"""
+
+import asyncio
+import logging
+import sys
+import time
+import traceback
+
+sys.path.insert(0, ".")
+from app.utils.llm.circuit_breaker import CircuitOpenError, LLMCircuitBreaker
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("CircuitBreakerTest")
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+class Transient(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def is_failure(exc):
+    return isinstance(exc, Transient)
+
+
+async def _fail():
+    raise Transient("connection reset")
+
+
+async def _ok():
+    return "ok"
+
+
+async def _call(breaker, key, fn):
+    try:
+        return await breaker.call(key, fn, is_failure=is_failure)
+    except Exception as exc:
+        return exc
+
+
+async def test_1_open_after_threshold():
+    """Test 1: opens after N failures, then fails fast"""
+    breaker = LLMCircuitBreaker(failure_threshold=3, cooldown_s=60)
+    for _ in range(3):
+        await _call(breaker, "k", _fail)
+    started = time.perf_counter()
+    result = await _call(breaker, "k", _ok)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stats = breaker.get_stats()["circuits"]["k"]
+    ok = isinstance(result, CircuitOpenError) and stats["state"] == "open" and elapsed_ms < 5
+    record("Open after threshold", ok, f"state={stats['state']} fail_fast={elapsed_ms:.2f}ms")
+
+
+async def test_2_half_open_passive():
+    """Test 2: after cooldown one live probe passes, success closes"""
+    breaker = LLMCircuitBreaker(failure_threshold=1, cooldown_s=0.1)
+    await _call(breaker, "k", _fail)
+    await asyncio.sleep(0.15)
+    first = breaker.allow("k")
+    second = breaker.allow("k")
+    breaker.record_success("k")
+    ok = first and not second and not breaker.is_open("k")
+    record("Half-open passive probe", ok, f"first={first} second={second}")
+
+
+async def test_3_failed_probe_reopens():
+    """Test 3: failed probe re-opens with doubled cooldown"""
+    breaker = LLMCircuitBreaker(failure_threshold=1, cooldown_s=0.1, max_cooldown_s=10)
+    await _call(breaker, "k", _fail)
+    await asyncio.sleep(0.15)
+    await _call(breaker, "k", _fail)  # probe fails
+    retry_in = breaker.retry_in("k")
+    ok = breaker.is_open("k") and 0.1 < retry_in <= 0.2 and breaker.get_stats()["circuits"]["k"]["opens"] == 2
+    record("Failed probe re-opens", ok, f"retry_in={retry_in:.2f}s")
+
+
+async def test_4_background_probe():
+    """Test 4: registered probe closes the circuit in the background"""
+    breaker = LLMCircuitBreaker(failure_threshold=1, cooldown_s=0.05)
+    probes = {"n": 0}
+
+    async def probe():
+        probes["n"] += 1
+        if probes["n"] < 2:
+            raise Transient("still down")
+        return True
+
+    breaker.register_probe("k", probe)
+    await _call(breaker, "k", _fail)
+    rejected_while_open = not breaker.allow("k")
+    for _ in range(50):
+        if not breaker.is_open("k"):
+            break
+        await asyncio.sleep(0.02)
+    ok = rejected_while_open and not breaker.is_open("k") and probes["n"] == 2
+    await breaker.close()
+    record("Background probe", ok, f"probes={probes['n']}")
+
+
+async def test_5_non_transient_is_success():
+    """Test 5: 4xx-style errors reset the failure count"""
+    breaker = LLMCircuitBreaker(failure_threshold=2, cooldown_s=60)
+
+    async def bad_request():
+        raise BadRequest("400")
+
+    await _call(breaker, "k", _fail)
+    await _call(breaker, "k", bad_request)
+    await _call(breaker, "k", _fail)
+    ok = not breaker.is_open("k") and breaker.get_stats()["circuits"]["k"]["failures"] == 1
+    record("Non-transient resets", ok, str(breaker.get_stats()["circuits"]["k"]))
+
+
+async def test_6_cancelled_probe_released():
+    """Test 6: cancelled live probe lets the next call probe"""
+    breaker = LLMCircuitBreaker(failure_threshold=1, cooldown_s=0.05)
+    await _call(breaker, "k", _fail)
+    await asyncio.sleep(0.08)
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    task = asyncio.create_task(breaker.call("k", slow, is_failure=is_failure))
+    await asyncio.sleep(0.01)
+    blocked = not breaker.allow("k")
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    result = await _call(breaker, "k", _ok)
+    ok = blocked and result == "ok" and not breaker.is_open("k")
+    record("Cancelled probe released", ok, f"blocked={blocked} result={result}")
+
+
+async def run_all_tests():
+    tests = [
+        test_1_open_after_threshold,
+        test_2_half_open_passive,
+        test_3_failed_probe_reopens,
+        test_4_background_probe,
+        test_5_non_transient_is_success,
+        test_6_cancelled_probe_released,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Circuit Breaker Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            await test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
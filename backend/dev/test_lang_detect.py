@@ -0,0 +1,144 @@
+"""
+Language Detect Test — ทดสอบ script-based language detection
+
+ทดสอบ:
+1. Thai / Thai+English mixed → th
+2. Chinese vs Japanese (kana)
+3. Short Latin → en without langdetect
+4. Numbers / emoji only → default (th)
+5. Memoization per normalized message
+6. Document classification keeps th / en / mixed thresholds
+7. Speed: 10k detections of cached Thai turns
+
+Usage:
+    cd backend
+    python dev/test_lang_detect.py
+"""
+
+import logging
+import sys
+import time
+import traceback
+
+sys.path.insert(0, ".")
+from app.utils.lang_detect import (
+    classify_document_language,
+    detect_language,
+    detect_language_fast,
+    get_cache_stats,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("LangDetectTest")
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+def test_1_thai():
+    """Test 1: Thai and Thai-English mixed turns → th"""
+    samples = ["เปิดเทอมวันไหน", "ลงทะเบียน CS101 ได้ถึงวันไหนครับ", "ค่าเทอม TCAS รอบ 3"]
+    results = [detect_language(text) for text in samples]
+    record("Thai", results == ["th"] * 3, str(results))
+
+
+def test_2_cjk():
+    """Test 2: Chinese vs Japanese"""
+    zh = detect_language("什么时候开学")
+    ja = detect_language("登録はいつですか")
+    record("CJK / Kana", zh == "zh" and ja == "ja", f"zh={zh} ja={ja}")
+
+
+def test_3_short_latin():
+    """Test 3: short Latin resolves without langdetect"""
+    fast = detect_language_fast("when does term start?")
+    long_latin = detect_language_fast("When does the registration period for the second semester begin this year?")
+    record("Short Latin", fast == "en" and long_latin is None, f"short={fast} long={long_latin}")
+
+
+def test_4_no_letters():
+    """Test 4: digits / emoji only → default th"""
+    result = detect_language("2/2568 🙂")
+    record("No letters", result == "th", result)
+
+
+def test_5_memoized():
+    """Test 5: normalized duplicates hit the cache"""
+    before = get_cache_stats()
+    detect_language("  ค่าเทอม   เท่าไหร่ ")
+    detect_language("ค่าเทอม เท่าไหร่")
+    after = get_cache_stats()
+    record("Memoized", after["hits"] > before["hits"], f"before={before} after={after}")
+
+
+def test_6_document():
+    """Test 6: document classification (ingest metadata)"""
+    th = classify_document_language("ปฏิทินการศึกษา ภาคเรียนที่ 1 " * 20)
+    en = classify_document_language("Academic calendar first semester " * 20)
+    mixed = classify_document_language("ปฏิทิน calendar " * 20)
+    record("Document language", (th, en, mixed) == ("th", "en", "mixed"), f"{th} {en} {mixed}")
+
+
+def test_7_speed():
+    """Test 7: cached detection is sub-microsecond scale"""
+    started = time.perf_counter()
+    for _ in range(10_000):
+        detect_language_fast("ขอเอกสารรับรองสถานภาพนักศึกษาได้ที่ไหน")
+    per_call_us = (time.perf_counter() - started) / 10_000 * 1e6
+    record("Speed", per_call_us < 50, f"{per_call_us:.2f}µs/call")
+
+
+def run_all_tests():
+    tests = [
+        test_1_thai,
+        test_2_cjk,
+        test_3_short_latin,
+        test_4_no_letters,
+        test_5_memoized,
+        test_6_document,
+        test_7_speed,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Language Detect Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
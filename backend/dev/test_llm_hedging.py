@@ -0,0 +1,289 @@
+"""
+LLM Hedging Test — ทดสอบ hedged requests ของ OpenAIFailoverClient กับ fake OpenAI server
+
+เปิด fake OpenAI-compatible server บน localhost (ไม่ใช้ API จริง):
+    /slow/v1/chat/completions  → ตอบช้า
+    /fast/v1/chat/completions  → ตอบเร็ว
+
+ทดสอบ:
+1. Slow primary → hedge ไป key ถัดไป, ตัวเร็วชนะ, ตัวช้าถูก cancel
+2. Fast primary → ไม่ hedge
+3. Budget หมด → ไม่ hedge (รอ primary ตามปกติ)
+4. Streaming call ไม่ถูก hedge
+5. Hedge delay มาจาก p95 ของ latency จริง
+
+Usage:
+    cd backend
+    python dev/test_llm_hedging.py
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import time
+import traceback
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, ".")
+import httpx
+import openai
+
+from app.utils.llm.llm_model import OpenAIFailoverClient, _HedgePolicy
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("LLMHedgingTest")
+
+SLOW_DELAY_S = 1.5
+FAST_DELAY_S = 0.05
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+class FakeOpenAIServer:
+    """Minimal HTTP/1.1 server speaking the chat.completions wire format."""
+
+    def __init__(self):
+        self.server = None
+        self.port = 0
+        self.requests = {"slow": 0, "fast": 0}
+        self.completed = {"slow": 0, "fast": 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def base_url(self, lane: str) -> str:
+        return f"http://127.0.0.1:{self.port}/{lane}/v1"
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0") or 0))
+                payload = json.loads(body or b"{}")
+
+                lane = "slow" if path.startswith("/slow/") else "fast"
+                self.requests[lane] += 1
+                await asyncio.sleep(SLOW_DELAY_S if lane == "slow" else FAST_DELAY_S)
+                self.completed[lane] += 1
+
+                if payload.get("stream"):
+                    chunk = {
+                        "id": "fake", "object": "chat.completion.chunk", "created": 0,
+                        "model": payload.get("model", "fake"),
+                        "choices": [{"index": 0, "delta": {"content": lane}, "finish_reason": "stop"}],
+                    }
+                    data = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode()
+                    head = "HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                else:
+                    response = {
+                        "id": "fake", "object": "chat.completion", "created": 0,
+                        "model": payload.get("model", "fake"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": lane},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                    }
+                    data = json.dumps(response).encode()
+                    head = "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                writer.write(f"{head}Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+@asynccontextmanager
+async def fake_server():
+    """เปิด fake server แยกต่อ test (ไม่ต้องใช้ fixture ของ pytest)"""
+    server = FakeOpenAIServer()
+    await server.start()
+    try:
+        yield server
+    finally:
+        await server.stop()
+
+
+def make_client(server, lanes, policy):
+    clients = [
+        openai.AsyncOpenAI(
+            api_key=f"sk-fake-{lane}",
+            base_url=server.base_url(lane),
+            timeout=httpx.Timeout(10.0, connect=2.0),
+            max_retries=0,
+        )
+        for lane in lanes
+    ]
+    return OpenAIFailoverClient(clients, list(lanes), hedge_policy=policy)
+
+
+async def _ask(client, **extra):
+    return await client.chat.completions.create(
+        model="fake", messages=[{"role": "user", "content": "hi"}], **extra
+    )
+
+
+async def test_1_slow_primary_hedged():
+    """Test 1: slow primary → hedge wins, loser cancelled"""
+    async with fake_server() as server:
+        policy = _HedgePolicy(enabled=True, default_delay_s=0.2, min_delay_s=0.05)
+        client = make_client(server, ["slow", "fast"], policy)
+        try:
+            started = time.perf_counter()
+            response = await _ask(client)
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(SLOW_DELAY_S)  # give the cancelled slow handler time to (not) finish
+            stats = policy.get_stats()
+            ok = (
+                response.choices[0].message.content == "fast"
+                and elapsed < SLOW_DELAY_S
+                and stats["hedges_sent"] == 1
+                and stats["hedge_wins"] == 1
+            )
+            record("Slow primary hedged", ok, f"elapsed={elapsed:.2f}s stats={stats}")
+        finally:
+            await client.close()
+
+
+async def test_2_fast_primary_not_hedged():
+    """Test 2: fast primary → no hedge"""
+    async with fake_server() as server:
+        policy = _HedgePolicy(enabled=True, default_delay_s=0.5, min_delay_s=0.05)
+        client = make_client(server, ["fast", "slow"], policy)
+        before_slow = server.requests["slow"]
+        try:
+            response = await _ask(client)
+            ok = (
+                response.choices[0].message.content == "fast"
+                and policy.hedges_sent == 0
+                and server.requests["slow"] == before_slow
+            )
+            record("Fast primary not hedged", ok, f"stats={policy.get_stats()}")
+        finally:
+            await client.close()
+
+
+async def test_3_budget_caps_hedges():
+    """Test 3: exhausted budget → primary only"""
+    async with fake_server() as server:
+        policy = _HedgePolicy(enabled=True, default_delay_s=0.1, min_delay_s=0.05, budget_ratio=0.0, budget_burst=1)
+        client = make_client(server, ["slow", "fast"], policy)
+        try:
+            first = await _ask(client)
+            second = await _ask(client)
+            stats = policy.get_stats()
+            ok = (
+                first.choices[0].message.content == "fast"
+                and second.choices[0].message.content == "slow"
+                and stats["hedges_sent"] == 1
+                and stats["budget_denied"] == 1
+            )
+            record("Budget caps hedges", ok, f"stats={stats}")
+        finally:
+            await client.close()
+
+
+async def test_4_stream_not_hedged():
+    """Test 4: streaming calls are never hedged"""
+    async with fake_server() as server:
+        policy = _HedgePolicy(enabled=True, default_delay_s=0.1, min_delay_s=0.05)
+        client = make_client(server, ["slow", "fast"], policy)
+        try:
+            stream = await _ask(client, stream=True)
+            parts = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+            ok = "".join(parts) == "slow" and policy.hedges_sent == 0 and policy.primary_calls == 0
+            record("Stream not hedged", ok, f"parts={parts} stats={policy.get_stats()}")
+        finally:
+            await client.close()
+
+
+async def test_5_delay_from_p95():
+    """Test 5: hedge delay follows observed p95 latency"""
+    policy = _HedgePolicy(enabled=True, default_delay_s=3.0, min_delay_s=0.05, percentile=95)
+    before = policy.delay_s()
+    for idx in range(100):
+        policy.record_latency(0.1 if idx < 95 else 2.0)
+    after = policy.delay_s()
+    ok = before == 3.0 and abs(after - 0.1) < 1e-9
+    record("Delay from p95", ok, f"before={before} after={after}")
+
+
+async def run_all_tests():
+    tests = [
+        test_1_slow_primary_hedged,
+        test_2_fast_primary_not_hedged,
+        test_3_budget_caps_hedges,
+        test_4_stream_not_hedged,
+        test_5_delay_from_p95,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  LLM Hedging Test — %d tests (fake server per test)", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            await test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
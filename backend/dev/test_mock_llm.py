@@ -0,0 +1,165 @@
+"""
+Mock LLM Test — ทดสอบ LLM_PROVIDER=mock (offline, deterministic)
+
+ทดสอบ:
+1. Prompt เดียวกัน → คำตอบเดียวกัน, prompt ต่างกัน → คำตอบต่างกัน
+2. Streaming ต่อ delta แล้วได้ข้อความเดียวกับ non-stream + usage ใน chunk สุดท้าย
+3. Injected 429 / timeout ตามสัดส่วน (มี status_code ให้ limiter / breaker จัดประเภท)
+4. Latency distribution: median ใกล้ค่าที่ตั้ง, seed เดิม → ลำดับเดิม
+
+Usage:
+    cd backend
+    python dev/test_mock_llm.py
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import traceback
+
+sys.path.insert(0, ".")
+from app.utils.llm.mock_llm import MockLLMClient, MockRateLimitError, MockTimeoutError, _LatencyModel
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("MockLLMTest")
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+def make_client(**kwargs):
+    options = {"latency_dist": "fixed", "latency_ms": 5, "stream_chunk_ms": 1, "reply_words": 12}
+    options.update(kwargs)
+    return MockLLMClient(**options)
+
+
+def _messages(question):
+    return [{"role": "system", "content": "system"}, {"role": "user", "content": question}]
+
+
+async def test_1_deterministic_reply():
+    """Test 1: same prompt → same reply"""
+    client_a, client_b = make_client(seed=1), make_client(seed=2)
+    first = await client_a.chat.completions.create(model="mock", messages=_messages("ค่าเทอมเท่าไร"))
+    again = await client_b.chat.completions.create(model="mock", messages=_messages("ค่าเทอมเท่าไร"))
+    other = await client_a.chat.completions.create(model="mock", messages=_messages("เปิดเทอมวันไหน"))
+    text = first.choices[0].message.content
+    ok = (
+        text == again.choices[0].message.content
+        and text != other.choices[0].message.content
+        and first.usage.total_tokens == first.usage.prompt_tokens + first.usage.completion_tokens
+    )
+    record("Deterministic reply", ok, text[:60])
+
+
+async def test_2_stream_matches():
+    """Test 2: streamed deltas join to the non-stream reply"""
+    client = make_client()
+    full = await client.chat.completions.create(model="mock", messages=_messages("hello"))
+    stream = await client.chat.completions.create(
+        model="mock", messages=_messages("hello"), stream=True, stream_options={"include_usage": True}
+    )
+    parts, usage = [], None
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+    ok = "".join(parts) == full.choices[0].message.content and len(parts) > 1 and usage is not None
+    record("Stream matches", ok, f"deltas={len(parts)} usage={getattr(usage, 'total_tokens', None)}")
+
+
+async def test_3_injected_failures():
+    """Test 3: injected 429 / timeout rates"""
+    client = make_client(latency_ms=0, rate_limit_rate=0.2, timeout_rate=0.1, timeout_ms=1, seed=42)
+    outcomes = {"ok": 0, "429": 0, "timeout": 0}
+    for idx in range(500):
+        try:
+            await client.chat.completions.create(model="mock", messages=_messages(f"q{idx}"))
+            outcomes["ok"] += 1
+        except MockRateLimitError as exc:
+            outcomes["429"] += int(exc.status_code == 429 and "429" in str(exc))
+        except MockTimeoutError as exc:
+            outcomes["timeout"] += int(isinstance(exc, TimeoutError))
+    stats = client.get_stats()
+    ok = (
+        60 <= outcomes["429"] <= 140
+        and 25 <= outcomes["timeout"] <= 90
+        and stats["rate_limited"] == outcomes["429"]
+        and stats["timeouts"] == outcomes["timeout"]
+    )
+    record("Injected failures", ok, f"outcomes={outcomes}")
+
+
+async def test_4_latency_distribution():
+    """Test 4: latency median + seeded reproducibility"""
+    results = {}
+    for dist in ("fixed", "uniform", "lognormal", "exponential"):
+        model = _LatencyModel(dist, 200, 0.5, seed=7)
+        samples = [model.sample() for _ in range(2000)]
+        replay = _LatencyModel(dist, 200, 0.5, seed=7)
+        results[dist] = (
+            round(statistics.median(samples) * 1000, 1),
+            samples[:5] == [replay.sample() for _ in range(5)],
+        )
+    ok = all(abs(median - 200) <= 20 and same for median, same in results.values())
+    record("Latency distribution", ok, str(results))
+
+
+async def run_all_tests():
+    tests = [
+        test_1_deterministic_reply,
+        test_2_stream_matches,
+        test_3_injected_failures,
+        test_4_latency_distribution,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Mock LLM Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            await test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
@@ -12,6 +12,15 @@ Queue System Stress Test — ทดสอบระบบคิว Multi-User
 8. Graceful shutdown
 9. Statistics accuracy
 10. Fair ordering (FIFO)
+11. Queue overhead with the offline mock LLM provider
+12. Priority classes (voice not stuck behind a Messenger burst)
+13. Per-user round-robin within a class + per-class stats
+14. O(1) positions + batched, change-only position broadcasts
+15. Event-driven workers: idle shutdown latency + per-item scheduling overhead (microbenchmark)
+16. EWMA service-time model: wait estimates + admission control (reject / divert)
+17. Elastic worker pool (scale up to LLM headroom, retire idle workers)
+18. Cancellation on client disconnect (pending + in-flight, cooperative at stage boundaries)
+19. Per-request deadline propagated to the handler + admission against the caller deadline
 
 Usage:
     cd backend
@@ -26,7 +35,25 @@ import traceback
 from collections import defaultdict
 
 sys.path.insert(0, ".")
-from queue_manager import LLMRequestQueue, QueueConfig, QueueFullError, QueueTimeoutError
+from app.utils.llm.mock_llm import MockLLMClient
+from queue_manager import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_MESSENGER,
+    PRIORITY_REALTIME,
+    PRIORITY_WEB,
+    LLMRequestQueue,
+    QueueConfig,
+    QueueFullError,
+    QueueOverloadedError,
+    QueueTimeoutError,
+    RequestCancelled,
+    Deadline,
+    cancellable,
+    check_cancelled,
+    current_deadline,
+    deadline_scope,
+)
+from queue_manager.service_model import OUTCOME_CACHE, OUTCOME_LLM, ServiceTimeModel, classify_outcome
 
 logging.basicConfig(
     level=logging.INFO,
@@ -346,6 +373,30 @@ async def test_7_error_isolation():
 
     await q.shutdown()
 
+    # Handler task cancelled from inside → request aborted, the (only) worker keeps serving
+    async def self_cancel(msg, session_id, emit_fn=None, **kwargs):
+        if msg == "cancel":
+            asyncio.current_task().cancel()
+        await asyncio.sleep(0.01)
+        return {"text": f"OK: {msg}", "tokens": {}, "trace_id": "ok"}
+
+    q = LLMRequestQueue(handler_fn=self_cancel, config=QueueConfig(num_workers=1, request_timeout=5))
+    await q.start()
+    try:
+        await q.submit("u1", "s1", "cancel")
+        outcome = "no error"
+    except RequestCancelled as exc:
+        outcome = f"RequestCancelled({exc.reason})"
+    worker_alive = all(not task.done() for task in q._workers.values())
+    after = await q.submit("u2", "s2", "after")
+    record(
+        "Handler CancelledError doesn't kill worker",
+        outcome.startswith("RequestCancelled") and worker_alive and after["text"] == "OK: after"
+        and q.get_stats()["totals"]["aborted"] == 1,
+        f"first={outcome} worker_alive={worker_alive} next={after['text']}",
+    )
+    await q.shutdown()
+
 
 async def test_8_graceful_shutdown():
     """Test 8: Graceful shutdown cancels pending items"""
@@ -482,6 +533,492 @@ async def test_10_fair_ordering():
     await q.shutdown()
 
 
+async def test_11_mock_llm_overhead():
+    """Test 11: queue overhead on top of the mock LLM (no network)"""
+    llm_latency_ms = 50
+    client = MockLLMClient(latency_dist="fixed", latency_ms=llm_latency_ms, stream_chunk_ms=0, reply_words=20)
+    timings = {}
+
+    async def mock_llm_handler(msg, session_id, emit_fn=None, **kwargs):
+        started = time.perf_counter()
+        response = await client.chat.completions.create(
+            model="mock", messages=[{"role": "user", "content": msg}]
+        )
+        timings[session_id] = time.perf_counter() - started
+        return {"text": response.choices[0].message.content, "tokens": {}, "trace_id": session_id}
+
+    q = LLMRequestQueue(
+        handler_fn=mock_llm_handler,
+        config=QueueConfig(num_workers=20, max_size=100, request_timeout=30),
+    )
+    await q.start()
+
+    async def one(idx):
+        started = time.perf_counter()
+        result = await q.submit(f"user_{idx}", f"sess_{idx}", f"question {idx % 5}")
+        return f"sess_{idx}", time.perf_counter() - started, result["text"]
+
+    rows = await asyncio.gather(*(one(i) for i in range(20)))
+    overheads_ms = sorted((total - timings[sid]) * 1000 for sid, total, _ in rows)
+    p50 = overheads_ms[len(overheads_ms) // 2]
+    same_prompt_same_text = len({text for sid, _, text in rows if sid in ("sess_0", "sess_5")}) == 1
+    ok = p50 < llm_latency_ms and same_prompt_same_text and client.get_stats()["calls"] == 20
+    record(
+        "Mock LLM overhead",
+        ok,
+        f"queue overhead p50={p50:.1f}ms max={overheads_ms[-1]:.1f}ms (llm={llm_latency_ms}ms)",
+    )
+
+    await q.shutdown()
+
+
+async def test_12_priority_classes():
+    """Test 12: voice request jumps a Messenger burst; lower classes still progress"""
+    global call_log
+    call_log = []
+
+    q = LLMRequestQueue(
+        handler_fn=mock_handler,
+        config=QueueConfig(num_workers=1, max_size=100, per_user_limit=5, request_timeout=30),
+    )
+    await q.start()
+
+    # Messenger burst: 30 users × 1 request, 50ms each → ~1.5s of backlog on 1 worker
+    burst = [
+        asyncio.create_task(
+            q.submit(f"fb_{i}", f"fb_sess_{i}", f"fb_msg_{i}", priority=PRIORITY_MESSENGER, delay=0.05)
+        )
+        for i in range(30)
+    ]
+    background = asyncio.create_task(
+        q.submit("faq_refresh", "faq_sess", "bg_msg", priority=PRIORITY_BACKGROUND, delay=0.01)
+    )
+    await asyncio.sleep(0.12)
+
+    started = time.perf_counter()
+    await q.submit("voice_user", "voice_sess", "voice_msg", priority=PRIORITY_REALTIME, delay=0.01)
+    voice_ms = (time.perf_counter() - started) * 1000
+    await asyncio.gather(*burst, background)
+
+    messages = [c["msg"] for c in call_log]
+    voice_pos = messages.index("voice_msg")
+    ok = voice_ms < 200 and voice_pos <= 4
+    record(
+        "Voice ahead of Messenger burst",
+        ok,
+        f"voice waited {voice_ms:.0f}ms (dispatch #{voice_pos + 1} of {len(messages)})",
+    )
+
+    # background (weight 1 vs messenger 2) must not starve behind the burst
+    bg_pos = messages.index("bg_msg")
+    record(
+        "Background class not starved",
+        bg_pos < len(messages) - 10,
+        f"background dispatched #{bg_pos + 1} of {len(messages)}",
+    )
+
+    await q.shutdown()
+
+
+async def test_13_user_round_robin():
+    """Test 13: one user's burst doesn't push other users of the same class to the back"""
+    global call_log
+    call_log = []
+
+    q = LLMRequestQueue(
+        handler_fn=mock_handler,
+        config=QueueConfig(num_workers=1, max_size=100, per_user_limit=10, request_timeout=30),
+    )
+    await q.start()
+
+    # Block the single worker so everything below queues up together
+    blocker = asyncio.create_task(q.submit("blocker", "blk", "blk_msg", delay=0.1))
+    await asyncio.sleep(0.02)
+
+    heavy = [
+        asyncio.create_task(q.submit("heavy", f"heavy_{i}", f"heavy_{i}", priority=PRIORITY_WEB, delay=0.01))
+        for i in range(8)
+    ]
+    await asyncio.sleep(0.01)
+    light = [
+        asyncio.create_task(q.submit(f"light_{i}", f"light_{i}", f"light_{i}", priority=PRIORITY_WEB, delay=0.01))
+        for i in range(3)
+    ]
+    await asyncio.gather(blocker, *heavy, *light)
+
+    messages = [c["msg"] for c in call_log][1:]
+    last_light = max(messages.index(f"light_{i}") for i in range(3))
+    record(
+        "Round-robin across users",
+        last_light <= 6,
+        f"last light user served at #{last_light + 1} of {len(messages)} (heavy user sent 8 first)",
+    )
+
+    classes = q.get_stats()["classes"]
+    web = classes.get("web", {})
+    ok = web.get("dispatched") == 12 and web.get("pending") == 0 and web.get("weight") == 4
+    record(
+        "Per-class stats",
+        ok,
+        f"web dispatched={web.get('dispatched')} pending={web.get('pending')} "
+        f"avg_wait={web.get('avg_wait_ms')}ms max_wait={web.get('max_wait_ms')}ms",
+    )
+
+    await q.shutdown()
+
+
+async def test_14_position_broadcasts():
+    """Test 14: ticket/served positions and debounced change-only broadcasts"""
+    updates = defaultdict(list)
+
+    def make_emit(idx):
+        async def emit_fn(event, payload):
+            if event == "queue_position" and payload.get("status") == "queued":
+                updates[idx].append(payload["position"])
+        return emit_fn
+
+    q = LLMRequestQueue(
+        handler_fn=mock_handler,
+        config=QueueConfig(num_workers=1, max_size=100, request_timeout=30, position_broadcast_interval=0.2),
+    )
+    await q.start()
+
+    n = 30
+    tasks = []
+    for i in range(n):
+        tasks.append(asyncio.create_task(
+            q.submit(f"user_{i}", f"sess_{i}", f"msg_{i}", emit_fn=make_emit(i), delay=0.02)
+        ))
+    await asyncio.sleep(0.005)
+
+    pending_ids = list(q._pending.keys())
+    positions = [await q.get_position(rid) for rid in pending_ids]
+    record(
+        "Ticket positions",
+        positions == list(range(1, len(pending_ids) + 1)),
+        f"pending={len(pending_ids)} positions={positions[:5]}...",
+    )
+
+    await asyncio.gather(*tasks)
+
+    total = sum(len(v) for v in updates.values())
+    monotonic = all(
+        all(later < earlier for earlier, later in zip(seq, seq[1:])) for seq in updates.values()
+    )
+    # เดิม: ทุก completion แจ้งทุกคน → ~n²/2 = 435 updates
+    ok = monotonic and total < n * 6
+    record(
+        "Batched position broadcasts",
+        ok,
+        f"queued updates={total} for {n} requests (per-completion fan-out ≈ {n * (n - 1) // 2}) "
+        f"strictly_decreasing={monotonic}",
+    )
+
+    await q.shutdown()
+
+
+async def test_15_scheduling_overhead():
+    """Test 15: event-driven workers — idle shutdown latency and per-item overhead"""
+    q = LLMRequestQueue(handler_fn=mock_handler, config=QueueConfig(num_workers=10, request_timeout=30))
+    await q.start()
+    await asyncio.sleep(0.05)  # workers parked on the scheduler
+    started = time.perf_counter()
+    await q.shutdown()
+    shutdown_ms = (time.perf_counter() - started) * 1000
+    record("Idle shutdown latency", shutdown_ms < 100, f"shutdown={shutdown_ms:.1f}ms (workers=10, idle)")
+
+    async def noop_handler(msg, session_id, emit_fn=None, **kwargs):
+        return {"text": msg}
+
+    n = 5000
+    results = {}
+    for workers in (1, 10):
+        q = LLMRequestQueue(
+            handler_fn=noop_handler,
+            config=QueueConfig(num_workers=workers, max_size=n, per_user_limit=n, request_timeout=60),
+        )
+        await q.start()
+        # warm-up
+        await asyncio.gather(*(q.submit(f"u{i % 50}", "s", "warm") for i in range(200)))
+        started = time.perf_counter()
+        await asyncio.gather(*(q.submit(f"u{i % 50}", f"s{i}", "m") for i in range(n)))
+        results[workers] = (time.perf_counter() - started) / n * 1e6
+        await q.shutdown()
+
+    # submit + schedule + dispatch + resolve ต่อ item (handler ไม่ทำอะไร)
+    ok = all(us < 2000 for us in results.values())
+    record(
+        "Per-item scheduling overhead",
+        ok,
+        " ".join(f"workers={w}: {us:.0f}us/item" for w, us in results.items()) + f" (n={n})",
+    )
+
+
+async def test_16_admission_control():
+    """Test 16: EWMA wait estimates; requests that can't make the deadline fail fast / divert"""
+    model = ServiceTimeModel(alpha=0.05)
+    for _ in range(100):
+        model.observe(PRIORITY_WEB, OUTCOME_LLM, 2.0)
+        model.observe(PRIORITY_WEB, OUTCOME_CACHE, 0.0)
+    expected = model.expected_service(PRIORITY_WEB)
+    record("Service-time mix", 0.8 < expected < 1.2, f"50% cache @0s + 50% llm @2s → {expected:.2f}s")
+
+    # Deadline-degraded / overload-diverted answers are not service-time samples
+    samples = model.samples(PRIORITY_WEB)
+    for result in (
+        {"text": "x", "tokens": {}, "degraded": "deadline"},
+        {"text": "y", "tokens": {"cached": True}, "diverted": True},
+    ):
+        model.observe(PRIORITY_WEB, classify_outcome(result), 0.05)
+    record(
+        "Degraded results excluded",
+        model.samples(PRIORITY_WEB) == samples and abs(model.expected_service(PRIORITY_WEB) - expected) < 1e-9,
+        f"samples={model.samples(PRIORITY_WEB)} expected={model.expected_service(PRIORITY_WEB):.2f}s",
+    )
+
+    estimates = []
+
+    async def emit_fn(event, payload):
+        if event == "queue_position" and payload.get("status") == "queued":
+            estimates.append(payload.get("estimated_wait"))
+
+    async def overload_fn(msg, session_id, **kwargs):
+        return {"text": f"faq:{msg}", "tokens": {"cached": True}, "diverted": True} if msg.startswith("faq") else None
+
+    q = LLMRequestQueue(
+        handler_fn=mock_handler,
+        config=QueueConfig(
+            num_workers=1, max_size=100, per_user_limit=100, request_timeout=1.0,
+            admission_min_samples=3, position_broadcast_interval=0,
+        ),
+        overload_fn=overload_fn,
+    )
+    await q.start()
+    for i in range(3):
+        await q.submit("warm", f"w{i}", "warm", delay=0.2)
+
+    outcomes = defaultdict(int)
+    shed_latency = []
+
+    async def one(i):
+        started = time.perf_counter()
+        msg = f"faq_{i}" if i % 2 else f"msg_{i}"
+        try:
+            result = await q.submit(f"u{i}", f"s{i}", msg, emit_fn=emit_fn, delay=0.2)
+            outcomes["diverted" if result.get("diverted") else "ok"] += 1
+            if result.get("diverted"):
+                shed_latency.append(time.perf_counter() - started)
+        except QueueOverloadedError:
+            outcomes["shed"] += 1
+            shed_latency.append(time.perf_counter() - started)
+        except QueueTimeoutError:
+            outcomes["timeout"] += 1
+
+    await asyncio.gather(*(one(i) for i in range(16)))
+    stats = q.get_stats()
+    ok = (
+        outcomes["timeout"] == 0
+        and outcomes["shed"] > 0 and outcomes["diverted"] > 0
+        and max(shed_latency) < 0.1
+        and stats["totals"]["shed"] == outcomes["shed"]
+        and stats["totals"]["diverted"] == outcomes["diverted"]
+    )
+    record(
+        "Admission control",
+        ok,
+        f"{dict(outcomes)} max fast-fail={max(shed_latency or [0]) * 1000:.1f}ms "
+        f"expected={stats['service_time']['classes'].get(PRIORITY_WEB, {}).get('expected_ms')}ms",
+    )
+    record(
+        "EWMA wait estimates",
+        bool(estimates) and all(0 <= e <= 1.0 for e in estimates) and max(estimates) >= 0.4,
+        f"estimated_wait (s, service≈0.2s) samples={estimates[:8]}",
+    )
+
+    await q.shutdown()
+
+
+async def test_17_elastic_workers():
+    """Test 17: pool grows with backlog up to the LLM headroom, shrinks to min when idle"""
+    llm_limit = 5
+    q = None
+
+    def capacity_fn():
+        return llm_limit - len(q._active)  # simulated limiter: one LLM slot per active request
+
+    q = LLMRequestQueue(
+        handler_fn=mock_handler,
+        config=QueueConfig(
+            num_workers=1, min_workers=1, max_workers=8, max_size=100, per_user_limit=100,
+            request_timeout=30, scale_target_wait=0.1, scale_down_idle=0.2, health_log_interval=0.3,
+        ),
+        capacity_fn=capacity_fn,
+    )
+    await q.start()
+    peak = 0
+
+    async def watch():
+        nonlocal peak
+        while True:
+            peak = max(peak, q.get_stats()["current"]["workers"])
+            await asyncio.sleep(0.01)
+
+    watcher = asyncio.create_task(watch())
+    started = time.perf_counter()
+    await asyncio.gather(*(q.submit(f"u{i}", f"s{i}", f"m{i}", delay=0.1) for i in range(20)))
+    elapsed = time.perf_counter() - started
+    record(
+        "Scale up to LLM headroom",
+        peak == llm_limit and q.get_stats()["peaks"]["max_active"] <= llm_limit and elapsed < 1.0,
+        f"peak workers={peak} (limit={llm_limit}, max=8) 20×100ms in {elapsed:.2f}s",
+    )
+
+    await asyncio.sleep(1.0)
+    watcher.cancel()
+    stats = q.get_stats()
+    result = await q.submit("late", "late", "late_msg", delay=0.01)
+    record(
+        "Retire idle workers",
+        stats["current"]["workers"] == 1 and stats["scaling"]["scale_downs"] >= 1 and bool(result),
+        f"workers after idle={stats['current']['workers']} scaling={stats['scaling']}",
+    )
+
+    await q.shutdown()
+
+
+async def test_18_cancel_on_disconnect():
+    """Test 18: client disconnect cancels queued and in-flight work"""
+    stages_run = defaultdict(int)
+
+    async def staged_handler(msg, session_id, emit_fn=None, **kwargs):
+        # Simulated ask_llm: 20 cheap stages with a boundary check, then one long "LLM call"
+        for _ in range(20):
+            check_cancelled()
+            stages_run[msg] += 1
+            await asyncio.sleep(0.02)
+        await cancellable(asyncio.sleep(kwargs.get("llm_delay", 5.0)))
+        return {"text": f"Response to: {msg}", "tokens": {}, "trace_id": msg}
+
+    q = LLMRequestQueue(
+        handler_fn=staged_handler,
+        config=QueueConfig(num_workers=1, max_size=10, per_user_limit=5, request_timeout=30),
+    )
+    await q.start()
+
+    # Socket.IO disconnect → cancel_session: one in-flight + one still queued
+    active = asyncio.create_task(q.submit("u1", "s_gone", "active"))
+    queued = asyncio.create_task(q.submit("u1", "s_gone", "queued"))
+    other = asyncio.create_task(q.submit("u2", "s_stay", "other", priority=PRIORITY_BACKGROUND))
+    await asyncio.sleep(0.1)
+    count = await q.cancel_session("s_gone")
+    outcomes = await asyncio.gather(active, queued, return_exceptions=True)
+    await asyncio.sleep(0.05)
+    stopped_early = 0 < stages_run["active"] < 20 and stages_run["queued"] == 0
+    record(
+        "Cancel session (pending + in-flight)",
+        count == 2
+        and all(isinstance(o, RequestCancelled) for o in outcomes)
+        and stopped_early
+        and q.get_stats()["totals"]["aborted"] == 1,
+        f"cancelled={count} stages(active)={stages_run['active']}/20 "
+        f"outcomes={[type(o).__name__ for o in outcomes]}",
+    )
+
+    # HTTP abort → submitter task cancelled while its handler waits on the long LLM call
+    started = time.perf_counter()
+    while stages_run["other"] < 20 and time.perf_counter() - started < 2.0:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    aborted_before = q.get_stats()["totals"]["aborted"]
+    other.cancel()
+    await asyncio.gather(other, return_exceptions=True)
+    while q.get_stats()["current"]["active"] and time.perf_counter() - started < 3.0:
+        await asyncio.sleep(0.01)
+    stats = q.get_stats()
+    record(
+        "Submitter cancelled → in-flight handler aborted",
+        stats["current"]["active"] == 0
+        and stats["totals"]["aborted"] == aborted_before + 1
+        and stats["totals"]["errors"] == 0,
+        f"active={stats['current']['active']} aborted={stats['totals']['aborted']} "
+        f"after {time.perf_counter() - started:.2f}s (LLM call would take 5s)",
+    )
+
+    result = await q.submit("u3", "s_new", "fresh", llm_delay=0.01)
+    record("Queue keeps serving after cancellations", "fresh" in result["text"], result["text"])
+    await q.shutdown()
+
+
+async def test_19_deadline_propagation():
+    """Test 19: handler sees the request deadline (queue budget minus reserve, or the caller's tighter one)"""
+    seen = {}
+
+    async def deadline_handler(msg, session_id, emit_fn=None, **kwargs):
+        deadline = current_deadline()
+        seen[msg] = deadline.remaining() if deadline is not None else None
+        # Stage decision as in ask_llm: skip optional work when the budget is short
+        skipped = deadline is not None and not deadline.allows(1.5)
+        return {"text": msg, "skipped_optional": skipped, "tokens": {}, "trace_id": msg}
+
+    q = LLMRequestQueue(
+        handler_fn=deadline_handler,
+        config=QueueConfig(num_workers=2, request_timeout=10, deadline_reserve=1.0),
+    )
+    await q.start()
+
+    queue_budget = await q.submit("u1", "s1", "queue_budget")
+    with deadline_scope(Deadline.within(0.6, 1.0)):  # voice turn: 600ms, reserve capped at 20%
+        voice = await q.submit("u2", "s2", "voice")
+    record(
+        "Queue deadline = request_timeout - reserve",
+        seen["queue_budget"] is not None and 8.5 < seen["queue_budget"] <= 9.0
+        and not queue_budget["skipped_optional"],
+        f"remaining at dispatch={seen['queue_budget']:.3f}s (timeout=10s reserve=1s)",
+    )
+    record(
+        "Tighter caller deadline wins + optional work skipped",
+        seen["voice"] is not None and seen["voice"] <= 0.48 and voice["skipped_optional"],
+        f"remaining at dispatch={seen['voice']:.3f}s (budget=0.6s)",
+    )
+
+    short = Deadline.within(0.6, 1.0)
+    record(
+        "Deadline budget helpers",
+        abs(short.budget_s - 0.48) < 1e-9 and short.allows(0.2) and not short.allows(1.5)
+        and not short.expired and current_deadline() is None,
+        f"budget={short.budget_s:.2f}s allows(0.2)={short.allows(0.2)} allows(1.5)={short.allows(1.5)}",
+    )
+    await q.shutdown()
+
+    # Admission uses the request's own deadline: a 0.6s voice turn behind ~1s of backlog is shed
+    # immediately even though the queue-wide request_timeout (30s) would admit it
+    q = LLMRequestQueue(
+        handler_fn=mock_handler,
+        config=QueueConfig(num_workers=1, request_timeout=30, per_user_limit=100, admission_min_samples=3),
+    )
+    await q.start()
+    for i in range(3):
+        await q.submit("warm", f"w{i}", "warm", delay=0.2)
+    backlog = [asyncio.create_task(q.submit(f"b{i}", f"b{i}", "backlog", delay=0.2)) for i in range(5)]
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    try:
+        with deadline_scope(Deadline.within(0.6, 0.1)):
+            await q.submit("voice", "voice", "voice", delay=0.2)
+        voice_shed = False
+    except QueueOverloadedError:
+        voice_shed = True
+    shed_ms = (time.perf_counter() - started) * 1000
+    web = await q.submit("web", "web", "web", delay=0.2)
+    await asyncio.gather(*backlog)
+    record(
+        "Admission against caller deadline",
+        voice_shed and shed_ms < 100 and web["text"] == "Response to: web",
+        f"voice shed={voice_shed} in {shed_ms:.1f}ms, web admitted (timeout=30s)",
+    )
+    await q.shutdown()
+
+
 # ─────────────────────────────────────────────────────────────────────────── #
 # RUNNER
 # ─────────────────────────────────────────────────────────────────────────── #
@@ -497,10 +1034,19 @@ async def run_all_tests():
         test_8_graceful_shutdown,
         test_9_stats_accuracy,
         test_10_fair_ordering,
+        test_11_mock_llm_overhead,
+        test_12_priority_classes,
+        test_13_user_round_robin,
+        test_14_position_broadcasts,
+        test_15_scheduling_overhead,
+        test_16_admission_control,
+        test_17_elastic_workers,
+        test_18_cancel_on_disconnect,
+        test_19_deadline_propagation,
     ]
 
     logger.info("=" * 60)
-    logger.info("  Queue System Stress Test — 10 tests")
+    logger.info("  Queue System Stress Test — %d tests", len(tests))
     logger.info("=" * 60)
 
     for test_fn in tests:
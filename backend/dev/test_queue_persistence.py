@@ -22,6 +22,11 @@ Queue Persistence & Recovery Test (Redis backend)
 18. Recovery skips empty messages
 19. Format summary age strings
 20. LLMRequestQueue static async methods
+21. WAL: crash keeps only unfinished requests (no shutdown snapshot)
+22. WAL: requests finished before a flush never touch Redis (coalesced)
+23. WAL: submit overhead < 1 ms
+24. WAL: recovery removes only replayed entries
+25. Recovery runs concurrently through the scheduler, reports progress, doesn't starve new traffic
 
 Usage:
     cd backend
@@ -49,12 +54,14 @@ load_dotenv()
 from memory.redis_client import init_redis, close_redis, get_redis
 from queue_manager import LLMRequestQueue, QueueConfig
 from queue_manager.persistence import (
+    QueueWal,
     save_pending_items,
     load_pending_items,
     clear_persisted,
     format_pending_summary,
     format_detailed_list,
     REDIS_QUEUE_KEY,
+    REDIS_WAL_KEY,
 )
 
 logging.basicConfig(
@@ -84,9 +91,9 @@ def record(name, success, detail=""):
 
 
 async def clear_test_key():
-    """Clear the Redis queue key before each test."""
+    """Clear the Redis queue keys (snapshot + WAL) before each test."""
     r = get_redis()
-    await r.delete(REDIS_QUEUE_KEY)
+    await r.delete(REDIS_QUEUE_KEY, REDIS_WAL_KEY)
 
 
 def sample_items(n=5):
@@ -504,6 +511,152 @@ async def test_20_static_methods():
     record("Static methods", ok1 and ok2 and ok3 and ok4, f"check={ok1} summary={ok2} detail={ok3} clear={ok4}")
 
 
+async def test_21_wal_crash_keeps_unfinished():
+    """Test 21: WAL keeps only unfinished requests after a crash"""
+    await clear_test_key()
+
+    async def gated_handler(msg, session_id, emit_fn=None, **kwargs):
+        if msg.startswith("slow"):
+            await asyncio.sleep(30)
+        return {"text": msg, "tokens": {}}
+
+    q = LLMRequestQueue(
+        handler_fn=gated_handler,
+        config=QueueConfig(num_workers=1, request_timeout=60, wal_flush_interval=0.01),
+    )
+    await q.start()
+
+    fast = await q.submit("user_fast", "sess_fast", "fast answer")
+    tasks = [
+        asyncio.create_task(q.submit(f"user_{i}", f"sess_{i}", f"slow_{i}"))
+        for i in range(3)
+    ]
+    await asyncio.sleep(0.3)
+
+    # "Crash": no shutdown / no snapshot — only what the WAL already flushed survives
+    state = await load_pending_items()
+    msgs = sorted(item["msg"] for item in (state or {}).get("items", []))
+    ok = fast["text"] == "fast answer" and msgs == ["slow_0", "slow_1", "slow_2"]
+    record("WAL keeps unfinished after crash", ok, f"persisted={msgs}")
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await q.shutdown()
+    await clear_persisted()
+
+
+async def test_22_wal_coalesces_fast_requests():
+    """Test 22: Requests finished before a flush never reach Redis"""
+    await clear_test_key()
+
+    q = LLMRequestQueue(
+        handler_fn=mock_handler,
+        config=QueueConfig(num_workers=4, wal_flush_interval=1.0),
+    )
+    await q.start()
+    await asyncio.gather(*[q.submit(f"user_{i}", f"sess_{i}", f"q{i}") for i in range(8)])
+    await asyncio.sleep(0.05)
+
+    wal = q.get_stats()["persistence"]
+    r = get_redis()
+    entries = await r.hlen(REDIS_WAL_KEY)
+    ok = wal["coalesced"] == 8 and wal["flushes"] == 0 and entries == 0
+    record("WAL coalesces fast requests", ok, f"wal={wal} entries={entries}")
+    await q.shutdown()
+
+
+async def test_23_wal_submit_overhead():
+    """Test 23: WAL adds < 1 ms to submit"""
+    await clear_test_key()
+
+    wal = QueueWal(flush_interval=0.01)
+    wal.start()
+    record_item = sample_items(1)[0]
+    n = 5000
+    start = time.perf_counter()
+    for i in range(n):
+        wal.append(f"bench_{i}", record_item)
+    for i in range(0, n, 2):
+        wal.remove(f"bench_{i}")
+    per_op_us = (time.perf_counter() - start) / (n * 1.5) * 1_000_000
+    await asyncio.sleep(0.1)
+    r = get_redis()
+    entries = await r.hlen(REDIS_WAL_KEY)
+    await wal.close()
+
+    ok = per_op_us < 1000 and entries == n // 2
+    record("WAL submit overhead", ok, f"{per_op_us:.1f} µs/op, flushed entries={entries}")
+    await clear_test_key()
+
+
+async def test_24_recovery_removes_replayed_only():
+    """Test 24: Recovery removes only the entries it replayed"""
+    await clear_test_key()
+    r = get_redis()
+    items = sample_items(3)
+    await r.hset(REDIS_WAL_KEY, mapping={item["request_id"]: json.dumps(item) for item in items})
+    await r.hset(REDIS_WAL_KEY, "live_request", json.dumps({
+        "request_id": "live_request", "user_id": "u", "session_id": "s", "msg": "new traffic",
+    }))
+
+    state = await LLMRequestQueue.check_pending_on_disk()
+    ok1 = state is not None and state["count"] == 4
+
+    q = LLMRequestQueue(handler_fn=mock_handler, config=QueueConfig(num_workers=2))
+    await q.start()
+    await q.recover_pending(items)
+    remaining = await r.hkeys(REDIS_WAL_KEY)
+    ok2 = remaining == ["live_request"]
+    record("Recovery removes replayed WAL entries only", ok1 and ok2, f"loaded={state and state['count']} remaining={remaining}")
+    await q.shutdown()
+    await clear_test_key()
+
+
+async def test_25_recovery_concurrent_background():
+    """Test 25: Recovery re-queues concurrently at background priority"""
+    await clear_test_key()
+    order = []
+
+    async def timed_handler(msg, session_id, emit_fn=None, **kwargs):
+        order.append(msg)
+        await asyncio.sleep(0.2)
+        return {"text": f"ตอบ: {msg}", "tokens": {}}
+
+    q = LLMRequestQueue(
+        handler_fn=timed_handler,
+        config=QueueConfig(
+            num_workers=2, recovery_concurrency=4, recovery_rate=0,
+            recovery_report_interval=0.1,
+        ),
+    )
+    await q.start()
+
+    items = sample_items(8)
+    start = time.perf_counter()
+    recovery = asyncio.create_task(q.recover_pending(items, send_fb_text_fn=mock_send_fb))
+    await asyncio.sleep(0.1)
+    progress = q.get_stats()["recovery"]
+    live = await q.submit("live_user", "live_sess", "new web question")
+    result = await recovery
+    elapsed = time.perf_counter() - start
+
+    backlog_after_live = order.index("new web question")
+    background = q.get_stats()["classes"].get("background", {})
+    final = q.get_stats()["recovery"]
+    ok1 = result["processed"] == 8 and result["errors"] == 0 and elapsed < 8 * 0.2 * 0.75
+    ok2 = progress["running"] and progress["in_flight"] == 4 and final["done"] == 8 and not final["running"]
+    ok3 = live["text"] == "ตอบ: new web question" and backlog_after_live <= 4
+    ok4 = background.get("dispatched") == 8
+    record(
+        "Concurrent background recovery",
+        ok1 and ok2 and ok3 and ok4,
+        f"elapsed={elapsed:.2f}s in_flight={progress['in_flight']} live_at={backlog_after_live} "
+        f"background_dispatched={background.get('dispatched')}",
+    )
+    await q.shutdown()
+
+
 # ─────────────────────────────────────────────────────────────────────────── #
 # RUNNER
 # ─────────────────────────────────────────────────────────────────────────── #
@@ -538,10 +691,15 @@ async def run_all_tests():
         test_17_nonexistent_load,
         test_18_recovery_skips_empty_msg,
         test_20_static_methods,
+        test_21_wal_crash_keeps_unfinished,
+        test_22_wal_coalesces_fast_requests,
+        test_23_wal_submit_overhead,
+        test_24_recovery_removes_replayed_only,
+        test_25_recovery_concurrent_background,
     ]
 
     logger.info("=" * 60)
-    logger.info("  Queue Persistence & Recovery Test (Redis) — 20 tests")
+    logger.info("  Queue Persistence & Recovery Test (Redis) — 25 tests")
     logger.info("=" * 60)
 
     for test_fn in sync_tests:
@@ -0,0 +1,181 @@
+"""
+Quota Limiter Test — ทดสอบ shared token-bucket quota ของ LLM (priority classes)
+
+ใช้ in-process bucket (use_redis=False) เพื่อให้รันได้โดยไม่ต้องมี Redis;
+Lua script ใน Redis ใช้สูตรเดียวกัน
+
+ทดสอบ:
+1. Interactive ใช้ quota ได้เต็ม bucket
+2. Ingest / refresh หยุดที่ reserve floor ของตัวเอง
+3. Interactive รอไม่เกิน max wait แล้วปล่อยผ่าน
+4. TPM: settle คืน token ที่ประมาณเกิน
+5. Priority context ไหลผ่าน create_task
+6. Bucket ที่ไม่กำหนด limit = ไม่จำกัด (is_limited=False → ผู้เรียกเว้นระยะเอง)
+
+Usage:
+    cd backend
+    python dev/test_quota_limiter.py
+"""
+
+import asyncio
+import logging
+import sys
+import time
+import traceback
+
+sys.path.insert(0, ".")
+from app.utils.llm.quota_limiter import (
+    PRIORITY_INGEST,
+    PRIORITY_REFRESH,
+    QuotaLimiter,
+    current_priority,
+    llm_priority,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("QuotaLimiterTest")
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+def make_limiter(rpm=0, tpm=0, **kwargs):
+    return QuotaLimiter(limits={"openai": (rpm, tpm)}, use_redis=False, **kwargs)
+
+
+async def _grants(limiter, count, **kwargs):
+    results = []
+    for _ in range(count):
+        results.append(await limiter.acquire("openai", "key-a", max_wait_s=0.05, **kwargs))
+    return results
+
+
+async def test_1_interactive_full_bucket():
+    """Test 1: interactive can drain the whole bucket"""
+    limiter = make_limiter(rpm=10)
+    results = await _grants(limiter, 11)
+    ok = results[:10] == [True] * 10 and results[10] is False
+    record("Interactive full bucket", ok, f"granted={sum(results)}")
+
+
+async def test_2_background_reserve():
+    """Test 2: refresh / ingest stop at their reserve floor"""
+    limiter = make_limiter(rpm=10, reserves={PRIORITY_REFRESH: 0.3, PRIORITY_INGEST: 0.5})
+    ingest = await _grants(limiter, 10, priority=PRIORITY_INGEST)
+    refresh = await _grants(limiter, 10, priority=PRIORITY_REFRESH)
+    interactive = await _grants(limiter, 10)
+    ok = sum(ingest) == 5 and sum(refresh) == 2 and sum(interactive) == 3
+    record(
+        "Background reserve",
+        ok,
+        f"ingest={sum(ingest)} refresh={sum(refresh)} interactive={sum(interactive)}",
+    )
+
+
+async def test_3_interactive_max_wait():
+    """Test 3: interactive gives up after max wait instead of blocking"""
+    limiter = make_limiter(rpm=1, interactive_max_wait_s=0.2)
+    await limiter.acquire("openai", "key-a")
+    started = time.perf_counter()
+    granted = await limiter.acquire("openai", "key-a")
+    elapsed = time.perf_counter() - started
+    stats = (await limiter.get_stats())["process"]["interactive"]
+    ok = granted is False and elapsed < 0.5 and stats["timeouts"] == 1
+    record("Interactive max wait", ok, f"elapsed={elapsed:.2f}s stats={stats}")
+
+
+async def test_4_tpm_settle():
+    """Test 4: settle refunds over-estimated tokens"""
+    limiter = make_limiter(tpm=1000)
+    first = await limiter.acquire("openai", "key-a", 800, max_wait_s=0.05)
+    blocked = await limiter.acquire("openai", "key-a", 800, max_wait_s=0.05)
+    await limiter.settle("openai", "key-a", 800, 100)  # used 100, refund 700
+    after_refund = await limiter.acquire("openai", "key-a", 800, max_wait_s=0.05)
+    ok = first and not blocked and after_refund
+    record("TPM settle", ok, f"first={first} blocked={not blocked} after_refund={after_refund}")
+
+
+async def test_5_priority_context():
+    """Test 5: priority context flows into spawned tasks"""
+    seen = {}
+
+    async def child():
+        seen["child"] = current_priority()
+
+    with llm_priority(PRIORITY_REFRESH):
+        await asyncio.create_task(child())
+        seen["inside"] = current_priority()
+    seen["outside"] = current_priority()
+    ok = seen == {"child": "refresh", "inside": "refresh", "outside": "interactive"}
+    record("Priority context", ok, str(seen))
+
+
+async def test_6_unlimited_bucket():
+    """Test 6: provider without limits is a no-op"""
+    limiter = make_limiter()
+    results = await _grants(limiter, 100, priority=PRIORITY_INGEST)
+    stats = await limiter.get_stats()
+    # is_limited=False → ผู้เรียก (FAQ refresh) ต้องเว้นระยะเอง
+    limited = make_limiter(rpm=10).is_limited("openai")
+    ok = all(results) and not stats["buckets"] and not limiter.is_limited("openai") and limited
+    record("Unlimited bucket", ok, f"granted={sum(results)} is_limited(unlimited)={limiter.is_limited('openai')}")
+
+
+async def run_all_tests():
+    tests = [
+        test_1_interactive_full_bucket,
+        test_2_background_reserve,
+        test_3_interactive_max_wait,
+        test_4_tpm_settle,
+        test_5_priority_context,
+        test_6_unlimited_bucket,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Quota Limiter Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            await test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
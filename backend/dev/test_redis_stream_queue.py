@@ -0,0 +1,478 @@
+"""
+Redis Streams Queue Backend Test — หลาย node ใช้คิวเดียวกันผ่าน consumer group
+
+ทดสอบ:
+1. Cross-node flow: submit บน node A (ไม่มี worker) → node B ประมวลผล → ผลลัพธ์ + streaming emits กลับผ่าน pub/sub
+2. Per-user limit ทั้ง cluster (submit จาก 2 node)
+3. Capacity (max_size) ทั้ง cluster
+4. Handler error ส่งกลับเป็น RemoteHandlerError (worker ไม่ตาย)
+5. Cancel pending request → ตัวนับคืน, worker ข้าม entry
+6. Timeout → QueueTimeoutError + cleanup ตัวนับ
+7. Load spread: 2 worker nodes แบ่งงานกันจาก consumer group
+8. Queue positions + cluster stats
+9. Worker node shutdown ระหว่างประมวลผล → ผู้ส่งได้ error ทันที, node อื่นรับงานที่เหลือ
+10. estimated_wait มาจาก EWMA service time (ไม่ใช่ position * 5)
+
+Usage:
+    cd backend
+    python dev/test_redis_stream_queue.py
+
+Requires:
+    - Redis server running (REDIS_URL env or redis://localhost:6379/0); ข้ามทั้งหมดถ้าเชื่อมต่อไม่ได้
+"""
+
+import asyncio
+import logging
+import os
+import platform
+import sys
+import time
+import traceback
+import uuid
+from collections import Counter
+
+sys.path.insert(0, ".")
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from memory.redis_client import init_redis, close_redis, get_redis
+from queue_manager import (
+    PRIORITY_WEB,
+    QueueConfig,
+    QueueFullError,
+    QueueTimeoutError,
+    RedisStreamQueue,
+    RemoteHandlerError,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("RedisQueueTest")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# ─────────────────────────────────────────────────────────────────────────── #
+# TEST INFRASTRUCTURE
+# ─────────────────────────────────────────────────────────────────────────── #
+passed = 0
+failed = 0
+test_results = []
+prefixes = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+def new_prefix() -> str:
+    prefix = f"reg01:qtest:{uuid.uuid4().hex[:8]}"
+    prefixes.append(prefix)
+    return prefix
+
+
+def make_node(prefix, node_id, handler=None, **config):
+    config.setdefault("request_timeout", 10)
+    config.setdefault("position_broadcast_interval", 0.05)
+    return RedisStreamQueue(
+        handler_fn=handler or mock_handler,
+        config=QueueConfig(**config),
+        redis_fn=get_redis,
+        prefix=prefix,
+        node_id=node_id,
+        block_ms=200,
+        stats_refresh_interval=0.2,
+    )
+
+
+async def counters(prefix):
+    r = get_redis()
+    return {
+        "depth": int(await r.get(f"{prefix}:depth") or 0),
+        "users": await r.hgetall(f"{prefix}:users"),
+        "class_pending": {k: int(v) for k, v in (await r.hgetall(f"{prefix}:class_pending")).items()},
+    }
+
+
+async def cleanup_keys():
+    r = get_redis()
+    for prefix in prefixes:
+        keys = [key async for key in r.scan_iter(match=f"{prefix}:*")]
+        if keys:
+            await r.delete(*keys)
+
+
+# ─────────────────────────────────────────────────────────────────────────── #
+# MOCK HANDLERS
+# ─────────────────────────────────────────────────────────────────────────── #
+processed_by = Counter()
+
+
+async def mock_handler(msg, session_id, emit_fn=None, **kwargs):
+    await asyncio.sleep(kwargs.get("delay", 0.05))
+    if kwargs.get("should_fail"):
+        raise RuntimeError(f"Simulated handler error for {session_id}")
+    if emit_fn and kwargs.get("stream"):
+        for word in msg.split():
+            await emit_fn("ai_response_delta", {"delta": word})
+    processed_by[kwargs.get("tag", "")] += 1
+    return {"text": f"Response to: {msg}", "tokens": {"total_tokens": 3}}
+
+
+def tagged_handler(tag):
+    async def _handler(msg, session_id, emit_fn=None, **kwargs):
+        processed_by[tag] += 1
+        await asyncio.sleep(kwargs.get("delay", 0.05))
+        return {"text": f"{tag}: {msg}", "tokens": {}}
+    return _handler
+
+
+# ─────────────────────────────────────────────────────────────────────────── #
+# TEST CASES
+# ─────────────────────────────────────────────────────────────────────────── #
+async def test_1_cross_node_flow():
+    """Test 1: Cross-node result + streamed emits"""
+    prefix = new_prefix()
+    front = make_node(prefix, "front", num_workers=0)
+    worker = make_node(prefix, "worker", num_workers=2)
+    await front.start()
+    await worker.start()
+
+    events = []
+
+    async def emit(event, payload):
+        events.append((event, payload))
+
+    try:
+        result = await front.submit("u1", "s1", "สวัสดี ครับ ทดสอบ", emit_fn=emit, priority=PRIORITY_WEB, stream=True)
+        await asyncio.sleep(0.1)
+        deltas = [p["delta"] for e, p in events if e == "ai_response_delta"]
+        processing = [p for e, p in events if e == "queue_position" and p.get("status") == "processing"]
+        c = await counters(prefix)
+        ok = (
+            result["text"] == "Response to: สวัสดี ครับ ทดสอบ"
+            and deltas == ["สวัสดี", "ครับ", "ทดสอบ"]
+            and len(processing) == 1
+            and c["depth"] == 0 and not c["users"]
+        )
+        record("Cross-node flow", ok, f"deltas={deltas} processing={len(processing)} counters={c}")
+    finally:
+        await front.shutdown()
+        await worker.shutdown()
+
+
+async def test_2_cluster_per_user_limit():
+    """Test 2: Per-user limit across nodes"""
+    prefix = new_prefix()
+    a = make_node(prefix, "a", num_workers=1, per_user_limit=2)
+    b = make_node(prefix, "b", num_workers=1, per_user_limit=2)
+    await a.start()
+    await b.start()
+    try:
+        t1 = asyncio.create_task(a.submit("same", "s1", "one", delay=0.5))
+        t2 = asyncio.create_task(b.submit("same", "s2", "two", delay=0.5))
+        await asyncio.sleep(0.1)
+        rejected = False
+        try:
+            await a.submit("same", "s3", "three")
+        except QueueFullError:
+            rejected = True
+        other = await b.submit("other", "s4", "four")
+        results = await asyncio.gather(t1, t2)
+        c = await counters(prefix)
+        ok = rejected and other["text"] == "Response to: four" and len(results) == 2 and not c["users"]
+        record("Cluster per-user limit", ok, f"rejected={rejected} counters={c}")
+    finally:
+        await a.shutdown()
+        await b.shutdown()
+
+
+async def test_3_cluster_capacity():
+    """Test 3: max_size across nodes"""
+    prefix = new_prefix()
+    a = make_node(prefix, "a", num_workers=0, max_size=3, per_user_limit=10)
+    b = make_node(prefix, "b", num_workers=0, max_size=3, per_user_limit=10)
+    await a.start()
+    await b.start()
+    tasks = [
+        asyncio.create_task((a if i % 2 else b).submit(f"u{i}", f"s{i}", f"m{i}"))
+        for i in range(3)
+    ]
+    await asyncio.sleep(0.1)
+    rejected = False
+    try:
+        await a.submit("u9", "s9", "overflow")
+    except QueueFullError:
+        rejected = True
+    worker = make_node(prefix, "worker", num_workers=3, max_size=3, per_user_limit=10)
+    await worker.start()
+    try:
+        results = await asyncio.gather(*tasks)
+        record("Cluster capacity", rejected and len(results) == 3, f"rejected={rejected}")
+    finally:
+        for node in (a, b, worker):
+            await node.shutdown()
+
+
+async def test_4_remote_error():
+    """Test 4: Handler error isolation"""
+    prefix = new_prefix()
+    front = make_node(prefix, "front", num_workers=0)
+    worker = make_node(prefix, "worker", num_workers=1)
+    await front.start()
+    await worker.start()
+    try:
+        error = None
+        try:
+            await front.submit("u1", "s1", "boom", should_fail=True)
+        except RemoteHandlerError as exc:
+            error = str(exc)
+        after = await front.submit("u1", "s2", "still alive")
+        ok = error is not None and "Simulated handler error" in error and after["text"] == "Response to: still alive"
+        record("Remote handler error", ok, f"error={error!r}")
+    finally:
+        await front.shutdown()
+        await worker.shutdown()
+
+
+async def test_5_cancel_pending():
+    """Test 5: Cancel pending request"""
+    prefix = new_prefix()
+    front = make_node(prefix, "front", num_workers=0)
+    await front.start()
+    task = asyncio.create_task(front.submit("u1", "s1", "cancel me"))
+    await asyncio.sleep(0.1)
+    request_id = next(iter(front._waiting))
+    worker = None
+    try:
+        cancelled = await front.cancel(request_id)
+        try:
+            await task
+            raised = False
+        except asyncio.CancelledError:
+            raised = True
+        c = await counters(prefix)
+        processed_by.clear()
+        worker = make_node(prefix, "worker", num_workers=1)
+        await worker.start()
+        await asyncio.sleep(0.5)
+        stream_len = await get_redis().xlen(f"{prefix}:s:{PRIORITY_WEB}")
+        ok = cancelled and raised and c["depth"] == 0 and not c["users"] and not processed_by and stream_len == 0
+        record("Cancel pending", ok, f"cancelled={cancelled} raised={raised} counters={c} stream_len={stream_len}")
+    finally:
+        await front.shutdown()
+        if worker:
+            await worker.shutdown()
+
+
+async def test_6_timeout():
+    """Test 6: Timeout cleans cluster counters"""
+    prefix = new_prefix()
+    front = make_node(prefix, "front", num_workers=0, request_timeout=0.3)
+    await front.start()
+    try:
+        timed_out = False
+        try:
+            await front.submit("u1", "s1", "no workers anywhere")
+        except QueueTimeoutError:
+            timed_out = True
+        c = await counters(prefix)
+        record("Timeout cleanup", timed_out and c["depth"] == 0 and not c["users"], f"counters={c}")
+    finally:
+        await front.shutdown()
+
+
+async def test_7_load_spread():
+    """Test 7: Consumer group spreads load over worker nodes"""
+    prefix = new_prefix()
+    processed_by.clear()
+    front = make_node(prefix, "front", num_workers=0, per_user_limit=50, max_size=100)
+    b = make_node(prefix, "b", handler=tagged_handler("b"), num_workers=4)
+    c = make_node(prefix, "c", handler=tagged_handler("c"), num_workers=4)
+    for node in (front, b, c):
+        await node.start()
+    try:
+        start = time.time()
+        results = await asyncio.gather(*[
+            front.submit(f"user{i % 10}", f"s{i}", f"m{i}", delay=0.1) for i in range(40)
+        ])
+        elapsed = time.time() - start
+        ok = len(results) == 40 and processed_by["b"] > 0 and processed_by["c"] > 0
+        record("Load spread", ok, f"b={processed_by['b']} c={processed_by['c']} elapsed={elapsed:.2f}s")
+    finally:
+        for node in (front, b, c):
+            await node.shutdown()
+
+
+async def test_8_positions_and_stats():
+    """Test 8: Positions + cluster stats"""
+    prefix = new_prefix()
+    front = make_node(prefix, "front", num_workers=0, per_user_limit=10)
+    await front.start()
+    tasks = [asyncio.create_task(front.submit(f"u{i}", f"s{i}", f"m{i}")) for i in range(3)]
+    await asyncio.sleep(0.4)
+    worker = None
+    try:
+        positions = sorted([await front.get_position(rid) for rid in front._waiting])
+        stats = front.get_stats()
+        worker = make_node(prefix, "worker", num_workers=3)
+        await worker.start()
+        await asyncio.gather(*tasks)
+        await asyncio.sleep(0.4)
+        after = front.get_stats()
+        ok = (
+            positions == [1, 2, 3]
+            and stats["current"]["pending"] == 3
+            and stats["backend"] == "redis_streams"
+            and after["current"]["pending"] == 0
+            and after["totals"]["processed"] == 3
+        )
+        record(
+            "Positions + stats", ok,
+            f"positions={positions} pending={stats['current']['pending']} "
+            f"after={after['current']} totals={after['totals']}",
+        )
+    finally:
+        await front.shutdown()
+        if worker:
+            await worker.shutdown()
+
+
+async def test_9_worker_shutdown():
+    """Test 9: Worker node shutdown mid-request"""
+    prefix = new_prefix()
+    front = make_node(prefix, "front", num_workers=0, per_user_limit=10)
+    b = make_node(prefix, "b", num_workers=1)
+    await front.start()
+    await b.start()
+    first = asyncio.create_task(front.submit("u1", "s1", "long", delay=2.0))
+    await asyncio.sleep(0.3)
+    second = asyncio.create_task(front.submit("u2", "s2", "next"))
+    await asyncio.sleep(0.1)
+    c = None
+    try:
+        start = time.time()
+        await b.shutdown()
+        try:
+            await first
+            aborted = False
+        except RemoteHandlerError:
+            aborted = True
+        abort_latency = time.time() - start
+        c = make_node(prefix, "c", num_workers=1)
+        await c.start()
+        result = await second
+        ok = aborted and abort_latency < 1.0 and result["text"] == "Response to: next"
+        record("Worker node shutdown", ok, f"aborted={aborted} latency={abort_latency:.2f}s")
+    finally:
+        await front.shutdown()
+        if c:
+            await c.shutdown()
+
+
+async def test_10_estimated_wait_from_service_time():
+    """Test 10: estimated_wait follows observed service time (not position * 5)"""
+    prefix = new_prefix()
+    node = make_node(prefix, "solo", num_workers=1, per_user_limit=10, default_service_time=5.0)
+    await node.start()
+    events = []
+
+    def collector(tag):
+        async def _emit(event, payload):
+            events.append((tag, event, payload))
+        return _emit
+
+    try:
+        await node.submit("warm", "s-warm", "warmup", delay=0.2)
+        tasks = [
+            asyncio.create_task(node.submit(f"u{i}", f"s{i}", f"m{i}", collector(i), delay=0.2))
+            for i in range(3)
+        ]
+        await asyncio.gather(*tasks)
+        queued = [
+            payload for _, event, payload in events
+            if event == "queue_position" and payload.get("status") == "queued"
+        ]
+        deep = [payload for payload in queued if payload["position"] >= 2]
+        service = node.get_stats()["service_time"]
+        ok = (
+            bool(deep)
+            and service["samples"] >= 4
+            and all(0 < payload["estimated_wait"] < payload["position"] for payload in deep)
+        )
+        record(
+            "Estimated wait from service time", ok,
+            f"queued={[(p['position'], p['estimated_wait']) for p in queued]} overall_ms={service['overall_ms']}",
+        )
+    finally:
+        await node.shutdown()
+
+
+# ─────────────────────────────────────────────────────────────────────────── #
+# RUNNER
+# ─────────────────────────────────────────────────────────────────────────── #
+async def run_all_tests():
+    try:
+        await init_redis(REDIS_URL)
+    except Exception as exc:
+        logger.warning("Redis not reachable at %s (%s) — skipping", REDIS_URL, exc)
+        return True
+
+    tests = [
+        test_1_cross_node_flow,
+        test_2_cluster_per_user_limit,
+        test_3_cluster_capacity,
+        test_4_remote_error,
+        test_5_cancel_pending,
+        test_6_timeout,
+        test_7_load_spread,
+        test_8_positions_and_stats,
+        test_9_worker_shutdown,
+        test_10_estimated_wait_from_service_time,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Redis Streams Queue Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    try:
+        for test_fn in tests:
+            name = test_fn.__doc__ or test_fn.__name__
+            logger.info(f"\n▶ {name}")
+            try:
+                await asyncio.wait_for(test_fn(), timeout=30)
+            except Exception as e:
+                record(name, False, f"CRASH: {e}")
+                traceback.print_exc()
+    finally:
+        await cleanup_keys()
+        await close_redis()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
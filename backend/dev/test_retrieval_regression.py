@@ -5,6 +5,8 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from retriever.context_selector import retrieve_top_k_chunks
+from retriever.hybrid_retriever import HybridRetriever
+from retriever.reranker import _get_cross_encoder, rerank_chunks_batch
 
 
 CASES = [
@@ -14,6 +16,18 @@ CASES = [
     "สอบ CMU-eGrad ปี 2568 วันไหน",
 ]
 
+# Fixed corpus: batch scoring is checked against the reference implementations,
+# independent of the indexed documents
+CORPUS = [
+    {"source": "calendar.pdf", "index": 0, "chunk": "ปฏิทินการศึกษา ภาคเรียนที่ 2/2568 เปิดเทอม วันที่ 10 พฤศจิกายน 2568"},
+    {"source": "calendar.pdf", "index": 1, "chunk": "ถอนกระบวนวิชาโดยได้รับอักษร W ภาคเรียนที่ 2/2568 ภายในวันที่ 20 กุมภาพันธ์ 2569"},
+    {"source": "fee.pdf", "index": 2, "chunk": "ชำระค่าธรรมเนียมการศึกษา ค่าเทอม ผ่าน QR Code ได้ถึงเวลา 23.00 น. ของวันสุดท้าย"},
+    {"source": "fee.pdf", "index": 3, "chunk": "ค่าเทอม ค่าเทอม ค่าธรรมเนียม ชำระผ่านธนาคาร หรือ QR Code payment"},
+    {"source": "egrad.pdf", "index": 4, "chunk": "สอบ CMU-eGrad ปี 2568 สมัครสอบออนไลน์ สอบวันที่ 15 มีนาคม 2568"},
+    {"source": "egrad.pdf", "index": 5, "chunk": "CMU-eGrad English proficiency test schedule 2568 and registration"},
+    {"source": "misc.pdf", "index": 6, "chunk": "ติดต่อสำนักทะเบียนและประมวลผล วันจันทร์ถึงวันศุกร์"},
+]
+
 
 def test_retrieval_regression_non_empty():
     for query in CASES:
@@ -28,9 +42,57 @@ def test_retrieval_regression_non_empty():
         assert len(chunks) > 0, f"retrieval empty for query: {query}"
 
 
+def test_bm25_batch_matches_okapi():
+    retriever = HybridRetriever()
+    retriever.build_index(CORPUS)
+    queries = CASES + ["ค่าเทอม ค่าเทอม QR Code"]  # duplicate query tokens
+    batch = retriever.bm25_search_batch(queries, k=len(CORPUS))
+    assert len(batch) == len(queries)
+    for query, results in zip(queries, batch):
+        expected = retriever.bm25_index.get_scores(retriever._tokenize(query))
+        got = {chunk["index"]: score for chunk, score in results}
+        for idx, score in enumerate(expected):
+            if score > 0:
+                assert abs(got.get(idx, 0.0) - score) < 1e-9, f"BM25 score mismatch doc={idx} query: {query}"
+            else:
+                assert idx not in got, f"zero-score doc={idx} returned for query: {query}"
+        ranked = [chunk["index"] for chunk, _ in results]
+        assert ranked == sorted(ranked, key=lambda idx: -expected[idx]), f"BM25 order mismatch for query: {query}"
+
+
+def test_rerank_batch_matches_per_query():
+    encoder = _get_cross_encoder()
+    if encoder is None:
+        print("rerank check skipped (cross-encoder not available)")
+        return
+    retriever = HybridRetriever()
+    retriever.build_index(CORPUS)
+    candidates = retriever.bm25_search_batch(CASES, k=5)
+    batch = rerank_chunks_batch(CASES, candidates, top_k=3)
+    for query, query_candidates, reranked in zip(CASES, candidates, batch):
+        if len(query_candidates) <= 1:
+            continue
+        # Independent scoring: one predict call per query over the same candidates
+        scores = encoder.predict(
+            [(query, chunk.get("chunk", "")[:1000]) for chunk, _ in query_candidates],
+            show_progress_bar=False,
+        )
+        expected = sorted(
+            ((chunk["index"], float(score)) for (chunk, _), score in zip(query_candidates, scores)),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:3]
+        got = [(chunk["index"], score) for chunk, score in reranked]
+        assert [idx for idx, _ in got] == [idx for idx, _ in expected], f"rerank order mismatch for query: {query}"
+        for (_, got_score), (_, expected_score) in zip(got, expected):
+            assert abs(got_score - expected_score) < 1e-4, f"rerank score mismatch for query: {query}"
+
+
 def main() -> int:
     try:
         test_retrieval_regression_non_empty()
+        test_bm25_batch_matches_okapi()
+        test_rerank_batch_matches_per_query()
         print(f"retrieval_regression PASS ({len(CASES)} cases)")
         return 0
     except AssertionError as exc:
@@ -0,0 +1,300 @@
+"""
+Single-Flight Test — ทดสอบการรวมคำถามเดียวกันที่กำลังประมวลผลพร้อมกัน
+
+ทดสอบ:
+1. Identical concurrent calls share one run
+2. Different keys run independently
+3. Streaming deltas fan out (late joiner gets replay in order)
+4. Leader error propagates to every waiter
+5. Cancelling one waiter does not cancel the shared run
+6. Key normalization (whitespace / case / trailing '?')
+7. Cancelling the leader while a follower is still replaying deltas
+8. ask_llm: concurrent first turns share one generation; a turn with history runs its own
+
+Usage:
+    cd backend
+    python dev/test_single_flight.py
+"""
+
+import asyncio
+import logging
+import sys
+import traceback
+
+sys.path.insert(0, ".")
+from app.utils.llm.single_flight import SingleFlight, make_flight_key
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("SingleFlightTest")
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+async def test_1_coalesce_identical():
+    """Test 1: 20 identical concurrent calls → 1 run"""
+    flights = SingleFlight("test")
+    calls = {"n": 0}
+
+    async def work(publish):
+        calls["n"] += 1
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    results = await asyncio.gather(*[flights.run("k", work) for _ in range(20)])
+    shared = sum(1 for _, is_shared in results if is_shared)
+    stats = flights.get_stats()
+    ok = (
+        calls["n"] == 1
+        and all(result == "answer" for result, _ in results)
+        and shared == 19
+        and stats["coalesced"] == 19
+        and stats["in_flight"] == 0
+    )
+    record("Coalesce identical", ok, f"runs={calls['n']} shared={shared} stats={stats}")
+
+
+async def test_2_distinct_keys():
+    """Test 2: different keys do not coalesce"""
+    flights = SingleFlight("test")
+    calls = {"n": 0}
+
+    async def work(publish):
+        calls["n"] += 1
+        await asyncio.sleep(0.05)
+        return calls["n"]
+
+    await asyncio.gather(flights.run("a", work), flights.run("b", work), flights.run("c", work))
+    ok = calls["n"] == 3 and flights.get_stats()["coalesced"] == 0
+    record("Distinct keys", ok, f"runs={calls['n']}")
+
+
+async def test_3_delta_fanout():
+    """Test 3: deltas fan out, late joiner receives replay in order"""
+    flights = SingleFlight("test")
+    tokens = ["a", "b", "c", "d"]
+
+    async def work(publish):
+        for token in tokens:
+            await publish(token)
+            await asyncio.sleep(0.02)
+        return "".join(tokens)
+
+    early, late = [], []
+
+    async def early_listener(delta):
+        early.append(delta)
+
+    async def late_listener(delta):
+        late.append(delta)
+
+    async def join_late():
+        await asyncio.sleep(0.03)
+        return await flights.run("k", work, listener=late_listener)
+
+    await asyncio.gather(flights.run("k", work, listener=early_listener), join_late())
+    ok = early == tokens and late == tokens
+    record("Delta fan-out", ok, f"early={early} late={late}")
+
+
+async def test_4_error_propagates():
+    """Test 4: leader error reaches every waiter"""
+    flights = SingleFlight("test")
+
+    async def work(publish):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("provider down")
+
+    results = await asyncio.gather(*[flights.run("k", work) for _ in range(5)], return_exceptions=True)
+    ok = all(isinstance(r, RuntimeError) for r in results) and flights.get_stats()["in_flight"] == 0
+    record("Error propagates", ok, f"errors={sum(isinstance(r, RuntimeError) for r in results)}")
+
+
+async def test_5_cancel_one_waiter():
+    """Test 5: cancelling the leader's waiter keeps the run alive for followers"""
+    flights = SingleFlight("test")
+
+    async def work(publish):
+        await asyncio.sleep(0.1)
+        return "done"
+
+    leader = asyncio.create_task(flights.run("k", work))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.run("k", work))
+    await asyncio.sleep(0.02)
+    leader.cancel()
+    result, shared = await follower
+    ok = result == "done" and shared and leader.cancelled()
+    record("Cancel one waiter", ok, f"result={result} shared={shared}")
+
+
+async def test_6_key_normalization():
+    """Test 6: normalized question / language / flow config form the key"""
+    base = make_flight_key("เปิดเทอม 2/2568 วันไหน", "th", {"rag": {"top_k": 5}})
+    same = make_flight_key("  เปิดเทอม   2/2568 วันไหน? ", "TH", {"rag": {"top_k": 5}})
+    other_lang = make_flight_key("เปิดเทอม 2/2568 วันไหน", "en", {"rag": {"top_k": 5}})
+    other_flow = make_flight_key("เปิดเทอม 2/2568 วันไหน", "th", {"rag": {"top_k": 3}})
+    ok = base == same and base != other_lang and base != other_flow
+    record("Key normalization", ok, "")
+
+
+async def test_7_cancel_leader_during_replay():
+    """Test 7: leader cancelled while a late follower replays deltas → run survives"""
+    flights = SingleFlight("test")
+    tokens = ["a", "b", "c", "d"]
+    replay_started = asyncio.Event()
+
+    async def work(publish):
+        for token in tokens:
+            await publish(token)
+        await asyncio.sleep(0.1)
+        return "".join(tokens)
+
+    received = []
+
+    async def slow_listener(delta):
+        received.append(delta)
+        replay_started.set()
+        await asyncio.sleep(0.02)  # client emit ช้า → replay ยังไม่จบตอน leader ถูก cancel
+
+    leader = asyncio.create_task(flights.run("k", work))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(flights.run("k", work, listener=slow_listener))
+    await replay_started.wait()
+    leader.cancel()
+    try:
+        result, shared = await follower
+    except asyncio.CancelledError:
+        result, shared = "CancelledError", False
+    ok = result == "abcd" and shared and leader.cancelled() and received == tokens
+    record("Cancel leader during replay", ok, f"result={result} replayed={received}")
+
+
+async def test_8_ask_llm_first_turns():
+    """Test 8: ask_llm — two concurrent first turns run one generation; a turn with history runs its own"""
+    from app.utils.llm import llm as llm_module
+
+    histories = {"s_history": [
+        {"role": "user", "parts": [{"text": "สวัสดีครับ"}]},
+        {"role": "model", "parts": [{"text": "สวัสดีครับ มีอะไรให้ช่วยไหม"}]},
+    ]}
+    prompts = []
+
+    async def get_or_create_history(session_id):
+        return [dict(row) for row in histories.get(session_id, [])]
+
+    async def save_history(session_id, history):
+        return None
+
+    async def no_cache(*args, **kwargs):
+        return None
+
+    async def update_faq(*args, **kwargs):
+        return {"updated": False}
+
+    async def fake_call_llm(system_prompt, user_prompt, on_delta=None, deadline=None):
+        prompts.append(user_prompt)
+        await asyncio.sleep(0.1)
+        return "ตอบ: เปิดเทอมวันที่ 10", {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+
+    patches = {
+        "get_or_create_history": get_or_create_history,
+        "save_history": save_history,
+        "get_greeting_response": no_cache,
+        "get_faq_answer": no_cache,
+        "update_faq": update_faq,
+        "record_trace": lambda trace: None,
+        "retrieve_top_k_chunks": lambda *args, **kwargs: [],
+        "_call_llm": fake_call_llm,
+    }
+    originals = {name: getattr(llm_module, name) for name in patches}
+    for name, value in patches.items():
+        setattr(llm_module, name, value)
+    try:
+        question = "เปิดเทอม 2/2568 วันไหน"
+        first_turns = await asyncio.gather(
+            llm_module.ask_llm(question, "s_first_a"),
+            llm_module.ask_llm(question, "s_first_b"),
+        )
+        first_turn_runs = len(prompts)
+        await asyncio.gather(
+            llm_module.ask_llm(question, "s_first_c"),
+            llm_module.ask_llm(question, "s_history"),
+        )
+    finally:
+        for name, value in originals.items():
+            setattr(llm_module, name, value)
+
+    ok = (
+        first_turn_runs == 1
+        and first_turns[0]["text"] == first_turns[1]["text"]
+        and len(prompts) == 3
+        and sum("สวัสดีครับ" in prompt for prompt in prompts) == 1
+    )
+    record(
+        "ask_llm coalesces first turns only",
+        ok,
+        f"first-turn runs={first_turn_runs} total runs={len(prompts)} (history turn runs alone)",
+    )
+
+
+async def run_all_tests():
+    tests = [
+        test_1_coalesce_identical,
+        test_2_distinct_keys,
+        test_3_delta_fanout,
+        test_4_error_propagates,
+        test_5_cancel_one_waiter,
+        test_6_key_normalization,
+        test_7_cancel_leader_during_replay,
+        test_8_ask_llm_first_turns,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Single-Flight Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            await test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
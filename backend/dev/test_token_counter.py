@@ -0,0 +1,213 @@
+"""
+Token Counter Test — ทดสอบการดึง usage / ประมาณ token / คำนวณค่าใช้จ่าย
+
+ไม่เรียก API จริง: ใช้ response ปลอม (SimpleNamespace) และ fake OpenAI-compatible model
+
+ทดสอบ:
+1. get_token_usage อ่าน usage ที่ provider รายงาน (OpenAI + Gemini รวม cached tokens)
+2. ไม่มี usage → คืนศูนย์โดยไม่เรียก tokenizer
+3. estimate_tokens: ไทย ~2 ตัวอักษร/token, อักษรอื่น ~4 ตัวอักษร/token
+4. calculate_cost ตามราคาใน TOKEN_COSTS
+5. _call_llm (OpenAI-compatible, ไม่มี usage) → ประมาณ usage ครั้งเดียวบน worker thread
+
+Usage:
+    cd backend
+    python dev/test_token_counter.py
+"""
+
+import asyncio
+import logging
+import sys
+import traceback
+from types import SimpleNamespace
+
+sys.path.insert(0, ".")
+from app.utils import token_counter
+from app.utils.token_counter import calculate_cost, estimate_tokens, get_token_usage
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger("TokenCounterTest")
+
+passed = 0
+failed = 0
+test_results = []
+
+
+def record(name, success, detail=""):
+    global passed, failed
+    if success:
+        passed += 1
+        test_results.append(("✅", name, detail))
+    else:
+        failed += 1
+        test_results.append(("❌", name, detail))
+
+
+def openai_response(content, usage=None):
+    message = SimpleNamespace(content=content)
+    response = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    if usage is not None:
+        response.usage = usage
+    return response
+
+
+async def test_1_reported_usage():
+    """Test 1: provider-reported usage (OpenAI + Gemini, cached tokens)"""
+    openai_usage = SimpleNamespace(
+        prompt_tokens=120, completion_tokens=30, total_tokens=150,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=100),
+    )
+    gemini_meta = SimpleNamespace(
+        prompt_token_count=80, candidates_token_count=20, total_token_count=100,
+        cached_content_token_count=64,
+    )
+    from_openai = get_token_usage(openai_response("ok", openai_usage), "openai", "gpt-4o-mini")
+    from_gemini = get_token_usage(SimpleNamespace(text="ok", usage_metadata=gemini_meta), "gemini")
+    ok = (
+        from_openai == {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150, "cached_prompt_tokens": 100}
+        and from_gemini == {"prompt_tokens": 80, "completion_tokens": 20, "total_tokens": 100, "cached_prompt_tokens": 64}
+    )
+    record("Reported usage", ok, f"openai={from_openai} gemini={from_gemini}")
+
+
+async def test_2_missing_usage_no_tokenizer():
+    """Test 2: missing usage → zeros, tokenizer never called"""
+    calls = []
+    original = token_counter.get_encoder
+
+    def tracking_encoder(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    token_counter.get_encoder = tracking_encoder
+    try:
+        from_openai = get_token_usage(openai_response("คำตอบยาวๆ " * 50), "openai", "gpt-4o-mini")
+        from_local = get_token_usage(openai_response("answer", None), "local")
+        from_gemini = get_token_usage(SimpleNamespace(text="คำตอบ " * 50), "gemini")
+    finally:
+        token_counter.get_encoder = original
+
+    zeros = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_prompt_tokens": 0}
+    ok = from_openai == zeros and from_local == zeros and from_gemini == zeros and not calls
+    record("Missing usage → zeros", ok, f"openai={from_openai} gemini={from_gemini} tokenizer_calls={len(calls)}")
+
+
+async def test_3_estimate_tokens():
+    """Test 3: estimate_tokens heuristic (Thai vs other scripts)"""
+    thai = "ก" * 40
+    english = "a" * 40
+    mixed = thai + english
+    results = {
+        "empty": estimate_tokens(""),
+        "short": estimate_tokens("a"),
+        "thai": estimate_tokens(thai),
+        "english": estimate_tokens(english),
+        "mixed": estimate_tokens(mixed),
+    }
+    ok = results == {"empty": 0, "short": 1, "thai": 20, "english": 10, "mixed": 30}
+    record("estimate_tokens", ok, str(results))
+
+
+async def test_4_calculate_cost():
+    """Test 4: calculate_cost uses TOKEN_COSTS by model substring"""
+    usage = {"prompt_tokens": 1000, "completion_tokens": 1000, "total_tokens": 2000}
+    paid = calculate_cost(usage, "GPT-4o-mini-2024-07-18")
+    free = calculate_cost(usage, "gemini-2.5-flash")
+    unknown = calculate_cost(usage, "some-unknown-model")
+    ok = abs(paid - (0.00015 + 0.0006)) < 1e-12 and free == 0 and unknown == 0.0
+    record("calculate_cost", ok, f"paid={paid:.8f} free={free} unknown={unknown}")
+
+
+async def test_5_call_llm_estimates_once():
+    """Test 5: _call_llm without provider usage → one off-loop estimate"""
+    from app.utils.llm import llm as llm_module
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            return openai_response("ตอบ: เปิดเทอมวันที่ 10")
+
+    fake_model = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    estimate_calls = []
+    tokenizer_calls = []
+
+    async def tracking_count_tokens_async(*texts, model_name="gpt-3.5-turbo"):
+        estimate_calls.append(texts)
+        return [estimate_tokens(text) for text in texts]
+
+    def tracking_count_tokens(*args, **kwargs):
+        tokenizer_calls.append(args)
+        return 0
+
+    patches = {
+        "LLM_PROVIDER": "local",
+        "get_llm_model": lambda: fake_model,
+        "count_tokens_async": tracking_count_tokens_async,
+    }
+    originals = {name: getattr(llm_module, name) for name in patches}
+    original_count_tokens = token_counter.count_tokens
+    for name, value in patches.items():
+        setattr(llm_module, name, value)
+    token_counter.count_tokens = tracking_count_tokens
+    try:
+        reply, usage = await llm_module._call_llm("system", "เปิดเทอมวันไหน")
+    finally:
+        for name, value in originals.items():
+            setattr(llm_module, name, value)
+        token_counter.count_tokens = original_count_tokens
+
+    ok = (
+        reply == "ตอบ: เปิดเทอมวันที่ 10"
+        and len(estimate_calls) == 1
+        and not tokenizer_calls
+        and usage.get("estimated") is True
+        and usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"] > 0
+    )
+    record("Call LLM estimates once", ok, f"estimates={len(estimate_calls)} sync_tokenizer={len(tokenizer_calls)} usage={usage}")
+
+
+async def run_all_tests():
+    tests = [
+        test_1_reported_usage,
+        test_2_missing_usage_no_tokenizer,
+        test_3_estimate_tokens,
+        test_4_calculate_cost,
+        test_5_call_llm_estimates_once,
+    ]
+
+    logger.info("=" * 60)
+    logger.info("  Token Counter Test — %d tests", len(tests))
+    logger.info("=" * 60)
+
+    for test_fn in tests:
+        name = test_fn.__doc__ or test_fn.__name__
+        logger.info(f"\n▶ {name}")
+        try:
+            await test_fn()
+        except Exception as e:
+            record(name, False, f"CRASH: {e}")
+            traceback.print_exc()
+
+    logger.info("\n" + "=" * 60)
+    logger.info("  RESULTS")
+    logger.info("=" * 60)
+
+    for icon, name, detail in test_results:
+        logger.info(f"  {icon} {name}: {detail}")
+
+    logger.info(f"\n  Total: {passed + failed} | ✅ Passed: {passed} | ❌ Failed: {failed}")
+    logger.info("=" * 60)
+
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import platform
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    success = asyncio.run(run_all_tests())
+    sys.exit(0 if success else 1)
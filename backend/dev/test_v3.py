@@ -53,6 +53,13 @@ print(f"  [PASS] build_unified_prompt: {len(p1)} chars")
 print(f"  [PASS] context_prompt: {len(p2)} chars")
 passed += 2
 
+from app.prompt.prompt import build_unified_prompt_parts
+sys_a, user_a = build_unified_prompt_parts("วันเปิดเทอม", "context A", "history A", "th")
+sys_b, user_b = build_unified_prompt_parts("สอบกลางภาค", "context B", "", "en")
+prefix_ok = sys_a == sys_b and "เวลาปัจจุบัน" not in sys_a and user_a.index("context A") < user_a.index("คำถาม:")
+print(f"  [{'PASS' if prefix_ok else 'FAIL'}] stable system prefix: {len(sys_a)} chars shared")
+passed += int(prefix_ok)
+
 # Test pose
 import asyncio
 from app.utils.pose import suggest_pose
@@ -66,5 +73,5 @@ print(f"  [{'PASS' if pose2 == 'FlickDown' else 'INFO'}] no-info reply -> {pose2
 print(f"  [{'PASS' if pose3 == 'Flick' else 'INFO'}] confirm reply -> {pose3}")
 passed += 3
 
-total = len(tests) + len(retrieval_tests) + 5
+total = len(tests) + len(retrieval_tests) + 6
 print(f"\n=== {passed}/{total} tests passed ===")
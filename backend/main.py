@@ -20,22 +20,39 @@ from app.config import (
     AUDIT_LOG_RETENTION_DAYS,
     AUDIT_LOG_MAX_SIZE_MB,
     QUEUE_NUM_WORKERS,
+    QUEUE_MIN_WORKERS,
+    QUEUE_MAX_WORKERS,
+    QUEUE_SCALE_TARGET_WAIT_S,
+    QUEUE_SCALE_DOWN_IDLE_S,
     QUEUE_MAX_SIZE,
     QUEUE_PER_USER_LIMIT,
     QUEUE_REQUEST_TIMEOUT,
     QUEUE_HEALTH_LOG_INTERVAL,
+    QUEUE_CLASS_WEIGHTS,
+    QUEUE_USER_QUANTUM,
+    QUEUE_POSITION_BROADCAST_MS,
+    QUEUE_ADMISSION_CONTROL,
+    QUEUE_ADMISSION_MIN_SAMPLES,
+    QUEUE_SERVICE_EWMA_ALPHA,
+    QUEUE_WAL_FLUSH_MS,
+    QUEUE_RECOVERY_CONCURRENCY,
+    QUEUE_RECOVERY_RATE,
+    LLM_DEADLINE_RESERVE_S,
+    QUEUE_BACKEND,
+    QUEUE_REDIS_PREFIX,
     DATABASE_URL,
     DB_POOL_MIN_SIZE,
     DB_POOL_MAX_SIZE,
     REDIS_URL,
 )
 from memory.database import init_db, close_db
-from memory.redis_client import init_redis, close_redis
+from memory.redis_client import init_redis, close_redis, get_redis
 from app.utils.llm.llm_model import close_llm_clients
-from app.utils.llm.llm import ask_llm, prewarm_llm_clients
+from app.utils.llm.adaptive_limiter import llm_limiter
+from app.utils.llm.llm import answer_without_llm, ask_llm, prewarm_llm_clients
 from app.utils.token_counter import calculate_cost
 # ensure_local_request removed - dev page now served by Next.js frontend
-from queue_manager import LLMRequestQueue, QueueConfig
+from queue_manager import LLMRequestQueue, QueueConfig, RedisStreamQueue, parse_class_weights
 
 # Import routers
 from app.auth import auth_router
@@ -244,21 +261,47 @@ asgi_app = socketio.ASGIApp(sio, app)
 # INITIALIZE ROUTERS
 # ----------------------------------------------------------------------------- #
 # Initialize queue system
-llm_queue = LLMRequestQueue(
-    handler_fn=ask_llm,
-    config=QueueConfig(
-        max_size=QUEUE_MAX_SIZE,
-        num_workers=QUEUE_NUM_WORKERS,
-        per_user_limit=QUEUE_PER_USER_LIMIT,
-        request_timeout=QUEUE_REQUEST_TIMEOUT,
-        health_log_interval=QUEUE_HEALTH_LOG_INTERVAL,
-    ),
+_queue_config = QueueConfig(
+    max_size=QUEUE_MAX_SIZE,
+    num_workers=QUEUE_NUM_WORKERS,
+    min_workers=QUEUE_MIN_WORKERS,
+    max_workers=QUEUE_MAX_WORKERS,
+    scale_target_wait=QUEUE_SCALE_TARGET_WAIT_S,
+    scale_down_idle=QUEUE_SCALE_DOWN_IDLE_S,
+    per_user_limit=QUEUE_PER_USER_LIMIT,
+    request_timeout=QUEUE_REQUEST_TIMEOUT,
+    deadline_reserve=LLM_DEADLINE_RESERVE_S,
+    health_log_interval=QUEUE_HEALTH_LOG_INTERVAL,
+    class_weights=parse_class_weights(QUEUE_CLASS_WEIGHTS),
+    user_quantum=QUEUE_USER_QUANTUM,
+    position_broadcast_interval=QUEUE_POSITION_BROADCAST_MS / 1000.0,
+    admission_control=QUEUE_ADMISSION_CONTROL,
+    admission_min_samples=QUEUE_ADMISSION_MIN_SAMPLES,
+    service_ewma_alpha=QUEUE_SERVICE_EWMA_ALPHA,
+    wal_flush_interval=QUEUE_WAL_FLUSH_MS / 1000.0,
+    recovery_concurrency=QUEUE_RECOVERY_CONCURRENCY,
+    recovery_rate=QUEUE_RECOVERY_RATE,
 )
+if QUEUE_BACKEND == "redis":
+    # Redis client ถูกสร้างตอน startup → resolve ตอน llm_queue.start()
+    llm_queue = RedisStreamQueue(
+        handler_fn=ask_llm,
+        config=_queue_config,
+        redis_fn=get_redis,
+        prefix=QUEUE_REDIS_PREFIX,
+    )
+else:
+    llm_queue = LLMRequestQueue(
+        handler_fn=ask_llm,
+        config=_queue_config,
+        overload_fn=answer_without_llm,
+        capacity_fn=lambda: llm_limiter.available,
+    )
 
 set_llm_queue(llm_queue)
 webhook_router.init_webhook_router(fb_task_queue)
 chat_router.init_chat_router(sio, session_locks, write_audit_log, llm_queue)
-socketio_handlers.init_socketio_handlers(sio, send_fb_text)
+socketio_handlers.init_socketio_handlers(sio, send_fb_text, llm_queue)
 background_tasks.init_background_tasks(
     sio,
     fb_task_queue,
@@ -310,7 +353,10 @@ async def startup_event():
     
     # Queue Recovery: ประมวลผลคิวค้างจาก session ก่อนหน้า
     recovery_action = os.environ.pop("_QUEUE_RECOVERY_ACTION", "none")
-    if recovery_action == "process":
+    if recovery_action == "process" and QUEUE_BACKEND == "redis":
+        # Redis Streams: request ค้างอยู่ใน stream อยู่แล้ว ไม่มี snapshot ให้ replay
+        logger.info("[Recovery] Skipped: QUEUE_BACKEND=redis keeps pending requests in Redis Streams")
+    elif recovery_action == "process":
         pending_state = await LLMRequestQueue.check_pending_on_disk()
         if pending_state and pending_state.get("items"):
             logger.info(
@@ -326,7 +372,10 @@ async def startup_event():
         asyncio.create_task(background_tasks.fb_worker())
     asyncio.create_task(_warmup_realtime_pipeline())
 
-    logger.info("Application ready (queue workers=%d, max_size=%d)", QUEUE_NUM_WORKERS, QUEUE_MAX_SIZE)
+    logger.info(
+        "Application ready (queue workers=%d..%d, max_size=%d)",
+        QUEUE_MIN_WORKERS, QUEUE_MAX_WORKERS, QUEUE_MAX_SIZE,
+    )
 
 
 async def _run_queue_recovery(items: list):
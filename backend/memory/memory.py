@@ -10,6 +10,7 @@ import asyncio
 import logging
 from app.config import LLM_PROVIDER, GEMINI_API_KEY, GEMINI_MODEL_NAME, OPENAI_API_KEY, OPENAI_MODEL_NAME
 from app.utils.llm.llm_model import get_llm_model
+from app.utils.llm.quota_limiter import estimate_request_tokens, llm_quota, quota_key
 import openai
 
 logger = logging.getLogger("Memory")
@@ -119,9 +120,12 @@ async def summarize_chat_history_async(history):
             if genai is None:
                 return "(Error: google-genai library not installed)"
 
-            # ✅ ใช้ sync API สำหรับ Gemini
-            response = await asyncio.to_thread(
-                model.models.generate_content,
+            await llm_quota.acquire(
+                "gemini", quota_key(GEMINI_API_KEY, GEMINI_MODEL_NAME),
+                estimate_request_tokens(prompt, completion_tokens=MAX_OUTPUT_TOKENS),
+            )
+            # ✅ ใช้ async API (client.aio) ของ Gemini client ที่ cache ไว้
+            response = await model.aio.models.generate_content(
                 model=GEMINI_MODEL_NAME,
                 contents=prompt
             )
@@ -133,7 +137,7 @@ async def summarize_chat_history_async(history):
             logger.debug(f"[Gemini] Summary generated: {len(result)} chars")
             return result
 
-        elif LLM_PROVIDER in ["openai", "local"]:
+        elif LLM_PROVIDER in ["openai", "local", "mock"]:
             # ✅ ใช้ await สำหรับ AsyncOpenAI
             response = await model.chat.completions.create(
                 model=OPENAI_MODEL_NAME,
@@ -8,6 +8,7 @@ from typing import List, Tuple, Optional, Dict
 from collections import deque
 from dotenv import load_dotenv
 from app.config import PDF_INPUT_FOLDER, PDF_QUICK_USE_FOLDER, debug_list_files
+from app.utils.llm.quota_limiter import PRIORITY_INGEST, llm_quota, quota_key
 
 load_dotenv()
 
@@ -113,6 +114,12 @@ class UniversalRateLimitTracker:
         
         self.window_seconds = self.config["window_seconds"]
         self.lock = asyncio.Lock()
+
+        # Shared quota bucket (ต่อ key + model) ใช้ limit แบบ safe ของ provider นี้
+        self.quota_key = quota_key(
+            os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY", ""), MODEL_NAME
+        )
+        llm_quota.configure(provider, self.quota_key, rpm=self.rpm_limit, tpm=self.tpm_limit)
         
         # Statistics
         self.total_tokens = 0
@@ -146,50 +153,18 @@ class UniversalRateLimitTracker:
         }
     
     async def wait_if_needed(self, estimated_tokens: int):
-        """รอถ้าใกล้เกิน rate limit (ทั้ง TPM และ RPM)"""
-        async with self.lock:
-            now = time.time()
-            usage = self._get_current_usage(now)
-            
-            wait_reasons = []
-            max_wait_time = 0
-            
-            # ✅ Check TPM limit
-            if usage["tokens"] + estimated_tokens > self.tpm_limit:
-                # หา timestamp ของ token ที่ต้องรอให้หมดอายุ
-                temp_tokens = 0
-                for timestamp, tokens in self.token_usage:
-                    temp_tokens += tokens
-                    if temp_tokens + estimated_tokens > self.tpm_limit:
-                        wait_time = timestamp + self.window_seconds - now + 0.5
-                        if wait_time > 0:
-                            wait_reasons.append(f"TPM: {usage['tokens']}/{self.tpm_limit}")
-                            max_wait_time = max(max_wait_time, wait_time)
-                        break
-            
-            # ✅ Check RPM limit
-            if usage["requests"] + 1 > self.rpm_limit:
-                # หา timestamp ของ request แรกที่ต้องรอให้หมดอายุ
-                if self.request_times:
-                    oldest_request = self.request_times[0]
-                    wait_time = oldest_request + self.window_seconds - now + 0.5
-                    if wait_time > 0:
-                        wait_reasons.append(f"RPM: {usage['requests']}/{self.rpm_limit}")
-                        max_wait_time = max(max_wait_time, wait_time)
-            
-            # ✅ รอถ้าจำเป็น
-            if max_wait_time > 0:
-                logger.warning(
-                    f"⏳ Rate limit protection ({', '.join(wait_reasons)}). "
-                    f"Waiting {max_wait_time:.1f}s..."
-                )
-                await asyncio.sleep(max_wait_time)
-                
-                # Cleanup after waiting
-                self._cleanup_old_data(time.time())
-    
-    async def record_usage(self, tokens_used: int):
+        """
+        รอ quota จาก shared limiter (Redis token bucket) ด้วย priority ต่ำสุด (ingest)
+        → ไม่แย่ง quota ของผู้ใช้จริง และเห็น usage ของ process อื่นที่ใช้ key เดียวกันด้วย
+        """
+        await llm_quota.acquire(
+            self.provider, self.quota_key, estimated_tokens, priority=PRIORITY_INGEST
+        )
+
+    async def record_usage(self, tokens_used: int, estimated_tokens: int = 0):
         """บันทึกการใช้ token และ request"""
+        if estimated_tokens:
+            await llm_quota.settle(self.provider, self.quota_key, estimated_tokens, tokens_used)
         async with self.lock:
             now = time.time()
             self.token_usage.append((now, tokens_used))
@@ -481,7 +456,7 @@ async def organize_chunk_with_llm_retry(
             
             if hasattr(response, 'usage_metadata') and response.usage_metadata:
                 tokens_used = response.usage_metadata.total_token_count
-                await rate_limiter.record_usage(tokens_used)
+                await rate_limiter.record_usage(tokens_used, estimated_tokens)
                 logger.debug(f"  📊 Actual tokens used: {tokens_used}")
             else:
                 await rate_limiter.record_usage(estimated_tokens)
@@ -703,9 +678,16 @@ async def process_pdfs_async():
     save_hashes(new_hashes)
     logger.info("✅ PDF processing complete")
 
+async def _process_pdfs_main():
+    try:
+        await process_pdfs_async()
+    finally:
+        # Redis client ของ quota limiter ผูกกับ loop นี้ (asyncio.run) → ปิดก่อน loop จบ
+        await llm_quota.close()
+
 def process_pdfs():
     """Synchronous wrapper"""
-    asyncio.run(process_pdfs_async())
+    asyncio.run(_process_pdfs_main())
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -5,10 +5,14 @@ Queue Manager — Decoupled LLM Request Queue System
 - Request queuing with capacity limits
 - Worker pool for parallel processing
 - Per-user fairness (max requests per user)
+- Priority classes + weighted fair queueing (realtime > web > messenger > background)
 - Real-time queue position updates via callback
-- Request timeout & overflow protection
+- Admission control from EWMA service times (reject / divert instead of timing out)
+- Request timeout & overflow protection + per-request Deadline ที่ส่งต่อลงทุก stage
+- Cooperative cancellation เมื่อ client หลุด (pending + in-flight)
 - Error isolation (handler errors don't crash workers)
-- Queue persistence ข้าม server restart
+- Queue persistence ข้าม server restart (write-ahead log ต่อ request)
+- Redis Streams backend (consumer group) สำหรับหลาย process / หลาย node
 - Recovery: ประมวลผลคิวค้าง หรือ ล้างทิ้ง
 """
 
@@ -16,9 +20,34 @@ from queue_manager.request_queue import (
     LLMRequestQueue,
     QueueConfig,
     QueueFullError,
+    QueueOverloadedError,
     QueueTimeoutError,
 )
+from queue_manager.cancellation import (
+    CancelScope,
+    RequestCancelled,
+    cancellable,
+    check_cancelled,
+    current_cancel_scope,
+)
+from queue_manager.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    current_deadline,
+    deadline_scope,
+)
+from queue_manager.redis_stream_queue import RedisStreamQueue, RemoteHandlerError
+from queue_manager.scheduler import (
+    FairScheduler,
+    PRIORITY_REALTIME,
+    PRIORITY_WEB,
+    PRIORITY_MESSENGER,
+    PRIORITY_BACKGROUND,
+    DEFAULT_CLASS_WEIGHTS,
+    parse_class_weights,
+)
 from queue_manager.persistence import (
+    QueueWal,
     load_pending_items,
     clear_persisted,
     format_pending_summary,
@@ -30,7 +59,27 @@ __all__ = [
     "LLMRequestQueue",
     "QueueConfig",
     "QueueFullError",
+    "QueueOverloadedError",
     "QueueTimeoutError",
+    "CancelScope",
+    "RequestCancelled",
+    "cancellable",
+    "check_cancelled",
+    "current_cancel_scope",
+    "Deadline",
+    "DeadlineExceeded",
+    "current_deadline",
+    "deadline_scope",
+    "RedisStreamQueue",
+    "RemoteHandlerError",
+    "FairScheduler",
+    "PRIORITY_REALTIME",
+    "PRIORITY_WEB",
+    "PRIORITY_MESSENGER",
+    "PRIORITY_BACKGROUND",
+    "DEFAULT_CLASS_WEIGHTS",
+    "parse_class_weights",
+    "QueueWal",
     "load_pending_items",
     "clear_persisted",
     "format_pending_summary",
@@ -0,0 +1,113 @@
+"""
+Cooperative cancellation ของ request ที่อยู่ในคิว / กำลังประมวลผล
+
+- ทุก QueueItem มี CancelScope ของตัวเอง ผูกกับ contextvars ของ request
+  (handler รันใน context นั้น → ทุก stage ภายใน ask_llm มองเห็น scope เดียวกัน)
+- client หลุด (Socket.IO disconnect / HTTP abort) → queue.cancel / cancel_session
+  เรียก scope.cancel(reason)
+- handler ตรวจที่ขอบ stage ด้วย check_cancelled() และครอบ stage ที่แพง
+  (retrieval + LLM) ด้วย cancellable() ซึ่งหยุด await ทันทีที่ scope ถูก cancel
+
+ใช้งาน:
+    check_cancelled()                       # raise RequestCancelled ถ้า client หลุดแล้ว
+    result = await cancellable(expensive())  # หยุดกลางทางได้
+"""
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class RequestCancelled(Exception):
+    """Request ถูกยกเลิก (client หลุด / ถูก cancel) — ไม่ใช่ error ของ handler"""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelScope:
+    """ธงยกเลิกของ request หนึ่งรายการ + callback ที่ต้องเรียกเมื่อถูกยกเลิก"""
+
+    __slots__ = ("_reason", "_callbacks")
+
+    def __init__(self):
+        self._reason: Optional[str] = None
+        self._callbacks: List[Callable[[], Any]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._reason is not None
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._reason
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Returns True ถ้าเพิ่งถูก cancel ครั้งแรก"""
+        if self._reason is not None:
+            return False
+        self._reason = reason
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+        return True
+
+    def add_callback(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """ลงทะเบียน callback (เรียกทันทีถ้าถูก cancel ไปแล้ว) → คืนฟังก์ชันถอนออก"""
+        if self._reason is not None:
+            callback()
+            return lambda: None
+        self._callbacks.append(callback)
+
+        def _remove() -> None:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+        return _remove
+
+    def raise_if_cancelled(self) -> None:
+        if self._reason is not None:
+            raise RequestCancelled(self._reason)
+
+
+_current_scope: contextvars.ContextVar[Optional[CancelScope]] = contextvars.ContextVar(
+    "queue_cancel_scope", default=None
+)
+
+
+def bind_cancel_scope(scope: Optional[CancelScope]) -> contextvars.Token:
+    """ผูก scope กับ context ปัจจุบัน (queue เรียกผ่าน context.run ตอนสร้าง item)"""
+    return _current_scope.set(scope)
+
+
+def current_cancel_scope() -> Optional[CancelScope]:
+    return _current_scope.get()
+
+
+def check_cancelled() -> None:
+    """ขอบ stage: raise RequestCancelled ถ้า request ของ context นี้ถูกยกเลิกแล้ว"""
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.raise_if_cancelled()
+
+
+async def cancellable(awaitable: Awaitable[Any]) -> Any:
+    """
+    await งานที่แพงโดยหยุดได้ทันทีเมื่อ scope ถูก cancel
+    (งานถูก cancel แบบ asyncio ภายใน แล้ว raise RequestCancelled ให้ผู้เรียก)
+    ไม่มี scope → await ตรง ๆ
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        return await awaitable
+    scope.raise_if_cancelled()
+    task = asyncio.ensure_future(awaitable)
+    remove = scope.add_callback(task.cancel)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        current = asyncio.current_task()
+        if scope.cancelled and not (current is not None and current.cancelling()):
+            raise RequestCancelled(scope.reason or "cancelled") from None
+        raise
+    finally:
+        remove()
@@ -0,0 +1,105 @@
+"""
+Per-request deadline ที่ส่งต่อลงไปทุก stage ของ pipeline
+
+timeout ภายนอก (QueueConfig.request_timeout / realtime LLM timeout) ตัดงานจากข้างนอกด้วย wait_for
+→ งานข้างใน (retrieval, rerank, retry backoff, fallback provider) ไม่รู้ว่าเหลือเวลาเท่าไร
+Deadline ให้แต่ละ stage ถาม remaining() แล้วข้ามงานที่ไม่จำเป็นเมื่องบไม่พอ
+และตอบแบบ degraded ก่อน timeout ภายนอกจะตัด
+
+- สร้างด้วย Deadline.within(budget_s, reserve_s): เผื่อเวลาไว้ส่งคำตอบ degraded
+  ก่อน timeout ภายนอก (reserve ไม่เกิน 20% ของงบ)
+- queue ผูก deadline กับ contextvars ของ request (ไหลผ่าน await / create_task)
+  ถ้าผู้ส่งผูก deadline ที่เร็วกว่าไว้แล้ว (เช่น voice turn) จะใช้ตัวที่เร็วกว่า
+- ฟังก์ชันที่รันใน thread pool (retrieval) รับ deadline เป็น argument ตรง ๆ
+
+ใช้งาน:
+    with deadline_scope(Deadline.within(0.6, 0.1)):
+        await queue.submit(...)
+
+    deadline = current_deadline()
+    if deadline is not None and not deadline.allows(2.0):
+        ...  # ข้ามงานที่ไม่จำเป็น
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class DeadlineExceeded(Exception):
+    """งบเวลาของ request หมดก่อน stage จะทำงานเสร็จ (แยกจาก asyncio.TimeoutError ของ wait_for ภายนอก)"""
+
+
+class Deadline:
+    """จุดสิ้นสุดของงบเวลา (time.monotonic) ของ request หนึ่งรายการ"""
+
+    __slots__ = ("expires_at", "budget_s")
+
+    def __init__(self, timeout_s: float):
+        self.budget_s = max(0.0, float(timeout_s))
+        self.expires_at = time.monotonic() + self.budget_s
+
+    @classmethod
+    def within(cls, budget_s: float, reserve_s: float = 0.0) -> "Deadline":
+        """งบ budget_s หัก reserve_s (ไม่เกิน 20% ของงบ) ไว้ส่งคำตอบก่อน timeout ภายนอก"""
+        budget_s = max(0.0, float(budget_s))
+        return cls(budget_s - min(max(0.0, float(reserve_s)), budget_s * 0.2))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def allows(self, seconds: float) -> bool:
+        """เหลือเวลาพอสำหรับงานที่ใช้ ~seconds หรือไม่"""
+        return self.expires_at - time.monotonic() >= seconds
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """timeout สำหรับ wait_for: เวลาที่เหลือ (ไม่เกิน cap)"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(remaining, float(cap))
+
+    def earliest(self, other: Optional["Deadline"]) -> "Deadline":
+        if other is None or self.expires_at <= other.expires_at:
+            return self
+        return other
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "budget_ms": round(self.budget_s * 1000, 1),
+            "remaining_ms": round(self.remaining() * 1000, 1),
+        }
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.3f}s budget={self.budget_s:.3f}s)"
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def bind_deadline(deadline: Optional[Deadline]) -> contextvars.Token:
+    """ผูก deadline กับ context ปัจจุบัน — ใช้ตัวที่เร็วกว่าถ้ามีผูกไว้แล้ว"""
+    existing = _current_deadline.get()
+    if deadline is not None:
+        deadline = deadline.earliest(existing)
+    else:
+        deadline = existing
+    return _current_deadline.set(deadline)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """กำหนด deadline ให้ทุก stage ภายใน block (ไหลผ่าน await / create_task)"""
+    token = bind_deadline(deadline)
+    try:
+        yield _current_deadline.get()
+    finally:
+        _current_deadline.reset(token)
@@ -1,14 +1,21 @@
 """
 Queue Persistence — บันทึก/โหลด pending items ผ่าน Redis
 
-เมื่อ server ถูกปิด (graceful หรือ crash) คำขอที่ค้างอยู่ในคิวจะถูกบันทึกลง Redis
-เมื่อเปิด server ใหม่ ระบบจะตรวจสอบ key นี้และถามผู้ดูแลว่า:
+Write-ahead log (QueueWal): ทุก submit เขียน entry ของ request นั้น, ทุก request ที่จบ
+(ได้ผล / timeout / cancel) ลบ entry ทิ้ง → สิ่งที่เหลือใน Redis คือคำขอที่ยังไม่เสร็จเท่านั้น
+แม้ process crash ก็ไม่ต้องพึ่ง snapshot ตอน shutdown
+- submit แค่ใส่ op ลง buffer ในหน่วยความจำ (ไม่รอ Redis) — flusher รวม op เป็น pipeline เดียว
+  ทุก flush_interval (group commit)
+- request ที่เสร็จก่อน flush (cache hit / คำตอบเร็ว) หักล้างกันใน buffer ไม่แตะ Redis เลย
+
+เมื่อเปิด server ใหม่ ระบบจะตรวจสอบ WAL (+ snapshot รุ่นเก่า) และถามผู้ดูแลว่า:
   - ต้องการประมวลผลคำขอค้าง → re-submit เข้าคิว
   - ล้างคิวทิ้ง → ลบ key
 
-Redis key: reg01:queue_state
+Redis keys: reg01:queue_wal (hash request_id → item JSON), reg01:queue_state (snapshot รุ่นเก่า)
 """
 
+import asyncio
 import json
 import logging
 import time
@@ -18,6 +25,7 @@ from typing import Any, Dict, List, Optional
 logger = logging.getLogger("QueuePersistence")
 
 REDIS_QUEUE_KEY = "reg01:queue_state"
+REDIS_WAL_KEY = "reg01:queue_wal"
 # TTL สำหรับ queue state (7 วัน — คิวค้างเก่ากว่านี้ไม่มีประโยชน์)
 QUEUE_STATE_TTL = 7 * 86400
 
@@ -31,6 +39,174 @@ def _get_redis():
     return get_redis()
 
 
+# ─────────────────────────────────────────────────────────────────────────── #
+# WRITE-AHEAD LOG
+# ─────────────────────────────────────────────────────────────────────────── #
+class QueueWal:
+    """
+    Incremental persistence ของคิว: append(request_id, record) / remove(request_id)
+    เป็น O(1) ในหน่วยความจำ; flusher task เขียนลง Redis hash แบบ batch (HSET + HDEL + EXPIRE
+    ใน round trip เดียว) ถ้า Redis ล่ม op ยังอยู่ใน buffer แล้วลองใหม่แบบ backoff
+    """
+
+    def __init__(
+        self,
+        key: str = REDIS_WAL_KEY,
+        flush_interval: float = 0.02,
+        ttl: int = QUEUE_STATE_TTL,
+        redis_fn=None,
+    ):
+        self._key = key
+        self._flush_interval = max(0.0, float(flush_interval))
+        self._ttl = ttl
+        self._redis_fn = redis_fn or _get_redis
+        # request_id → record (ยังไม่ได้เขียน) หรือ None (ต้องลบจาก Redis)
+        self._buffer: Dict[str, Optional[str]] = {}
+        self._dirty = asyncio.Event()
+        self._flush_lock = asyncio.Lock()  # one pipeline at a time → HSET/HDEL of a request stay in order
+        self._task: Optional[asyncio.Task] = None
+        self._open = False
+        self._failing = False
+        self._appended = 0
+        self._removed = 0
+        self._coalesced = 0
+        self._flushes = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+
+    def start(self) -> None:
+        if self._open:
+            return
+        self._open = True
+        self._task = asyncio.create_task(self._flusher(), name="queue-wal")
+
+    async def close(self) -> None:
+        """Flush op ที่ค้าง แล้วหยุดรับ op ใหม่ (เรียกก่อน cancel คิวตอน shutdown — entry ที่ยังไม่เสร็จคงอยู่)"""
+        if not self._open:
+            return
+        self._open = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def append(self, request_id: str, record: Dict[str, Any]) -> None:
+        if not self._open:
+            return
+        self._buffer[request_id] = json.dumps(record, ensure_ascii=False)
+        self._appended += 1
+        self._dirty.set()
+
+    def remove(self, request_id: str) -> None:
+        if not self._open:
+            return
+        self._removed += 1
+        if self._buffer.get(request_id) is not None:
+            del self._buffer[request_id]  # ยังไม่เคยถึง Redis → หักล้างกันในหน่วยความจำ
+            self._coalesced += 1
+            return
+        self._buffer[request_id] = None
+        self._dirty.set()
+
+    async def flush(self) -> bool:
+        async with self._flush_lock:
+            if not self._buffer:
+                return True
+            ops, self._buffer = self._buffer, {}
+            writes = {rid: record for rid, record in ops.items() if record is not None}
+            deletes = [rid for rid, record in ops.items() if record is None]
+            started = time.perf_counter()
+            try:
+                pipe = self._redis_fn().pipeline(transaction=False)
+                if writes:
+                    pipe.hset(self._key, mapping=writes)
+                    pipe.expire(self._key, self._ttl)
+                if deletes:
+                    pipe.hdel(self._key, *deletes)
+                await pipe.execute()
+            except BaseException as exc:
+                # คืน op เข้า buffer (op ที่ใหม่กว่าชนะ; HSET/HDEL ซ้ำไม่เป็นไร) แล้วให้รอบถัดไปลองใหม่
+                for rid, record in ops.items():
+                    self._buffer.setdefault(rid, record)
+                if not isinstance(exc, Exception):
+                    raise
+                self._errors += 1
+                if not self._failing:
+                    logger.warning("[Persistence] WAL flush failed (%d ops buffered): %s", len(self._buffer), exc)
+                self._failing = True
+                return False
+            if self._failing:
+                logger.info("[Persistence] WAL flush recovered")
+                self._failing = False
+            self._flushes += 1
+            self._last_flush_ms = (time.perf_counter() - started) * 1000
+            return True
+
+    async def _flusher(self) -> None:
+        backoff = 0.0
+        while self._open:
+            try:
+                await self._dirty.wait()
+                await asyncio.sleep(self._flush_interval + backoff)
+                self._dirty.clear()
+                if await self.flush():
+                    backoff = 0.0
+                else:
+                    backoff = min(30.0, max(1.0, backoff * 2))
+                    self._dirty.set()
+            except asyncio.CancelledError:
+                return
+            except Exception as exc:
+                logger.error("[Persistence] WAL flusher error: %s", exc)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._open,
+            "buffered": len(self._buffer),
+            "appended": self._appended,
+            "removed": self._removed,
+            "coalesced": self._coalesced,
+            "flushes": self._flushes,
+            "errors": self._errors,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+        }
+
+
+async def load_wal_items(key: str = REDIS_WAL_KEY) -> List[Dict[str, Any]]:
+    """Entry ที่ยังไม่เสร็จใน WAL (เรียงตาม submitted_at); entry ที่ parse ไม่ได้ถูกข้าม"""
+    r = _get_redis()
+    raw = await r.hgetall(key)
+    items = []
+    for request_id, record in (raw or {}).items():
+        try:
+            item = json.loads(record)
+        except (TypeError, ValueError):
+            logger.warning("[Persistence] Skipping corrupted WAL entry %s", request_id)
+            continue
+        if isinstance(item, dict):
+            item.setdefault("request_id", request_id)
+            items.append(item)
+    items.sort(key=lambda item: item.get("submitted_at") or 0)
+    return items
+
+
+async def mark_recovered(request_ids: List[str], key: str = REDIS_WAL_KEY) -> None:
+    """
+    หลัง recovery: ลบ WAL entry ของรายการที่จัดการแล้ว + snapshot รุ่นเก่า
+    (ไม่แตะ entry ของ request ใหม่ที่เข้ามาระหว่าง recovery)
+    """
+    try:
+        r = _get_redis()
+        pipe = r.pipeline(transaction=False)
+        if request_ids:
+            pipe.hdel(key, *request_ids)
+        pipe.delete(REDIS_QUEUE_KEY)
+        await pipe.execute()
+    except Exception as exc:
+        logger.warning("[Persistence] Failed to mark %d items recovered: %s", len(request_ids), exc)
+
+
 # ─────────────────────────────────────────────────────────────────────────── #
 # SAVE (async)
 # ─────────────────────────────────────────────────────────────────────────── #
@@ -75,7 +251,8 @@ async def load_pending_items(
     path: str = REDIS_QUEUE_KEY,
 ) -> Optional[Dict[str, Any]]:
     """
-    โหลด pending items จาก Redis
+    โหลด pending items จาก Redis: entry ที่ยังไม่เสร็จใน WAL + snapshot รุ่นเก่า (ถ้ามี)
+    รายการที่ request_id ซ้ำกันนับครั้งเดียว
 
     Returns:
         dict ที่มี keys: saved_at, count, items
@@ -83,17 +260,37 @@ async def load_pending_items(
     """
     try:
         r = _get_redis()
+        wal_items = await load_wal_items()
         raw = await r.get(REDIS_QUEUE_KEY)
-        if not raw:
+        if not raw and not wal_items:
             return None
 
-        state = json.loads(raw)
+        state: Any = {"items": []}
+        if raw:
+            try:
+                state = json.loads(raw)
+            except json.JSONDecodeError as exc:
+                logger.error("[Persistence] Corrupted state in Redis: %s", exc)
+                await r.delete(REDIS_QUEUE_KEY)
+                if not wal_items:
+                    return None
 
         if not isinstance(state, dict) or "items" not in state:
             logger.warning("[Persistence] Invalid state format in Redis")
             return None
 
         items = state.get("items", [])
+        if wal_items:
+            seen = {item.get("request_id") for item in wal_items}
+            items = wal_items + [
+                item for item in (items if isinstance(items, list) else [])
+                if not isinstance(item, dict) or not item.get("request_id") or item.get("request_id") not in seen
+            ]
+            latest = max(float(item.get("submitted_at") or 0) for item in wal_items)
+            if latest > float(state.get("saved_at_ts") or 0):
+                state["saved_at_ts"] = latest
+                state["saved_at"] = datetime.fromtimestamp(latest).isoformat()
+
         if not isinstance(items, list) or len(items) == 0:
             logger.info("[Persistence] State empty in Redis, removing")
             await clear_persisted()
@@ -123,10 +320,6 @@ async def load_pending_items(
         )
         return state
 
-    except json.JSONDecodeError as exc:
-        logger.error("[Persistence] Corrupted state in Redis: %s", exc)
-        await clear_persisted()
-        return None
     except Exception as exc:
         logger.error("[Persistence] Failed to load: %s", exc)
         return None
@@ -136,10 +329,10 @@ async def load_pending_items(
 # CLEAR (async)
 # ─────────────────────────────────────────────────────────────────────────── #
 async def clear_persisted(path: str = REDIS_QUEUE_KEY) -> bool:
-    """ลบ persisted state จาก Redis"""
+    """ลบ persisted state จาก Redis (WAL + snapshot รุ่นเก่า)"""
     try:
         r = _get_redis()
-        await r.delete(REDIS_QUEUE_KEY)
+        await r.delete(REDIS_QUEUE_KEY, REDIS_WAL_KEY)
         logger.info("[Persistence] Cleared persisted state from Redis")
         return True
     except Exception as exc:
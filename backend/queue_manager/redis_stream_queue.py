@@ -0,0 +1,875 @@
+"""
+Redis Streams backend สำหรับ LLM request queue — รันได้หลาย uvicorn worker / หลาย node
+
+API เดียวกับ LLMRequestQueue: start / shutdown / submit / cancel / cancel_session / get_position / get_stats
+
+โครงสร้างใน Redis (prefix เริ่มต้น "reg01:q"):
+- {prefix}:s:{priority}        Stream ต่อ priority class, consumer group "llm-workers"
+- {prefix}:req:{request_id}    Hash สถานะ request (pending → active → done) — เปลี่ยนสถานะผ่าน Lua
+                               จึงนับ per-user / capacity ครั้งเดียวเสมอ แม้ cancel / timeout / complete ชนกัน
+- {prefix}:users               Hash user_id → pending + active (per_user_limit ข้าม node)
+- {prefix}:depth               pending + active ทั้ง cluster (max_size)
+- {prefix}:class_pending / :tickets / :served   Hash ต่อ priority → ตำแหน่งคิว = ticket - served
+- {prefix}:stats               Hash ตัวนับรวมทั้ง cluster
+- {prefix}:reply:{node_id}     Pub/Sub channel ของ node ที่ submit: ส่งผลลัพธ์ + emit events
+                               (queue_position / ai_status / ai_response_delta) กลับไปหา socket ของผู้ใช้
+
+แต่ละ node: fetcher ดึงจาก consumer group เท่าที่มี worker ว่าง แล้วเรียงผ่าน FairScheduler
+(priority class + DRR ข้ามผู้ใช้) เหมือน backend ในหน่วยความจำ
+
+Redis client ต้องเป็น redis.asyncio แบบ decode_responses=True (เหมือน memory.redis_client)
+ไม่มี application imports — redis_fn ถูก inject (ค่าเริ่มต้น lazy import memory.redis_client)
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from queue_manager.cancellation import CancelScope, RequestCancelled, bind_cancel_scope
+from queue_manager.deadline import Deadline, bind_deadline
+from queue_manager.request_queue import QueueConfig, QueueFullError, QueueTimeoutError
+from queue_manager.scheduler import (
+    PRIORITY_NAMES,
+    PRIORITY_WEB,
+    FairScheduler,
+    priority_name,
+)
+from queue_manager.service_model import OUTCOME_ERROR, ServiceTimeModel, classify_outcome
+
+logger = logging.getLogger("QueueManager.Redis")
+
+DEFAULT_PREFIX = "reg01:q"
+CONSUMER_GROUP = "llm-workers"
+
+# KEYS: users, depth, class_pending, tickets, req   ARGV: user, per_user_limit, max_size, priority, ttl
+_ADMIT_LUA = """
+local used = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if used >= tonumber(ARGV[2]) then return -1 end
+local depth = tonumber(redis.call('GET', KEYS[2]) or '0')
+if depth >= tonumber(ARGV[3]) then return -2 end
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+redis.call('INCR', KEYS[2])
+redis.call('HINCRBY', KEYS[3], ARGV[4], 1)
+local ticket = redis.call('HINCRBY', KEYS[4], ARGV[4], 1)
+redis.call('HSET', KEYS[5], 'state', 'pending', 'user', ARGV[1], 'priority', ARGV[4])
+redis.call('EXPIRE', KEYS[5], tonumber(ARGV[5]))
+return ticket
+"""
+
+# KEYS: req, class_pending, served   → 1 = claimed (pending → active), 0 = cancelled / timed out
+_CLAIM_LUA = """
+if redis.call('HGET', KEYS[1], 'state') ~= 'pending' then return 0 end
+local priority = redis.call('HGET', KEYS[1], 'priority')
+redis.call('HSET', KEYS[1], 'state', 'active')
+redis.call('HINCRBY', KEYS[2], priority, -1)
+redis.call('HINCRBY', KEYS[3], priority, 1)
+return 1
+"""
+
+# KEYS: req, users, depth, class_pending, served   ARGV: only_pending ("1" = cancel เฉพาะที่ยังรอ)
+# → 1 = เปลี่ยนเป็น done ครั้งนี้ (ลดตัวนับแล้ว), 0 = done ไปแล้ว / ไม่พบ / active แต่ only_pending
+_FINISH_LUA = """
+local state = redis.call('HGET', KEYS[1], 'state')
+if (not state) or state == 'done' then return 0 end
+if ARGV[1] == '1' and state ~= 'pending' then return 0 end
+local user = redis.call('HGET', KEYS[1], 'user')
+local priority = redis.call('HGET', KEYS[1], 'priority')
+if state == 'pending' then
+  redis.call('HINCRBY', KEYS[4], priority, -1)
+  redis.call('HINCRBY', KEYS[5], priority, 1)
+end
+redis.call('HSET', KEYS[1], 'state', 'done')
+if redis.call('HINCRBY', KEYS[2], user, -1) <= 0 then redis.call('HDEL', KEYS[2], user) end
+if redis.call('DECR', KEYS[3]) < 0 then redis.call('SET', KEYS[3], 0) end
+return 1
+"""
+
+
+def _default_redis():
+    """Shared app Redis client (lazy import เหมือน queue_manager.persistence)"""
+    from memory.redis_client import get_redis
+    return get_redis()
+
+
+@dataclass
+class _Waiter:
+    """Request ที่ submit จาก node นี้และกำลังรอผล"""
+    future: asyncio.Future
+    emit_fn: Optional[Callable]
+    priority: int
+    ticket: int
+    last_position: int = 0
+    session_id: str = ""
+
+
+@dataclass
+class _StreamItem:
+    """Entry ที่ node นี้ดึงจาก stream (อยู่ใน PEL ของ consumer นี้จนกว่าจะ ack)"""
+    entry_id: str
+    stream: str
+    request_id: str
+    user_id: str
+    session_id: str
+    msg: str
+    priority: int
+    reply_to: str
+    has_emit: bool
+    submitted_at: float
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    cancel_scope: CancelScope = field(default_factory=CancelScope)
+
+
+class RemoteHandlerError(RuntimeError):
+    """Handler บน node อื่น raise error (ส่งกลับมาเป็นข้อความ)"""
+
+
+class RedisStreamQueue:
+    """
+    Drop-in แทน LLMRequestQueue เมื่อต้องรันหลาย process / node (QUEUE_BACKEND=redis)
+
+    Usage:
+        queue = RedisStreamQueue(handler_fn=ask_llm, config=QueueConfig(), redis_fn=get_redis)
+        await queue.start()
+        result = await queue.submit(user_id, session_id, msg, emit_fn, priority=PRIORITY_WEB)
+        await queue.shutdown()
+    """
+
+    def __init__(
+        self,
+        handler_fn: Callable,
+        config: Optional[QueueConfig] = None,
+        redis_fn: Optional[Callable] = None,
+        prefix: str = DEFAULT_PREFIX,
+        node_id: Optional[str] = None,
+        block_ms: int = 5000,
+        stats_refresh_interval: float = 2.0,
+    ):
+        if not callable(handler_fn):
+            raise ValueError("handler_fn must be callable")
+
+        self._handler = handler_fn
+        self._config = config or QueueConfig()
+        self._redis_fn = redis_fn or _default_redis
+        self._redis = None
+        self._prefix = prefix
+        self._node_id = node_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._block_ms = max(1, int(block_ms))
+        self._stats_refresh_interval = max(0.1, float(stats_refresh_interval))
+        self._priorities = sorted(set(self._config.class_weights) | set(PRIORITY_NAMES))
+        self._reply_channel = f"{prefix}:reply:{self._node_id}"
+
+        self._local = FairScheduler(self._config.class_weights, self._config.user_quantum)
+        # service time ที่ node นี้ทำเสร็จ → estimated_wait (model เดียวกับ backend ในหน่วยความจำ)
+        self._service = ServiceTimeModel(
+            alpha=self._config.service_ewma_alpha,
+            default_service_s=self._config.default_service_time,
+        )
+        self._waiting: Dict[str, _Waiter] = {}
+        self._active: Dict[str, _StreamItem] = {}
+        self._idle_workers = 0
+        self._capacity = asyncio.Event()
+
+        self._workers: List[asyncio.Task] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pubsub = None
+        self._running = False
+        self._started_at: Optional[float] = None
+
+        self._cluster: Dict[str, Any] = {}
+        self._local_totals = {"submitted": 0, "processed": 0, "errors": 0, "timeouts": 0, "rejected": 0, "cancelled": 0}
+
+    # ── keys ──────────────────────────────────────────────────────────
+    def _stream(self, priority: int) -> str:
+        return f"{self._prefix}:s:{priority}"
+
+    def _req_key(self, request_id: str) -> str:
+        return f"{self._prefix}:req:{request_id}"
+
+    def _key(self, name: str) -> str:
+        return f"{self._prefix}:{name}"
+
+    def _finish_keys(self, request_id: str) -> List[str]:
+        return [
+            self._req_key(request_id), self._key("users"), self._key("depth"),
+            self._key("class_pending"), self._key("served"),
+        ]
+
+    # ───────────────────────────────────────────────────────────────────── #
+    # LIFECYCLE
+    # ───────────────────────────────────────────────────────────────────── #
+    async def start(self):
+        if self._running:
+            logger.warning("Queue already running")
+            return
+
+        self._redis = self._redis_fn()
+        self._admit = self._redis.register_script(_ADMIT_LUA)
+        self._claim = self._redis.register_script(_CLAIM_LUA)
+        self._finish = self._redis.register_script(_FINISH_LUA)
+
+        for priority in self._priorities:
+            try:
+                await self._redis.xgroup_create(self._stream(priority), CONSUMER_GROUP, id="0", mkstream=True)
+            except Exception as exc:
+                if "BUSYGROUP" not in str(exc):
+                    raise
+
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(self._reply_channel)
+
+        self._running = True
+        self._started_at = time.time()
+        for i in range(self._config.num_workers):
+            self._workers.append(asyncio.create_task(self._worker(i), name=f"redis-queue-worker-{i}"))
+        self._tasks = [
+            asyncio.create_task(self._fetcher(), name="redis-queue-fetcher"),
+            asyncio.create_task(self._reply_listener(), name="redis-queue-replies"),
+            asyncio.create_task(self._position_broadcaster(), name="redis-queue-positions"),
+            asyncio.create_task(self._health_monitor(), name="redis-queue-health"),
+        ]
+        await self._refresh_cluster_stats()
+
+        logger.info(
+            "✅ [Queue:redis] Started | node=%s workers=%d max_size=%d per_user=%d timeout=%ds",
+            self._node_id, self._config.num_workers, self._config.max_size,
+            self._config.per_user_limit, int(self._config.request_timeout),
+        )
+
+    async def shutdown(self):
+        if not self._running:
+            return
+        logger.info("🛑 [Queue:redis] Shutting down node=%s...", self._node_id)
+        self._running = False
+
+        for task in self._tasks + self._workers:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._workers, return_exceptions=True)
+        self._tasks.clear()
+        self._workers.clear()
+
+        # Prefetched แต่ยังไม่เริ่ม → คืนเข้า stream ให้ node อื่น; กำลังทำอยู่ → แจ้ง error ให้ผู้ส่ง
+        requeued = 0
+        while not self._local.empty():
+            item = self._local.get_nowait()
+            try:
+                await self._requeue(item)
+                requeued += 1
+            except Exception as exc:
+                logger.warning("[Queue:redis] Requeue failed for %s: %s", item.request_id[:8], exc)
+        for item in list(self._active.values()):
+            try:
+                await self._complete(item, {"type": "error", "error": "queue node shutting down"})
+            except Exception as exc:
+                logger.warning("[Queue:redis] Abort failed for %s: %s", item.request_id[:8], exc)
+        self._active.clear()
+
+        # ผู้ใช้ที่รออยู่บน node นี้ → ยกเลิก (submit จะ cleanup ตัวนับเอง)
+        for waiter in self._waiting.values():
+            if not waiter.future.done():
+                waiter.future.cancel()
+        await asyncio.sleep(0)
+
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self._reply_channel)
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+        logger.info("✅ [Queue:redis] Shutdown complete | requeued=%d", requeued)
+
+    # ───────────────────────────────────────────────────────────────────── #
+    # SUBMIT
+    # ───────────────────────────────────────────────────────────────────── #
+    async def submit(
+        self,
+        user_id: str,
+        session_id: str,
+        msg: str,
+        emit_fn: Optional[Callable] = None,
+        priority: int = PRIORITY_WEB,
+        **kwargs,
+    ) -> dict:
+        """
+        Submit a request to the cluster queue and wait for the result.
+        kwargs ต้อง serialize เป็น JSON ได้ (ส่งข้าม node ผ่าน stream)
+
+        Raises:
+            QueueFullError: Queue at capacity or per-user limit reached (ทั้ง cluster)
+            QueueTimeoutError: Request timed out
+            RuntimeError: Queue not running
+        """
+        if not self._running:
+            raise RuntimeError("Queue is not running")
+
+        request_id = uuid.uuid4().hex
+        ttl = int(self._config.request_timeout * 3) + 60
+        ticket = int(await self._admit(
+            keys=[
+                self._key("users"), self._key("depth"), self._key("class_pending"),
+                self._key("tickets"), self._req_key(request_id),
+            ],
+            args=[user_id, self._config.per_user_limit, self._config.max_size, priority, ttl],
+        ))
+        if ticket < 0:
+            self._local_totals["rejected"] += 1
+            await self._redis.hincrby(self._key("stats"), "rejected", 1)
+            if ticket == -1:
+                raise QueueFullError(
+                    f"ระบบกำลังประมวลผลคำขอของคุณอยู่ กรุณารอสักครู่ "
+                    f"(สูงสุด {self._config.per_user_limit} คำขอพร้อมกันต่อผู้ใช้)"
+                )
+            raise QueueFullError(
+                "ระบบมีผู้ใช้งานจำนวนมากในขณะนี้ "
+                "กรุณาลองใหม่อีกครั้งในอีกสักครู่"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(future=future, emit_fn=emit_fn, priority=priority, ticket=ticket, session_id=session_id)
+        self._waiting[request_id] = waiter
+        self._local_totals["submitted"] += 1
+
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.xadd(self._stream(priority), {
+                "request_id": request_id,
+                "user_id": user_id,
+                "session_id": session_id,
+                "msg": msg,
+                "priority": priority,
+                "reply_to": self._reply_channel,
+                "has_emit": "1" if emit_fn else "0",
+                "submitted_at": time.time(),
+                "kwargs": json.dumps(kwargs, ensure_ascii=False),
+            })
+            pipe.hincrby(self._key("stats"), "submitted", 1)
+            await pipe.execute()
+
+            position, estimated_wait = await self._position_and_wait(request_id)
+            waiter.last_position = position
+            if position > 0:
+                await self._emit_safe(emit_fn, "queue_position", {
+                    "position": position,
+                    "request_id": request_id,
+                    "estimated_wait": round(estimated_wait, 1),
+                    "status": "queued",
+                })
+                await self._emit_safe(emit_fn, "ai_status", {"status": f"กำลังรอคิว ลำดับที่ {position} ..."})
+
+            logger.info(
+                "[Queue:redis] Submitted request=%s user=%s session=%s class=%s pos=%d",
+                request_id[:8], user_id[:16], session_id[:16], priority_name(priority), position,
+            )
+            return await asyncio.wait_for(future, timeout=self._config.request_timeout)
+
+        except asyncio.TimeoutError:
+            self._local_totals["timeouts"] += 1
+            self._abort_local(request_id, "timeout")
+            await self._finish_quietly(request_id, "timeouts")
+            logger.warning(
+                "[Queue:redis] Timeout request=%s user=%s (%.0fs)",
+                request_id[:8], user_id[:16], self._config.request_timeout,
+            )
+            raise QueueTimeoutError(
+                f"คำขอหมดเวลารอ ({int(self._config.request_timeout)}s) "
+                "กรุณาลองใหม่อีกครั้ง"
+            )
+        except asyncio.CancelledError:
+            self._local_totals["cancelled"] += 1
+            self._abort_local(request_id, "client_cancelled")
+            await asyncio.shield(self._finish_quietly(request_id, "cancelled"))
+            raise
+        except RemoteHandlerError:
+            raise
+        except Exception:
+            await self._finish_quietly(request_id, None)
+            raise
+        finally:
+            self._waiting.pop(request_id, None)
+
+    def _abort_local(self, request_id: str, reason: str) -> None:
+        """ผู้รอเลิกรอแล้ว → ถ้า worker บน node นี้กำลังทำ request นี้อยู่ ให้หยุดที่ขอบ stage ถัดไป"""
+        item = self._active.get(request_id)
+        if item is not None:
+            item.cancel_scope.cancel(reason)
+
+    async def _finish_quietly(self, request_id: str, stat: Optional[str]) -> None:
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            await self._finish(keys=self._finish_keys(request_id), args=["0"], client=pipe)
+            if stat:
+                pipe.hincrby(self._key("stats"), stat, 1)
+            await pipe.execute()
+        except Exception as exc:
+            logger.warning("[Queue:redis] Cleanup failed for %s: %s", request_id[:8], exc)
+
+    # ───────────────────────────────────────────────────────────────────── #
+    # FETCH + WORKERS
+    # ───────────────────────────────────────────────────────────────────── #
+    async def _fetcher(self):
+        """ดึง entry จาก consumer group เท่าที่ worker ว่างรับได้ → local FairScheduler"""
+        streams = {self._stream(priority): ">" for priority in self._priorities}
+        while self._running:
+            try:
+                free = self._idle_workers - self._local.qsize()
+                if free <= 0:
+                    self._capacity.clear()
+                    await self._capacity.wait()
+                    continue
+                response = await self._redis.xreadgroup(
+                    CONSUMER_GROUP, self._node_id, streams, count=free, block=self._block_ms,
+                )
+                if not response:
+                    continue
+                batches = response.items() if isinstance(response, dict) else response
+                for stream, entries in batches:
+                    for entry in entries:
+                        entry_id, fields = entry[0], entry[1]
+                        item = self._parse_entry(stream, entry_id, fields)
+                        if item is None:
+                            await self._redis.xack(stream, CONSUMER_GROUP, entry_id)
+                            await self._redis.xdel(stream, entry_id)
+                            continue
+                        self._local.put_nowait(item)
+            except asyncio.CancelledError:
+                return
+            except Exception as exc:
+                logger.error("[Queue:redis] Fetch error: %s", exc)
+                await asyncio.sleep(1.0)
+
+    @staticmethod
+    def _parse_entry(stream: str, entry_id: str, fields: Dict[str, str]) -> Optional[_StreamItem]:
+        try:
+            return _StreamItem(
+                entry_id=entry_id,
+                stream=stream,
+                request_id=fields["request_id"],
+                user_id=fields["user_id"],
+                session_id=fields["session_id"],
+                msg=fields["msg"],
+                priority=int(fields.get("priority", PRIORITY_WEB)),
+                reply_to=fields["reply_to"],
+                has_emit=fields.get("has_emit") == "1",
+                submitted_at=float(fields.get("submitted_at") or time.time()),
+                kwargs=json.loads(fields.get("kwargs") or "{}"),
+            )
+        except (KeyError, ValueError, TypeError) as exc:
+            logger.warning("[Queue:redis] Dropping malformed entry %s: %s", entry_id, exc)
+            return None
+
+    async def _worker(self, worker_id: int):
+        try:
+            while self._running:
+                self._idle_workers += 1
+                self._capacity.set()
+                try:
+                    item: _StreamItem = await self._local.get()
+                finally:
+                    self._idle_workers -= 1
+                await self._process(worker_id, item)
+        except asyncio.CancelledError:
+            pass
+
+    async def _process(self, worker_id: int, item: _StreamItem) -> None:
+        claimed = await self._claim(
+            keys=[self._req_key(item.request_id), self._key("class_pending"), self._key("served")],
+        )
+        if not claimed:
+            # ผู้ส่ง cancel / timeout ไปแล้ว
+            await self._ack(item)
+            return
+
+        self._active[item.request_id] = item
+        dispatched_at = time.time()
+        wait_time = dispatched_at - item.submitted_at
+        emit_fn = self._make_emit(item) if item.has_emit else None
+        await self._emit_safe(emit_fn, "queue_position", {
+            "position": 0,
+            "request_id": item.request_id,
+            "status": "processing",
+            "waited": round(wait_time, 1),
+        })
+        await self._emit_safe(emit_fn, "ai_status", {"status": "กำลังประมวลผล..."})
+        logger.info(
+            "[Queue:redis] Worker #%d processing request=%s user=%s class=%s waited=%.1fs",
+            worker_id, item.request_id[:8], item.user_id[:16], priority_name(item.priority), wait_time,
+        )
+
+        try:
+            context = contextvars.copy_context()
+            context.run(bind_cancel_scope, item.cancel_scope)
+            # Deadline นับจากเวลาที่ submit บน node ต้นทาง (wall clock ข้าม node)
+            context.run(bind_deadline, Deadline.within(
+                item.submitted_at + self._config.request_timeout - time.time(),
+                self._config.deadline_reserve,
+            ))
+            result = await asyncio.create_task(
+                self._handler(item.msg, item.session_id, emit_fn=emit_fn, **item.kwargs),
+                context=context,
+            )
+            reply = {"type": "result", "result": result}
+            stat = "processed"
+            self._service.observe(item.priority, classify_outcome(result), time.time() - dispatched_at)
+        except RequestCancelled as cancelled:
+            logger.info(
+                "[Queue:redis] Worker #%d aborted request=%s reason=%s",
+                worker_id, item.request_id[:8], cancelled.reason,
+            )
+            reply = {"type": "cancelled", "error": cancelled.reason}
+            stat = "cancelled"
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if current is not None and current.cancelling():
+                raise  # worker itself is being cancelled (shutdown)
+            # Handler task cancelled from inside — abort this request, keep the worker alive
+            logger.warning("[Queue:redis] Worker #%d handler cancelled request=%s", worker_id, item.request_id[:8])
+            reply = {"type": "cancelled", "error": "handler_cancelled"}
+            stat = "cancelled"
+        except Exception as exc:
+            logger.error("[Queue:redis] Worker #%d error request=%s: %s", worker_id, item.request_id[:8], exc)
+            reply = {"type": "error", "error": f"{type(exc).__name__}: {exc}"}
+            stat = "errors"
+            self._service.observe(item.priority, OUTCOME_ERROR, time.time() - dispatched_at)
+        self._local_totals[stat] += 1
+        await self._complete(item, reply, stat)
+        self._active.pop(item.request_id, None)
+
+    async def _complete(self, item: _StreamItem, reply: Dict[str, Any], stat: Optional[str] = None) -> None:
+        """ส่งผลกลับ + done + ack/del ใน round trip เดียว"""
+        reply["request_id"] = item.request_id
+        delivered = self._deliver_local(item.reply_to, reply)
+        pipe = self._redis.pipeline(transaction=False)
+        if not delivered:
+            pipe.publish(item.reply_to, json.dumps(reply, ensure_ascii=False, default=str))
+        await self._finish(keys=self._finish_keys(item.request_id), args=["0"], client=pipe)
+        pipe.xack(item.stream, CONSUMER_GROUP, item.entry_id)
+        pipe.xdel(item.stream, item.entry_id)
+        if stat:
+            pipe.hincrby(self._key("stats"), stat, 1)
+        await pipe.execute()
+
+    async def _ack(self, item: _StreamItem) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.xack(item.stream, CONSUMER_GROUP, item.entry_id)
+        pipe.xdel(item.stream, item.entry_id)
+        await pipe.execute()
+
+    async def _requeue(self, item: _StreamItem) -> None:
+        """คืน entry ที่ prefetch ไว้กลับเข้า stream (ตอน shutdown) ให้ node อื่นรับต่อ"""
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.xadd(item.stream, {
+            "request_id": item.request_id,
+            "user_id": item.user_id,
+            "session_id": item.session_id,
+            "msg": item.msg,
+            "priority": item.priority,
+            "reply_to": item.reply_to,
+            "has_emit": "1" if item.has_emit else "0",
+            "submitted_at": item.submitted_at,
+            "kwargs": json.dumps(item.kwargs, ensure_ascii=False),
+        })
+        pipe.xack(item.stream, CONSUMER_GROUP, item.entry_id)
+        pipe.xdel(item.stream, item.entry_id)
+        await pipe.execute()
+
+    def _make_emit(self, item: _StreamItem) -> Callable:
+        async def _emit(event: str, payload: dict) -> None:
+            message = {"type": "emit", "request_id": item.request_id, "event": event, "payload": payload}
+            if self._deliver_local(item.reply_to, message):
+                return
+            await self._redis.publish(item.reply_to, json.dumps(message, ensure_ascii=False, default=str))
+        return _emit
+
+    # ───────────────────────────────────────────────────────────────────── #
+    # REPLIES
+    # ───────────────────────────────────────────────────────────────────── #
+    def _deliver_local(self, reply_to: str, message: Dict[str, Any]) -> bool:
+        """ผู้ส่งอยู่บน node นี้ → ส่งตรงโดยไม่ผ่าน pub/sub"""
+        if reply_to != self._reply_channel:
+            return False
+        self._dispatch_reply(message)
+        return True
+
+    def _dispatch_reply(self, message: Dict[str, Any]) -> None:
+        waiter = self._waiting.get(str(message.get("request_id") or ""))
+        if waiter is None:
+            return
+        kind = message.get("type")
+        if kind == "emit":
+            if waiter.emit_fn is not None:
+                asyncio.ensure_future(
+                    self._emit_safe(waiter.emit_fn, message.get("event", ""), message.get("payload") or {})
+                )
+            return
+        if waiter.future.done():
+            return
+        if kind == "result":
+            waiter.future.set_result(message.get("result"))
+        elif kind == "cancelled":
+            waiter.future.set_exception(RequestCancelled(str(message.get("error") or "cancelled")))
+        else:
+            waiter.future.set_exception(RemoteHandlerError(str(message.get("error") or "remote handler failed")))
+
+    async def _reply_listener(self):
+        while self._running:
+            try:
+                async for raw in self._pubsub.listen():
+                    if raw.get("type") != "message":
+                        continue
+                    try:
+                        self._dispatch_reply(json.loads(raw["data"]))
+                    except (ValueError, TypeError) as exc:
+                        logger.warning("[Queue:redis] Bad reply message: %s", exc)
+            except asyncio.CancelledError:
+                return
+            except Exception as exc:
+                logger.error("[Queue:redis] Reply listener error: %s", exc)
+                await asyncio.sleep(1.0)
+
+    # ───────────────────────────────────────────────────────────────────── #
+    # POSITION & NOTIFICATIONS
+    # ───────────────────────────────────────────────────────────────────── #
+    async def _counters(self) -> tuple:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hgetall(self._key("served"))
+        pipe.hgetall(self._key("class_pending"))
+        served, pending = await pipe.execute()
+        return (
+            {int(k): int(v) for k, v in (served or {}).items()},
+            {int(k): int(v) for k, v in (pending or {}).items()},
+        )
+
+    @staticmethod
+    def _position_from(waiter: _Waiter, served: Dict[int, int], pending: Dict[int, int]) -> int:
+        ahead = sum(count for priority, count in pending.items() if priority < waiter.priority and count > 0)
+        return max(1, waiter.ticket - served.get(waiter.priority, 0)) + ahead
+
+    def _estimate_wait(self, waiter: _Waiter, served: Dict[int, int], pending: Dict[int, int]) -> float:
+        """
+        estimated_wait (วินาที) จาก EWMA service time — สูตรเดียวกับ LLMRequestQueue
+        ใช้ worker ของ node นี้เป็นตัวหาร (ไม่รู้จำนวน node ทั้ง cluster → ค่าประมาณฝั่งสูง)
+        """
+        ahead = max(0, waiter.ticket - served.get(waiter.priority, 0) - 1)
+        return self._service.expected_wait(
+            waiter.priority,
+            ahead,
+            pending,
+            self._config.class_weights,
+            len(self._workers),
+            (active.priority for active in self._active.values()),
+        )
+
+    async def _position_and_wait(self, request_id: str) -> tuple:
+        """(position, estimated_wait) ของ request ที่ submit จาก node นี้; (0, 0.0) = กำลังทำ / ไม่พบ"""
+        waiter = self._waiting.get(request_id)
+        if waiter is None:
+            return 0, 0.0
+        if await self._redis.hget(self._req_key(request_id), "state") != "pending":
+            return 0, 0.0
+        served, pending = await self._counters()
+        return self._position_from(waiter, served, pending), self._estimate_wait(waiter, served, pending)
+
+    async def get_position(self, request_id: str) -> int:
+        """Queue position (1-based) ของ request ที่ submit จาก node นี้; 0 = กำลังทำ / ไม่พบ"""
+        position, _ = await self._position_and_wait(request_id)
+        return position
+
+    async def _position_broadcaster(self):
+        """ทุก position_broadcast_interval: 1 round trip → แจ้งเฉพาะผู้ใช้บน node นี้ที่ลำดับเปลี่ยน"""
+        interval = max(0.1, self._config.position_broadcast_interval)
+        while self._running:
+            try:
+                await asyncio.sleep(interval)
+                waiters = [(rid, w) for rid, w in self._waiting.items() if w.emit_fn and not w.future.done()]
+                if not waiters:
+                    continue
+                served, pending = await self._counters()
+                emits = []
+                for rid, waiter in waiters:
+                    position = self._position_from(waiter, served, pending)
+                    if waiter.ticket <= served.get(waiter.priority, 0) or position == waiter.last_position:
+                        continue  # dispatched already, or unchanged
+                    waiter.last_position = position
+                    emits.append(self._emit_safe(waiter.emit_fn, "queue_position", {
+                        "position": position,
+                        "request_id": rid,
+                        "status": "queued",
+                        "estimated_wait": round(self._estimate_wait(waiter, served, pending), 1),
+                    }))
+                    emits.append(self._emit_safe(
+                        waiter.emit_fn, "ai_status", {"status": f"กำลังรอคิว ลำดับที่ {position} ..."},
+                    ))
+                if emits:
+                    await asyncio.gather(*emits)
+            except asyncio.CancelledError:
+                return
+            except Exception as exc:
+                logger.error("[Queue:redis] Position broadcast error: %s", exc)
+
+    @staticmethod
+    async def _emit_safe(emit_fn: Optional[Callable], event: str, payload: dict) -> None:
+        if not emit_fn:
+            return
+        try:
+            await emit_fn(event, payload)
+        except Exception:
+            pass
+
+    # ───────────────────────────────────────────────────────────────────── #
+    # CANCEL
+    # ───────────────────────────────────────────────────────────────────── #
+    async def cancel(self, request_id: str) -> bool:
+        """Cancel a pending request (จาก node ไหนก็ได้). Returns True if it was still queued."""
+        cancelled = bool(await self._finish(keys=self._finish_keys(request_id), args=["1"]))
+        if cancelled:
+            self._local_totals["cancelled"] += 1
+            await self._redis.hincrby(self._key("stats"), "cancelled", 1)
+            waiter = self._waiting.get(request_id)
+            if waiter is not None and not waiter.future.done():
+                waiter.future.cancel()
+        return cancelled
+
+    async def cancel_session(self, session_id: str, reason: str = "client_disconnected") -> int:
+        """
+        Cancel request ของ session ที่ submit จาก node นี้ (client หลุด)
+        ที่ยังรอใน stream → done ทันที; ที่ worker บน node นี้กำลังทำ → หยุดที่ขอบ stage ถัดไป
+        (handler บน node อื่นทำจนจบ แต่ผู้รอได้ RequestCancelled ทันที)
+        """
+        cancelled = 0
+        for request_id, waiter in list(self._waiting.items()):
+            if waiter.session_id != session_id or waiter.future.done():
+                continue
+            if await self._finish(keys=self._finish_keys(request_id), args=["1"]):
+                await self._redis.hincrby(self._key("stats"), "cancelled", 1)
+            self._abort_local(request_id, reason)
+            if not waiter.future.done():
+                waiter.future.set_exception(RequestCancelled(reason))
+            cancelled += 1
+        if cancelled:
+            self._local_totals["cancelled"] += cancelled
+            logger.info("[Queue:redis] Cancelled %d request(s) of session=%s (%s)", cancelled, session_id[:16], reason)
+        return cancelled
+
+    # ───────────────────────────────────────────────────────────────────── #
+    # STATISTICS & HEALTH
+    # ───────────────────────────────────────────────────────────────────── #
+    async def _refresh_cluster_stats(self) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(self._key("depth"))
+        pipe.hgetall(self._key("class_pending"))
+        pipe.hgetall(self._key("stats"))
+        pipe.hlen(self._key("users"))
+        for priority in self._priorities:
+            pipe.xlen(self._stream(priority))
+        results = await pipe.execute()
+        depth, class_pending, totals, users = results[:4]
+        lengths = results[4:]
+        class_pending = {int(k): max(0, int(v)) for k, v in (class_pending or {}).items()}
+        self._cluster = {
+            "depth": int(depth or 0),
+            "class_pending": class_pending,
+            "totals": {k: int(v) for k, v in (totals or {}).items()},
+            "users": int(users or 0),
+            "stream_lengths": dict(zip(self._priorities, (int(n or 0) for n in lengths))),
+            "refreshed_at": time.time(),
+        }
+
+    async def _reclaim_stale(self) -> int:
+        """Entry ค้างใน PEL ของ consumer ที่ตายไปนานเกิน timeout → cleanup ตัวนับ + ack/del"""
+        min_idle_ms = int((self._config.request_timeout * 2 + 60) * 1000)
+        reclaimed = 0
+        for priority in self._priorities:
+            stream = self._stream(priority)
+            try:
+                response = await self._redis.xautoclaim(stream, CONSUMER_GROUP, self._node_id, min_idle_ms, count=100)
+            except Exception as exc:
+                logger.debug("[Queue:redis] XAUTOCLAIM unavailable on %s: %s", stream, exc)
+                continue
+            for entry_id, fields in (response[1] if response and len(response) > 1 else []):
+                if not fields:
+                    continue
+                pipe = self._redis.pipeline(transaction=False)
+                await self._finish(keys=self._finish_keys(fields.get("request_id", "")), args=["0"], client=pipe)
+                pipe.xack(stream, CONSUMER_GROUP, entry_id)
+                pipe.xdel(stream, entry_id)
+                await pipe.execute()
+                reclaimed += 1
+        return reclaimed
+
+    async def _health_monitor(self):
+        last_log = time.monotonic()
+        while self._running:
+            try:
+                await asyncio.sleep(self._stats_refresh_interval)
+                await self._refresh_cluster_stats()
+                if time.monotonic() - last_log < self._config.health_log_interval:
+                    continue
+                last_log = time.monotonic()
+                reclaimed = await self._reclaim_stale()
+                stats = self.get_stats()
+                logger.info(
+                    "[Queue:redis Health] node=%s cluster pending=%d active=%d users=%d "
+                    "local waiting=%d active=%d reclaimed=%d",
+                    self._node_id, stats["current"]["pending"], stats["current"]["active"],
+                    stats["active_users"], len(self._waiting), len(self._active), reclaimed,
+                )
+            except asyncio.CancelledError:
+                return
+            except Exception as exc:
+                logger.error("[Queue:redis Health] Monitor error: %s", exc)
+
+    def get_stats(self) -> dict:
+        """Snapshot (cluster counters refresh ทุก stats_refresh_interval) — รูปแบบเดียวกับ LLMRequestQueue"""
+        uptime = round(time.time() - self._started_at, 1) if self._started_at else 0
+        cluster = self._cluster
+        class_pending = cluster.get("class_pending", {})
+        pending = sum(class_pending.values())
+        depth = cluster.get("depth", 0)
+        totals = {key: 0 for key in self._local_totals}
+        totals.update(cluster.get("totals", {}))
+        return {
+            "running": self._running,
+            "backend": "redis_streams",
+            "node_id": self._node_id,
+            "config": {
+                "max_size": self._config.max_size,
+                "num_workers": self._config.num_workers,
+                "per_user_limit": self._config.per_user_limit,
+                "request_timeout": self._config.request_timeout,
+                "class_weights": self._local.weights(),
+                "user_quantum": self._config.user_quantum,
+            },
+            "current": {
+                "pending": pending,
+                "active": max(0, depth - pending),
+                "available_slots": max(0, self._config.max_size - depth),
+                "workers": len(self._workers),
+                "idle_workers": self._idle_workers,
+                "local_waiting": len(self._waiting),
+                "local_active": len(self._active),
+                "prefetched": self._local.qsize(),
+            },
+            "totals": totals,
+            "local_totals": dict(self._local_totals),
+            "classes": {
+                priority_name(priority): {
+                    "priority": priority,
+                    "weight": self._config.class_weights.get(priority, 1),
+                    "pending": class_pending.get(priority, 0),
+                    "stream_length": cluster.get("stream_lengths", {}).get(priority, 0),
+                }
+                for priority in self._priorities
+            },
+            "service_time": self._service.get_stats(),
+            "throughput_per_min": round(self._local_totals["processed"] / max(uptime, 1) * 60, 2) if uptime > 0 else 0,
+            "uptime_seconds": uptime,
+            "active_users": cluster.get("users", 0),
+            "refreshed_at": cluster.get("refreshed_at"),
+        }
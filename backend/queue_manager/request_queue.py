@@ -5,36 +5,59 @@ Decoupled LLM Request Queue System
 รับ handler function ตอน init และจัดการ:
 
 - Request queuing พร้อม capacity limits
-- Worker pool สำหรับ parallel processing
+- Worker pool สำหรับ parallel processing (elastic ระหว่าง min_workers..max_workers
+  ตาม backlog, EWMA service time และ headroom ของ LLM limiter)
 - Per-user fairness (จำกัดจำนวน request ต่อผู้ใช้)
+- Priority classes (realtime > web > messenger > background) + weighted fair queueing
+  (deficit round-robin ข้ามผู้ใช้ใน class เดียวกัน) — ดู queue_manager/scheduler.py
 - Real-time queue position updates ผ่าน emit callback
-- Request timeout & overflow protection
+  (ticket/served counter ต่อ class → O(1); broadcast แบบ batch ทุก position_broadcast_interval
+  เฉพาะรายการที่ลำดับเปลี่ยน)
+- Request timeout & overflow protection + per-request Deadline ใน contextvars ของ handler
+  (stage ภายในข้ามงานที่ไม่จำเป็นเมื่องบไม่พอ — ดู queue_manager/deadline.py)
+- Cancellation: client หลุด → cancel / cancel_session ถอด request ที่รอคิวออก และ cancel CancelScope
+  ของ request ที่กำลังทำ (handler หยุดที่ขอบ stage ถัดไป) — ดู queue_manager/cancellation.py
+- Admission control: EWMA service time ต่อ class / ผลลัพธ์ (queue_manager/service_model.py)
+  ทำนายเวลาเสร็จ ถ้าเกิน request_timeout ปฏิเสธทันที (หรือ overload_fn ตอบแบบไม่ใช้ LLM)
 - Error isolation (handler error ไม่ crash workers)
 - Graceful shutdown
 - Health monitoring & statistics
-- Queue persistence ข้าม server restart
-- Recovery: ประมวลผลคิวค้าง หรือ ล้างทิ้ง
+- Queue persistence ข้าม server restart: write-ahead log ต่อ request (queue_manager/persistence.py
+  QueueWal) — submit เขียน entry, request ที่จบลบ entry, group commit ลง Redis ไม่บล็อก submit
+- Recovery: ประมวลผลคิวค้าง (re-queue ที่ PRIORITY_BACKGROUND แบบจำกัด concurrency / rate) หรือ ล้างทิ้ง
 
 รองรับ 100+ concurrent users
 """
 
 import asyncio
-import atexit
+import contextvars
 import logging
+import math
 import time
 import uuid
 from collections import OrderedDict, defaultdict
 from dataclasses import dataclass, field
 from typing import Any, Callable, Dict, List, Optional
 
+from queue_manager.cancellation import CancelScope, RequestCancelled, bind_cancel_scope
+from queue_manager.deadline import Deadline, bind_deadline, current_deadline
 from queue_manager.persistence import (
-    save_pending_items,
+    QueueWal,
     load_pending_items,
     clear_persisted,
+    mark_recovered,
     format_pending_summary,
     format_detailed_list,
     DEFAULT_PERSIST_PATH,
 )
+from queue_manager.scheduler import (
+    DEFAULT_CLASS_WEIGHTS,
+    PRIORITY_BACKGROUND,
+    PRIORITY_WEB,
+    FairScheduler,
+    priority_name,
+)
+from queue_manager.service_model import OUTCOME_ERROR, ServiceTimeModel, classify_outcome
 
 logger = logging.getLogger("QueueManager")
 
@@ -47,6 +70,14 @@ class QueueFullError(Exception):
     pass
 
 
+class QueueOverloadedError(QueueFullError):
+    """Raised when the predicted completion time already exceeds the request deadline."""
+
+    def __init__(self, message: str, predicted_s: float = 0.0):
+        super().__init__(message)
+        self.predicted_s = predicted_s
+
+
 class QueueTimeoutError(Exception):
     """Raised when a request times out waiting in queue."""
     pass
@@ -58,11 +89,30 @@ class QueueTimeoutError(Exception):
 @dataclass
 class QueueConfig:
     max_size: int = 200             # Max total items in queue
-    num_workers: int = 10           # Number of worker coroutines
+    num_workers: int = 10           # Number of worker coroutines (initial size when elastic)
+    min_workers: Optional[int] = None  # Elastic pool lower bound (None = num_workers, fixed pool)
+    max_workers: Optional[int] = None  # Elastic pool upper bound (None = num_workers, fixed pool)
+    scale_target_wait: float = 5.0  # Scale up until the backlog drains within ~this many seconds
+    scale_down_idle: float = 60.0   # Retire workers idle longer than this (checked by health monitor)
     per_user_limit: int = 3         # Max pending+active requests per user
     request_timeout: float = 120.0  # Seconds before request times out
+    deadline_reserve: float = 1.0   # Seconds of request_timeout kept back so the handler's Deadline
+                                    # ends early enough to return a degraded answer (≤ 20% of the budget)
     health_log_interval: float = 60.0  # Seconds between health log outputs
     persist_path: str = DEFAULT_PERSIST_PATH  # Redis key for queue state
+    wal_enabled: bool = True        # Write-ahead log of unfinished requests (crash-safe recovery)
+    wal_flush_interval: float = 0.02  # Seconds between WAL group commits to Redis
+    recovery_concurrency: int = 4   # Recovered requests in flight at once (re-queued at PRIORITY_BACKGROUND)
+    recovery_rate: float = 2.0      # Recovered requests started per second (0 = unlimited)
+    recovery_report_interval: float = 10.0  # Seconds between recovery progress logs
+    # priority → weight (share of dispatches when classes are backlogged)
+    class_weights: Dict[int, int] = field(default_factory=lambda: dict(DEFAULT_CLASS_WEIGHTS))
+    user_quantum: int = 1           # Requests per user per round-robin turn within a class
+    position_broadcast_interval: float = 0.5  # Seconds between batched position updates
+    admission_control: bool = True  # Reject/divert requests predicted to miss request_timeout
+    admission_min_samples: int = 5  # Completed requests before predictions are trusted
+    service_ewma_alpha: float = 0.2  # Weight of the newest service-time sample
+    default_service_time: float = 5.0  # Seconds assumed per request before any samples
 
 
 # ─────────────────────────────────────────────────────────────────────────── #
@@ -78,7 +128,11 @@ class QueueItem:
     emit_fn: Optional[Callable] = None
     kwargs: Dict[str, Any] = field(default_factory=dict)
     submitted_at: float = 0.0
-    priority: int = 0  # Lower number = higher priority (reserved for future use)
+    priority: int = PRIORITY_WEB  # Lower number = higher priority (see queue_manager.scheduler)
+    context: Optional[contextvars.Context] = None  # submitter's contextvars (handler runs inside it)
+    cancel_scope: CancelScope = field(default_factory=CancelScope)  # client gone → handler stops at next stage
+    ticket: int = 0         # Per-class arrival number (position = ticket - served)
+    last_position: int = 0  # Last position sent to the client (skip unchanged broadcasts)
 
 
 # ─────────────────────────────────────────────────────────────────────────── #
@@ -98,6 +152,13 @@ class LLMRequestQueue:
         # From HTTP handler:
         result = await queue.submit(user_id, session_id, msg, emit_fn)
 
+    capacity_fn (optional): callable() -> int | None — LLM concurrency ที่ยังว่าง (เช่น limiter headroom)
+        ใช้เป็นเพดานตอนขยาย worker pool
+
+    overload_fn (optional): async callable(msg, session_id, **kwargs) -> dict | None
+        เรียกเมื่อ admission control ทำนายว่า request จะไม่ทัน deadline — คืน dict = ตอบแทน
+        (เช่น FAQ / extractive answer), คืน None = ปฏิเสธด้วย QueueOverloadedError
+
         # Shutdown:
         await queue.shutdown()
     """
@@ -106,30 +167,60 @@ class LLMRequestQueue:
         self,
         handler_fn: Callable,
         config: Optional[QueueConfig] = None,
+        overload_fn: Optional[Callable] = None,
+        capacity_fn: Optional[Callable[[], Optional[int]]] = None,
     ):
         if not callable(handler_fn):
             raise ValueError("handler_fn must be callable")
 
         self._handler = handler_fn
+        self._overload_fn = overload_fn
+        self._capacity_fn = capacity_fn
         self._config = config or QueueConfig()
+        self._min_workers = max(1, self._config.min_workers or self._config.num_workers)
+        self._max_workers = max(
+            self._min_workers, self._config.max_workers or self._config.num_workers
+        )
+        self._service = ServiceTimeModel(
+            alpha=self._config.service_ewma_alpha,
+            default_service_s=self._config.default_service_time,
+        )
 
-        # Internal queue (unbounded — capacity managed by self._pending)
-        self._queue: asyncio.Queue = asyncio.Queue()
+        # Internal scheduler (unbounded — capacity managed by self._pending)
+        self._queue = FairScheduler(self._config.class_weights, self._config.user_quantum)
 
         # Tracking structures
         self._pending: OrderedDict[str, QueueItem] = OrderedDict()
         self._active: Dict[str, QueueItem] = {}
         self._per_user_pending: Dict[str, int] = defaultdict(int)
         self._per_user_active: Dict[str, int] = defaultdict(int)
+        self._per_class_pending: Dict[int, int] = defaultdict(int)
+        # priority → {"dispatched", "wait_total", "wait_max"}
+        self._class_stats: Dict[int, Dict[str, float]] = defaultdict(
+            lambda: {"dispatched": 0, "wait_total": 0.0, "wait_max": 0.0}
+        )
+        # Position tracking: ticket issued at submit, served bumped on every pending removal
+        self._tickets: Dict[int, int] = defaultdict(int)
+        self._served: Dict[int, int] = defaultdict(int)
+        self._positions_dirty = asyncio.Event()
+        self._position_task: Optional[asyncio.Task] = None
 
         # Concurrency control
         self._lock = asyncio.Lock()
-        self._workers: List[asyncio.Task] = []
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._idle_since: Dict[int, float] = {}  # worker_id → monotonic time it started waiting
+        self._next_worker_id = 0
+        self._scale_ups = 0
+        self._scale_downs = 0
+        self._last_scale: str = ""
+        self._last_scale_logged: str = ""
         self._health_task: Optional[asyncio.Task] = None
         self._running = False
 
         # Persistence
         self._persist_path = self._config.persist_path
+        self._wal = QueueWal(flush_interval=self._config.wal_flush_interval)
+        self._recovery: Optional[dict] = None  # progress of the last recover_pending()
 
         # Statistics (atomic increments via lock)
         self._total_submitted = 0
@@ -138,6 +229,9 @@ class LLMRequestQueue:
         self._total_timeouts = 0
         self._total_rejected = 0
         self._total_cancelled = 0
+        self._total_aborted = 0  # In-flight handlers stopped because the client went away
+        self._total_shed = 0
+        self._total_diverted = 0
         self._started_at: Optional[float] = None
         self._peak_pending = 0
         self._peak_active = 0
@@ -154,35 +248,41 @@ class LLMRequestQueue:
         self._running = True
         self._started_at = time.time()
 
-        for i in range(self._config.num_workers):
-            task = asyncio.create_task(self._worker(i), name=f"queue-worker-{i}")
-            self._workers.append(task)
+        initial = min(self._max_workers, max(self._min_workers, self._config.num_workers))
+        for _ in range(initial):
+            self._spawn_worker()
 
         self._health_task = asyncio.create_task(
             self._health_monitor(), name="queue-health"
         )
+        self._position_task = asyncio.create_task(
+            self._position_broadcaster(), name="queue-positions"
+        )
 
-        # ลงทะเบียน atexit handler สำหรับกรณี crash หรือ kill process
-        atexit.register(self._emergency_persist)
+        if self._config.wal_enabled:
+            self._wal.start()
 
         logger.info(
-            "✅ [Queue] Started | workers=%d max_size=%d per_user=%d timeout=%ds",
-            self._config.num_workers,
+            "✅ [Queue] Started | workers=%d (min=%d max=%d) max_size=%d per_user=%d timeout=%ds",
+            len(self._workers), self._min_workers, self._max_workers,
             self._config.max_size,
             self._config.per_user_limit,
             int(self._config.request_timeout),
         )
 
     async def shutdown(self):
-        """Gracefully shut down queue — persist pending, cancel futures, wait for workers."""
+        """Gracefully shut down queue — flush the WAL, cancel futures, wait for workers."""
         if not self._running:
             return
 
         logger.info("🛑 [Queue] Shutting down...")
         self._running = False
 
-        # Persist pending + active items before cancelling
-        await self._persist_state()
+        # Flush + close the WAL before cancelling: entries of unfinished requests stay for recovery
+        await self._wal.close()
+        unfinished = len(self._pending) + len(self._active)
+        if unfinished:
+            logger.info("[Queue] %d unfinished requests kept in the WAL for recovery", unfinished)
 
         # Cancel all pending futures
         async with self._lock:
@@ -191,19 +291,23 @@ class LLMRequestQueue:
                     item.future.cancel()
             self._pending.clear()
             self._per_user_pending.clear()
+            self._per_class_pending.clear()
 
-        # Cancel health monitor
-        if self._health_task and not self._health_task.done():
-            self._health_task.cancel()
+        # Cancel health monitor + position broadcaster
+        for task in (self._health_task, self._position_task):
+            if task and not task.done():
+                task.cancel()
 
         # Cancel workers
-        for task in self._workers:
+        workers = list(self._workers.values())
+        for task in workers:
             task.cancel()
 
-        if self._workers:
-            await asyncio.gather(*self._workers, return_exceptions=True)
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
 
         self._workers.clear()
+        self._idle_since.clear()
         logger.info("✅ [Queue] Shutdown complete | stats=%s", self.get_stats())
 
     # ───────────────────────────────────────────────────────────────────── #
@@ -215,7 +319,7 @@ class LLMRequestQueue:
         session_id: str,
         msg: str,
         emit_fn: Optional[Callable] = None,
-        priority: int = 0,
+        priority: int = PRIORITY_WEB,
         **kwargs,
     ) -> dict:
         """
@@ -226,7 +330,7 @@ class LLMRequestQueue:
             session_id: Chat session identifier
             msg: User message text
             emit_fn: async callable(event, payload) for real-time updates
-            priority: Reserved for future priority queuing
+            priority: Priority class (PRIORITY_REALTIME / WEB / MESSENGER / BACKGROUND)
             **kwargs: Extra args passed to handler_fn
 
         Returns:
@@ -262,6 +366,17 @@ class LLMRequestQueue:
                     "กรุณาลองใหม่อีกครั้งในอีกสักครู่"
                 )
 
+            predicted = self._predict_admission(priority)
+
+        # Deadline ของ request (รวมเวลารอคิว) — ถ้าผู้ส่งผูกตัวที่เร็วกว่าไว้ (voice turn) จะใช้ตัวนั้น
+        deadline = Deadline.within(
+            self._config.request_timeout, self._config.deadline_reserve
+        ).earliest(current_deadline())
+
+        # ── Admission control: ทำนายแล้วไม่ทัน deadline ของ request นี้ → ตอบเร็วแทนการรอ timeout ──
+        if predicted is not None and predicted > deadline.remaining():
+            return await self._shed(user_id, session_id, msg, priority, predicted, deadline, kwargs)
+
         # ── Create queue item ──
         request_id = uuid.uuid4().hex
         loop = asyncio.get_running_loop()
@@ -277,25 +392,43 @@ class LLMRequestQueue:
             kwargs=kwargs,
             submitted_at=time.time(),
             priority=priority,
+            context=contextvars.copy_context(),
         )
+        item.context.run(bind_cancel_scope, item.cancel_scope)
+        item.context.run(bind_deadline, deadline)
 
         # ── Register in tracking ──
         async with self._lock:
             self._pending[request_id] = item
             self._per_user_pending[user_id] = self._per_user_pending.get(user_id, 0) + 1
+            self._per_class_pending[priority] += 1
+            self._tickets[priority] += 1
+            item.ticket = self._tickets[priority]
             self._total_submitted += 1
             self._peak_pending = max(self._peak_pending, len(self._pending))
 
-        # ── Put in async queue for workers ──
-        await self._queue.put(item)
+        # ── Write-ahead log (buffer only; flushed by QueueWal in the background) ──
+        self._wal.append(request_id, {
+            "request_id": request_id,
+            "user_id": user_id,
+            "session_id": session_id,
+            "msg": msg,
+            "submitted_at": item.submitted_at,
+            "priority": priority,
+        })
+
+        # ── Hand to the scheduler for workers ──
+        self._queue.put_nowait(item)
+        self._scale_up()
 
         # ── Notify user of queue position ──
-        position = await self.get_position(request_id)
+        position = self._position_of(item)
+        item.last_position = position
         if position > 0:
             await self._emit_safe(emit_fn, "queue_position", {
                 "position": position,
                 "request_id": request_id,
-                "estimated_wait": position * 5,
+                "estimated_wait": round(self._estimate_wait(item), 1),
                 "status": "queued",
             })
             # Also send as ai_status for backward-compatible UI
@@ -320,10 +453,8 @@ class LLMRequestQueue:
         except asyncio.TimeoutError:
             self._total_timeouts += 1
             async with self._lock:
-                self._pending.pop(request_id, None)
-                self._per_user_pending[user_id] = max(
-                    0, self._per_user_pending.get(user_id, 0) - 1
-                )
+                self._pop_pending(request_id)
+            item.cancel_scope.cancel("timeout")  # nobody reads the answer any more
             logger.warning(
                 "[Queue] Timeout request=%s user=%s (%.0fs)",
                 request_id[:8], user_id[:16], self._config.request_timeout,
@@ -335,102 +466,137 @@ class LLMRequestQueue:
 
         except asyncio.CancelledError:
             self._total_cancelled += 1
+            item.cancel_scope.cancel("client_cancelled")
             async with self._lock:
-                self._pending.pop(request_id, None)
-                self._per_user_pending[user_id] = max(
-                    0, self._per_user_pending.get(user_id, 0) - 1
-                )
+                self._pop_pending(request_id)
             raise
 
         except Exception:
             # Clean up tracking on unexpected errors
             async with self._lock:
-                self._pending.pop(request_id, None)
-                self._per_user_pending[user_id] = max(
-                    0, self._per_user_pending.get(user_id, 0) - 1
-                )
+                self._pop_pending(request_id)
             raise
 
+        finally:
+            self._wal.remove(request_id)
+
     # ───────────────────────────────────────────────────────────────────── #
     # WORKER
     # ───────────────────────────────────────────────────────────────────── #
     async def _worker(self, worker_id: int):
-        """Worker coroutine — pulls items from queue and processes them."""
-        logger.debug("[Queue] Worker #%d started", worker_id)
+        """
+        Worker coroutine — รอ item จาก scheduler แบบ event-driven (ไม่มี timeout polling)
+        หยุดด้วย task.cancel() ตอน shutdown
 
-        while self._running:
-            item: Optional[QueueItem] = None
-            try:
-                item = await asyncio.wait_for(self._queue.get(), timeout=1.0)
-            except asyncio.TimeoutError:
-                continue
-            except asyncio.CancelledError:
-                return
-            except Exception:
-                continue
+        การย้าย pending → active และ cleanup ไม่มี await คั่น จึง atomic บน event loop
+        โดยไม่ต้องถือ self._lock (ลด lock round trip ต่อ item)
+        """
+        logger.debug("[Queue] Worker #%d started", worker_id)
 
-            # Skip if already done (timeout / cancel)
-            if item.future.done():
-                async with self._lock:
-                    self._pending.pop(item.request_id, None)
-                    self._per_user_pending[item.user_id] = max(
-                        0, self._per_user_pending.get(item.user_id, 0) - 1
-                    )
-                self._queue.task_done()
-                continue
+        try:
+            while True:
+                self._idle_since[worker_id] = time.monotonic()
+                item: QueueItem = await self._queue.get()
+                del self._idle_since[worker_id]
+                await self._process(worker_id, item)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._idle_since.pop(worker_id, None)
+            logger.debug("[Queue] Worker #%d stopped", worker_id)
+
+    async def _process(self, worker_id: int, item: QueueItem) -> None:
+        # Skip if already done (timeout / cancel already untracked it)
+        if item.future.done():
+            self._pop_pending(item.request_id)
+            return
 
-            # ── Move from pending → active ──
-            async with self._lock:
-                self._pending.pop(item.request_id, None)
-                self._per_user_pending[item.user_id] = max(
-                    0, self._per_user_pending.get(item.user_id, 0) - 1
-                )
-                self._active[item.request_id] = item
-                self._per_user_active[item.user_id] = (
-                    self._per_user_active.get(item.user_id, 0) + 1
-                )
-                self._peak_active = max(self._peak_active, len(self._active))
+        # ── Move from pending → active ──
+        self._pop_pending(item.request_id)
+        self._active[item.request_id] = item
+        self._per_user_active[item.user_id] = self._per_user_active.get(item.user_id, 0) + 1
+        self._peak_active = max(self._peak_active, len(self._active))
 
-            wait_time = time.time() - item.submitted_at
+        dispatched_at = time.time()
+        wait_time = dispatched_at - item.submitted_at
+        class_stats = self._class_stats[item.priority]
+        class_stats["dispatched"] += 1
+        class_stats["wait_total"] += wait_time
+        class_stats["wait_max"] = max(class_stats["wait_max"], wait_time)
 
+        try:
             # ── Notify: processing started ──
-            await self._emit_safe(item.emit_fn, "queue_position", {
-                "position": 0,
-                "request_id": item.request_id,
-                "status": "processing",
-                "waited": round(wait_time, 1),
-            })
-            await self._emit_safe(
-                item.emit_fn, "ai_status",
-                {"status": "กำลังประมวลผล..."},
-            )
+            if item.emit_fn is not None:
+                await asyncio.gather(
+                    self._emit_safe(item.emit_fn, "queue_position", {
+                        "position": 0,
+                        "request_id": item.request_id,
+                        "status": "processing",
+                        "waited": round(wait_time, 1),
+                    }),
+                    self._emit_safe(
+                        item.emit_fn, "ai_status",
+                        {"status": "กำลังประมวลผล..."},
+                    ),
+                )
 
             logger.info(
-                "[Queue] Worker #%d processing request=%s user=%s waited=%.1fs",
-                worker_id, item.request_id[:8], item.user_id[:16], wait_time,
+                "[Queue] Worker #%d processing request=%s user=%s class=%s waited=%.1fs",
+                worker_id, item.request_id[:8], item.user_id[:16],
+                priority_name(item.priority), wait_time,
             )
 
             # ── Call handler (isolated from worker) ──
             try:
-                result = await self._handler(
+                handler_coro = self._handler(
                     item.msg,
                     item.session_id,
                     emit_fn=item.emit_fn,
                     **item.kwargs,
                 )
+                if item.context is not None:
+                    # Submitter's contextvars (e.g. LLM quota priority) follow the request
+                    result = await asyncio.create_task(handler_coro, context=item.context)
+                else:
+                    result = await handler_coro
 
                 if not item.future.done():
                     item.future.set_result(result)
                 self._total_processed += 1
+                self._service.observe(item.priority, classify_outcome(result), time.time() - dispatched_at)
 
-                process_time = time.time() - item.submitted_at
                 logger.info(
                     "[Queue] Worker #%d completed request=%s total=%.1fs",
-                    worker_id, item.request_id[:8], process_time,
+                    worker_id, item.request_id[:8], time.time() - item.submitted_at,
+                )
+
+            except RequestCancelled as cancelled:
+                # Client gone: handler stopped at a stage boundary — not a handler error,
+                # and the partial run is not a service-time sample
+                self._total_aborted += 1
+                logger.info(
+                    "[Queue] Worker #%d aborted request=%s reason=%s after %.1fs",
+                    worker_id, item.request_id[:8], cancelled.reason, time.time() - dispatched_at,
                 )
+                if not item.future.done():
+                    item.future.set_exception(cancelled)
+
+            except asyncio.CancelledError:
+                current = asyncio.current_task()
+                if current is not None and current.cancelling():
+                    raise  # worker itself is being cancelled (shutdown / retire)
+                # Handler task cancelled from inside — abort this request, keep the worker alive
+                self._total_aborted += 1
+                logger.warning(
+                    "[Queue] Worker #%d handler cancelled request=%s after %.1fs",
+                    worker_id, item.request_id[:8], time.time() - dispatched_at,
+                )
+                if not item.future.done():
+                    item.future.set_exception(RequestCancelled("handler_cancelled"))
 
             except Exception as exc:
                 self._total_errors += 1
+                self._service.observe(item.priority, OUTCOME_ERROR, time.time() - dispatched_at)
                 logger.error(
                     "[Queue] Worker #%d error request=%s: %s",
                     worker_id, item.request_id[:8], exc,
@@ -438,62 +604,246 @@ class LLMRequestQueue:
                 if not item.future.done():
                     item.future.set_exception(exc)
 
-            finally:
-                # ── Clean up active tracking ──
-                async with self._lock:
-                    self._active.pop(item.request_id, None)
-                    self._per_user_active[item.user_id] = max(
-                        0, self._per_user_active.get(item.user_id, 0) - 1
-                    )
-                    # Prune zero-count entries
-                    if self._per_user_active.get(item.user_id, 0) == 0:
-                        self._per_user_active.pop(item.user_id, None)
-                    if self._per_user_pending.get(item.user_id, 0) == 0:
-                        self._per_user_pending.pop(item.user_id, None)
+        finally:
+            if not item.future.done():
+                item.future.cancel()  # worker cancelled mid-request (shutdown)
+            # ── Clean up active tracking ──
+            self._active.pop(item.request_id, None)
+            active = self._per_user_active.get(item.user_id, 0) - 1
+            if active > 0:
+                self._per_user_active[item.user_id] = active
+            else:
+                # Prune zero-count entries
+                self._per_user_active.pop(item.user_id, None)
+            if self._per_user_pending.get(item.user_id, 0) == 0:
+                self._per_user_pending.pop(item.user_id, None)
 
-                self._queue.task_done()
+    # ───────────────────────────────────────────────────────────────────── #
+    # ELASTIC WORKER POOL
+    # ───────────────────────────────────────────────────────────────────── #
+    def _spawn_worker(self) -> None:
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        self._workers[worker_id] = asyncio.create_task(
+            self._worker(worker_id), name=f"queue-worker-{worker_id}"
+        )
 
-                # ── Broadcast updated positions to remaining pending ──
-                await self._notify_pending_positions()
+    def _llm_headroom(self) -> Optional[int]:
+        if self._capacity_fn is None:
+            return None
+        try:
+            headroom = self._capacity_fn()
+        except Exception as exc:
+            logger.debug("[Queue] capacity_fn failed: %s", exc)
+            return None
+        return None if headroom is None else max(0, int(headroom))
+
+    def _scale_ceiling(self) -> int:
+        """max_workers จำกัดด้วย headroom ของ LLM (worker ที่เกินนั้นจะแค่รอ limiter)"""
+        headroom = self._llm_headroom()
+        if headroom is None:
+            return self._max_workers
+        return max(self._min_workers, min(self._max_workers, len(self._active) + max(1, headroom)))
+
+    def _effective_workers(self) -> int:
+        """จำนวน worker ที่ใช้ทำนายเวลารอ (รวมที่ pool จะขยายได้ทันที)"""
+        return max(1, len(self._workers), min(self._scale_ceiling(), len(self._active) + len(self._pending)))
+
+    def _desired_workers(self) -> int:
+        """active + worker ที่ต้องใช้เพื่อระบาย backlog ภายใน scale_target_wait (ตาม EWMA service time)"""
+        active = len(self._active)
+        pending = len(self._pending)
+        need = active
+        if pending:
+            backlog = sum(
+                count * self._service.expected_service(priority)
+                for priority, count in self._per_class_pending.items() if count > 0
+            )
+            extra = math.ceil(backlog / max(0.1, self._config.scale_target_wait))
+            need += min(pending, max(1, extra))
+        return max(self._min_workers, min(self._scale_ceiling(), need))
 
-        logger.debug("[Queue] Worker #%d stopped", worker_id)
+    def _scale_up(self) -> None:
+        """เรียกตอน submit: เพิ่ม worker ทันทีเมื่อ backlog เกินกว่า worker ที่ว่างอยู่"""
+        if self._max_workers <= self._min_workers or not self._running:
+            return
+        if len(self._idle_since) >= len(self._pending):
+            return
+        desired = self._desired_workers()
+        added = desired - len(self._workers)
+        if added <= 0:
+            return
+        for _ in range(added):
+            self._spawn_worker()
+        self._scale_ups += 1
+        self._last_scale = (
+            f"up +{added} → {len(self._workers)} (pending={len(self._pending)} "
+            f"active={len(self._active)} headroom={self._llm_headroom()})"
+        )
+        logger.debug("[Queue] Scale %s", self._last_scale)
+
+    def _scale_down(self) -> int:
+        """เรียกจาก health monitor: ปลด worker ที่ idle นานกว่า scale_down_idle (ไม่ต่ำกว่า min)"""
+        if self._max_workers <= self._min_workers:
+            return 0
+        now = time.monotonic()
+        floor = max(self._min_workers, self._desired_workers())
+        stale = sorted(
+            (since, worker_id) for worker_id, since in self._idle_since.items()
+            if now - since >= self._config.scale_down_idle
+        )
+        retired = 0
+        for _, worker_id in stale:
+            if len(self._workers) <= floor:
+                break
+            task = self._workers.pop(worker_id, None)
+            self._idle_since.pop(worker_id, None)
+            if task is not None:
+                task.cancel()
+                retired += 1
+        if retired:
+            self._scale_downs += 1
+            self._last_scale = f"down -{retired} → {len(self._workers)} (idle ≥ {self._config.scale_down_idle:g}s)"
+        return retired
+
+    def _pop_pending(self, request_id: str) -> Optional[QueueItem]:
+        """ลบออกจาก pending tracking (sync, ไม่มี await) — ซ้ำได้โดยไม่นับลดสองครั้ง"""
+        item = self._pending.pop(request_id, None)
+        if item is not None:
+            self._per_user_pending[item.user_id] = max(
+                0, self._per_user_pending.get(item.user_id, 0) - 1
+            )
+            self._per_class_pending[item.priority] = max(
+                0, self._per_class_pending.get(item.priority, 0) - 1
+            )
+            self._served[item.priority] += 1
+            self._positions_dirty.set()  # broadcaster sends one batched update
+        return item
 
     # ───────────────────────────────────────────────────────────────────── #
     # POSITION & NOTIFICATIONS
     # ───────────────────────────────────────────────────────────────────── #
+    def _position_of(self, item: QueueItem) -> int:
+        """
+        O(1) estimate (1-based): ลำดับใน class ของตัวเอง (ticket - served)
+        + จำนวนที่รออยู่ใน class ที่ priority สูงกว่า
+        DRR ข้ามผู้ใช้ทำให้ dispatch ไม่ตรง ticket เป๊ะ จึงเป็นค่าประมาณ (ไม่ต่ำกว่า 1)
+        """
+        ahead = sum(
+            count for priority, count in self._per_class_pending.items()
+            if priority < item.priority
+        )
+        return max(1, item.ticket - self._served[item.priority]) + ahead
+
+    def _estimate_wait_ahead(self, priority: int, ahead_in_class: int) -> float:
+        """เวลารอโดยประมาณ (วินาที) ของ request ที่มี ahead_in_class รายการอยู่ข้างหน้าใน class ตัวเอง"""
+        return self._service.expected_wait(
+            priority,
+            ahead_in_class,
+            self._per_class_pending,
+            self._config.class_weights,
+            self._effective_workers(),
+            (active.priority for active in self._active.values()),
+        )
+
+    def _estimate_wait(self, item: QueueItem) -> float:
+        ahead = max(0, item.ticket - self._served[item.priority] - 1)
+        return self._estimate_wait_ahead(item.priority, ahead)
+
+    def _predict_admission(self, priority: int) -> Optional[float]:
+        """เวลาเสร็จที่ทำนายไว้ของ request ใหม่ (None = ไม่ตัดสิน: ปิดอยู่ / sample ยังน้อย / คิวว่าง)"""
+        if not self._config.admission_control:
+            return None
+        if self._service.samples() < self._config.admission_min_samples:
+            return None
+        if not self._pending and len(self._active) < len(self._workers):
+            return None  # มี worker ว่าง → เริ่มได้ทันที
+        wait = self._estimate_wait_ahead(priority, self._per_class_pending.get(priority, 0))
+        return wait + self._service.expected_service(priority)
+
+    async def _shed(
+        self,
+        user_id: str,
+        session_id: str,
+        msg: str,
+        priority: int,
+        predicted: float,
+        deadline: Deadline,
+        kwargs: Dict[str, Any],
+    ) -> dict:
+        """Predicted to miss the deadline: divert to overload_fn หรือ raise QueueOverloadedError"""
+        logger.warning(
+            "[Queue] Admission: predicted %.1fs > deadline %.1fs for user=%s class=%s pending=%d",
+            predicted, deadline.remaining(), user_id[:16],
+            priority_name(priority), len(self._pending),
+        )
+        if self._overload_fn is not None:
+            try:
+                diverted = await self._overload_fn(msg, session_id, **kwargs)
+            except Exception as exc:
+                logger.warning("[Queue] overload_fn failed: %s", exc)
+                diverted = None
+            if isinstance(diverted, dict):
+                self._total_diverted += 1
+                return diverted
+        self._total_shed += 1
+        self._total_rejected += 1
+        raise QueueOverloadedError(
+            "ระบบมีผู้ใช้งานจำนวนมากในขณะนี้ คาดว่าต้องรอนานเกินกำหนด "
+            "กรุณาลองใหม่อีกครั้งในอีกสักครู่",
+            predicted_s=predicted,
+        )
+
     async def get_position(self, request_id: str) -> int:
         """
         Get current queue position (1-based).
         Returns 0 if actively processing or not found.
         """
-        async with self._lock:
-            if request_id in self._active:
-                return 0
-            keys = list(self._pending.keys())
+        item = self._pending.get(request_id)
+        if item is None or request_id in self._active:
+            return 0
+        return self._position_of(item)
+
+    async def _position_broadcaster(self):
+        """
+        ส่ง queue_position แบบ batch: รอให้มี dispatch/cancel/timeout แล้วรวบทุก
+        position_broadcast_interval วินาที ส่งเฉพาะรายการที่ลำดับเปลี่ยน (emit พร้อมกัน)
+        """
+        interval = max(0.0, self._config.position_broadcast_interval)
+        while self._running:
             try:
-                return keys.index(request_id) + 1
-            except ValueError:
-                return 0
+                await self._positions_dirty.wait()
+                if interval:
+                    await asyncio.sleep(interval)
+                self._positions_dirty.clear()
+                await self._notify_pending_positions()
+            except asyncio.CancelledError:
+                return
+            except Exception as exc:
+                logger.error("[Queue] Position broadcast error: %s", exc)
 
     async def _notify_pending_positions(self):
-        """Notify all pending users of their updated queue position."""
-        async with self._lock:
-            items = list(self._pending.values())
-
-        for idx, item in enumerate(items):
-            if item.future.done():
+        """Notify pending users whose queue position changed since the last update."""
+        emits = []
+        for item in list(self._pending.values()):
+            if item.future.done() or item.emit_fn is None:
+                continue
+            pos = self._position_of(item)
+            if pos == item.last_position:
                 continue
-            pos = idx + 1
-            await self._emit_safe(item.emit_fn, "queue_position", {
+            item.last_position = pos
+            emits.append(self._emit_safe(item.emit_fn, "queue_position", {
                 "position": pos,
                 "request_id": item.request_id,
                 "status": "queued",
-                "estimated_wait": pos * 5,
-            })
-            await self._emit_safe(
+                "estimated_wait": round(self._estimate_wait(item), 1),
+            }))
+            emits.append(self._emit_safe(
                 item.emit_fn, "ai_status",
                 {"status": f"กำลังรอคิว ลำดับที่ {pos} ..."},
-            )
+            ))
+        if emits:
+            await asyncio.gather(*emits)
 
     @staticmethod
     async def _emit_safe(
@@ -513,50 +863,57 @@ class LLMRequestQueue:
     # CANCEL
     # ───────────────────────────────────────────────────────────────────── #
     async def cancel(self, request_id: str) -> bool:
-        """Cancel a pending request by request_id. Returns True if found."""
+        """
+        Cancel a request by request_id. Returns True if found.
+        pending → ถอดออกจากคิว; active → handler หยุดที่ขอบ stage ถัดไป (CancelScope)
+        """
         async with self._lock:
-            item = self._pending.pop(request_id, None)
+            item = self._pop_pending(request_id)
             if item:
-                self._per_user_pending[item.user_id] = max(
-                    0, self._per_user_pending.get(item.user_id, 0) - 1
-                )
+                item.cancel_scope.cancel("cancelled")
                 if not item.future.done():
                     item.future.cancel()
                 self._total_cancelled += 1
                 return True
-        return False
+        item = self._active.get(request_id)
+        if item is None:
+            return False
+        item.cancel_scope.cancel("cancelled")
+        if not item.future.done():
+            item.future.cancel()
+        self._total_cancelled += 1
+        return True
+
+    async def cancel_session(self, session_id: str, reason: str = "client_disconnected") -> int:
+        """
+        Cancel ทุก request ของ session (client หลุด) — ทั้งที่รอคิวและที่กำลังประมวลผล
+        ผู้รอผลได้ RequestCancelled แทนคำตอบ. Returns จำนวนที่ถูก cancel
+        """
+        cancelled = 0
+        async with self._lock:
+            for request_id in [rid for rid, item in self._pending.items() if item.session_id == session_id]:
+                item = self._pop_pending(request_id)
+                if item is None:
+                    continue
+                item.cancel_scope.cancel(reason)
+                if not item.future.done():
+                    item.future.set_exception(RequestCancelled(reason))
+                cancelled += 1
+        for item in list(self._active.values()):
+            if item.session_id != session_id or item.cancel_scope.cancelled:
+                continue
+            item.cancel_scope.cancel(reason)
+            if not item.future.done():
+                item.future.set_exception(RequestCancelled(reason))
+            cancelled += 1
+        if cancelled:
+            self._total_cancelled += cancelled
+            logger.info("[Queue] Cancelled %d request(s) of session=%s (%s)", cancelled, session_id[:16], reason)
+        return cancelled
 
     # ───────────────────────────────────────────────────────────────────── #
     # PERSISTENCE
     # ───────────────────────────────────────────────────────────────────── #
-    async def _persist_state(self) -> None:
-        """บันทึก pending + active items ลง Redis (async, เรียกตอน shutdown)"""
-        items_to_save = []
-
-        # รวม pending items
-        for item in self._pending.values():
-            items_to_save.append({
-                "request_id": item.request_id,
-                "user_id": item.user_id,
-                "session_id": item.session_id,
-                "msg": item.msg,
-                "submitted_at": item.submitted_at,
-                "priority": item.priority,
-            })
-
-        # รวม active items (กำลังประมวลผลแต่ยังไม่เสร็จ)
-        for item in self._active.values():
-            items_to_save.append({
-                "request_id": item.request_id,
-                "user_id": item.user_id,
-                "session_id": item.session_id,
-                "msg": item.msg,
-                "submitted_at": item.submitted_at,
-                "priority": item.priority,
-            })
-
-        await save_pending_items(items_to_save, self._persist_path)
-
     @staticmethod
     async def check_pending_on_disk(persist_path: str = DEFAULT_PERSIST_PATH):
         """
@@ -592,11 +949,14 @@ class LLMRequestQueue:
         send_fb_text_fn: Optional[Callable] = None,
     ) -> dict:
         """
-        ประมวลผลคิวค้างจาก session ก่อนหน้า
+        ประมวลผลคิวค้างจาก session ก่อนหน้า — re-submit ผ่าน scheduler ที่ PRIORITY_BACKGROUND
+        (ได้ worker pool / per-user limit / admission control เหมือน request ปกติ)
+        พร้อมกันไม่เกิน recovery_concurrency และเริ่มไม่เกิน recovery_rate รายการต่อวินาที
+        → traffic ใหม่ที่ priority สูงกว่าไม่ถูก starve; ความคืบหน้าดูได้จาก get_stats()["recovery"]
 
         สำหรับ web users: ประมวลผลและบันทึกลง session history
                           (HTTP connection หายแล้ว แต่ผลลัพธ์จะอยู่ใน history)
-        สำหรับ FB users: ประมวลผลและส่งตอบกลับทาง Facebook
+        สำหรับ FB users: ประมวลผลและส่งตอบกลับทาง Facebook ทันทีที่ได้คำตอบ
 
         Args:
             items: list ของ dict (user_id, session_id, msg, ...)
@@ -609,10 +969,30 @@ class LLMRequestQueue:
             raise RuntimeError("Queue must be started before recovery")
 
         results = {"processed": 0, "errors": 0, "details": []}
+        details: List[Optional[dict]] = [None] * len(items)
+        recovered_ids = [item["request_id"] for item in items if item.get("request_id")]
+        semaphore = asyncio.Semaphore(max(1, self._config.recovery_concurrency))
+        interval = 1.0 / self._config.recovery_rate if self._config.recovery_rate > 0 else 0.0
+        next_start = time.monotonic()
+        progress = self._recovery = {
+            "running": True,
+            "total": len(items),
+            "done": 0,
+            "processed": 0,
+            "errors": 0,
+            "skipped": 0,
+            "in_flight": 0,
+            "started_at": time.time(),
+            "finished_at": None,
+        }
 
-        logger.info("[Queue Recovery] Processing %d pending items...", len(items))
+        logger.info(
+            "[Queue Recovery] Re-queueing %d pending items (concurrency=%d rate=%s/s)...",
+            len(items), self._config.recovery_concurrency, self._config.recovery_rate or "∞",
+        )
 
-        for item in items:
+        async def _replay(index: int, item: dict) -> None:
+            nonlocal next_start
             user_id = item.get("user_id", "unknown")
             session_id = item.get("session_id", "unknown")
             msg = item.get("msg", "")
@@ -620,58 +1000,106 @@ class LLMRequestQueue:
 
             if not msg.strip():
                 logger.warning("[Queue Recovery] Skipping empty message for %s", session_id)
-                continue
+                progress["skipped"] += 1
+                progress["done"] += 1
+                return
 
-            try:
-                # เรียก handler โดยตรง (ไม่ผ่าน queue submit เพราะไม่มี HTTP caller รอ)
-                result = await self._handler(msg, session_id)
-                reply = result.get("text", "")
-
-                # ส่ง FB reply ถ้าเป็น FB user
-                if is_fb and send_fb_text_fn and reply:
-                    psid = session_id.replace("fb_", "", 1)
-                    fb_message = f"[Bot พี่เร็ก] {reply.replace('//', '')}"
-                    try:
-                        await send_fb_text_fn(psid, fb_message)
-                        logger.info("[Queue Recovery] FB reply sent to %s", psid[:16])
-                    except Exception as fb_exc:
-                        logger.warning("[Queue Recovery] FB send failed for %s: %s", psid[:16], fb_exc)
-
-                results["processed"] += 1
-                results["details"].append({
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "status": "ok",
-                    "reply_preview": reply[:80] if reply else "",
-                })
+            async with semaphore:
+                # Pace starts: at most recovery_rate items per second
+                now = time.monotonic()
+                start_at, next_start = max(now, next_start), max(now, next_start) + interval
+                if start_at > now:
+                    await asyncio.sleep(start_at - now)
+
+                # entry เดิมใน WAL ถูกแทนด้วย entry ของ request ใหม่ (flush ใน batch เดียวกัน)
+                if item.get("request_id"):
+                    self._wal.remove(item["request_id"])
+
+                progress["in_flight"] += 1
+                try:
+                    result = await self._submit_recovered(user_id, session_id, msg)
+                    reply = result.get("text", "")
+
+                    # ส่ง FB reply ถ้าเป็น FB user
+                    if is_fb and send_fb_text_fn and reply:
+                        psid = session_id.replace("fb_", "", 1)
+                        fb_message = f"[Bot พี่เร็ก] {reply.replace('//', '')}"
+                        try:
+                            await send_fb_text_fn(psid, fb_message)
+                            logger.info("[Queue Recovery] FB reply sent to %s", psid[:16])
+                        except Exception as fb_exc:
+                            logger.warning("[Queue Recovery] FB send failed for %s: %s", psid[:16], fb_exc)
+
+                    progress["processed"] += 1
+                    details[index] = {
+                        "user_id": user_id,
+                        "session_id": session_id,
+                        "status": "ok",
+                        "reply_preview": reply[:80] if reply else "",
+                    }
+                    logger.info(
+                        "[Queue Recovery] ✅ %s/%s → %s",
+                        user_id[:16], session_id[:16], reply[:50] if reply else "(empty)",
+                    )
 
-                logger.info(
-                    "[Queue Recovery] ✅ %s/%s → %s",
-                    user_id[:16], session_id[:16], reply[:50] if reply else "(empty)",
-                )
+                except Exception as exc:
+                    progress["errors"] += 1
+                    details[index] = {
+                        "user_id": user_id,
+                        "session_id": session_id,
+                        "status": "error",
+                        "error": str(exc),
+                    }
+                    logger.error(
+                        "[Queue Recovery] ❌ %s/%s error: %s",
+                        user_id[:16], session_id[:16], exc,
+                    )
+                finally:
+                    progress["in_flight"] -= 1
+                    progress["done"] += 1
 
-            except Exception as exc:
-                results["errors"] += 1
-                results["details"].append({
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "status": "error",
-                    "error": str(exc),
-                })
-                logger.error(
-                    "[Queue Recovery] ❌ %s/%s error: %s",
-                    user_id[:16], session_id[:16], exc,
+        async def _report() -> None:
+            while True:
+                await asyncio.sleep(self._config.recovery_report_interval)
+                logger.info(
+                    "[Queue Recovery] Progress %d/%d (ok=%d errors=%d in_flight=%d)",
+                    progress["done"], progress["total"], progress["processed"],
+                    progress["errors"], progress["in_flight"],
                 )
 
-        # ล้าง persisted state หลังประมวลผลเสร็จ
-        await clear_persisted(self._persist_path)
-
+        reporter = asyncio.create_task(_report(), name="queue-recovery-progress")
+        try:
+            await asyncio.gather(*(_replay(index, item) for index, item in enumerate(items)))
+        finally:
+            reporter.cancel()
+            progress["running"] = False
+            progress["finished_at"] = time.time()
+
+        # ลบเฉพาะ entry ที่ recovery จัดการแล้ว (entry ของ request ใหม่ระหว่าง recovery ยังอยู่)
+        await self._wal.flush()
+        await mark_recovered(recovered_ids)
+
+        results["processed"] = progress["processed"]
+        results["errors"] = progress["errors"]
+        results["details"] = [detail for detail in details if detail is not None]
         logger.info(
-            "[Queue Recovery] Complete: processed=%d errors=%d",
-            results["processed"], results["errors"],
+            "[Queue Recovery] Complete: processed=%d errors=%d in %.1fs",
+            results["processed"], results["errors"], progress["finished_at"] - progress["started_at"],
         )
         return results
 
+    async def _submit_recovered(self, user_id: str, session_id: str, msg: str) -> dict:
+        """submit ที่ PRIORITY_BACKGROUND; คิวเต็ม / เกิน per-user limit → รอแล้วลองใหม่ (ไม่นับเป็น error)"""
+        backoff = 0.5
+        while True:
+            try:
+                return await self.submit(user_id, session_id, msg, priority=PRIORITY_BACKGROUND)
+            except QueueFullError:
+                if not self._running:
+                    raise
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+
     # ───────────────────────────────────────────────────────────────────── #
     # STATISTICS & HEALTH
     # ───────────────────────────────────────────────────────────────────── #
@@ -687,8 +1115,13 @@ class LLMRequestQueue:
             "config": {
                 "max_size": self._config.max_size,
                 "num_workers": self._config.num_workers,
+                "min_workers": self._min_workers,
+                "max_workers": self._max_workers,
                 "per_user_limit": self._config.per_user_limit,
                 "request_timeout": self._config.request_timeout,
+                "class_weights": self._queue.weights(),
+                "user_quantum": self._config.user_quantum,
+                "admission_control": self._config.admission_control,
             },
             "current": {
                 "pending": len(self._pending),
@@ -697,6 +1130,14 @@ class LLMRequestQueue:
                     0,
                     self._config.max_size - len(self._pending) - len(self._active),
                 ),
+                "workers": len(self._workers),
+                "idle_workers": len(self._idle_since),
+            },
+            "scaling": {
+                "scale_ups": self._scale_ups,
+                "scale_downs": self._scale_downs,
+                "llm_headroom": self._llm_headroom(),
+                "last": self._last_scale,
             },
             "totals": {
                 "submitted": self._total_submitted,
@@ -705,19 +1146,44 @@ class LLMRequestQueue:
                 "timeouts": self._total_timeouts,
                 "rejected": self._total_rejected,
                 "cancelled": self._total_cancelled,
+                "aborted": self._total_aborted,
+                "shed": self._total_shed,
+                "diverted": self._total_diverted,
             },
             "peaks": {
                 "max_pending": self._peak_pending,
                 "max_active": self._peak_active,
             },
+            "classes": self._class_snapshot(),
+            "service_time": self._service.get_stats(),
+            "persistence": self._wal.get_stats(),
+            "recovery": dict(self._recovery) if self._recovery else None,
             "throughput_per_min": throughput,
             "uptime_seconds": uptime,
             "active_users": len(self._per_user_active),
         }
 
+    def _class_snapshot(self) -> Dict[str, dict]:
+        """Per priority class: pending depth, users waiting, dispatches, wait time."""
+        depths = self._queue.class_depths()
+        priorities = set(self._config.class_weights) | set(self._per_class_pending) | set(self._class_stats)
+        snapshot = {}
+        for priority in sorted(priorities):
+            stats = self._class_stats.get(priority) or {"dispatched": 0, "wait_total": 0.0, "wait_max": 0.0}
+            dispatched = int(stats["dispatched"])
+            snapshot[priority_name(priority)] = {
+                "priority": priority,
+                "weight": self._config.class_weights.get(priority, 1),
+                "pending": self._per_class_pending.get(priority, 0),
+                "users": depths.get(priority, {}).get("users", 0),
+                "dispatched": dispatched,
+                "avg_wait_ms": round(stats["wait_total"] / dispatched * 1000, 1) if dispatched else 0.0,
+                "max_wait_ms": round(stats["wait_max"] * 1000, 1),
+            }
+        return snapshot
+
     async def _health_monitor(self):
-        """Periodic health logging + crash-safe persist + worker self-healing."""
-        _persist_counter = 0
+        """Periodic health logging + worker self-healing + pool scale-down."""
 
         while self._running:
             try:
@@ -725,6 +1191,18 @@ class LLMRequestQueue:
                 if not self._running:
                     break
 
+                # ── Elastic pool: retire long-idle workers, log scaling decisions ──
+                self._scale_down()
+                if self._last_scale_logged != self._last_scale:
+                    logger.info(
+                        "[Queue Health] workers=%d idle=%d (min=%d max=%d headroom=%s) "
+                        "scale_ups=%d scale_downs=%d last=%s",
+                        len(self._workers), len(self._idle_since), self._min_workers,
+                        self._max_workers, self._llm_headroom(), self._scale_ups,
+                        self._scale_downs, self._last_scale or "-",
+                    )
+                    self._last_scale_logged = self._last_scale
+
                 stats = self.get_stats()
                 current = stats["current"]
                 totals = stats["totals"]
@@ -757,24 +1235,10 @@ class LLMRequestQueue:
                         self._config.max_size,
                     )
 
-                # ── Periodic persist (crash protection) ──
-                # บันทึกทุก 5 รอบ health check (~5 นาที) ถ้ามี pending/active items
-                _persist_counter += 1
-                if _persist_counter >= 5 and (current["pending"] > 0 or current["active"] > 0):
-                    _persist_counter = 0
-                    try:
-                        await self._persist_state()
-                        logger.debug("[Queue Health] Periodic persist: %d items saved",
-                                     current["pending"] + current["active"])
-                    except Exception as pe:
-                        logger.warning("[Queue Health] Periodic persist failed: %s", pe)
-                elif current["pending"] == 0 and current["active"] == 0:
-                    _persist_counter = 0
-
                 # ── Worker self-healing ──
                 # ตรวจสอบว่า worker ตายหรือไม่ ถ้าตายให้สร้างใหม่
                 dead_workers = []
-                for i, task in enumerate(self._workers):
+                for i, task in list(self._workers.items()):
                     if task.done():
                         dead_workers.append(i)
                         exc = task.exception() if not task.cancelled() else None
@@ -798,22 +1262,3 @@ class LLMRequestQueue:
                 return
             except Exception as exc:
                 logger.error("[Queue Health] Monitor error: %s", exc)
-
-    def _emergency_persist(self):
-        """
-        atexit handler — บันทึก state เมื่อ process ถูก kill/crash
-        พยายาม run async persist ผ่าน event loop ที่ยังเปิดอยู่
-        ถ้า loop ปิดแล้ว → ข้ามไป (graceful shutdown ทำ persist ไว้แล้ว)
-        """
-        if not self._pending and not self._active:
-            return
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._persist_state())
-            else:
-                loop.run_until_complete(self._persist_state())
-            count = len(self._pending) + len(self._active)
-            print(f"[Queue] Emergency persist: {count} items saved to Redis")
-        except Exception:
-            pass
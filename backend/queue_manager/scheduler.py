@@ -0,0 +1,185 @@
+"""
+Fair Scheduler — priority classes + weighted fair queueing สำหรับ LLMRequestQueue
+
+ใช้แทน asyncio.Queue (FIFO เดียว):
+
+- ระหว่าง class: stride scheduling ตาม weight (class ที่ weight สูงได้ส่วนแบ่ง dispatch มากกว่า)
+  class ที่เพิ่งมีงานเข้ามาเริ่มที่ virtual time ปัจจุบัน → ได้คิวถัดไปทันที ไม่ต้องรอหลัง burst
+  ของ class อื่น แต่ class ต่ำก็ยังได้ส่วนแบ่งตาม weight (ไม่ starve)
+- ภายใน class: deficit round-robin ข้ามผู้ใช้ (user ละ quantum รายการต่อรอบ)
+  ผู้ใช้ที่ส่งมาเป็นชุดไม่ดันผู้ใช้อื่นไปท้ายคิว
+
+ไม่มี application imports (เหมือน request_queue)
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+# Lower number = higher priority
+PRIORITY_REALTIME = 0    # voice turns (budget < 2 s)
+PRIORITY_WEB = 1         # web chat
+PRIORITY_MESSENGER = 2   # Facebook Messenger
+PRIORITY_BACKGROUND = 3  # queue recovery / FAQ refresh
+
+PRIORITY_NAMES: Dict[int, str] = {
+    PRIORITY_REALTIME: "realtime",
+    PRIORITY_WEB: "web",
+    PRIORITY_MESSENGER: "messenger",
+    PRIORITY_BACKGROUND: "background",
+}
+
+DEFAULT_CLASS_WEIGHTS: Dict[int, int] = {
+    PRIORITY_REALTIME: 16,
+    PRIORITY_WEB: 4,
+    PRIORITY_MESSENGER: 2,
+    PRIORITY_BACKGROUND: 1,
+}
+
+
+def priority_name(priority: int) -> str:
+    return PRIORITY_NAMES.get(priority, f"p{priority}")
+
+
+def parse_class_weights(items: Iterable[str]) -> Dict[int, int]:
+    """["realtime=16", "web=4", "3=1"] → {0: 16, 1: 4, 3: 1} (ค่าที่ไม่ระบุใช้ DEFAULT_CLASS_WEIGHTS)"""
+    by_name = {name: priority for priority, name in PRIORITY_NAMES.items()}
+    weights = dict(DEFAULT_CLASS_WEIGHTS)
+    for item in items:
+        name, _, raw = str(item).partition("=")
+        name = name.strip().lower()
+        try:
+            priority = by_name[name] if name in by_name else int(name)
+            weights[priority] = max(1, int(raw))
+        except (KeyError, ValueError):
+            continue
+    return weights
+
+
+class _ClassQueue:
+    """หนึ่ง priority class: deficit round-robin ข้ามผู้ใช้"""
+
+    __slots__ = ("priority", "weight", "quantum", "pass_value", "size", "_users", "_deficit")
+
+    def __init__(self, priority: int, weight: int, quantum: int):
+        self.priority = priority
+        self.weight = max(1, int(weight))
+        self.quantum = max(1, int(quantum))
+        self.pass_value = 0.0
+        self.size = 0
+        self._users: "OrderedDict[str, Deque[Any]]" = OrderedDict()  # active ring (front = next)
+        self._deficit: Dict[str, int] = {}
+
+    def push(self, user_id: str, item: Any) -> None:
+        items = self._users.get(user_id)
+        if items is None:
+            items = self._users[user_id] = deque()
+            self._deficit[user_id] = 0
+        items.append(item)
+        self.size += 1
+
+    def pop(self) -> Any:
+        user_id, items = next(iter(self._users.items()))
+        if self._deficit[user_id] <= 0:
+            self._deficit[user_id] += self.quantum
+        item = items.popleft()
+        self._deficit[user_id] -= 1  # unit cost per request
+        self.size -= 1
+        if not items:
+            # DRR: idle users don't bank credit
+            del self._users[user_id]
+            del self._deficit[user_id]
+        elif self._deficit[user_id] <= 0:
+            self._users.move_to_end(user_id)
+        return item
+
+    @property
+    def users(self) -> int:
+        return len(self._users)
+
+
+class FairScheduler:
+    """
+    asyncio.Queue-compatible subset (put_nowait / get / qsize / empty) ที่ dispatch
+    ตาม priority class + weight และ DRR ข้ามผู้ใช้ใน class เดียวกัน
+
+    Items ต้องมี `.priority` และ `.user_id`
+    """
+
+    def __init__(self, class_weights: Optional[Dict[int, int]] = None, user_quantum: int = 1):
+        self._weights = dict(DEFAULT_CLASS_WEIGHTS if class_weights is None else class_weights)
+        self._quantum = max(1, int(user_quantum))
+        self._classes: Dict[int, _ClassQueue] = {}
+        self._virtual_time = 0.0
+        self._size = 0
+        self._getters: Deque[asyncio.Future] = deque()
+
+    def _class(self, priority: int) -> _ClassQueue:
+        cls = self._classes.get(priority)
+        if cls is None:
+            cls = self._classes[priority] = _ClassQueue(priority, self._weights.get(priority, 1), self._quantum)
+        return cls
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, item: Any) -> None:
+        cls = self._class(int(item.priority))
+        if cls.size == 0:
+            # Idle class rejoins at the current virtual time (no banked credit, no penalty)
+            cls.pass_value = max(cls.pass_value, self._virtual_time)
+        cls.push(item.user_id, item)
+        self._size += 1
+        self._wakeup_next()
+
+    def get_nowait(self) -> Any:
+        if self._size == 0:
+            raise asyncio.QueueEmpty
+        cls = min(
+            (c for c in self._classes.values() if c.size),
+            key=lambda c: (c.pass_value, c.priority),
+        )
+        self._virtual_time = cls.pass_value
+        cls.pass_value += 1.0 / cls.weight
+        self._size -= 1
+        return cls.pop()
+
+    async def get(self) -> Any:
+        while self._size == 0:
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                try:
+                    self._getters.remove(getter)
+                except ValueError:
+                    pass
+                if self._size and not getter.cancelled():
+                    self._wakeup_next()  # we were woken but won't consume: pass it on
+                raise
+        return self.get_nowait()
+
+    def _wakeup_next(self) -> None:
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                break
+
+    def class_depths(self) -> Dict[int, Dict[str, Any]]:
+        """จำนวนรายการที่ค้างใน scheduler ต่อ class (รวมรายการที่ timeout แล้วแต่ยังไม่ถูกดึงออก)"""
+        return {
+            priority: {"queued": cls.size, "users": cls.users, "weight": cls.weight}
+            for priority, cls in sorted(self._classes.items())
+        }
+
+    def weights(self) -> List[Dict[str, Any]]:
+        return [
+            {"priority": priority, "class": priority_name(priority), "weight": weight}
+            for priority, weight in sorted(self._weights.items())
+        ]
@@ -0,0 +1,147 @@
+"""
+Service-time model — EWMA ของเวลาประมวลผลต่อ priority class และต่อผลลัพธ์ (cache / llm / error)
+
+ใช้ทำ:
+- estimated_wait จริงแทน `position * 5`
+- admission control: ทำนายเวลาเสร็จของ request ใหม่ ถ้าเกิน deadline ปฏิเสธทันที
+  (หรือส่งต่อให้ overload handler ตอบแบบไม่ใช้ LLM) แทนที่จะรอจน timeout
+
+expected service ของ class = P(cache) * EWMA(cache) + (1 - P(cache)) * EWMA(llm)
+โดย P(cache) เองก็เป็น EWMA ของสัดส่วน request ที่ตอบจาก greeting / FAQ tier
+
+ไม่มี application imports (เหมือน request_queue)
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+OUTCOME_CACHE = "cache"
+OUTCOME_LLM = "llm"
+OUTCOME_ERROR = "error"
+OUTCOME_DEGRADED = "degraded"
+
+
+def classify_outcome(result: Any) -> str:
+    """ผลลัพธ์จาก handler (ask_llm) → cache / llm / error / degraded"""
+    if not isinstance(result, dict):
+        return OUTCOME_LLM
+    if result.get("degraded") or result.get("diverted"):
+        # ตัดจบเพราะหมดงบ / ตอบแบบไม่ใช้ LLM → เวลาไม่แทน service time จริง
+        return OUTCOME_DEGRADED
+    tokens = result.get("tokens") if isinstance(result.get("tokens"), dict) else {}
+    if tokens.get("error"):
+        return OUTCOME_ERROR
+    if tokens.get("cached") or result.get("from_faq"):
+        return OUTCOME_CACHE
+    return OUTCOME_LLM
+
+
+class _Ewma:
+    __slots__ = ("value", "samples")
+
+    def __init__(self):
+        self.value = 0.0
+        self.samples = 0
+
+    def update(self, sample: float, alpha: float) -> None:
+        if self.samples == 0:
+            self.value = sample
+        else:
+            self.value += alpha * (sample - self.value)
+        self.samples += 1
+
+
+class ServiceTimeModel:
+    def __init__(self, alpha: float = 0.2, default_service_s: float = 5.0):
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self.default_service_s = max(0.0, float(default_service_s))
+        # (priority, outcome) → service-time EWMA (seconds)
+        self._service: Dict[tuple, _Ewma] = {}
+        # priority → EWMA of "answered from cache" (0/1)
+        self._cache_share: Dict[int, _Ewma] = {}
+        self._all = _Ewma()
+
+    def observe(self, priority: int, outcome: str, service_s: float) -> None:
+        if outcome == OUTCOME_DEGRADED:
+            return
+        service_s = max(0.0, float(service_s))
+        key = (priority, outcome)
+        ewma = self._service.get(key)
+        if ewma is None:
+            ewma = self._service[key] = _Ewma()
+        ewma.update(service_s, self.alpha)
+        if outcome != OUTCOME_ERROR:
+            share = self._cache_share.get(priority)
+            if share is None:
+                share = self._cache_share[priority] = _Ewma()
+            share.update(1.0 if outcome == OUTCOME_CACHE else 0.0, self.alpha)
+        self._all.update(service_s, self.alpha)
+
+    def samples(self, priority: Optional[int] = None) -> int:
+        if priority is None:
+            return self._all.samples
+        return sum(e.samples for (p, _), e in self._service.items() if p == priority)
+
+    def _outcome_mean(self, priority: int, outcome: str) -> Optional[float]:
+        ewma = self._service.get((priority, outcome))
+        return ewma.value if ewma is not None and ewma.samples else None
+
+    def expected_service(self, priority: int) -> float:
+        """คาดการณ์เวลาประมวลผล 1 request ของ class นี้ (วินาที)"""
+        fallback = self._all.value if self._all.samples else self.default_service_s
+        llm = self._outcome_mean(priority, OUTCOME_LLM)
+        cache = self._outcome_mean(priority, OUTCOME_CACHE)
+        if llm is None and cache is None:
+            return fallback
+        share = self._cache_share.get(priority)
+        p_cache = share.value if share is not None and share.samples else 0.0
+        if llm is None:
+            llm = fallback
+        if cache is None:
+            cache = 0.0
+            p_cache = 0.0
+        return p_cache * cache + (1.0 - p_cache) * llm
+
+    def expected_wait(
+        self,
+        priority: int,
+        ahead_in_class: int,
+        class_pending: Dict[int, int],
+        class_weights: Dict[int, int],
+        workers: int,
+        active_priorities: Iterable[int] = (),
+    ) -> float:
+        """
+        เวลารอโดยประมาณ (วินาที) ของ request ที่มี ahead_in_class รายการอยู่ข้างหน้าใน class ตัวเอง
+        (ใช้ร่วมกันทั้ง backend ในหน่วยความจำและ Redis Streams ให้ estimated_wait เทียบกันได้)
+
+        ระหว่างที่ class ตัวเองปล่อย ahead_in_class + 1 รายการ class อื่นที่มีงานค้างได้ dispatch
+        ตามสัดส่วน weight (stride) แต่ไม่เกินที่ค้างอยู่จริง; active ที่กำลังทำถือว่าเหลือครึ่งหนึ่ง
+        """
+        own_weight = max(1, class_weights.get(priority, 1))
+        rounds = ahead_in_class + 1
+        work = ahead_in_class * self.expected_service(priority)
+        for other, count in class_pending.items():
+            if other == priority or count <= 0:
+                continue
+            share = rounds * max(1, class_weights.get(other, 1)) / own_weight
+            work += min(count, share) * self.expected_service(other)
+        for active in active_priorities:
+            work += 0.5 * self.expected_service(active)
+        return work / max(1, workers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        classes: Dict[int, Dict[str, Any]] = {}
+        for (priority, outcome), ewma in sorted(self._service.items()):
+            entry = classes.setdefault(priority, {})
+            entry[f"{outcome}_ms"] = round(ewma.value * 1000, 1)
+            entry[f"{outcome}_samples"] = ewma.samples
+        for priority, entry in classes.items():
+            share = self._cache_share.get(priority)
+            entry["cache_share"] = round(share.value, 3) if share is not None else 0.0
+            entry["expected_ms"] = round(self.expected_service(priority) * 1000, 1)
+        return {
+            "alpha": self.alpha,
+            "samples": self._all.samples,
+            "overall_ms": round(self._all.value * 1000, 1),
+            "classes": classes,
+        }
@@ -2,11 +2,12 @@ import os
 import threading
 import logging
 from typing import List, Dict, Tuple, Optional
-from app.config import PDF_QUICK_USE_FOLDER, debug_list_files
+from app.config import LLM_DEADLINE_MIN_RERANK_S, PDF_QUICK_USE_FOLDER, debug_list_files
 from app.utils.vector_manager import vector_manager
 from retriever.hybrid_retriever import hybrid_retriever
 from retriever.intent_analyzer import analyze_intent
-from retriever.reranker import rerank_chunks
+from retriever.reranker import rerank_chunks_batch
+from queue_manager.deadline import Deadline
 
 # ตั้งค่า Logging สำหรับการตรวจสอบการทำงาน
 logging.basicConfig(level=logging.INFO)
@@ -69,6 +70,7 @@ def retrieve_top_k_chunks(
     use_intent_analysis: bool = True,
     # Legacy parameters (kept for backward compatibility)
     use_llm_rerank: bool = True,
+    deadline: Optional[Deadline] = None,
 ) -> List[Tuple[Dict, float]]:
     """
     ค้นหาข้อมูลที่ใกล้เคียงที่สุด — ไม่มี LLM call ใดๆ
@@ -85,142 +87,255 @@ def retrieve_top_k_chunks(
         use_hybrid: Enable hybrid search (dense + sparse)
         use_rerank: Enable cross-encoder reranking
         use_intent_analysis: Enable rule-based intent detection
+        deadline: Request deadline — งบเหลือไม่ถึง LLM_DEADLINE_MIN_RERANK_S จะข้าม rerank
     
     Returns:
         List of (entry, score) tuples where entry has 'chunk' and 'source'
     """
+    return retrieve_top_k_chunks_batch(
+        [query],
+        k=k,
+        folder=folder,
+        use_hybrid=use_hybrid,
+        use_rerank=use_rerank,
+        use_intent_analysis=use_intent_analysis,
+        use_llm_rerank=use_llm_rerank,
+        deadline=deadline,
+    )[0]
+
+
+def _build_filters(intent_data: Dict) -> Dict:
+    # Only use doc_type as a hard filter (pre-filter in ChromaDB)
+    # academic_year/semester are NOT used as filters because:
+    # 1. Chunk metadata may not have these fields set correctly
+    # 2. Semantic search + BM25 naturally rank by relevance
+    # 3. Aggressive filtering causes 0-result searches
+    filters = {}
+    if intent_data.get("doc_type") and intent_data["doc_type"] != "payment":
+        filters["doc_type"] = intent_data["doc_type"]
+    return filters
+
+
+def _filter_sparse_by_doc_type(sparse_results: List[Tuple[Dict, float]], filters: Dict) -> List[Tuple[Dict, float]]:
+    # Apply doc_type filter to sparse results (soft filter)
+    if not filters.get('doc_type'):
+        return sparse_results
+    filtered_sparse = []
+    for doc, score in sparse_results:
+        if filters['doc_type'] not in doc.get('source', '').lower():
+            continue
+        filtered_sparse.append((doc, score))
+    # Only use filtered if it has results; else keep all
+    return filtered_sparse if filtered_sparse else sparse_results
+
+
+def _to_scored_chunks(fused_results: List[Dict]) -> List[Tuple[Dict, float]]:
+    scored_chunks = []
+    for result in fused_results:
+        entry = {
+            'chunk': result.get('chunk', ''),
+            'source': result.get('source', ''),
+            'index': result.get('metadata', {}).get('chunk_index', 0)
+        }
+        score = result.get('rrf_score', result.get('score', 0))
+        scored_chunks.append((entry, score))
+    return scored_chunks
+
+
+def _apply_keyword_guarantee(
+    scored_chunks: List[Tuple[Dict, float]],
+    fused_results: List[Dict],
+    entities: List[str],
+    k: int,
+) -> List[Tuple[Dict, float]]:
+    """
+    Keyword guarantee — ensure chunks with exact entity matches from
+    intent analysis are always included in results.
+    This prevents cross-encoder from dropping keyword-relevant chunks.
+    """
+    if not entities or not scored_chunks:
+        return scored_chunks
+
+    # Check if entities are already in scored_chunks
+    scored_text = " ".join(c[0].get('chunk', '') for c in scored_chunks)
+    entities_missing = [e for e in entities if e not in scored_text]
+    if not entities_missing:
+        return scored_chunks
+
+    logger.info(f"🔑 Entities missing from top-{k}: {entities_missing}, checking fused ({len(fused_results)} results)...")
+    for result in fused_results:
+        chunk_text = result.get('chunk', '')
+        for entity in entities_missing:
+            if entity in chunk_text:
+                entry = {
+                    'chunk': chunk_text,
+                    'source': result.get('source', ''),
+                    'index': result.get('metadata', {}).get('chunk_index', 0),
+                }
+                boost_score = scored_chunks[0][1] * 0.9 if scored_chunks else 1.0
+                scored_chunks.insert(1, (entry, boost_score))
+                scored_chunks = scored_chunks[:k + 1]
+                entities_missing.remove(entity)
+                logger.info(f"🔑 Keyword boost: inserted chunk containing '{entity}' (len={len(chunk_text)})")
+                break
+        if not entities_missing:
+            break
+    if entities_missing:
+        logger.warning(f"⚠️ Entities still missing after boost: {entities_missing}")
+    return scored_chunks
+
+
+def retrieve_top_k_chunks_batch(
+    queries: List[str],
+    k: int = 5,
+    folder: str = PDF_QUICK_USE_FOLDER,
+    use_hybrid: bool = True,
+    use_rerank: bool = True,
+    use_intent_analysis: bool = True,
+    # Legacy parameters (kept for backward compatibility)
+    use_llm_rerank: bool = True,
+    deadline: Optional[Deadline] = None,
+) -> List[List[Tuple[Dict, float]]]:
+    """
+    Batch retrieval — pipeline เดียวกับ retrieve_top_k_chunks แต่ทำหลายคำถามพร้อมกัน
+    ใช้สำหรับ offline evaluation และ FAQ refresh
+
+    - Dense: encode ทุกคำถามใน embedding batch เดียว
+    - Sparse: BM25 แบบ vectorized (query x document matrix)
+    - Rerank: ส่ง (query, chunk) pairs ทั้งหมดให้ cross-encoder เป็น batch ใหญ่
+
+    Args:
+        queries: Search queries
+        k: Number of results per query
+        folder: Source folder (kept for compatibility)
+        use_hybrid: Enable hybrid search (dense + sparse)
+        use_rerank: Enable cross-encoder reranking
+        use_intent_analysis: Enable rule-based intent detection
+        deadline: Request deadline (ถามตอนถึง stage rerank — thread pool ไม่เห็น contextvars)
+
+    Returns:
+        One list of (entry, score) tuples per query, in input order
+    """
+    if not queries:
+        return []
+
     try:
         # Step 1: Rule-based Intent Analysis (instant, no API call)
-        intent_data = {}
-        if use_intent_analysis:
-            try:
-                intent_data = analyze_intent(query)
-            except Exception as e:
-                logger.warning(f"⚠️ Intent analysis error: {e}")
-        
+        intents: List[Dict] = []
+        for query in queries:
+            intent_data = {}
+            if use_intent_analysis:
+                try:
+                    intent_data = analyze_intent(query)
+                except Exception as e:
+                    logger.warning(f"⚠️ Intent analysis error: {e}")
+            intents.append(intent_data)
+
         # Extract filters from intent
-        # Only use doc_type as a hard filter (pre-filter in ChromaDB)
-        # academic_year/semester are NOT used as filters because:
-        # 1. Chunk metadata may not have these fields set correctly
-        # 2. Semantic search + BM25 naturally rank by relevance
-        # 3. Aggressive filtering causes 0-result searches
-        filters = {}
-        if intent_data.get("doc_type") and intent_data["doc_type"] != "payment":
-            filters["doc_type"] = intent_data["doc_type"]
-        
-        if filters:
-            logger.info(f"🔍 Filters: {filters}")
-        
+        filters_per_query = [_build_filters(intent_data) for intent_data in intents]
+        for filters in filters_per_query:
+            if filters:
+                logger.info(f"🔍 Filters: {filters}")
+
         # Step 2: Hybrid Search
         if use_hybrid and hybrid_retriever.bm25_index is not None:
             # Dense search with filters
-            dense_results = vector_manager.search(query, k=k*3, filter_dict=filters)
-            
+            dense_batch = vector_manager.search_batch(queries, k=k*3, filter_dicts=filters_per_query)
+
             # Sparse search (BM25)
-            sparse_results = hybrid_retriever.bm25_search(query, k=k*2)
-            
-            # Apply doc_type filter to sparse results (soft filter)
-            if filters.get('doc_type'):
-                filtered_sparse = []
-                for doc, score in sparse_results:
-                    if filters['doc_type'] not in doc.get('source', '').lower():
-                        continue
-                    filtered_sparse.append((doc, score))
-                # Only use filtered if it has results; else keep all
-                if filtered_sparse:
-                    sparse_results = filtered_sparse
-            
+            sparse_batch = hybrid_retriever.bm25_search_batch(queries, k=k*2)
+            sparse_batch = [
+                _filter_sparse_by_doc_type(sparse_results, filters)
+                for sparse_results, filters in zip(sparse_batch, filters_per_query)
+            ]
+
             # RRF Fusion
-            fused_results = hybrid_retriever.rrf_fusion(
-                dense_results, 
-                sparse_results, 
-                k=k*2,
-                dense_weight=0.7,
-                sparse_weight=0.3,
-            )
-            
-            # Fallback: if filtered search returns 0, retry WITHOUT filters
-            if not fused_results and filters:
-                logger.info("🔄 Filtered search returned 0, retrying without filters...")
-                dense_results = vector_manager.search(query, k=k*3, filter_dict=None)
-                sparse_results = hybrid_retriever.bm25_search(query, k=k*2)
-                fused_results = hybrid_retriever.rrf_fusion(
-                    dense_results, sparse_results, k=k*2,
-                    dense_weight=0.7, sparse_weight=0.3,
+            fused_batch = [
+                hybrid_retriever.rrf_fusion(
+                    dense_results,
+                    sparse_results,
+                    k=k*2,
+                    dense_weight=0.7,
+                    sparse_weight=0.3,
                 )
-            
-            logger.info(f"🔀 Hybrid: {len(dense_results)} dense + {len(sparse_results)} sparse → {len(fused_results)} fused")
-            
+                for dense_results, sparse_results in zip(dense_batch, sparse_batch)
+            ]
+
+            # Fallback: if filtered search returns 0, retry WITHOUT filters
+            retry_idx = [
+                i for i, fused in enumerate(fused_batch)
+                if not fused and filters_per_query[i]
+            ]
+            if retry_idx:
+                logger.info(f"🔄 Filtered search returned 0 for {len(retry_idx)} queries, retrying without filters...")
+                retry_queries = [queries[i] for i in retry_idx]
+                retry_dense = vector_manager.search_batch(retry_queries, k=k*3, filter_dicts=None)
+                retry_sparse = hybrid_retriever.bm25_search_batch(retry_queries, k=k*2)
+                for pos, i in enumerate(retry_idx):
+                    dense_batch[i] = retry_dense[pos]
+                    sparse_batch[i] = retry_sparse[pos]
+                    fused_batch[i] = hybrid_retriever.rrf_fusion(
+                        retry_dense[pos], retry_sparse[pos], k=k*2,
+                        dense_weight=0.7, sparse_weight=0.3,
+                    )
+
+            for dense_results, sparse_results, fused_results in zip(dense_batch, sparse_batch, fused_batch):
+                logger.info(f"🔀 Hybrid: {len(dense_results)} dense + {len(sparse_results)} sparse → {len(fused_results)} fused")
+
         else:
             # Fallback to pure semantic search
             logger.info("📡 Using pure semantic search")
-            fused_results = vector_manager.search(query, k=k*2, filter_dict=filters)
-            
+            fused_batch = vector_manager.search_batch(queries, k=k*2, filter_dicts=filters_per_query)
+
             # Fallback: if filtered search returns 0, retry WITHOUT filters
-            if not fused_results and filters:
-                logger.info("🔄 Filtered search returned 0, retrying without filters...")
-                fused_results = vector_manager.search(query, k=k*2, filter_dict=None)
-        
+            retry_idx = [
+                i for i, fused in enumerate(fused_batch)
+                if not fused and filters_per_query[i]
+            ]
+            if retry_idx:
+                logger.info(f"🔄 Filtered search returned 0 for {len(retry_idx)} queries, retrying without filters...")
+                retry_results = vector_manager.search_batch(
+                    [queries[i] for i in retry_idx], k=k*2, filter_dicts=None
+                )
+                for pos, i in enumerate(retry_idx):
+                    fused_batch[i] = retry_results[pos]
+
         # Step 3: Convert to (entry, score) tuples
-        scored_chunks = []
-        for result in fused_results:
-            entry = {
-                'chunk': result.get('chunk', ''),
-                'source': result.get('source', ''),
-                'index': result.get('metadata', {}).get('chunk_index', 0)
-            }
-            score = result.get('rrf_score', result.get('score', 0))
-            scored_chunks.append((entry, score))
-        
+        scored_batch = [_to_scored_chunks(fused_results) for fused_results in fused_batch]
+
         # Step 4: Cross-Encoder Reranking (local model, no API call)
-        if use_rerank and scored_chunks:
+        # งบเหลือน้อย → ข้าม rerank (ใช้ลำดับจาก RRF) เพื่อเหลือเวลาให้ LLM
+        if use_rerank and deadline is not None and not deadline.allows(LLM_DEADLINE_MIN_RERANK_S):
+            logger.info(f"⏱️ Skipping rerank: {deadline.remaining():.2f}s left before the request deadline")
+            use_rerank = False
+        if use_rerank:
             try:
-                scored_chunks = rerank_chunks(query, scored_chunks, top_k=k)
+                scored_batch = rerank_chunks_batch(queries, scored_batch, top_k=k)
             except Exception as e:
                 logger.warning(f"⚠️ Cross-encoder reranking error: {e}")
-                scored_chunks = scored_chunks[:k]
+                scored_batch = [scored_chunks[:k] for scored_chunks in scored_batch]
         else:
-            scored_chunks = scored_chunks[:k]
-        
-        # Step 5: Keyword guarantee — ensure chunks with exact entity
-        # matches from intent analysis are always included in results.
-        # This prevents cross-encoder from dropping keyword-relevant chunks.
-        entities = intent_data.get("key_entities", [])
-        if entities and scored_chunks:
-            # Check if entities are already in scored_chunks
-            scored_text = " ".join(c[0].get('chunk', '') for c in scored_chunks)
-            entities_missing = [e for e in entities if e not in scored_text]
-            if entities_missing:
-                logger.info(f"🔑 Entities missing from top-{k}: {entities_missing}, checking fused ({len(fused_results)} results)...")
-                for result in fused_results:
-                    chunk_text = result.get('chunk', '')
-                    for entity in entities_missing:
-                        if entity in chunk_text:
-                            entry = {
-                                'chunk': chunk_text,
-                                'source': result.get('source', ''),
-                                'index': result.get('metadata', {}).get('chunk_index', 0),
-                            }
-                            boost_score = scored_chunks[0][1] * 0.9 if scored_chunks else 1.0
-                            scored_chunks.insert(1, (entry, boost_score))
-                            scored_chunks = scored_chunks[:k + 1]
-                            entities_missing.remove(entity)
-                            logger.info(f"🔑 Keyword boost: inserted chunk containing '{entity}' (len={len(chunk_text)})")
-                            break
-                    if not entities_missing:
-                        break
-                if entities_missing:
-                    logger.warning(f"⚠️ Entities still missing after boost: {entities_missing}")
-        
-        if not scored_chunks:
-            logger.warning(f"⚠️ No results found for query: '{query}'")
-        else:
-            logger.info(f"✅ Final results: {len(scored_chunks)} chunks (top score: {scored_chunks[0][1]:.2f})")
-        
-        return scored_chunks
+            scored_batch = [scored_chunks[:k] for scored_chunks in scored_batch]
+
+        # Step 5: Keyword guarantee
+        results_batch = []
+        for query, intent_data, scored_chunks, fused_results in zip(queries, intents, scored_batch, fused_batch):
+            scored_chunks = _apply_keyword_guarantee(
+                scored_chunks,
+                fused_results,
+                intent_data.get("key_entities", []),
+                k,
+            )
+            if not scored_chunks:
+                logger.warning(f"⚠️ No results found for query: '{query}'")
+            else:
+                logger.info(f"✅ Final results: {len(scored_chunks)} chunks (top score: {scored_chunks[0][1]:.2f})")
+            results_batch.append(scored_chunks)
+
+        return results_batch
 
     except Exception as e:
         logger.error(f"❌ Retrieval Error: {e}")
         import traceback
         traceback.print_exc()
-        return []
\ No newline at end of file
+        return [[] for _ in queries]
@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 from rank_bm25 import BM25Okapi
 from collections import defaultdict
 from typing import List, Dict, Tuple, Optional
@@ -10,12 +11,15 @@ class HybridRetriever:
     🔥 Hybrid Search combining Dense (Semantic) + Sparse (BM25) with:
     - Thai tokenization support
     - Weighted RRF fusion
+    - Vectorized BM25 scoring (single + batch queries)
     - Better error handling
     """
     def __init__(self):
         self.bm25_index = None
         self.documents = []
         self.corpus_tokens = []
+        # term -> (doc indices, BM25 weights) precomputed at index time
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
         self.use_thai_tokenizer = False
         
         try:
@@ -46,10 +50,41 @@ class HybridRetriever:
         
         try:
             self.bm25_index = BM25Okapi(self.corpus_tokens)
-            logger.info(f"✅ BM25 index built with {len(chunks)} documents")
+            self._postings = self._build_postings(self.bm25_index)
+            logger.info(f"✅ BM25 index built with {len(chunks)} documents ({len(self._postings)} terms)")
         except Exception as e:
             logger.error(f"❌ BM25 index build failed: {e}")
             self.bm25_index = None
+            self._postings = {}
+
+    @staticmethod
+    def _build_postings(bm25: BM25Okapi) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Precompute per-term BM25 contributions as sparse (indices, weights) arrays
+
+        Same formula as BM25Okapi.get_scores, but computed once per term at
+        index time instead of scanning every document for every query term.
+        """
+        doc_len = np.asarray(bm25.doc_len, dtype=np.float64)
+        length_norm = bm25.k1 * (1 - bm25.b + bm25.b * doc_len / bm25.avgdl)
+
+        raw: Dict[str, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        for doc_idx, freqs in enumerate(bm25.doc_freqs):
+            for term, freq in freqs.items():
+                indices, tfs = raw[term]
+                indices.append(doc_idx)
+                tfs.append(freq)
+
+        postings = {}
+        for term, (indices, tfs) in raw.items():
+            idf = bm25.idf.get(term) or 0
+            if not idf:
+                continue
+            idx_arr = np.asarray(indices, dtype=np.int64)
+            tf_arr = np.asarray(tfs, dtype=np.float64)
+            weights = idf * (tf_arr * (bm25.k1 + 1) / (tf_arr + length_norm[idx_arr]))
+            postings[term] = (idx_arr, weights)
+        return postings
     
     def _tokenize(self, text: str) -> List[str]:
         """
@@ -87,39 +122,65 @@ class HybridRetriever:
         Returns:
             List of (document, score) tuples
         """
+        return self.bm25_search_batch([query], k=k)[0]
+
+    def bm25_search_batch(self, queries: List[str], k: int = 10) -> List[List[Tuple[Dict, float]]]:
+        """
+        BM25 keyword search for many queries at once
+
+        Scores are accumulated into a (queries x documents) matrix from the
+        precomputed postings, then top-k is taken per row.
+
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+
+        Returns:
+            One list of (document, score) tuples per query, in input order
+        """
+        if not queries:
+            return []
+
         if not self.bm25_index:
             logger.warning("⚠️ BM25 index not built yet")
-            return []
+            return [[] for _ in queries]
         
         try:
-            query_tokens = self._tokenize(query)
-            
-            if not query_tokens:
-                logger.warning("⚠️ Query tokenization resulted in empty tokens")
-                return []
-            
-            scores = self.bm25_index.get_scores(query_tokens)
-            
-            top_indices = sorted(
-                range(len(scores)), 
-                key=lambda i: scores[i], 
-                reverse=True
-            )[:k]
-            
-            results = [
-                (self.documents[i], float(scores[i]))
-                for i in top_indices
-                if scores[i] > 0
-            ]
-            
-            if results:
-                logger.debug(f"BM25 found {len(results)} results, top score: {results[0][1]:.2f}")
-            
-            return results
+            scores = np.zeros((len(queries), len(self.documents)), dtype=np.float64)
+            has_tokens = []
+            for row, query in enumerate(queries):
+                query_tokens = self._tokenize(query)
+                has_tokens.append(bool(query_tokens))
+                if not query_tokens:
+                    logger.warning("⚠️ Query tokenization resulted in empty tokens")
+                    continue
+                # Duplicate query tokens count once per occurrence (same as BM25Okapi)
+                for token in query_tokens:
+                    posting = self._postings.get(token)
+                    if posting is not None:
+                        scores[row, posting[0]] += posting[1]
+
+            batch_results = []
+            for row in range(len(queries)):
+                if not has_tokens[row]:
+                    batch_results.append([])
+                    continue
+                row_scores = scores[row]
+                top_indices = np.argsort(-row_scores, kind="stable")[:k]
+                results = [
+                    (self.documents[i], float(row_scores[i]))
+                    for i in top_indices
+                    if row_scores[i] > 0
+                ]
+                if results:
+                    logger.debug(f"BM25 found {len(results)} results, top score: {results[0][1]:.2f}")
+                batch_results.append(results)
+
+            return batch_results
             
         except Exception as e:
             logger.error(f"❌ BM25 search error: {e}")
-            return []
+            return [[] for _ in queries]
     
     def rrf_fusion(
         self, 
@@ -32,6 +32,10 @@ def _get_cross_encoder():
     return _cross_encoder
 
 
+_MAX_RERANK_CANDIDATES = 20
+_RERANK_BATCH_SIZE = 64
+
+
 def rerank_chunks(
     query: str,
     chunks: List[Tuple[Dict, float]],
@@ -50,54 +54,91 @@ def rerank_chunks(
     Returns:
         Reranked list of (chunk_dict, new_score) tuples
     """
-    if not chunks:
-        return []
+    return rerank_chunks_batch([query], [chunks], top_k=top_k, min_score=min_score)[0]
+
+
+def rerank_chunks_batch(
+    queries: List[str],
+    chunks_per_query: List[List[Tuple[Dict, float]]],
+    top_k: int = 5,
+    min_score: float = -10.0,
+    batch_size: int = _RERANK_BATCH_SIZE,
+) -> List[List[Tuple[Dict, float]]]:
+    """
+    Rerank หลายคำถามพร้อมกัน — รวม (query, chunk) pairs ทุกคำถาม
+    แล้วส่งให้ cross-encoder ในการเรียก predict ครั้งเดียว (แบ่งเป็น batch ใหญ่)
+
+    Args:
+        queries: รายการคำถาม
+        chunks_per_query: candidates ของแต่ละคำถาม (ลำดับเดียวกับ queries)
+        top_k: จำนวนผลลัพธ์ที่ต้องการต่อคำถาม
+        min_score: คะแนนต่ำสุดที่จะรวม
+        batch_size: ขนาด batch ของ cross-encoder
+
+    Returns:
+        Reranked list of (chunk_dict, new_score) tuples ต่อคำถาม
+    """
+    if len(queries) != len(chunks_per_query):
+        raise ValueError("queries and chunks_per_query must have the same length")
+
+    output: List[List[Tuple[Dict, float]]] = [
+        list(chunks[:top_k]) if chunks else [] for chunks in chunks_per_query
+    ]
 
-    if len(chunks) <= 1:
-        return chunks[:top_k]
+    # คำถามที่มี candidate มากกว่า 1 เท่านั้นที่ต้อง rerank
+    pending = [idx for idx, chunks in enumerate(chunks_per_query) if chunks and len(chunks) > 1]
+    if not pending:
+        return output
 
     encoder = _get_cross_encoder()
     if encoder is None:
         logger.warning("Cross-encoder not available, using original ranking")
-        return chunks[:top_k]
+        return output
 
     try:
         # จำกัดจำนวน chunks ที่ส่งให้ cross-encoder (ประหยัดเวลา)
-        candidates = chunks[:min(20, len(chunks))]
-
-        # สร้าง query-document pairs สำหรับ cross-encoder
-        pairs = [
-            (query, chunk_dict.get("chunk", "")[:1000])
-            for chunk_dict, _ in candidates
-        ]
-
-        # Cross-encoder scoring (local, ไม่มี API cost)
-        scores = encoder.predict(pairs, show_progress_bar=False)
-
-        # สร้าง reranked results
-        reranked = []
-        for idx, score in enumerate(scores):
-            score_float = float(score)
-            if score_float >= min_score:
-                chunk_dict = candidates[idx][0]
-                reranked.append((chunk_dict, score_float))
-
-        # Sort by cross-encoder score (descending)
-        reranked.sort(key=lambda x: x[1], reverse=True)
-
-        if reranked:
-            logger.info(
-                "Cross-encoder reranked: %d chunks, top score: %.3f, bottom score: %.3f",
-                len(reranked),
-                reranked[0][1],
-                reranked[-1][1],
+        candidates = {idx: chunks_per_query[idx][:_MAX_RERANK_CANDIDATES] for idx in pending}
+
+        # สร้าง query-document pairs ของทุกคำถามรวมกัน
+        pairs = []
+        for idx in pending:
+            pairs.extend(
+                (queries[idx], chunk_dict.get("chunk", "")[:1000])
+                for chunk_dict, _ in candidates[idx]
             )
 
-        return reranked[:top_k]
+        # Cross-encoder scoring (local, ไม่มี API cost)
+        scores = encoder.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+
+        offset = 0
+        for idx in pending:
+            query_candidates = candidates[idx]
+            query_scores = scores[offset:offset + len(query_candidates)]
+            offset += len(query_candidates)
+
+            reranked = []
+            for cand_idx, score in enumerate(query_scores):
+                score_float = float(score)
+                if score_float >= min_score:
+                    reranked.append((query_candidates[cand_idx][0], score_float))
+
+            # Sort by cross-encoder score (descending)
+            reranked.sort(key=lambda x: x[1], reverse=True)
+
+            if reranked:
+                logger.info(
+                    "Cross-encoder reranked: %d chunks, top score: %.3f, bottom score: %.3f",
+                    len(reranked),
+                    reranked[0][1],
+                    reranked[-1][1],
+                )
+            output[idx] = reranked[:top_k]
+
+        return output
 
     except Exception as e:
         logger.error(f"Cross-encoder reranking failed: {e}")
-        return chunks[:top_k]
+        return output
 
 
 def is_reranker_available() -> bool:
@@ -22,6 +22,11 @@ from memory.faq_cache import (
     delete_faq_entry,
     purge_expired_faq_entries,
 )
+from app.utils.llm.adaptive_limiter import llm_limiter
+from app.utils.llm.circuit_breaker import llm_breaker
+from app.utils.llm.pipeline_stages import get_pipeline_stage_stats
+from app.utils.llm.quota_limiter import llm_quota
+from app.utils.llm.single_flight import answer_flights
 from memory.session import get_bot_enabled, set_bot_enabled
 from memory.session_db import session_db
 from pdf_to_txt import process_pdfs
@@ -568,6 +573,11 @@ async def api_monitor_stats():
 
     return {
         "queue": queue_stats,
+        "llm_limiter": llm_limiter.get_stats(),
+        "single_flight": answer_flights.get_stats(),
+        "pipeline_stages": get_pipeline_stage_stats(),
+        "llm_quota": await llm_quota.get_stats(),
+        "llm_breaker": llm_breaker.get_stats(),
         "recent_activity": logs,
         "active_sessions": session_count,
         "faq_analytics": await get_faq_analytics(),
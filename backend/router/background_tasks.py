@@ -20,7 +20,10 @@ from app.config import (
     RAG_STARTUP_EMBEDDING,
     RAG_STARTUP_PROCESS_PDF,
     RAG_STARTUP_BUILD_HYBRID,
+    FAQ_REFRESH_PACING_S,
 )
+from app.utils.llm.quota_limiter import PRIORITY_REFRESH, llm_priority, llm_quota
+from queue_manager import PRIORITY_BACKGROUND, PRIORITY_MESSENGER
 from memory.session import get_or_create_history, save_history, cleanup_old_sessions, get_bot_enabled
 
 load_dotenv()
@@ -222,8 +225,12 @@ async def refresh_faq_cache():
     logger.info(f"🔄 [FAQ Refresh] Validating {len(stale_questions)} stale entries...")
     refreshed = 0
     invalidated = 0
+    # ไม่มี quota limit สำหรับ provider (ค่า default) → acquire ไม่หน่วง: เว้นระยะเองเหมือนเดิม
+    pacing_s = 0.0 if llm_quota.is_limited(LLM_PROVIDER) else FAQ_REFRESH_PACING_S
 
-    for question in stale_questions:
+    for idx, question in enumerate(stale_questions):
+        if idx and pacing_s and ask_llm_fn:
+            await asyncio.sleep(pacing_s)
         try:
             if not ask_llm_fn:
                 await mark_validated(question)
@@ -231,8 +238,26 @@ async def refresh_faq_cache():
                 continue
 
             # ask_llm_fn ทำ retrieval + reranking + LLM call ครบในรอบเดียว
-            result = await ask_llm_fn(question, f"faq_refresh_{hash(question) % 10000}")
+            # priority "refresh": ใช้ได้เฉพาะ quota ที่เกิน reserve ของผู้ใช้จริง (ถ้าตั้ง LLM_QUOTA_LIMITS ไว้)
+            # ผ่าน llm_queue ที่ class background → ไม่แย่ง worker จาก web / Messenger / voice
+            refresh_session_id = f"faq_refresh_{hash(question) % 10000}"
+            with llm_priority(PRIORITY_REFRESH):
+                if llm_queue:
+                    result = await llm_queue.submit(
+                        user_id="faq_refresh",
+                        session_id=refresh_session_id,
+                        msg=question,
+                        priority=PRIORITY_BACKGROUND,
+                    )
+                else:
+                    result = await ask_llm_fn(question, refresh_session_id)
             new_answer = str(result.get("text", "")).strip()
+            tokens = result.get("tokens") if isinstance(result.get("tokens"), dict) else {}
+            if result.get("degraded") or result.get("diverted") or tokens.get("error"):
+                # หมดงบ / คิวล้น / LLM ล่ม → ไม่ใช่คำตอบจริง: ไม่ validate และไม่ invalidate (ลองใหม่รอบหน้า)
+                reason = result.get("degraded") or ("diverted" if result.get("diverted") else "error")
+                logger.info(f"⏭️ [FAQ Refresh] Skipped '{question[:40]}' ({reason})")
+                continue
 
             if new_answer and len(new_answer) > 20:
                 await mark_validated(question, new_answer=new_answer)
@@ -241,9 +266,6 @@ async def refresh_faq_cache():
                 await invalidate_entry(question)
                 invalidated += 1
 
-            # Small delay between questions to avoid rate limits
-            await asyncio.sleep(5)
-
         except Exception as e:
             logger.warning(f"⚠️ [FAQ Refresh] Error refreshing '{question[:40]}': {e}")
             # Don't invalidate on error — just skip
@@ -364,6 +386,7 @@ async def fb_worker():
                         user_id=f"fb_{psid}",
                         session_id=session_id,
                         msg=user_text,
+                        priority=PRIORITY_MESSENGER,
                     )
                 else:
                     result = await ask_llm_fn(user_text, session_id)
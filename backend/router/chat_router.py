@@ -29,10 +29,11 @@ from app.config import (
     SPEECH_REQUIRE_API_KEY,
     SPEECH_ALLOWED_API_KEYS,
     SPEECH_RATE_LIMIT_PER_MINUTE,
+    QUEUE_DISCONNECT_POLL_S,
 )
 from memory.session import get_or_create_history, save_history, get_bot_enabled
 from router.socketio_handlers import emit_to_web_session
-from queue_manager import QueueFullError, QueueTimeoutError
+from queue_manager import PRIORITY_WEB, QueueFullError, QueueTimeoutError, RequestCancelled
 
 router = APIRouter(prefix="/api", tags=["chat"])
 logger = logging.getLogger("ChatRouter")
@@ -94,6 +95,34 @@ def _resolve_session_id(request: Request, incoming_session_id: str) -> str:
         return cookie_sid
     return _issue_server_session_id()
 
+async def _until_disconnected(request: Request, coro):
+    """
+    รอผลของ coro แต่ cancel ทิ้งถ้า HTTP client ตัดการเชื่อมต่อ (ASGI http.disconnect)
+    → submit ถูก cancel: คิวถอด request ออก / handler หยุดที่ขอบ stage ถัดไป
+    """
+    task = asyncio.ensure_future(coro)
+    disconnected = False
+
+    async def _watch():
+        nonlocal disconnected
+        while not task.done():
+            if await request.is_disconnected():
+                disconnected = True
+                task.cancel()
+                return
+            await asyncio.sleep(QUEUE_DISCONNECT_POLL_S)
+
+    watcher = asyncio.create_task(_watch())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if disconnected:
+            raise RequestCancelled("client_disconnected") from None
+        raise
+    finally:
+        watcher.cancel()
+
+
 def init_chat_router(socketio_instance, locks_dict, audit_log_fn, queue_instance=None):
     """Initialize router with dependencies"""
     global sio, session_locks, audit_logger, llm_queue
@@ -218,14 +247,27 @@ async def handle_speech(
         # ── Submit to decoupled queue system ──
         try:
             if llm_queue:
-                result = await llm_queue.submit(
+                result = await _until_disconnected(request, llm_queue.submit(
                     user_id=user_id,
                     session_id=final_session_id,
                     msg=text,
                     emit_fn=_emit_to_session,
-                )
+                    priority=PRIORITY_WEB,
+                    stream=True,
+                ))
             else:
-                result = await ask_llm(text, final_session_id, emit_fn=_emit_to_session)
+                result = await _until_disconnected(
+                    request, ask_llm(text, final_session_id, emit_fn=_emit_to_session, stream=True)
+                )
+        except RequestCancelled as cancelled:
+            # Client gone (HTTP abort / every socket of the session disconnected): nothing to send
+            logger.info("Request cancelled for session=%s: %s", final_session_id[:16], cancelled.reason)
+            return {
+                "text": "",
+                "motion": "Idle",
+                "session_id": final_session_id,
+                "queue_error": "cancelled",
+            }
         except QueueFullError as qfe:
             logger.warning("Queue full for user=%s: %s", user_id[:16], qfe)
             return {
@@ -252,6 +294,15 @@ async def handle_speech(
             motion = "Idle"
         tokens = result.get("tokens", {})
     
+    display_text = f"[Bot พี่เร็ก] {reply.replace('//', '')}"
+
+    # ส่งคำตอบสุดท้ายให้ผู้ใช้ก่อน แล้วค่อยทำ audit / admin fan-out
+    await emit_to_web_session("ai_response", {
+        "motion": motion,
+        "text": display_text,
+        "tts_text": reply,
+    }, final_session_id)
+
     model_name = GEMINI_MODEL_NAME if LLM_PROVIDER == "gemini" else (
         OPENAI_MODEL_NAME if LLM_PROVIDER == "openai" else LOCAL_MODEL_NAME
     )
@@ -269,19 +320,12 @@ async def handle_speech(
             trace_id=trace_id,
         )
     
-    display_text = f"[Bot พี่เร็ก] {reply.replace('//', '')}"
     if sio:
         await sio.emit("admin_bot_reply", {
             "platform": "web",
             "uid": final_session_id,
             "text": display_text
         })
-
-    await emit_to_web_session("ai_response", {
-        "motion": motion,
-        "text": display_text,
-        "tts_text": reply,
-    }, final_session_id)
     
     return {
         "text": display_text,
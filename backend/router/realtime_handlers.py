@@ -27,9 +27,11 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Awaitable, Callable
 
+from app.config import LLM_DEADLINE_RESERVE_S
 from app.stt import transcribe
 from app.stt_stream import StreamingSTTSession
 from app.utils.llm.llm import ask_llm
+from queue_manager import PRIORITY_REALTIME, Deadline, QueueFullError, RequestCancelled, deadline_scope
 
 
 ResolveSessionFn = Callable[[str, dict | None], str]
@@ -54,6 +56,7 @@ class RealtimeSession:
 
 _resolve_session_id: ResolveSessionFn | None = None
 _emit_to_session: EmitToSessionFn | None = None
+_llm_queue = None  # LLMRequestQueue (optional) — voice turns go through it at the top priority class
 _sessions: dict[str, RealtimeSession] = {}
 
 _ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -74,6 +77,39 @@ def _append_realtime_log(entry: dict) -> None:
         f.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
 
+async def _ask_llm_realtime(user_text: str, session_id: str) -> dict:
+    """
+    Voice turn → LLM queue (PRIORITY_REALTIME) ถ้ามี, ไม่งั้นเรียก ask_llm ตรง
+    Deadline = งบ REALTIME_LLM_TIMEOUT_MS (หักเวลาเผื่อไว้) → pipeline ตอบ degraded ก่อน wait_for ภายนอกตัด
+    """
+    deadline = Deadline.within(_REALTIME_LLM_TIMEOUT_MS / 1000.0, LLM_DEADLINE_RESERVE_S)
+    result: dict
+    if _llm_queue is None:
+        result = await ask_llm(
+            user_text, session_id, runtime_profile="realtime", trace_source="realtime", deadline=deadline
+        )
+    else:
+        with deadline_scope(deadline):  # queue ใช้ตัวที่เร็วกว่าระหว่างนี้กับ request_timeout ของคิว
+            result = await _llm_queue.submit(
+                user_id=session_id,
+                session_id=session_id,
+                msg=user_text,
+                priority=PRIORITY_REALTIME,
+                runtime_profile="realtime",
+                trace_source="realtime",
+            )
+    return result
+
+
+def cancel_session_turn(session_id: str) -> bool:
+    """Client หลุด: ยกเลิก voice turn ที่กำลังทำ (submit ในคิวถูก cancel ตาม) และทิ้ง state ของ session"""
+    ses = _sessions.pop(session_id, None)
+    if ses is None or ses.turn_task is None or ses.turn_task.done():
+        return False
+    ses.turn_task.cancel()
+    return True
+
+
 def _get_or_create_session(session_id: str) -> RealtimeSession:
     ses = _sessions.get(session_id)
     if ses is None:
@@ -188,7 +224,7 @@ async def _process_turn(session_id: str) -> None:
         metrics["llm_start_ts"] = time.perf_counter()
         try:
             result = await asyncio.wait_for(
-                ask_llm(user_text, session_id, runtime_profile="realtime", trace_source="realtime"),
+                _ask_llm_realtime(user_text, session_id),
                 timeout=_REALTIME_LLM_TIMEOUT_MS / 1000.0,
             )
             metrics["llm_end_ts"] = time.perf_counter()
@@ -197,6 +233,15 @@ async def _process_turn(session_id: str) -> None:
             metrics["llm_end_ts"] = time.perf_counter()
             metrics["error"] = "llm_timeout"
             ai_text = "ขออภัย ตอนนี้ระบบตอบสนองช้า กรุณาถามสั้นลงอีกครั้งครับ"
+        except QueueFullError:
+            metrics["llm_end_ts"] = time.perf_counter()
+            metrics["error"] = "queue_full"
+            ai_text = "ขออภัย ตอนนี้มีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้งครับ"
+        except RequestCancelled:
+            # Client disconnected: nobody is listening for the reply
+            metrics["llm_end_ts"] = time.perf_counter()
+            metrics["error"] = "cancelled"
+            return
 
         if not ai_text:
             metrics["error"] = "empty_ai_response"
@@ -375,10 +420,12 @@ def init_realtime_handlers(
     socketio_instance,
     resolve_session_id_fn: ResolveSessionFn,
     emit_to_session_fn: EmitToSessionFn,
+    llm_queue=None,
 ):
-    global _resolve_session_id, _emit_to_session
+    global _resolve_session_id, _emit_to_session, _llm_queue
     _resolve_session_id = resolve_session_id_fn
     _emit_to_session = emit_to_session_fn
+    _llm_queue = llm_queue
 
     socketio_instance.on("live_start")(handle_live_start)
     socketio_instance.on("live_audio_in")(handle_live_audio_in)
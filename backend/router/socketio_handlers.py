@@ -2,11 +2,13 @@
 SocketIO Event Handlers
 จัดการ real-time communication ผ่าน WebSocket
 """
+import asyncio
 import hmac
 import logging
 import os
 
 from app.auth import Role, decode_jwt
+from app.config import QUEUE_DISCONNECT_GRACE_S
 from memory.session import get_bot_enabled, get_or_create_history, save_history
 from router import realtime_handlers
 
@@ -14,8 +16,10 @@ logger = logging.getLogger("SocketIOHandlers")
 
 sio = None
 send_fb_text_fn = None
+_llm_queue = None  # LLMRequestQueue / RedisStreamQueue — cancel work of sessions whose client is gone
 WEB_SESSION_ROOM_PREFIX = "web_session:"
 _sid_to_session_id: dict[str, str] = {}
+_disconnect_cancels: dict[str, asyncio.Task] = {}  # session_id → grace timer before cancelling its work
 
 
 def web_session_room(session_id: str) -> str:
@@ -31,11 +35,18 @@ async def emit_to_web_session(event: str, payload: dict, session_id: str):
     await sio.emit(event, payload, room=web_session_room(session_key))
 
 
+def _register_sid(sid: str, session_id: str) -> None:
+    _sid_to_session_id[sid] = session_id
+    pending_cancel = _disconnect_cancels.pop(session_id, None)
+    if pending_cancel is not None:
+        pending_cancel.cancel()  # reconnected within the grace period → keep its work
+
+
 def resolve_session_id_for_sid(sid: str, data: dict | None = None) -> str:
     if isinstance(data, dict):
         explicit = str(data.get("session_id") or "").strip()
         if explicit:
-            _sid_to_session_id[sid] = explicit
+            _register_sid(sid, explicit)
             return explicit
     return _sid_to_session_id.get(sid, "")
 
@@ -63,11 +74,12 @@ def _is_valid_admin_socket_token(raw_token: str) -> bool:
     return claims.get("role") == Role.admin.value
 
 
-def init_socketio_handlers(socketio_instance, fb_sender_fn):
+def init_socketio_handlers(socketio_instance, fb_sender_fn, llm_queue=None):
     """Initialize SocketIO handlers"""
-    global sio, send_fb_text_fn
+    global sio, send_fb_text_fn, _llm_queue
     sio = socketio_instance
     send_fb_text_fn = fb_sender_fn
+    _llm_queue = llm_queue
 
     sio.on("admin_manual_reply")(handle_admin_manual_reply)
     sio.on("client_register_session")(handle_client_register_session)
@@ -77,6 +89,7 @@ def init_socketio_handlers(socketio_instance, fb_sender_fn):
         socketio_instance=sio,
         resolve_session_id_fn=resolve_session_id_for_sid,
         emit_to_session_fn=emit_to_web_session,
+        llm_queue=llm_queue,
     )
 
 
@@ -91,13 +104,38 @@ async def handle_client_register_session(sid, data):
 
     room = web_session_room(session_id)
     await sio.enter_room(sid, room)
-    _sid_to_session_id[sid] = session_id
+    _register_sid(sid, session_id)
     await sio.emit("session_registered", {"session_id": session_id}, room=sid)
     logger.info("Registered sid=%s to room=%s", sid, room)
 
 
 async def handle_disconnect(sid):
-    _sid_to_session_id.pop(sid, None)
+    session_id = _sid_to_session_id.pop(sid, None)
+    if not session_id or session_id in _sid_to_session_id.values():
+        return  # another tab / socket of the same session is still connected
+    if session_id not in _disconnect_cancels:
+        _disconnect_cancels[session_id] = asyncio.create_task(_cancel_session_work(session_id))
+
+
+async def _cancel_session_work(session_id: str):
+    """
+    ทุก socket ของ session หลุดนานเกิน QUEUE_DISCONNECT_GRACE_S → ไม่มีใครรอคำตอบแล้ว
+    ยกเลิก voice turn + request ในคิว (รอคิว → ถอดออก, กำลังทำ → หยุดที่ขอบ stage ถัดไป)
+    """
+    try:
+        await asyncio.sleep(QUEUE_DISCONNECT_GRACE_S)
+        if session_id in _sid_to_session_id.values():
+            return
+        realtime_handlers.cancel_session_turn(session_id)
+        if _llm_queue is not None:
+            await _llm_queue.cancel_session(session_id, reason="client_disconnected")
+    except asyncio.CancelledError:
+        pass
+    except Exception as exc:
+        logger.warning("Cancel on disconnect failed for session=%s: %s", session_id, exc)
+    finally:
+        if _disconnect_cancels.get(session_id) is asyncio.current_task():
+            _disconnect_cancels.pop(session_id, None)
 
 
 async def handle_admin_manual_reply(sid, data):
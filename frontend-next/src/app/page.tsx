@@ -28,16 +28,45 @@ export default function ChatPage() {
   const inputRef = useRef<HTMLInputElement>(null);
   const { speak, browserSpeak, stop: stopTts } = useTts();
 
+  const streamingRef = useRef<{ traceId: string; id: string } | null>(null);
+
   const addMessage = useCallback((role: "user" | "ai", text: string) => {
     setMessages((prev) => [...prev, { id: crypto.randomUUID(), role, text, timestamp: Date.now() }]);
   }, []);
 
+  const handleAIResponseDelta = useCallback(
+    (data: { trace_id?: string; delta?: string }) => {
+      const delta = data?.delta || "";
+      if (!delta) return;
+      const traceId = data.trace_id || "";
+      setStatusText("");
+      const current = streamingRef.current;
+      if (current && current.traceId === traceId) {
+        setMessages((prev) =>
+          prev.map((m) => (m.id === current.id ? { ...m, text: m.text + delta } : m))
+        );
+        return;
+      }
+      const id = crypto.randomUUID();
+      streamingRef.current = { traceId, id };
+      setMessages((prev) => [...prev, { id, role: "ai", text: delta, timestamp: Date.now() }]);
+    },
+    []
+  );
+
   const handleAIResponse = useCallback(
     async (data: { text?: string; tts_text?: string; motion?: string }) => {
       const text = (data.text || "").trim();
       if (!text) return;
       setStatusText("");
-      addMessage("ai", text);
+      // Streamed reply: replace the partial bubble with the final text
+      const streaming = streamingRef.current;
+      streamingRef.current = null;
+      if (streaming) {
+        setMessages((prev) => prev.map((m) => (m.id === streaming.id ? { ...m, text } : m)));
+      } else {
+        addMessage("ai", text);
+      }
 
       if (!ttsEnabled) return;
       const ttsText = data.tts_text || text;
@@ -63,6 +92,7 @@ export default function ChatPage() {
     registeredRef.current = true;
 
     socket.on("ai_response", (data) => handleAIResponse(data));
+    socket.on("ai_response_delta", (data) => handleAIResponseDelta(data));
     socket.on("ai_status", (data) => setStatusText(data?.status || ""));
     socket.on("queue_position", (data) => {
       if (!data) return;
@@ -81,12 +111,13 @@ export default function ChatPage() {
 
     return () => {
       socket.off("ai_response");
+      socket.off("ai_response_delta");
       socket.off("ai_status");
       socket.off("queue_position");
       socket.off("subtitle");
       registeredRef.current = false;
     };
-  }, [socket, handleAIResponse, addMessage]);
+  }, [socket, handleAIResponse, handleAIResponseDelta, addMessage]);
 
   const handleSend = useCallback(async () => {
     const text = input.trim();